@@ -1,6 +1,7 @@
 from GridCal.Engine.Core.topology import Graph
 
-from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit, compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit, compile_snapshot_circuit, split_into_islands, \
+    update_snapshot_circuit
 from GridCal.Engine.Core.snapshot_acdc import AcDcSnapshotCircuit, compile_acdc_snapshot_circuit, split_into_islands_acdc
 from GridCal.Engine.Core.time_series_pf_data import TimeCircuit
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
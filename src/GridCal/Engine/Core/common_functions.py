@@ -15,6 +15,7 @@
 
 from typing import List, Dict
 import numpy as np
+import scipy.sparse as sp
 from GridCal.Engine.basic_structures import BusMode, Logger
 
 
@@ -98,4 +99,66 @@ def find_different_states(branch_active_prof) -> Dict[int, List[int]]:
 
         k += 1
 
-    return states
\ No newline at end of file
+    return states
+
+def get_connectivity_matrix(rows, cols, shape, fmt='csc'):
+    """
+    Build a connectivity matrix straight from its coordinates
+    :param rows: array of row indices
+    :param cols: array of column indices
+    :param shape: shape of the matrix
+    :param fmt: sparse format of the result ('csc' or 'csr')
+    :return: sparse matrix with ones at the given coordinates
+    """
+    data = np.ones(len(rows), dtype=int)
+    C = sp.coo_matrix((data, (rows, cols)), shape=shape, dtype=int).asformat(fmt)
+
+    # repeated coordinates are summed by the conversion; a connectivity is binary
+    C.data[:] = 1
+
+    return C
+
+
+def get_devices_per_bus(buses, device_type_name):
+    """
+    Collect the devices of a type in bus order, which is the order in which they are compiled
+    :param buses: list of Bus objects
+    :param device_type_name: name of the bus property that holds the devices (i.e. 'loads')
+    :return: list of devices, array with the bus index of each device
+    """
+    devices = list()
+    bus_idx = list()
+    for i, bus in enumerate(buses):
+        elements = getattr(bus, device_type_name)
+        devices += elements
+        bus_idx += [i] * len(elements)
+
+    return devices, np.array(bus_idx, dtype=int)
+
+
+def get_controlling_devices(bus_idx, vset, nbus):
+    """
+    Find the device that sets the voltage of each bus: the first device (in compilation order)
+    whose set point is not 1.0, or the last device of the bus if all of them are 1.0
+    :param bus_idx: array with the bus index of each device, in compilation order
+    :param vset: array with the voltage set point of each device
+    :param nbus: number of buses
+    :return: array with the controlling device index of each bus (-1 if the bus has no device)
+    """
+    n = len(bus_idx)
+    ctrl = np.full(nbus, -1, dtype=int)
+
+    if n > 0:
+        pos = np.arange(n)
+
+        # last device of each bus
+        np.maximum.at(ctrl, bus_idx, pos)
+
+        # first device with a set point different from 1.0
+        first = np.full(nbus, n, dtype=int)
+        idx = np.where(vset != 1.0)[0]
+        np.minimum.at(first, bus_idx[idx], idx)
+        found = first < n
+        ctrl[found] = first[found]
+
+    return ctrl
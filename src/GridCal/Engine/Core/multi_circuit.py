@@ -165,6 +165,9 @@ class MultiCircuit:
         # Object with the necessary inputs for a power flow study
         self.numerical_circuit = None
 
+        # devices modified since numerical_circuit was compiled, keyed by id() (used as an ordered set)
+        self.modified_devices = dict()
+
         # Bus-Branch graph
         self.graph = None
 
@@ -311,6 +314,8 @@ class MultiCircuit:
         # Object with the necessary inputs for a power flow study
         self.numerical_circuit = None
 
+        self.modified_devices = dict()
+
         # Bus-Branch graph
         self.graph = None
 
@@ -326,6 +331,31 @@ class MultiCircuit:
 
         self.time_profile = None
 
+    def set_modified(self, elements):
+        """
+        Mark devices as modified, so that the next incremental compilation of the
+        numerical circuit patches them (see update_snapshot_circuit)
+        :param elements: device or list of devices (buses, branches, loads, generators, etc.)
+        """
+        if not isinstance(elements, (list, tuple, set)):
+            elements = [elements]
+
+        for elm in elements:
+            self.modified_devices[id(elm)] = elm
+
+    def get_modified(self):
+        """
+        Get the devices marked as modified since the last compilation
+        :return: list of devices
+        """
+        return list(self.modified_devices.values())
+
+    def clear_modified(self):
+        """
+        Forget the devices marked as modified
+        """
+        self.modified_devices = dict()
+
     def get_buses(self):
         return self.buses
 
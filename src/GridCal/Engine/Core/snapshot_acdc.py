@@ -478,8 +478,11 @@ def get_acdc_pf_island(circuit: AcDcSnapshotCircuit, bus_idx) -> "AcDcSnapshotCi
     # branch common ------------------------------------------------------------------------------------------------
     nc.branch_names = circuit.branch_names[br_idx]
     nc.branch_active = circuit.branch_active[br_idx]
-    nc.F = circuit.F[br_idx]
-    nc.T = circuit.T[br_idx]
+    # the from and to bus indices are referred to the buses of the island
+    bus_map = np.full(circuit.nbus, -1, dtype=int)
+    bus_map[bus_idx] = np.arange(len(bus_idx))
+    nc.F = bus_map[circuit.F[br_idx]]
+    nc.T = bus_map[circuit.T[br_idx]]
     nc.branch_rates = circuit.branch_rates[br_idx]
     nc.C_branch_bus_f = circuit.C_branch_bus_f[np.ix_(br_idx, bus_idx)]
     nc.C_branch_bus_t = circuit.C_branch_bus_t[np.ix_(br_idx, bus_idx)]
@@ -452,8 +452,11 @@ def get_opf_island(self, bus_idx) -> "OpfSnapshotCircuit":
     # branch common ------------------------------------------------------------------------------------------------
     nc.branch_names = self.branch_names[br_idx]
     nc.branch_active = self.branch_active[br_idx]
-    nc.F = self.F[br_idx]
-    nc.T = self.T[br_idx]
+    # the from and to bus indices are referred to the buses of the island
+    bus_map = np.full(self.nbus, -1, dtype=int)
+    bus_map[bus_idx] = np.arange(len(bus_idx))
+    nc.F = bus_map[self.F[br_idx]]
+    nc.T = bus_map[self.T[br_idx]]
     nc.branch_rates = self.branch_rates[br_idx]
     nc.branch_cost = self.branch_cost[br_idx]
     nc.branch_R = self.branch_R[br_idx]
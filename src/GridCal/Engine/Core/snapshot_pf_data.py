@@ -23,8 +23,10 @@ import GridCal.Engine.Core.topology as tp
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.basic_structures import BranchImpedanceMode
 from GridCal.Engine.basic_structures import BusMode
+from GridCal.Engine.Devices.enumerations import DeviceType
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
-from GridCal.Engine.Core.common_functions import compile_types
+from GridCal.Engine.Core.common_functions import compile_types, get_connectivity_matrix, get_devices_per_bus, \
+    get_controlling_devices
 from GridCal.Engine.Simulations.OPF.opf_results import OptimalPowerFlowResults
 from GridCal.Engine.Simulations.sparse_solve import get_sparse_type
 
@@ -70,6 +72,7 @@ class SnapshotCircuit:
         self.bus_active = np.ones(nbus, dtype=int)
         self.Vbus = np.ones(nbus, dtype=complex)
         self.bus_types = np.empty(nbus, dtype=int)
+        self.bus_types_base = np.empty(nbus, dtype=int)  # bus types before the slack selection of compile_types
         self.bus_installed_power = np.zeros(nbus, dtype=float)
         self.bus_is_dc = np.empty(nbus, dtype=bool)
 
@@ -81,8 +84,8 @@ class SnapshotCircuit:
         self.F = np.zeros(self.nbr, dtype=int)  # indices of the "from" buses
         self.T = np.zeros(self.nbr, dtype=int)  # indices of the "to" buses
         self.branch_rates = np.zeros(self.nbr, dtype=float)
-        self.C_branch_bus_f = sp.lil_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "from" bus
-        self.C_branch_bus_t = sp.lil_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "to" bus
+        self.C_branch_bus_f = sp.csc_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "from" bus
+        self.C_branch_bus_t = sp.csc_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "to" bus
 
         # lines --------------------------------------------------------------------------------------------------------
         self.line_names = np.zeros(nline, dtype=object)
@@ -94,7 +97,7 @@ class SnapshotCircuit:
         self.line_alpha = np.zeros(nline, dtype=float)
         self.line_impedance_tolerance = np.zeros(nline, dtype=float)
 
-        self.C_line_bus = sp.lil_matrix((nline, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_line_bus = sp.csc_matrix((nline, nbus), dtype=int)  # this ons is just for splitting islands
 
         # dc lines -----------------------------------------------------------------------------------------------------
         self.dc_line_names = np.zeros(ndcline, dtype=object)
@@ -104,7 +107,7 @@ class SnapshotCircuit:
         self.dc_line_alpha = np.zeros(ndcline, dtype=float)
         self.dc_line_impedance_tolerance = np.zeros(ndcline, dtype=float)
 
-        self.C_dc_line_bus = sp.lil_matrix((ndcline, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_dc_line_bus = sp.csc_matrix((ndcline, nbus), dtype=int)  # this ons is just for splitting islands
         self.dc_F = np.zeros(ndcline, dtype=int)
         self.dc_T = np.zeros(ndcline, dtype=int)
 
@@ -129,7 +132,7 @@ class SnapshotCircuit:
         self.tr_vset = np.ones(ntr)
         self.tr_control_mode = np.zeros(ntr, dtype=object)
 
-        self.C_tr_bus = sp.lil_matrix((ntr, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_tr_bus = sp.csc_matrix((ntr, nbus), dtype=int)  # this ons is just for splitting islands
 
         # hvdc line ----------------------------------------------------------------------------------------------------
         self.hvdc_names = np.zeros(nhvdc, dtype=object)
@@ -146,8 +149,8 @@ class SnapshotCircuit:
         self.hvdc_Qmin_t = np.zeros(nhvdc)
         self.hvdc_Qmax_t = np.zeros(nhvdc)
 
-        self.C_hvdc_bus_f = sp.lil_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
-        self.C_hvdc_bus_t = sp.lil_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_hvdc_bus_f = sp.csc_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_hvdc_bus_t = sp.csc_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
 
         # vsc converter ------------------------------------------------------------------------------------------------
         self.vsc_names = np.zeros(nvsc, dtype=object)
@@ -164,21 +167,21 @@ class SnapshotCircuit:
         self.vsc_Vdc_set = np.ones(nvsc)
         self.vsc_control_mode = np.zeros(nvsc, dtype=object)
 
-        self.C_vsc_bus = sp.lil_matrix((nvsc, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_vsc_bus = sp.csc_matrix((nvsc, nbus), dtype=int)  # this ons is just for splitting islands
 
         # load ---------------------------------------------------------------------------------------------------------
         self.load_names = np.empty(nload, dtype=object)
         self.load_active = np.zeros(nload, dtype=bool)
         self.load_s = np.zeros(nload, dtype=complex)
 
-        self.C_bus_load = sp.lil_matrix((nbus, nload), dtype=int)
+        self.C_bus_load = sp.csr_matrix((nbus, nload), dtype=int)
 
         # static generators --------------------------------------------------------------------------------------------
         self.static_generator_names = np.empty(nstagen, dtype=object)
         self.static_generator_active = np.zeros(nstagen, dtype=bool)
         self.static_generator_s = np.zeros(nstagen, dtype=complex)
 
-        self.C_bus_static_generator = sp.lil_matrix((nbus, nstagen), dtype=int)
+        self.C_bus_static_generator = sp.csr_matrix((nbus, nstagen), dtype=int)
 
         # battery ------------------------------------------------------------------------------------------------------
         self.battery_names = np.empty(nbatt, dtype=object)
@@ -191,7 +194,7 @@ class SnapshotCircuit:
         self.battery_qmin = np.zeros(nbatt)
         self.battery_qmax = np.zeros(nbatt)
 
-        self.C_bus_batt = sp.lil_matrix((nbus, nbatt), dtype=int)
+        self.C_bus_batt = sp.csr_matrix((nbus, nbatt), dtype=int)
 
         # generator ----------------------------------------------------------------------------------------------------
         self.generator_names = np.empty(ngen, dtype=object)
@@ -204,14 +207,14 @@ class SnapshotCircuit:
         self.generator_qmin = np.zeros(ngen)
         self.generator_qmax = np.zeros(ngen)
 
-        self.C_bus_gen = sp.lil_matrix((nbus, ngen), dtype=int)
+        self.C_bus_gen = sp.csr_matrix((nbus, ngen), dtype=int)
 
         # shunt --------------------------------------------------------------------------------------------------------
         self.shunt_names = np.empty(nshunt, dtype=object)
         self.shunt_active = np.zeros(nshunt, dtype=bool)
         self.shunt_admittance = np.zeros(nshunt, dtype=complex)
 
-        self.C_bus_shunt = sp.lil_matrix((nbus, nshunt), dtype=int)
+        self.C_bus_shunt = sp.csr_matrix((nbus, nshunt), dtype=int)
 
         #---------------------------------------------------------------------------------------------------------------
         # Results
@@ -228,6 +231,10 @@ class SnapshotCircuit:
         self.Yf = None
         self.Yt = None
 
+        # branch primitives and branch states used to form the admittance matrices (for the incremental updates)
+        self.branch_primitives = None
+        self.branch_primitives_active = None
+
         # Admittance for HELM / AC linear
         self.Yseries = None
         self.Yshunt = None
@@ -240,6 +247,9 @@ class SnapshotCircuit:
         self.Bpqpv = None
         self.Bref = None
 
+        # island partitions of the already seen topologies (see split_into_islands)
+        self.topology_cache = tp.TopologyCache()
+
         self.original_bus_idx = np.arange(self.nbus)
         self.original_branch_idx = np.arange(self.nbr)
         self.original_line_idx = np.arange(self.nline)
@@ -252,6 +262,11 @@ class SnapshotCircuit:
         self.vd = list()
         self.pqpv = list()
 
+        # dictionary of id(compiled device) -> (device, index in its arrays) (only for the circuits compiled from a
+        # MultiCircuit); the devices hash is their idtag as an hex number, which does not hold for all the imported
+        # grids, and the devices are kept so that their id cannot be reused by other objects
+        self.element_index = dict()
+
         self.available_structures = ['Vbus',
                                      'Sbus',
                                      'Ibus',
@@ -363,66 +378,30 @@ class SnapshotCircuit:
                                          helm=False,
                                          tr_tap_module=tap_module)
 
-    def compute_admittance_matrices(self, newton_raphson=False, linear_dc=False, linear_ac=False, fast_decoupled=False,
-                                    helm=False, tr_tap_module=None):
+    def get_branch_primitives(self, tr_tap_module=None):
         """
-        Compute the admittance matrices
-        :param newton_raphson: Compute the matrices necessary for Newton-Raphson like power flow
-        :param linear_dc: Compute the matrices necessary for the Linear-DC method
-        :param linear_ac: Compute the matrices necessary for the Linear-AC method
-        :param fast_decoupled: Compute the matrices necessary for the fast-decoupled method
-        :param helm: Compute the matrices necessary for the HELM method
-        :return:
+        Compute the branch primitives in vector form for all the branches, regardless of their state
+        :param tr_tap_module: transformers tap module to use instead of tr_tap_mod (optional)
+        :return: dictionary with the (ff, ft, tf, tt) primitives of Ybus ('Y'), Yseries ('Ys'), B1 and B2,
+                 and the branch shunt admittances of Yshunt ('ysh')
         """
-
-        """
-        
-        :return: Ybus, Yseries, Yshunt
-        """
-        # form the connectivity matrices with the states applied -------------------------------------------------------
-        br_states_diag = sp.diags(self.branch_active)
-        Cf = br_states_diag * self.C_branch_bus_f
-        Ct = br_states_diag * self.C_branch_bus_t
-
-        # Declare the empty primitives ---------------------------------------------------------------------------------
-
         # The composition order is and will be: Pi model, HVDC, VSC
-        if newton_raphson:
-            Ytt = np.empty(self.nbr, dtype=complex)
-            Yff = np.empty(self.nbr, dtype=complex)
-            Yft = np.empty(self.nbr, dtype=complex)
-            Ytf = np.empty(self.nbr, dtype=complex)
-        else:
-            Ytt = np.empty(0, dtype=complex)
-            Yff = np.empty(0, dtype=complex)
-            Yft = np.empty(0, dtype=complex)
-            Ytf = np.empty(0, dtype=complex)
+        Ytt = np.empty(self.nbr, dtype=complex)
+        Yff = np.empty(self.nbr, dtype=complex)
+        Yft = np.empty(self.nbr, dtype=complex)
+        Ytf = np.empty(self.nbr, dtype=complex)
 
         # Branch primitives in vector form, for Yseries
-        if linear_ac or helm:
-            Ytts = np.empty(self.nbr, dtype=complex)
-            Yffs = np.empty(self.nbr, dtype=complex)
-            Yfts = np.empty(self.nbr, dtype=complex)
-            Ytfs = np.empty(self.nbr, dtype=complex)
-            ysh_br = np.empty(self.nbr, dtype=complex)
-
-        else:
-            Ytts = np.empty(0, dtype=complex)
-            Yffs = np.empty(0, dtype=complex)
-            Yfts = np.empty(0, dtype=complex)
-            Ytfs = np.empty(0, dtype=complex)
-            ysh_br = np.empty(0, dtype=complex)
+        Ytts = np.empty(self.nbr, dtype=complex)
+        Yffs = np.empty(self.nbr, dtype=complex)
+        Yfts = np.empty(self.nbr, dtype=complex)
+        Ytfs = np.empty(self.nbr, dtype=complex)
+        ysh_br = np.zeros(self.nbr, dtype=complex)
 
         # Arrays to compose the fast decoupled
-        if fast_decoupled:
-            reactances = np.empty(self.nbr)
-            susceptances = np.empty(self.nbr)
-            all_taps = np.ones(self.nbr, dtype=complex)
-
-        else:
-            reactances = np.empty(0)
-            susceptances = np.empty(0)
-            all_taps = np.ones(0, dtype=complex)
+        reactances = np.zeros(self.nbr)
+        susceptances = np.zeros(self.nbr)
+        all_taps = np.ones(self.nbr, dtype=complex)
 
         # line ---------------------------------------------------------------------------------------------------------
         a = 0
@@ -436,32 +415,29 @@ class SnapshotCircuit:
 
         # modify the branches impedance with the lower, upper tolerance values
         if self.branch_tolerance_mode == BranchImpedanceMode.Lower:
-            line_R *= (1 - self.line_impedance_tolerance / 100.0)
+            line_R = line_R * (1 - self.line_impedance_tolerance / 100.0)
         elif self.branch_tolerance_mode == BranchImpedanceMode.Upper:
-            line_R *= (1 + self.line_impedance_tolerance / 100.0)
+            line_R = line_R * (1 + self.line_impedance_tolerance / 100.0)
 
         Ys_line = 1.0 / (line_R + 1.0j * self.line_X)
         Ysh_line = 1.0j * self.line_B
         Ys_line2 = Ys_line + Ysh_line / 2.0
 
         # branch primitives in vector form for Ybus
-        if newton_raphson:
-            Ytt[a:b] = Ys_line2
-            Yff[a:b] = Ys_line2
-            Yft[a:b] = - Ys_line
-            Ytf[a:b] = - Ys_line
+        Ytt[a:b] = Ys_line2
+        Yff[a:b] = Ys_line2
+        Yft[a:b] = - Ys_line
+        Ytf[a:b] = - Ys_line
 
         # branch primitives in vector form, for Yseries
-        if linear_ac or helm:
-            Ytts[a:b] = Ys_line
-            Yffs[a:b] = Ys_line
-            Yfts[a:b] = - Ys_line
-            Ytfs[a:b] = - Ys_line
-            ysh_br[a:b] = Ysh_line / 2.0
+        Ytts[a:b] = Ys_line
+        Yffs[a:b] = Ys_line
+        Yfts[a:b] = - Ys_line
+        Ytfs[a:b] = - Ys_line
+        ysh_br[a:b] = Ysh_line / 2.0
 
-        if fast_decoupled:
-            reactances[a:b] = self.line_X
-            susceptances[a:b] = self.line_B
+        reactances[a:b] = self.line_X
+        susceptances[a:b] = self.line_B
 
         # transformer models -------------------------------------------------------------------------------------------
 
@@ -478,24 +454,21 @@ class SnapshotCircuit:
             tap = tr_tap_module * np.exp(1.0j * self.tr_tap_ang)
 
         # branch primitives in vector form for Ybus
-        if newton_raphson:
-            Ytt[a:b] = Ys_tr2 / (self.tr_tap_t * self.tr_tap_t)
-            Yff[a:b] = Ys_tr2 / (self.tr_tap_f * self.tr_tap_f * tap * np.conj(tap))
-            Yft[a:b] = - Ys_tr / (self.tr_tap_f * self.tr_tap_t * np.conj(tap))
-            Ytf[a:b] = - Ys_tr / (self.tr_tap_t * self.tr_tap_f * tap)
+        Ytt[a:b] = Ys_tr2 / (self.tr_tap_t * self.tr_tap_t)
+        Yff[a:b] = Ys_tr2 / (self.tr_tap_f * self.tr_tap_f * tap * np.conj(tap))
+        Yft[a:b] = - Ys_tr / (self.tr_tap_f * self.tr_tap_t * np.conj(tap))
+        Ytf[a:b] = - Ys_tr / (self.tr_tap_t * self.tr_tap_f * tap)
 
         # branch primitives in vector form, for Yseries
-        if linear_ac or helm:
-            Ytts[a:b] = Ys_tr
-            Yffs[a:b] = Ys_tr / (tap * np.conj(tap))
-            Yfts[a:b] = - Ys_tr / np.conj(tap)
-            Ytfs[a:b] = - Ys_tr / tap
-            ysh_br[a:b] = Ysh_tr / 2.0
+        Ytts[a:b] = Ys_tr
+        Yffs[a:b] = Ys_tr / (tap * np.conj(tap))
+        Yfts[a:b] = - Ys_tr / np.conj(tap)
+        Ytfs[a:b] = - Ys_tr / tap
+        ysh_br[a:b] = Ysh_tr / 2.0
 
-        if fast_decoupled:
-            reactances[a:b] = self.tr_X
-            susceptances[a:b] = self.tr_B
-            all_taps[a:b] = tap
+        reactances[a:b] = self.tr_X
+        susceptances[a:b] = self.tr_B
+        all_taps[a:b] = tap
 
         # VSC MODEL ----------------------------------------------------------------------------------------------------
         a = self.nline + self.ntr
@@ -503,22 +476,19 @@ class SnapshotCircuit:
 
         Y_vsc = 1.0 / (self.vsc_R1 + 1.0j * self.vsc_X1)  # Y1
 
-        if newton_raphson:
-            Yff[a:b] = Y_vsc
-            Yft[a:b] = -self.vsc_m * np.exp(1.0j * self.vsc_theta) * Y_vsc
-            Ytf[a:b] = -self.vsc_m * np.exp(-1.0j * self.vsc_theta) * Y_vsc
-            Ytt[a:b] = self.vsc_G0 + self.vsc_m * self.vsc_m * (Y_vsc + 1.0j * self.vsc_Beq)
+        Yff[a:b] = Y_vsc
+        Yft[a:b] = -self.vsc_m * np.exp(1.0j * self.vsc_theta) * Y_vsc
+        Ytf[a:b] = -self.vsc_m * np.exp(-1.0j * self.vsc_theta) * Y_vsc
+        Ytt[a:b] = self.vsc_G0 + self.vsc_m * self.vsc_m * (Y_vsc + 1.0j * self.vsc_Beq)
 
-        if linear_ac or helm:
-            Yffs[a:b] = Y_vsc
-            Yfts[a:b] = -self.vsc_m * np.exp(1.0j * self.vsc_theta) * Y_vsc
-            Ytfs[a:b] = -self.vsc_m * np.exp(-1.0j * self.vsc_theta) * Y_vsc
-            Ytts[a:b] = self.vsc_m * self.vsc_m * (Y_vsc + 1.0j)
+        Yffs[a:b] = Y_vsc
+        Yfts[a:b] = -self.vsc_m * np.exp(1.0j * self.vsc_theta) * Y_vsc
+        Ytfs[a:b] = -self.vsc_m * np.exp(-1.0j * self.vsc_theta) * Y_vsc
+        Ytts[a:b] = self.vsc_m * self.vsc_m * (Y_vsc + 1.0j)
 
-        if fast_decoupled:
-            reactances[a:b] = self.vsc_X1
-            susceptances[a:b] = self.vsc_Beq
-            all_taps[a:b] = self.vsc_m * np.exp(1.0j * self.vsc_theta)
+        reactances[a:b] = self.vsc_X1
+        susceptances[a:b] = self.vsc_Beq
+        all_taps[a:b] = self.vsc_m * np.exp(1.0j * self.vsc_theta)
 
         # dc-line ------------------------------------------------------------------------------------------------------
         a = self.nline + self.ntr + self.nvsc
@@ -532,34 +502,80 @@ class SnapshotCircuit:
 
         # modify the branches impedance with the lower, upper tolerance values
         if self.branch_tolerance_mode == BranchImpedanceMode.Lower:
-            dc_line_R *= (1 - self.dc_line_impedance_tolerance / 100.0)
+            dc_line_R = dc_line_R * (1 - self.dc_line_impedance_tolerance / 100.0)
         elif self.branch_tolerance_mode == BranchImpedanceMode.Upper:
-            dc_line_R *= (1 + self.dc_line_impedance_tolerance / 100.0)
+            dc_line_R = dc_line_R * (1 + self.dc_line_impedance_tolerance / 100.0)
 
         Ys_dc_line = 1.0 / dc_line_R
 
         # branch primitives in vector form for Ybus
-        if newton_raphson:
-            Ytt[a:b] = Ys_dc_line
-            Yff[a:b] = Ys_dc_line
-            Yft[a:b] = - Ys_dc_line
-            Ytf[a:b] = - Ys_dc_line
+        Ytt[a:b] = Ys_dc_line
+        Yff[a:b] = Ys_dc_line
+        Yft[a:b] = - Ys_dc_line
+        Ytf[a:b] = - Ys_dc_line
 
         # branch primitives in vector form, for Yseries
-        if linear_ac or helm:
-            Ytts[a:b] = Ys_dc_line
-            Yffs[a:b] = Ys_dc_line
-            Yfts[a:b] = - Ys_dc_line
-            Ytfs[a:b] = - Ys_dc_line
+        Ytts[a:b] = Ys_dc_line
+        Yffs[a:b] = Ys_dc_line
+        Yfts[a:b] = - Ys_dc_line
+        Ytfs[a:b] = - Ys_dc_line
 
         # HVDC LINE MODEL ----------------------------------------------------------------------------------------------
         # does not apply since the HVDC-line model is the simplistic 2-generator model
 
+        # fast decoupled primitives
+        b1 = 1.0 / (reactances + 1e-20)
+        b2 = b1 + susceptances
+        b2_ff = -(b2 / (all_taps * np.conj(all_taps))).real
+        b2_ft = -(b1 / np.conj(all_taps)).real
+        b2_tf = -(b1 / all_taps).real
+        b2_tt = - b2
+
+        return {'Y': (Yff, Yft, Ytf, Ytt),
+                'Ys': (Yffs, Yfts, Ytfs, Ytts),
+                'B1': (b1, -b1, -b1, b1),
+                'B2': (-b2_ff, b2_ft, b2_tf, -b2_tt),
+                'ysh': ysh_br}
+
+    def compute_admittance_matrices(self, newton_raphson=False, linear_dc=False, linear_ac=False, fast_decoupled=False,
+                                    helm=False, tr_tap_module=None):
+        """
+        Compute the admittance matrices
+        :param newton_raphson: Compute the matrices necessary for Newton-Raphson like power flow
+        :param linear_dc: Compute the matrices necessary for the Linear-DC method
+        :param linear_ac: Compute the matrices necessary for the Linear-AC method
+        :param fast_decoupled: Compute the matrices necessary for the fast-decoupled method
+        :param helm: Compute the matrices necessary for the HELM method
+        :param tr_tap_module: transformers tap module to use instead of tr_tap_mod (optional)
+        :return:
+        """
+
+        """
+        
+        :return: Ybus, Yseries, Yshunt
+        """
+        # form the connectivity matrices with the states applied -------------------------------------------------------
+        br_states_diag = sp.diags(self.branch_active)
+        Cf = br_states_diag * self.C_branch_bus_f
+        Ct = br_states_diag * self.C_branch_bus_t
+
+        # branch primitives in vector form -----------------------------------------------------------------------------
+        primitives = self.get_branch_primitives(tr_tap_module=tr_tap_module)
+
+        # keep the primitives for the incremental updates, only if all the matrices are consistent with them
+        if tr_tap_module is None and newton_raphson and (linear_ac or helm) and fast_decoupled:
+            self.branch_primitives = primitives
+            self.branch_primitives_active = self.branch_active.copy()
+        else:
+            self.branch_primitives = None
+            self.branch_primitives_active = None
+
         # SHUNT --------------------------------------------------------------------------------------------------------
         self.Yshunt_from_devices = self.C_bus_shunt * (self.shunt_admittance * self.shunt_active / self.Sbase)
 
         # form the admittance matrices ---------------------------------------------------------------------------------
         if newton_raphson:
+            Yff, Yft, Ytf, Ytt = primitives['Y']
             self.Yf = sp.diags(Yff) * Cf + sp.diags(Yft) * Ct
             self.Yt = sp.diags(Ytf) * Cf + sp.diags(Ytt) * Ct
             self.Ybus = sp.csc_matrix(Cf.T * self.Yf + Ct.T * self.Yt) + sp.diags(self.Yshunt_from_devices)
@@ -569,6 +585,8 @@ class SnapshotCircuit:
 
         # form the admittance matrices of the series and shunt elements ------------------------------------------------
         if linear_ac or helm:
+            Yffs, Yfts, Ytfs, Ytts = primitives['Ys']
+            ysh_br = primitives['ysh']
             Yfs = sp.diags(Yffs) * Cf + sp.diags(Yfts) * Ct
             Yts = sp.diags(Ytfs) * Cf + sp.diags(Ytts) * Ct
             self.Yseries = sp.csc_matrix(Cf.T * Yfs + Ct.T * Yts)
@@ -576,22 +594,85 @@ class SnapshotCircuit:
 
         # Form the matrices for fast decoupled -------------------------------------------------------------------------
         if fast_decoupled:
-            b1 = 1.0 / (reactances + 1e-20)
-            b1_tt = sp.diags(b1)
-            B1f = b1_tt * Cf - b1_tt * Ct
-            B1t = -b1_tt * Cf + b1_tt * Ct
+            b1_ff, b1_ft, b1_tf, b1_tt = primitives['B1']
+            B1f = sp.diags(b1_ff) * Cf + sp.diags(b1_ft) * Ct
+            B1t = sp.diags(b1_tf) * Cf + sp.diags(b1_tt) * Ct
             self.B1 = sparse_type(Cf.T * B1f + Ct.T * B1t)
 
-            b2 = b1 + susceptances
-            b2_ff = -(b2 / (all_taps * np.conj(all_taps))).real
-            b2_ft = -(b1 / np.conj(all_taps)).real
-            b2_tf = -(b1 / all_taps).real
-            b2_tt = - b2
-
-            B2f = -sp.diags(b2_ff) * Cf + sp.diags(b2_ft) * Ct
-            B2t = sp.diags(b2_tf) * Cf + -sp.diags(b2_tt) * Ct
+            b2_ff, b2_ft, b2_tf, b2_tt = primitives['B2']
+            B2f = sp.diags(b2_ff) * Cf + sp.diags(b2_ft) * Ct
+            B2t = sp.diags(b2_tf) * Cf + sp.diags(b2_tt) * Ct
             self.B2 = sparse_type(Cf.T * B2f + Ct.T * B2t)
 
+    def update_admittance_matrices(self, branch_idx):
+        """
+        Update the admittance matrices after the modification of some branches (and/or shunts)
+        by adding rank-k corrections instead of forming the matrices again.
+        The branch arrays (including branch_active) must have been patched already.
+        :param branch_idx: array of the indices of the modified branches
+        """
+        if self.branch_primitives is None or self.Ybus is None:
+            # there is nothing consistent to correct: compute from scratch
+            self.compute_admittance_matrices(newton_raphson=True,
+                                             linear_dc=True,
+                                             linear_ac=True,
+                                             fast_decoupled=True,
+                                             helm=True)
+            return
+
+        # shunt devices correction
+        Yshunt_from_devices = self.C_bus_shunt * (self.shunt_admittance * self.shunt_active / self.Sbase)
+        dYsh = Yshunt_from_devices - self.Yshunt_from_devices
+        self.Yshunt_from_devices = Yshunt_from_devices
+
+        self.Ybus = sp.csc_matrix(self.Ybus + sp.diags(dYsh))
+        self.Yshunt = self.Yshunt + dYsh
+
+        branch_idx = np.array(branch_idx, dtype=int)
+
+        if len(branch_idx) > 0:
+
+            primitives = self.get_branch_primitives()
+
+            # state of the modified branches before and after the modification
+            active0 = self.branch_primitives_active[branch_idx]
+            active1 = self.branch_active[branch_idx]
+
+            def delta(name):
+                return [new[branch_idx] * active1 - old[branch_idx] * active0
+                        for new, old in zip(primitives[name], self.branch_primitives[name])]
+
+            # rows of the modified branches
+            Cf_k = sp.csr_matrix(self.C_branch_bus_f)[branch_idx, :]
+            Ct_k = sp.csr_matrix(self.C_branch_bus_t)[branch_idx, :]
+
+            # Ybus, Yf, Yt
+            dYf, dYt, dY = get_branch_admittance_correction(Cf_k, Ct_k, *delta('Y'))
+            S = sp.csc_matrix((np.ones(len(branch_idx)), (branch_idx, np.arange(len(branch_idx)))),
+                              shape=(self.nbr, len(branch_idx)))
+            self.Yf = self.Yf + S * dYf
+            self.Yt = self.Yt + S * dYt
+            self.Ybus = sp.csc_matrix(self.Ybus + dY)
+
+            # Yseries, Yshunt
+            dYfs, dYts, dYs = get_branch_admittance_correction(Cf_k, Ct_k, *delta('Ys'))
+            self.Yseries = sp.csc_matrix(self.Yseries + dYs)
+            dysh = primitives['ysh'][branch_idx] * active1 - self.branch_primitives['ysh'][branch_idx] * active0
+            self.Yshunt = self.Yshunt + Cf_k.T * dysh + Ct_k.T * dysh
+
+            # B1, B2
+            dB1f, dB1t, dB1 = get_branch_admittance_correction(Cf_k, Ct_k, *delta('B1'))
+            self.B1 = sparse_type(self.B1 + dB1)
+
+            dB2f, dB2t, dB2 = get_branch_admittance_correction(Cf_k, Ct_k, *delta('B2'))
+            self.B2 = sparse_type(self.B2 + dB2)
+
+            self.branch_primitives = primitives
+            self.branch_primitives_active = self.branch_active.copy()
+
+        self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
+        self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.vd)]
+
     def get_generator_injections(self):
         """
         Compute the active and reactive power of non-controlled generators (assuming all)
@@ -789,26 +870,58 @@ class SnapshotCircuit:
         return df
 
 
-def get_pf_island(circuit: SnapshotCircuit, bus_idx) -> "SnapshotCircuit":
+def get_branch_admittance_correction(Cf_k, Ct_k, d_ff, d_ft, d_tf, d_tt):
+    """
+    Get the correction of a branch admittance matrix (Ybus-like) due to the variation of the primitives of k branches
+    :param Cf_k: "from" connectivity of the k branches (k x n)
+    :param Ct_k: "to" connectivity of the k branches (k x n)
+    :param d_ff: variation of the from-from primitives
+    :param d_ft: variation of the from-to primitives
+    :param d_tf: variation of the to-from primitives
+    :param d_tt: variation of the to-to primitives
+    :return: correction of the "from" rows (k x n), correction of the "to" rows (k x n), correction (n x n)
+    """
+    dYf = sp.diags(d_ff) * Cf_k + sp.diags(d_ft) * Ct_k
+    dYt = sp.diags(d_tf) * Cf_k + sp.diags(d_tt) * Ct_k
+    dY = Cf_k.T * dYf + Ct_k.T * dYt
+    return dYf, dYt, dY
+
+
+def get_pf_island_indices(circuit: SnapshotCircuit, bus_idx):
+    """
+    Get the indices of the devices of the island corresponding to the given buses
+    :param circuit: SnapshotCircuit
+    :param bus_idx: array of bus indices
+    :return: line, dc line, transformer, vsc, hvdc, branch, load, static generator, generator, battery
+             and shunt indices
+    """
+    return (tp.get_elements_of_the_island(circuit.C_line_bus, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_dc_line_bus, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_tr_bus, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_vsc_bus, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_hvdc_bus_f + circuit.C_hvdc_bus_t, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_branch_bus_f + circuit.C_branch_bus_t, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_bus_load.T, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_bus_static_generator.T, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_bus_gen.T, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_bus_batt.T, bus_idx),
+            tp.get_elements_of_the_island(circuit.C_bus_shunt.T, bus_idx))
+
+
+def get_pf_island(circuit: SnapshotCircuit, bus_idx, indices=None) -> "SnapshotCircuit":
     """
     Get the island corresponding to the given buses
     :param bus_idx: array of bus indices
+    :param indices: indices of the devices of the island (see get_pf_island_indices), computed if None
     :return: SnapshotCircuit
     """
 
     # find the indices of the devices of the island
-    line_idx = tp.get_elements_of_the_island(circuit.C_line_bus, bus_idx)
-    dc_line_idx = tp.get_elements_of_the_island(circuit.C_dc_line_bus, bus_idx)
-    tr_idx = tp.get_elements_of_the_island(circuit.C_tr_bus, bus_idx)
-    vsc_idx = tp.get_elements_of_the_island(circuit.C_vsc_bus, bus_idx)
-    hvdc_idx = tp.get_elements_of_the_island(circuit.C_hvdc_bus_f + circuit.C_hvdc_bus_t, bus_idx)
-    br_idx = tp.get_elements_of_the_island(circuit.C_branch_bus_f + circuit.C_branch_bus_t, bus_idx)
-
-    load_idx = tp.get_elements_of_the_island(circuit.C_bus_load.T, bus_idx)
-    stagen_idx = tp.get_elements_of_the_island(circuit.C_bus_static_generator.T, bus_idx)
-    gen_idx = tp.get_elements_of_the_island(circuit.C_bus_gen.T, bus_idx)
-    batt_idx = tp.get_elements_of_the_island(circuit.C_bus_batt.T, bus_idx)
-    shunt_idx = tp.get_elements_of_the_island(circuit.C_bus_shunt.T, bus_idx)
+    if indices is None:
+        indices = get_pf_island_indices(circuit, bus_idx)
+
+    line_idx, dc_line_idx, tr_idx, vsc_idx, hvdc_idx, br_idx, \
+        load_idx, stagen_idx, gen_idx, batt_idx, shunt_idx = indices
 
     nc = SnapshotCircuit(nbus=len(bus_idx),
                          nline=len(line_idx),
@@ -842,8 +955,11 @@ def get_pf_island(circuit: SnapshotCircuit, bus_idx) -> "SnapshotCircuit":
     # branch common ------------------------------------------------------------------------------------------------
     nc.branch_names = circuit.branch_names[br_idx]
     nc.branch_active = circuit.branch_active[br_idx]
-    nc.F = circuit.F[br_idx]
-    nc.T = circuit.T[br_idx]
+    # the from and to bus indices are referred to the buses of the island
+    bus_map = np.full(circuit.nbus, -1, dtype=int)
+    bus_map[bus_idx] = np.arange(len(bus_idx))
+    nc.F = bus_map[circuit.F[br_idx]]
+    nc.T = bus_map[circuit.T[br_idx]]
     nc.branch_rates = circuit.branch_rates[br_idx]
     nc.C_branch_bus_f = circuit.C_branch_bus_f[np.ix_(br_idx, bus_idx)]
     nc.C_branch_bus_t = circuit.C_branch_bus_t[np.ix_(br_idx, bus_idx)]
@@ -925,8 +1041,8 @@ def get_pf_island(circuit: SnapshotCircuit, bus_idx) -> "SnapshotCircuit":
     nc.dc_line_impedance_tolerance = circuit.dc_line_impedance_tolerance[dc_line_idx]
 
     nc.C_dc_line_bus = circuit.C_dc_line_bus[np.ix_(dc_line_idx, bus_idx)]
-    nc.dc_F = circuit.dc_F[dc_line_idx]
-    nc.dc_T = circuit.dc_T[dc_line_idx]
+    nc.dc_F = bus_map[circuit.dc_F[dc_line_idx]]
+    nc.dc_T = bus_map[circuit.dc_T[dc_line_idx]]
 
     # load ---------------------------------------------------------------------------------------------------------
     nc.load_names = circuit.load_names[load_idx]
@@ -984,45 +1100,83 @@ def split_into_islands(numeric_circuit: SnapshotCircuit, ignore_single_node_isla
     :return: List[NumericCircuit]
     """
 
-    # compute the adjacency matrix
-    A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
-                                C_branch_bus_t=numeric_circuit.C_branch_bus_t,
-                                branch_active=numeric_circuit.branch_active,
-                                bus_active=numeric_circuit.bus_active)
+    # the island partition and the device indices of each island are cached by topology
+    key = tp.get_topology_key(numeric_circuit.branch_active, numeric_circuit.bus_active)
+    islands = numeric_circuit.topology_cache.get(key)
+
+    if islands is None:
+        # compute the adjacency matrix
+        A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
+                                    C_branch_bus_t=numeric_circuit.C_branch_bus_t,
+                                    branch_active=numeric_circuit.branch_active,
+                                    bus_active=numeric_circuit.bus_active)
+
+        # find the matching islands
+        idx_islands = tp.find_islands(A)
+
+        if len(idx_islands) == 1:
+            islands = [(idx_islands[0], None)]
+        else:
+            islands = [(bus_idx, get_pf_island_indices(numeric_circuit, bus_idx)) for bus_idx in idx_islands]
 
-    # find the matching islands
-    idx_islands = tp.find_islands(A)
+        numeric_circuit.topology_cache.set(key, islands)
 
-    if len(idx_islands) == 1:
-        numeric_circuit.consolidate()  # compute the internal magnitudes
+    if len(islands) == 1:
+        if numeric_circuit.Ybus is None:
+            numeric_circuit.consolidate()  # compute the internal magnitudes
         return [numeric_circuit]
 
     else:
 
         circuit_islands = list()  # type: List[SnapshotCircuit]
 
-        for bus_idx in idx_islands:
+        for bus_idx, indices in islands:
 
             if ignore_single_node_islands:
 
                 if len(bus_idx) > 1:
-                    island = get_pf_island(numeric_circuit, bus_idx)
+                    island = get_pf_island(numeric_circuit, bus_idx, indices)
                     island.consolidate()  # compute the internal magnitudes
                     circuit_islands.append(island)
 
             else:
-                island = get_pf_island(numeric_circuit, bus_idx)
+                island = get_pf_island(numeric_circuit, bus_idx, indices)
                 island.consolidate()  # compute the internal magnitudes
                 circuit_islands.append(island)
 
         return circuit_islands
 
 
+def set_voltage_set_points(nc: SnapshotCircuit, gen_bus, batt_bus, logger: Logger):
+    """
+    Initialize the bus voltages with the set points of the generators and batteries
+    (the generators of a bus come before its batteries)
+    :param nc: SnapshotCircuit instance
+    :param gen_bus: array with the bus index of each generator
+    :param batt_bus: array with the bus index of each battery
+    :param logger: Logger instance where to report the conflicting set points
+    """
+    v_bus = np.r_[gen_bus, batt_bus]
+    v_set = np.r_[nc.generator_v, nc.battery_v]
+    ctrl = get_controlling_devices(v_bus, v_set, nc.nbus)
+    has_ctrl = ctrl > -1
+    nc.Vbus = np.ones(nc.nbus, dtype=complex)
+    nc.Vbus[has_ctrl] = v_set[ctrl[has_ctrl]]
+
+    # report the devices that disagree with the set point of their bus
+    for k in np.where((np.arange(len(v_bus)) > ctrl[v_bus]) & (v_set != nc.Vbus[v_bus]))[0]:
+        i = v_bus[k]
+        logger.append('Different set points at ' + str(nc.bus_names[i]) + ': ' +
+                      str(v_set[k]) + ' !=' + str(nc.Vbus[i]))
+
+
 def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
                              branch_tolerance_mode=BranchImpedanceMode.Specified,
                              opf_results: OptimalPowerFlowResults = None) -> SnapshotCircuit:
     """
     Compile the information of a circuit and generate the pertinent power flow islands
+    The device attributes are gathered in one pass per device type and the connectivity
+    matrices are built directly from the index arrays.
     :param circuit: Circuit instance
     :param apply_temperature:
     :param branch_tolerance_mode:
@@ -1033,21 +1187,23 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
 
     logger = Logger()
 
-    bus_dictionary = dict()
+    # index the buses by identity (the hash of the devices is their idtag as an hexadecimal number)
+    bus_dictionary = {id(bus): i for i, bus in enumerate(circuit.buses)}
+
+    # devices in compilation order (bus by bus) and the bus index of each one of them
+    loads, load_bus = get_devices_per_bus(circuit.buses, 'loads')
+    stagens, stagen_bus = get_devices_per_bus(circuit.buses, 'static_generators')
+    generators, gen_bus = get_devices_per_bus(circuit.buses, 'controlled_generators')
+    batteries, batt_bus = get_devices_per_bus(circuit.buses, 'batteries')
+    shunts, shunt_bus = get_devices_per_bus(circuit.buses, 'shunts')
 
     # Element count
     nbus = len(circuit.buses)
-    nload = 0
-    ngen = 0
-    n_batt = 0
-    nshunt = 0
-    nstagen = 0
-    for bus in circuit.buses:
-        nload += len(bus.loads)
-        ngen += len(bus.controlled_generators)
-        n_batt += len(bus.batteries)
-        nshunt += len(bus.shunts)
-        nstagen += len(bus.static_generators)
+    nload = len(loads)
+    ngen = len(generators)
+    n_batt = len(batteries)
+    nshunt = len(shunts)
+    nstagen = len(stagens)
 
     nline = len(circuit.lines)
     ntr2w = len(circuit.transformers2w)
@@ -1071,264 +1227,435 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
                          apply_temperature=apply_temperature,
                          branch_tolerance_mode=branch_tolerance_mode)
 
-    # buses and it's connected elements (loads, generators, etc...)
-    i_ld = 0
-    i_gen = 0
-    i_batt = 0
-    i_sh = 0
-    i_stagen = 0
-    for i, bus in enumerate(circuit.buses):
-
-        # bus parameters
-        nc.bus_names[i] = bus.name
-        nc.bus_active[i] = bus.active
-        nc.bus_types[i] = bus.determine_bus_type().value
-
-        # Add buses dictionary entry
-        bus_dictionary[bus] = i
-
-        for elm in bus.loads:
-            nc.load_names[i_ld] = elm.name
-            nc.load_active[i_ld] = elm.active
-
-            if opf_results is None:
-                nc.load_s[i_ld] = complex(elm.P, elm.Q)
-            else:
-                nc.load_s[i_ld] = complex(elm.P, elm.Q) - opf_results.load_shedding[i_ld]
-
-            nc.C_bus_load[i, i_ld] = 1
-            i_ld += 1
-
-        for elm in bus.static_generators:
-            nc.static_generator_names[i_stagen] = elm.name
-            nc.static_generator_active[i_stagen] = elm.active
-            nc.static_generator_s[i_stagen] = complex(elm.P, elm.Q)
-
-            nc.C_bus_static_generator[i, i_stagen] = 1
-            i_stagen += 1
-
-        for elm in bus.controlled_generators:
-            nc.generator_names[i_gen] = elm.name
-            nc.generator_pf[i_gen] = elm.Pf
-            nc.generator_v[i_gen] = elm.Vset
-            nc.generator_qmin[i_gen] = elm.Qmin
-            nc.generator_qmax[i_gen] = elm.Qmax
-            nc.generator_active[i_gen] = elm.active
-            nc.generator_controllable[i_gen] = elm.is_controlled
-            nc.generator_installed_p[i_gen] = elm.Snom
-
-            if opf_results is None:
-                nc.generator_p[i_gen] = elm.P
-            else:
-                nc.generator_p[i_gen] = opf_results.generators_power[i_gen] - opf_results.generation_shedding[i_gen]
-
-            nc.C_bus_gen[i, i_gen] = 1
-
-            if nc.Vbus[i].real == 1.0:
-                nc.Vbus[i] = complex(elm.Vset, 0)
-            elif elm.Vset != nc.Vbus[i]:
-                logger.append('Different set points at ' + bus.name + ': ' + str(elm.Vset) + ' !=' + str(nc.Vbus[i]))
-            i_gen += 1
+    # bus parameters
+    nc.bus_names[:] = [bus.name for bus in circuit.buses]
+    nc.bus_active[:] = [bus.active for bus in circuit.buses]
+    nc.bus_types[:] = [bus.determine_bus_type().value for bus in circuit.buses]
+
+    # loads
+    nc.load_names[:] = [elm.name for elm in loads]
+    nc.load_active[:] = [elm.active for elm in loads]
+    nc.load_s[:] = [complex(elm.P, elm.Q) for elm in loads]
+    if opf_results is not None:
+        nc.load_s -= opf_results.load_shedding[:nload]
+    nc.C_bus_load = get_connectivity_matrix(load_bus, np.arange(nload), (nbus, nload), fmt='csr')
+
+    # static generators
+    nc.static_generator_names[:] = [elm.name for elm in stagens]
+    nc.static_generator_active[:] = [elm.active for elm in stagens]
+    nc.static_generator_s[:] = [complex(elm.P, elm.Q) for elm in stagens]
+    nc.C_bus_static_generator = get_connectivity_matrix(stagen_bus, np.arange(nstagen), (nbus, nstagen), fmt='csr')
+
+    # generators
+    nc.generator_names[:] = [elm.name for elm in generators]
+    nc.generator_pf[:] = [elm.Pf for elm in generators]
+    nc.generator_v[:] = [elm.Vset for elm in generators]
+    nc.generator_qmin[:] = [elm.Qmin for elm in generators]
+    nc.generator_qmax[:] = [elm.Qmax for elm in generators]
+    nc.generator_active[:] = [elm.active for elm in generators]
+    nc.generator_controllable[:] = [elm.is_controlled for elm in generators]
+    nc.generator_installed_p[:] = [elm.Snom for elm in generators]
+    if opf_results is None:
+        nc.generator_p[:] = [elm.P for elm in generators]
+    else:
+        nc.generator_p[:] = opf_results.generators_power[:ngen] - opf_results.generation_shedding[:ngen]
+    nc.C_bus_gen = get_connectivity_matrix(gen_bus, np.arange(ngen), (nbus, ngen), fmt='csr')
+
+    # batteries
+    nc.battery_names[:] = [elm.name for elm in batteries]
+    nc.battery_pf[:] = [elm.Pf for elm in batteries]
+    nc.battery_v[:] = [elm.Vset for elm in batteries]
+    nc.battery_qmin[:] = [elm.Qmin for elm in batteries]
+    nc.battery_qmax[:] = [elm.Qmax for elm in batteries]
+    nc.battery_active[:] = [elm.active for elm in batteries]
+    nc.battery_controllable[:] = [elm.is_controlled for elm in batteries]
+    nc.battery_installed_p[:] = [elm.Snom for elm in batteries]
+    if opf_results is None:
+        nc.battery_p[:] = [elm.P for elm in batteries]
+    else:
+        nc.battery_p[:] = opf_results.battery_power[:n_batt]
+    nc.C_bus_batt = get_connectivity_matrix(batt_bus, np.arange(n_batt), (nbus, n_batt), fmt='csr')
+
+    # shunts
+    nc.shunt_names[:] = [elm.name for elm in shunts]
+    nc.shunt_active[:] = [elm.active for elm in shunts]
+    nc.shunt_admittance[:] = [complex(elm.G, elm.B) for elm in shunts]
+    nc.C_bus_shunt = get_connectivity_matrix(shunt_bus, np.arange(nshunt), (nbus, nshunt), fmt='csr')
+
+    # voltage set points
+    set_voltage_set_points(nc, gen_bus=gen_bus, batt_bus=batt_bus, logger=logger)
+
+    # branches: lines, 2-winding transformers, VSC and DC-lines in this order
+    branches = circuit.lines + circuit.transformers2w + circuit.vsc_converters + circuit.dc_lines
+    nbr = len(branches)
+    nc.branch_names[:] = [elm.name for elm in branches]
+    nc.branch_active[:] = [elm.active for elm in branches]
+    nc.branch_rates[:] = [elm.rate for elm in branches]
+    nc.F[:] = [bus_dictionary[id(elm.bus_from)] for elm in branches]
+    nc.T[:] = [bus_dictionary[id(elm.bus_to)] for elm in branches]
+    nc.C_branch_bus_f = get_connectivity_matrix(np.arange(nbr), nc.F, (nbr, nbus))
+    nc.C_branch_bus_t = get_connectivity_matrix(np.arange(nbr), nc.T, (nbr, nbus))
 
-        for elm in bus.batteries:
-            nc.battery_names[i_batt] = elm.name
+    # Compile the lines
+    a = 0
+    b = nline
+    nc.line_names[:] = nc.branch_names[a:b]
+    nc.line_R[:] = [elm.R for elm in circuit.lines]
+    nc.line_X[:] = [elm.X for elm in circuit.lines]
+    nc.line_B[:] = [elm.B for elm in circuit.lines]
+    nc.line_impedance_tolerance[:] = [elm.tolerance for elm in circuit.lines]
+    nc.line_temp_base[:] = [elm.temp_base for elm in circuit.lines]
+    nc.line_temp_oper[:] = [elm.temp_oper for elm in circuit.lines]
+    nc.line_alpha[:] = [elm.alpha for elm in circuit.lines]
+    nc.C_line_bus = get_connectivity_matrix(np.r_[np.arange(nline), np.arange(nline)],
+                                            np.r_[nc.F[a:b], nc.T[a:b]], (nline, nbus))
 
-            nc.battery_pf[i_batt] = elm.Pf
-            nc.battery_v[i_batt] = elm.Vset
-            nc.battery_qmin[i_batt] = elm.Qmin
-            nc.battery_qmax[i_batt] = elm.Qmax
-            nc.battery_active[i_batt] = elm.active
-            nc.battery_controllable[i_batt] = elm.is_controlled
-            nc.battery_installed_p[i_batt] = elm.Snom
+    # 2-winding transformers
+    a = b
+    b += ntr2w
+    nc.tr_names[:] = nc.branch_names[a:b]
+    nc.tr_R[:] = [elm.R for elm in circuit.transformers2w]
+    nc.tr_X[:] = [elm.X for elm in circuit.transformers2w]
+    nc.tr_G[:] = [elm.G for elm in circuit.transformers2w]
+    nc.tr_B[:] = [elm.B for elm in circuit.transformers2w]
+    nc.C_tr_bus = get_connectivity_matrix(np.r_[np.arange(ntr2w), np.arange(ntr2w)],
+                                          np.r_[nc.F[a:b], nc.T[a:b]], (ntr2w, nbus))
+
+    # tap changer
+    nc.tr_tap_mod[:] = [elm.tap_module for elm in circuit.transformers2w]
+    nc.tr_tap_ang[:] = [elm.angle for elm in circuit.transformers2w]
+    nc.tr_is_bus_to_regulated[:] = [elm.bus_to_regulated for elm in circuit.transformers2w]
+    nc.tr_tap_position[:] = [elm.tap_changer.tap for elm in circuit.transformers2w]
+    nc.tr_min_tap[:] = [elm.tap_changer.min_tap for elm in circuit.transformers2w]
+    nc.tr_max_tap[:] = [elm.tap_changer.max_tap for elm in circuit.transformers2w]
+    nc.tr_tap_inc_reg_up[:] = [elm.tap_changer.inc_reg_up for elm in circuit.transformers2w]
+    nc.tr_tap_inc_reg_down[:] = [elm.tap_changer.inc_reg_down for elm in circuit.transformers2w]
+    nc.tr_vset[:] = [elm.vset for elm in circuit.transformers2w]
+    for i, elm in enumerate(circuit.transformers2w):
+        nc.tr_control_mode[i] = elm.control_mode
+    nc.tr_bus_to_regulated_idx[:] = np.where(nc.tr_is_bus_to_regulated, nc.T[a:b], nc.F[a:b])
 
-            if opf_results is None:
-                nc.battery_p[i_batt] = elm.P
-            else:
-                nc.battery_p[i_batt] = opf_results.battery_power[i_batt]
+    # virtual taps for transformers where the connection voltage is off
+    if ntr2w:
+        nc.tr_tap_f[:], nc.tr_tap_t[:] = np.array([elm.get_virtual_taps() for elm in circuit.transformers2w]).T
 
-            nc.C_bus_batt[i, i_batt] = 1
+    # VSC
+    a = b
+    b += nvsc
+    nc.vsc_names[:] = nc.branch_names[a:b]
+    nc.vsc_R1[:] = [elm.R1 for elm in circuit.vsc_converters]
+    nc.vsc_X1[:] = [elm.X1 for elm in circuit.vsc_converters]
+    nc.vsc_G0[:] = [elm.G0 for elm in circuit.vsc_converters]
+    nc.vsc_Beq[:] = [elm.Beq for elm in circuit.vsc_converters]
+    nc.vsc_m[:] = [elm.m for elm in circuit.vsc_converters]
+    nc.vsc_theta[:] = [elm.theta for elm in circuit.vsc_converters]
+    nc.vsc_Inom[:] = [elm.Inom for elm in circuit.vsc_converters]
+    nc.vsc_Pset[:] = [elm.Pset for elm in circuit.vsc_converters]
+    nc.vsc_Qset[:] = [elm.Qset for elm in circuit.vsc_converters]
+    nc.vsc_Vac_set[:] = [elm.Vac_set for elm in circuit.vsc_converters]
+    nc.vsc_Vdc_set[:] = [elm.Vdc_set for elm in circuit.vsc_converters]
+    for i, elm in enumerate(circuit.vsc_converters):
+        nc.vsc_control_mode[i] = elm.control_mode
+    nc.C_vsc_bus = get_connectivity_matrix(np.r_[np.arange(nvsc), np.arange(nvsc)],
+                                           np.r_[nc.F[a:b], nc.T[a:b]], (nvsc, nbus))
 
-            if nc.Vbus[i].real == 1.0:
-                nc.Vbus[i] = complex(elm.Vset, 0)
-            elif elm.Vset != nc.Vbus[i]:
-                logger.append('Different set points at ' + bus.name + ': ' + str(elm.Vset) + ' !=' + str(nc.Vbus[i]))
+    # DC-lines
+    a = b
+    b += ndcline
+    nc.dc_line_names[:] = nc.branch_names[a:b]
+    nc.dc_line_R[:] = [elm.R for elm in circuit.dc_lines]
+    nc.dc_line_impedance_tolerance[:] = [elm.tolerance for elm in circuit.dc_lines]
+    nc.dc_line_temp_base[:] = [elm.temp_base for elm in circuit.dc_lines]
+    nc.dc_line_temp_oper[:] = [elm.temp_oper for elm in circuit.dc_lines]
+    nc.dc_line_alpha[:] = [elm.alpha for elm in circuit.dc_lines]
+    nc.dc_F[:] = nc.F[a:b]
+    nc.dc_T[:] = nc.T[a:b]
+    nc.C_dc_line_bus = get_connectivity_matrix(np.r_[np.arange(ndcline), np.arange(ndcline)],
+                                               np.r_[nc.dc_F, nc.dc_T], (ndcline, nbus))
 
-            i_batt += 1
+    # HVDC
+    hvdc_f = np.array([bus_dictionary[id(elm.bus_from)] for elm in circuit.hvdc_lines], dtype=int)
+    hvdc_t = np.array([bus_dictionary[id(elm.bus_to)] for elm in circuit.hvdc_lines], dtype=int)
+    nc.hvdc_names[:] = [elm.name for elm in circuit.hvdc_lines]
+    nc.hvdc_active[:] = [elm.active for elm in circuit.hvdc_lines]
+    nc.hvdc_rate[:] = [elm.rate for elm in circuit.hvdc_lines]
+    if nhvdc:
+        nc.hvdc_Pf[:], nc.hvdc_Pt[:] = np.array([elm.get_from_and_to_power() for elm in circuit.hvdc_lines]).T
+    nc.hvdc_loss_factor[:] = [elm.loss_factor for elm in circuit.hvdc_lines]
+    nc.hvdc_Vset_f[:] = [elm.Vset_f for elm in circuit.hvdc_lines]
+    nc.hvdc_Vset_t[:] = [elm.Vset_t for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmin_f[:] = [elm.Qmin_f for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmax_f[:] = [elm.Qmax_f for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmin_t[:] = [elm.Qmin_t for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmax_t[:] = [elm.Qmax_t for elm in circuit.hvdc_lines]
+
+    # hack the bus types to believe they are PV
+    nc.bus_types[hvdc_f] = BusMode.PV.value
+    nc.bus_types[hvdc_t] = BusMode.PV.value
+
+    # the the bus-hvdc line connectivity
+    nc.C_hvdc_bus_f = get_connectivity_matrix(np.arange(nhvdc), hvdc_f, (nhvdc, nbus))
+    nc.C_hvdc_bus_t = get_connectivity_matrix(np.arange(nhvdc), hvdc_t, (nhvdc, nbus))
+
+    # keep what is needed to patch this compilation (see update_snapshot_circuit)
+    nc.bus_types_base = nc.bus_types.copy()
+    for elements in [circuit.buses, branches, circuit.hvdc_lines, loads, stagens, generators, batteries, shunts]:
+        nc.element_index.update({id(elm): (elm, i) for i, elm in enumerate(elements)})
 
-        for elm in bus.shunts:
-            nc.shunt_names[i_sh] = elm.name
-            nc.shunt_active[i_sh] = elm.active
-            nc.shunt_admittance[i_sh] = complex(elm.G, elm.B)
+    # consolidate the information
+    nc.consolidate()
 
-            nc.C_bus_shunt[i, i_sh] = 1
-            i_sh += 1
+    return nc
 
-    # Compile the lines
-    for i, elm in enumerate(circuit.lines):
-        # generic stuff
-        nc.branch_names[i] = elm.name
-        nc.branch_active[i] = elm.active
-        nc.branch_rates[i] = elm.rate
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-        nc.C_branch_bus_f[i, f] = 1
-        nc.C_branch_bus_t[i, t] = 1
-        nc.F[i] = f
-        nc.T[i] = t
-
-        # impedance
-        nc.line_names[i] = elm.name
-        nc.line_R[i] = elm.R
-        nc.line_X[i] = elm.X
-        nc.line_B[i] = elm.B
-        nc.line_impedance_tolerance[i] = elm.tolerance
-        nc.C_line_bus[i, f] = 1
-        nc.C_line_bus[i, t] = 1
-
-        # Thermal correction
-        nc.line_temp_base[i] = elm.temp_base
-        nc.line_temp_oper[i] = elm.temp_oper
-        nc.line_alpha[i] = elm.alpha
 
-    # 2-winding transformers
-    for i, elm in enumerate(circuit.transformers2w):
-        ii = i + nline
-
-        # generic stuff
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-
-        nc.branch_names[ii] = elm.name
-        nc.branch_active[ii] = elm.active
-        nc.branch_rates[ii] = elm.rate
-        nc.C_branch_bus_f[ii, f] = 1
-        nc.C_branch_bus_t[ii, t] = 1
-        nc.F[ii] = f
-        nc.T[ii] = t
-
-        # impedance
-        nc.tr_names[i] = elm.name
-        nc.tr_R[i] = elm.R
-        nc.tr_X[i] = elm.X
-        nc.tr_G[i] = elm.G
-        nc.tr_B[i] = elm.B
-
-        nc.C_tr_bus[i, f] = 1
-        nc.C_tr_bus[i, t] = 1
-
-        # tap changer
-        nc.tr_tap_mod[i] = elm.tap_module
-        nc.tr_tap_ang[i] = elm.angle
-        nc.tr_is_bus_to_regulated[i] = elm.bus_to_regulated
-        nc.tr_tap_position[i] = elm.tap_changer.tap
-        nc.tr_min_tap[i] = elm.tap_changer.min_tap
-        nc.tr_max_tap[i] = elm.tap_changer.max_tap
-        nc.tr_tap_inc_reg_up[i] = elm.tap_changer.inc_reg_up
-        nc.tr_tap_inc_reg_down[i] = elm.tap_changer.inc_reg_down
-        nc.tr_vset[i] = elm.vset
-        nc.tr_control_mode[i] = elm.control_mode
+def patch_snapshot_circuit(nc: SnapshotCircuit, circuit: MultiCircuit, elements) -> bool:
+    """
+    Patch the arrays of a compiled SnapshotCircuit with the values of the given devices and
+    update its internal magnitudes; the admittance matrices are corrected with rank-k updates.
+    :param nc: SnapshotCircuit compiled from circuit (see compile_snapshot_circuit)
+    :param circuit: MultiCircuit instance
+    :param elements: list of modified devices
+    :return: True if the patch was possible, False if the modifications require a full compilation
+    """
+    def index_of(device):
+        """
+        Index of a device in the compiled arrays
+        :param device: device object
+        :return: index or None if the device was not compiled
+        """
+        entry = nc.element_index.get(id(device), None)
+        if entry is None or entry[0] is not device:
+            return None
+        return entry[1]
+
+    branch_idx = list()
+    bus_idx = set()
+    nbr_tr = nc.nline + nc.ntr
+    nbr_vsc = nbr_tr + nc.nvsc
+    gen_bus = sp.csc_matrix(nc.C_bus_gen).indices
+    batt_bus = sp.csc_matrix(nc.C_bus_batt).indices
+
+    # bus index of the injection devices, to detect the devices connected somewhere else
+    injection_bus = {DeviceType.LoadDevice: sp.csc_matrix(nc.C_bus_load).indices,
+                     DeviceType.StaticGeneratorDevice: sp.csc_matrix(nc.C_bus_static_generator).indices,
+                     DeviceType.GeneratorDevice: gen_bus,
+                     DeviceType.BatteryDevice: batt_bus,
+                     DeviceType.ShuntDevice: sp.csc_matrix(nc.C_bus_shunt).indices}
+
+    for elm in elements:
+
+        tpe = elm.device_type
+
+        if tpe == DeviceType.ExternalGridDevice:
+            # external grids are not compiled, but they determine the bus type
+            k = index_of(elm.bus)
+            if k is None:
+                return False
+            bus_idx.add(k)
+            continue
+
+        i = index_of(elm)
+
+        if i is None:
+            # this is a new device
+            return False
+
+        if tpe in injection_bus and injection_bus[tpe][i] != index_of(elm.bus):
+            # the device was connected somewhere else
+            return False
+
+        if tpe == DeviceType.BusDevice:
+            nc.bus_names[i] = elm.name
+            nc.bus_active[i] = elm.active
+            bus_idx.add(i)
+
+        elif tpe in [DeviceType.LineDevice, DeviceType.Transformer2WDevice,
+                     DeviceType.VscDevice, DeviceType.DCLineDevice]:
+
+            if nc.F[i] != index_of(elm.bus_from) or nc.T[i] != index_of(elm.bus_to):
+                # the branch was connected somewhere else
+                return False
+
+            nc.branch_names[i] = elm.name
+            nc.branch_active[i] = elm.active
+            nc.branch_rates[i] = elm.rate
+            branch_idx.append(i)
+
+            if tpe == DeviceType.LineDevice:
+                nc.line_names[i] = elm.name
+                nc.line_R[i] = elm.R
+                nc.line_X[i] = elm.X
+                nc.line_B[i] = elm.B
+                nc.line_impedance_tolerance[i] = elm.tolerance
+                nc.line_temp_base[i] = elm.temp_base
+                nc.line_temp_oper[i] = elm.temp_oper
+                nc.line_alpha[i] = elm.alpha
+
+            elif tpe == DeviceType.Transformer2WDevice:
+                j = i - nc.nline
+                nc.tr_names[j] = elm.name
+                nc.tr_R[j] = elm.R
+                nc.tr_X[j] = elm.X
+                nc.tr_G[j] = elm.G
+                nc.tr_B[j] = elm.B
+                nc.tr_tap_mod[j] = elm.tap_module
+                nc.tr_tap_ang[j] = elm.angle
+                nc.tr_is_bus_to_regulated[j] = elm.bus_to_regulated
+                nc.tr_tap_position[j] = elm.tap_changer.tap
+                nc.tr_min_tap[j] = elm.tap_changer.min_tap
+                nc.tr_max_tap[j] = elm.tap_changer.max_tap
+                nc.tr_tap_inc_reg_up[j] = elm.tap_changer.inc_reg_up
+                nc.tr_tap_inc_reg_down[j] = elm.tap_changer.inc_reg_down
+                nc.tr_vset[j] = elm.vset
+                nc.tr_control_mode[j] = elm.control_mode
+                nc.tr_bus_to_regulated_idx[j] = nc.T[i] if elm.bus_to_regulated else nc.F[i]
+                nc.tr_tap_f[j], nc.tr_tap_t[j] = elm.get_virtual_taps()
+
+            elif tpe == DeviceType.VscDevice:
+                j = i - nbr_tr
+                nc.vsc_names[j] = elm.name
+                nc.vsc_R1[j] = elm.R1
+                nc.vsc_X1[j] = elm.X1
+                nc.vsc_G0[j] = elm.G0
+                nc.vsc_Beq[j] = elm.Beq
+                nc.vsc_m[j] = elm.m
+                nc.vsc_theta[j] = elm.theta
+                nc.vsc_Inom[j] = elm.Inom
+                nc.vsc_Pset[j] = elm.Pset
+                nc.vsc_Qset[j] = elm.Qset
+                nc.vsc_Vac_set[j] = elm.Vac_set
+                nc.vsc_Vdc_set[j] = elm.Vdc_set
+                nc.vsc_control_mode[j] = elm.control_mode
 
-        nc.tr_bus_to_regulated_idx[i] = t if elm.bus_to_regulated else f
+            else:
+                j = i - nbr_vsc
+                nc.dc_line_names[j] = elm.name
+                nc.dc_line_R[j] = elm.R
+                nc.dc_line_impedance_tolerance[j] = elm.tolerance
+                nc.dc_line_temp_base[j] = elm.temp_base
+                nc.dc_line_temp_oper[j] = elm.temp_oper
+                nc.dc_line_alpha[j] = elm.alpha
+
+        elif tpe == DeviceType.HVDCLineDevice:
+            # the results may hold references to these arrays
+            nc.hvdc_Pf = nc.hvdc_Pf.copy()
+            nc.hvdc_Pt = nc.hvdc_Pt.copy()
+
+            nc.hvdc_names[i] = elm.name
+            nc.hvdc_active[i] = elm.active
+            nc.hvdc_rate[i] = elm.rate
+            nc.hvdc_Pf[i], nc.hvdc_Pt[i] = elm.get_from_and_to_power()
+            nc.hvdc_loss_factor[i] = elm.loss_factor
+            nc.hvdc_Vset_f[i] = elm.Vset_f
+            nc.hvdc_Vset_t[i] = elm.Vset_t
+            nc.hvdc_Qmin_f[i] = elm.Qmin_f
+            nc.hvdc_Qmax_f[i] = elm.Qmax_f
+            nc.hvdc_Qmin_t[i] = elm.Qmin_t
+            nc.hvdc_Qmax_t[i] = elm.Qmax_t
+
+        elif tpe == DeviceType.LoadDevice:
+            nc.load_names[i] = elm.name
+            nc.load_active[i] = elm.active
+            nc.load_s[i] = complex(elm.P, elm.Q)
+
+        elif tpe == DeviceType.StaticGeneratorDevice:
+            nc.static_generator_names[i] = elm.name
+            nc.static_generator_active[i] = elm.active
+            nc.static_generator_s[i] = complex(elm.P, elm.Q)
+
+        elif tpe == DeviceType.GeneratorDevice:
+            nc.generator_names[i] = elm.name
+            nc.generator_pf[i] = elm.Pf
+            nc.generator_v[i] = elm.Vset
+            nc.generator_qmin[i] = elm.Qmin
+            nc.generator_qmax[i] = elm.Qmax
+            nc.generator_active[i] = elm.active
+            nc.generator_controllable[i] = elm.is_controlled
+            nc.generator_installed_p[i] = elm.Snom
+            nc.generator_p[i] = elm.P
+            bus_idx.add(gen_bus[i])
+
+        elif tpe == DeviceType.BatteryDevice:
+            nc.battery_names[i] = elm.name
+            nc.battery_pf[i] = elm.Pf
+            nc.battery_v[i] = elm.Vset
+            nc.battery_qmin[i] = elm.Qmin
+            nc.battery_qmax[i] = elm.Qmax
+            nc.battery_active[i] = elm.active
+            nc.battery_controllable[i] = elm.is_controlled
+            nc.battery_installed_p[i] = elm.Snom
+            nc.battery_p[i] = elm.P
+            bus_idx.add(batt_bus[i])
+
+        elif tpe == DeviceType.ShuntDevice:
+            nc.shunt_names[i] = elm.name
+            nc.shunt_active[i] = elm.active
+            nc.shunt_admittance[i] = complex(elm.G, elm.B)
 
-        # virtual taps for transformers where the connection voltage is off
-        nc.tr_tap_f[i], nc.tr_tap_t[i] = elm.get_virtual_taps()
+        else:
+            return False
 
-    # VSC
-    for i, elm in enumerate(circuit.vsc_converters):
-        ii = i + nline + ntr2w
-
-        # generic stuff
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-
-        nc.branch_names[ii] = elm.name
-        nc.branch_active[ii] = elm.active
-        nc.branch_rates[ii] = elm.rate
-        nc.C_branch_bus_f[ii, f] = 1
-        nc.C_branch_bus_t[ii, t] = 1
-        nc.F[ii] = f
-        nc.T[ii] = t
-
-        # vsc values
-        nc.vsc_names[i] = elm.name
-        nc.vsc_R1[i] = elm.R1
-        nc.vsc_X1[i] = elm.X1
-        nc.vsc_G0[i] = elm.G0
-        nc.vsc_Beq[i] = elm.Beq
-        nc.vsc_m[i] = elm.m
-        nc.vsc_theta[i] = elm.theta
-        nc.vsc_Inom[i] = elm.Inom
-        nc.vsc_Pset[i] = elm.Pset
-        nc.vsc_Qset[i] = elm.Qset
-        nc.vsc_Vac_set[i] = elm.Vac_set
-        nc.vsc_Vdc_set[i] = elm.Vdc_set
-        nc.vsc_control_mode[i] = elm.control_mode
+    # bus types
+    for i in bus_idx:
+        nc.bus_types_base[i] = circuit.buses[i].determine_bus_type().value
+    nc.bus_types_base[sp.csr_matrix(nc.C_hvdc_bus_f).indices] = BusMode.PV.value
+    nc.bus_types_base[sp.csr_matrix(nc.C_hvdc_bus_t).indices] = BusMode.PV.value
+    nc.bus_types = nc.bus_types_base.copy()
 
-        nc.C_vsc_bus[i, f] = 1
-        nc.C_vsc_bus[i, t] = 1
+    # voltage set points
+    set_voltage_set_points(nc, gen_bus=gen_bus, batt_bus=batt_bus, logger=Logger())
 
-    # DC-lines
-    for i, elm in enumerate(circuit.dc_lines):
-        ii = i + nline + ntr2w + nvsc
-
-        # generic stuff
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-
-        nc.branch_names[ii] = elm.name
-        nc.branch_active[ii] = elm.active
-        nc.branch_rates[ii] = elm.rate
-        nc.C_branch_bus_f[ii, f] = 1
-        nc.C_branch_bus_t[ii, t] = 1
-        nc.F[ii] = f
-        nc.T[ii] = t
-
-        # dc line values
-        nc.dc_line_names[i] = elm.name
-        nc.dc_line_R[i] = elm.R
-        nc.dc_line_impedance_tolerance[i] = elm.tolerance
-        nc.C_dc_line_bus[i, f] = 1
-        nc.C_dc_line_bus[i, t] = 1
-        nc.dc_F[i] = f
-        nc.dc_T[i] = t
-
-        # Thermal correction
-        nc.dc_line_temp_base[i] = elm.temp_base
-        nc.dc_line_temp_oper[i] = elm.temp_oper
-        nc.dc_line_alpha[i] = elm.alpha
+    # update the internal magnitudes (the same as consolidate, but correcting the admittances)
+    nc.compute_injections()
 
-    # HVDC
-    for i, elm in enumerate(circuit.hvdc_lines):
-        ii = i + nline + ntr2w + nvsc
+    nc.vd, nc.pq, nc.pv, nc.pqpv = compile_types(Sbus=nc.Sbus, types=nc.bus_types)
 
-        # generic stuff
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
+    nc.update_admittance_matrices(np.unique(np.array(branch_idx, dtype=int)))
 
-        # hvdc values
-        nc.hvdc_names[i] = elm.name
-        nc.hvdc_active[i] = elm.active
-        nc.hvdc_rate[i] = elm.rate
+    nc.compute_reactive_power_limits()
 
-        nc.hvdc_Pf[i], nc.hvdc_Pt[i] = elm.get_from_and_to_power()
+    return True
 
-        nc.hvdc_loss_factor[i] = elm.loss_factor
-        nc.hvdc_Vset_f[i] = elm.Vset_f
-        nc.hvdc_Vset_t[i] = elm.Vset_t
-        nc.hvdc_Qmin_f[i] = elm.Qmin_f
-        nc.hvdc_Qmax_f[i] = elm.Qmax_f
-        nc.hvdc_Qmin_t[i] = elm.Qmin_t
-        nc.hvdc_Qmax_t[i] = elm.Qmax_t
 
-        # hack the bus types to believe they are PV
-        nc.bus_types[f] = BusMode.PV.value
-        nc.bus_types[t] = BusMode.PV.value
+def update_snapshot_circuit(circuit: MultiCircuit, numerical_circuit: SnapshotCircuit = None, apply_temperature=False,
+                            branch_tolerance_mode=BranchImpedanceMode.Specified) -> SnapshotCircuit:
+    """
+    Incremental compilation: update the last compilation of the circuit with the devices marked
+    as modified (see MultiCircuit.set_modified), instead of compiling the whole circuit again.
+    A full compilation is done when there is nothing to update or when the circuit structure changed.
+    The result is kept in circuit.numerical_circuit and the modifications are cleared.
+    :param circuit: MultiCircuit instance
+    :param numerical_circuit: SnapshotCircuit to update (by default circuit.numerical_circuit)
+    :param apply_temperature: apply the temperature correction to the resistances
+    :param branch_tolerance_mode: BranchImpedanceMode
+    :return: SnapshotCircuit
+    """
+    nc = circuit.numerical_circuit if numerical_circuit is None else numerical_circuit
+
+    if isinstance(nc, SnapshotCircuit) \
+            and len(nc.element_index) > 0 \
+            and nc.Ybus is not None \
+            and nc.apply_temperature == apply_temperature \
+            and nc.branch_tolerance_mode == branch_tolerance_mode \
+            and (nc.nbus, nc.nline, nc.ntr, nc.nvsc, nc.ndcline, nc.nhvdc) == (len(circuit.buses),
+                                                                          len(circuit.lines),
+                                                                          len(circuit.transformers2w),
+                                                                          len(circuit.vsc_converters),
+                                                                          len(circuit.dc_lines),
+                                                                          len(circuit.hvdc_lines)) \
+            and (nc.nload, nc.nstagen, nc.ngen, nc.nbatt, nc.nshunt) == tuple(
+                sum(len(getattr(bus, name)) for bus in circuit.buses)
+                for name in ['loads', 'static_generators', 'controlled_generators', 'batteries', 'shunts']):
+        updated = patch_snapshot_circuit(nc, circuit, circuit.get_modified())
+    else:
+        updated = False
 
-        # the the bus-hvdc line connectivity
-        nc.C_hvdc_bus_f[i, f] = 1
-        nc.C_hvdc_bus_t[i, t] = 1
+    if not updated:
+        nc = compile_snapshot_circuit(circuit=circuit,
+                                      apply_temperature=apply_temperature,
+                                      branch_tolerance_mode=branch_tolerance_mode)
 
-    # consolidate the information
-    nc.consolidate()
+    circuit.numerical_circuit = nc
+    circuit.clear_modified()
 
     return nc
@@ -596,8 +596,11 @@ def get_opf_time_island(self, bus_idx, time_idx) -> "OpfTimeCircuit":
     nc.branch_cost = self.branch_cost[np.ix_(time_idx, br_idx)]
     nc.branch_R = self.branch_R[br_idx]
     nc.branch_X = self.branch_X[br_idx]
-    nc.F = self.F[br_idx]
-    nc.T = self.T[br_idx]
+    # the from and to bus indices are referred to the buses of the island
+    bus_map = np.full(self.nbus, -1, dtype=int)
+    bus_map[bus_idx] = np.arange(len(bus_idx))
+    nc.F = bus_map[self.F[br_idx]]
+    nc.T = bus_map[self.T[br_idx]]
     nc.C_branch_bus_f = self.C_branch_bus_f[np.ix_(br_idx, bus_idx)]
     nc.C_branch_bus_t = self.C_branch_bus_t[np.ix_(br_idx, bus_idx)]
 
@@ -25,7 +25,8 @@ from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
 from GridCal.Engine.basic_structures import BranchImpedanceMode
 from GridCal.Engine.basic_structures import BusMode
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
-from GridCal.Engine.Core.common_functions import compile_types, find_different_states
+from GridCal.Engine.Core.common_functions import compile_types, find_different_states, get_connectivity_matrix, \
+    get_devices_per_bus, get_controlling_devices
 from GridCal.Engine.Simulations.sparse_solve import get_sparse_type
 from GridCal.Engine.Simulations.OPF.opf_ts_results import OptimalPowerFlowTimeSeriesResults
 
@@ -88,8 +89,8 @@ class TimeCircuit:
         self.F = np.zeros(self.nbr, dtype=int)  # indices of the "from" buses
         self.T = np.zeros(self.nbr, dtype=int)  # indices of the "to" buses
         self.branch_rates = np.zeros((ntime, self.nbr), dtype=float)
-        self.C_branch_bus_f = sp.lil_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "from" bus
-        self.C_branch_bus_t = sp.lil_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "to" bus
+        self.C_branch_bus_f = sp.csc_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "from" bus
+        self.C_branch_bus_t = sp.csc_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "to" bus
 
         # lines --------------------------------------------------------------------------------------------------------
         self.line_names = np.zeros(nline, dtype=object)
@@ -101,7 +102,7 @@ class TimeCircuit:
         self.line_alpha = np.zeros(nline, dtype=float)
         self.line_impedance_tolerance = np.zeros(nline, dtype=float)
 
-        self.C_line_bus = sp.lil_matrix((nline, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_line_bus = sp.csc_matrix((nline, nbus), dtype=int)  # this ons is just for splitting islands
 
         # transformer 2W + 3W ------------------------------------------------------------------------------------------
         self.tr_names = np.zeros(ntr, dtype=object)
@@ -123,7 +124,7 @@ class TimeCircuit:
         self.tr_tap_inc_reg_down = np.zeros(ntr)
         self.tr_vset = np.ones(ntr)
 
-        self.C_tr_bus = sp.lil_matrix((ntr, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_tr_bus = sp.csc_matrix((ntr, nbus), dtype=int)  # this ons is just for splitting islands
 
         # hvdc line ----------------------------------------------------------------------------------------------------
         self.hvdc_names = np.zeros(nhvdc, dtype=object)
@@ -143,8 +144,8 @@ class TimeCircuit:
         self.hvdc_Qmin_t = np.zeros(nhvdc)
         self.hvdc_Qmax_t = np.zeros(nhvdc)
 
-        self.C_hvdc_bus_f = sp.lil_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
-        self.C_hvdc_bus_t = sp.lil_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_hvdc_bus_f = sp.csc_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_hvdc_bus_t = sp.csc_matrix((nhvdc, nbus), dtype=int)  # this ons is just for splitting islands
 
         # vsc converter ------------------------------------------------------------------------------------------------
         self.vsc_names = np.zeros(nvsc, dtype=object)
@@ -155,14 +156,14 @@ class TimeCircuit:
         self.vsc_m = np.zeros(nvsc)
         self.vsc_theta = np.zeros(nvsc)
 
-        self.C_vsc_bus = sp.lil_matrix((nvsc, nbus), dtype=int)  # this ons is just for splitting islands
+        self.C_vsc_bus = sp.csc_matrix((nvsc, nbus), dtype=int)  # this ons is just for splitting islands
 
         # load ---------------------------------------------------------------------------------------------------------
         self.load_names = np.empty(nload, dtype=object)
         self.load_active = np.zeros((ntime, nload), dtype=bool)
         self.load_s = np.zeros((ntime, nload), dtype=complex)
 
-        self.C_bus_load = sp.lil_matrix((nbus, nload), dtype=int)
+        self.C_bus_load = sp.csr_matrix((nbus, nload), dtype=int)
 
         # static generators --------------------------------------------------------------------------------------------
         self.static_generator_names = np.empty(nstagen, dtype=object)
@@ -170,7 +171,7 @@ class TimeCircuit:
         self.static_generator_active = np.zeros((ntime, nstagen), dtype=bool)
         self.static_generator_s = np.zeros((ntime, nstagen), dtype=complex)
 
-        self.C_bus_static_generator = sp.lil_matrix((nbus, nstagen), dtype=int)
+        self.C_bus_static_generator = sp.csr_matrix((nbus, nstagen), dtype=int)
 
         # battery ------------------------------------------------------------------------------------------------------
         self.battery_names = np.empty(nbatt, dtype=object)
@@ -183,7 +184,7 @@ class TimeCircuit:
         self.battery_qmin = np.zeros(nbatt)
         self.battery_qmax = np.zeros(nbatt)
 
-        self.C_bus_batt = sp.lil_matrix((nbus, nbatt), dtype=int)
+        self.C_bus_batt = sp.csr_matrix((nbus, nbatt), dtype=int)
 
         # generator ----------------------------------------------------------------------------------------------------
         self.generator_names = np.empty(ngen, dtype=object)
@@ -196,14 +197,14 @@ class TimeCircuit:
         self.generator_qmin = np.zeros(ngen)
         self.generator_qmax = np.zeros(ngen)
 
-        self.C_bus_gen = sp.lil_matrix((nbus, ngen), dtype=int)
+        self.C_bus_gen = sp.csr_matrix((nbus, ngen), dtype=int)
 
         # shunt --------------------------------------------------------------------------------------------------------
         self.shunt_names = np.empty(nshunt, dtype=object)
         self.shunt_active = np.zeros((ntime, nshunt), dtype=bool)
         self.shunt_admittance = np.zeros((ntime, nshunt), dtype=complex)
 
-        self.C_bus_shunt = sp.lil_matrix((nbus, nshunt), dtype=int)
+        self.C_bus_shunt = sp.csr_matrix((nbus, nshunt), dtype=int)
 
         # --------------------------------------------------------------------------------------------------------------
         # Compiled arrays
@@ -226,6 +227,9 @@ class TimeCircuit:
         self.Bpqpv = None
         self.Bref = None
 
+        # island partitions of the already seen topologies (see split_time_circuit_into_islands)
+        self.topology_cache = tp.TopologyCache()
+
         self.original_time_idx = np.arange(self.ntime)
         self.original_bus_idx = np.arange(self.nbus)
         self.original_branch_idx = np.arange(self.nbr)
@@ -816,26 +820,39 @@ class TimeCircuit:
         return df
 
 
-def get_time_island(time_circuit: TimeCircuit, bus_idx, time_idx) -> "TimeCircuit":
+def get_time_island_indices(time_circuit: TimeCircuit, bus_idx):
+    """
+    Get the indices of the devices of the island corresponding to the given buses
+    :param time_circuit: TimeCircuit
+    :param bus_idx: array of bus indices
+    :return: line, transformer, vsc, hvdc, branch, load, static generator, generator, battery and shunt indices
+    """
+    return (tp.get_elements_of_the_island(time_circuit.C_line_bus, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_tr_bus, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_vsc_bus, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_hvdc_bus_f + time_circuit.C_hvdc_bus_t, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_branch_bus_f + time_circuit.C_branch_bus_t, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_bus_load.T, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_bus_static_generator.T, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_bus_gen.T, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_bus_batt.T, bus_idx),
+            tp.get_elements_of_the_island(time_circuit.C_bus_shunt.T, bus_idx))
+
+
+def get_time_island(time_circuit: TimeCircuit, bus_idx, time_idx, indices=None) -> "TimeCircuit":
         """
         Get the island corresponding to the given buses
         :param bus_idx: array of bus indices
         :param time_idx: array of time indices
+        :param indices: indices of the devices of the island (see get_time_island_indices), computed if None
         :return: TimeCircuit
         """
 
         # find the indices of the devices of the island
-        line_idx = tp.get_elements_of_the_island(time_circuit.C_line_bus, bus_idx)
-        tr_idx = tp.get_elements_of_the_island(time_circuit.C_tr_bus, bus_idx)
-        vsc_idx = tp.get_elements_of_the_island(time_circuit.C_vsc_bus, bus_idx)
-        hvdc_idx = tp.get_elements_of_the_island(time_circuit.C_hvdc_bus_f + time_circuit.C_hvdc_bus_t, bus_idx)
-        br_idx = tp.get_elements_of_the_island(time_circuit.C_branch_bus_f + time_circuit.C_branch_bus_t, bus_idx)
-
-        load_idx = tp.get_elements_of_the_island(time_circuit.C_bus_load.T, bus_idx)
-        stagen_idx = tp.get_elements_of_the_island(time_circuit.C_bus_static_generator.T, bus_idx)
-        gen_idx = tp.get_elements_of_the_island(time_circuit.C_bus_gen.T, bus_idx)
-        batt_idx = tp.get_elements_of_the_island(time_circuit.C_bus_batt.T, bus_idx)
-        shunt_idx = tp.get_elements_of_the_island(time_circuit.C_bus_shunt.T, bus_idx)
+        if indices is None:
+            indices = get_time_island_indices(time_circuit, bus_idx)
+
+        line_idx, tr_idx, vsc_idx, hvdc_idx, br_idx, load_idx, stagen_idx, gen_idx, batt_idx, shunt_idx = indices
 
         nc = TimeCircuit(nbus=len(bus_idx),
                          nline=len(line_idx),
@@ -870,8 +887,11 @@ def get_time_island(time_circuit: TimeCircuit, bus_idx, time_idx) -> "TimeCircui
         nc.branch_names = time_circuit.branch_names[br_idx]
         nc.branch_active = time_circuit.branch_active[np.ix_(time_idx, br_idx)]
         nc.branch_rates = time_circuit.branch_rates[np.ix_(time_idx, br_idx)]
-        nc.F = time_circuit.F[br_idx]
-        nc.T = time_circuit.T[br_idx]
+        # the from and to bus indices are referred to the buses of the island
+        bus_map = np.full(time_circuit.nbus, -1, dtype=int)
+        bus_map[bus_idx] = np.arange(len(bus_idx))
+        nc.F = bus_map[time_circuit.F[br_idx]]
+        nc.T = bus_map[time_circuit.T[br_idx]]
         nc.C_branch_bus_f = time_circuit.C_branch_bus_f[np.ix_(br_idx, bus_idx)]
         nc.C_branch_bus_t = time_circuit.C_branch_bus_t[np.ix_(br_idx, bus_idx)]
 
@@ -1008,76 +1028,55 @@ def split_time_circuit_into_islands(numeric_circuit: TimeCircuit, ignore_single_
     # find the probable time slices
     states = find_different_states(branch_active_prof=numeric_circuit.branch_active)
 
-    if len(states) == 1:
-        # compute the adjacency matrix
-        A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
-                                    C_branch_bus_t=numeric_circuit.C_branch_bus_t,
-                                    branch_active=numeric_circuit.branch_active[0, :],
-                                    bus_active=numeric_circuit.bus_active[0, :])
-
-        # find the matching islands
-        idx_islands = tp.find_islands(A)
-
-        if len(idx_islands) == 1:  # only one state and only one island -> just copy the data --------------------------
-
-            numeric_circuit.consolidate()  # compute the internal magnitudes
-            return [numeric_circuit]
-
-        else:  # one state, many islands -> split by bus index, keep the time ------------------------------------------
-
-            for bus_idx in idx_islands:
-
-                if ignore_single_node_islands:
-
-                    if len(bus_idx) > 1:
-                        island = get_time_island(numeric_circuit, bus_idx, all_time)
-                        island.consolidate()  # compute the internal magnitudes
-                        circuit_islands.append(island)
-
-                else:
-                    island = get_time_island(numeric_circuit, bus_idx, all_time)
-                    island.consolidate()  # compute the internal magnitudes
-                    circuit_islands.append(island)
-
-            return circuit_islands
+    for t, t_array in states.items():
 
-    else:  # -----------------------------------------------------------------------------------------------------------
-
-        for t, t_array in states.items():
+        # the island partition and the device indices of each island are cached by topology
+        key = tp.get_topology_key(numeric_circuit.branch_active[t, :], numeric_circuit.bus_active[t, :])
+        islands = numeric_circuit.topology_cache.get(key)
 
+        if islands is None:
             # compute the adjacency matrix
             A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
                                         C_branch_bus_t=numeric_circuit.C_branch_bus_t,
-                                        branch_active=numeric_circuit.branch_active[t_array, :],
-                                        bus_active=numeric_circuit.bus_active[t_array, :])
+                                        branch_active=numeric_circuit.branch_active[t, :],
+                                        bus_active=numeric_circuit.bus_active[t, :])
 
             # find the matching islands
             idx_islands = tp.find_islands(A)
 
-            if len(idx_islands) == 1:  # many time states, one island -> slice only by time ----------------------------
+            if len(idx_islands) == 1:
+                # the indices of a single island are only needed if the circuit is sliced by time
+                indices = get_time_island_indices(numeric_circuit, all_buses) if len(states) > 1 else None
+                islands = [(all_buses, indices)]
+            else:
+                islands = [(bus_idx, get_time_island_indices(numeric_circuit, bus_idx)) for bus_idx in idx_islands]
+
+            numeric_circuit.topology_cache.set(key, islands)
 
-                island = get_time_island(numeric_circuit, all_buses, t_array)  # convert the circuit to an island
-                island.consolidate()  # compute the internal magnitudes
+        if len(states) == 1:
 
-                circuit_islands.append(island)
+            if len(islands) == 1:  # only one state and only one island -> just copy the data ----------------------
 
-            else:  # any time states, many islands -> slice by both time and bus index ---------------------------------
+                numeric_circuit.consolidate()  # compute the internal magnitudes
+                return [numeric_circuit]
 
-                for bus_idx in idx_islands:
+            # one state, many islands -> split by bus index, keep the time
+            time_idx = all_time
 
-                    if ignore_single_node_islands:
+        else:
+            # many time states -> slice by time (and by bus index if there are many islands)
+            time_idx = t_array
 
-                        if len(bus_idx) > 1:
-                            island = get_time_island(numeric_circuit, bus_idx, t_array)
-                            island.consolidate()  # compute the internal magnitudes
-                            circuit_islands.append(island)
+        for bus_idx, indices in islands:
 
-                    else:
-                        island = get_time_island(numeric_circuit, bus_idx, t_array)
-                        island.consolidate()  # compute the internal magnitudes
-                        circuit_islands.append(island)
+            if ignore_single_node_islands and len(bus_idx) == 1 and len(islands) > 1:
+                continue
 
-        return circuit_islands
+            island = get_time_island(numeric_circuit, bus_idx, time_idx, indices)  # convert the circuit to an island
+            island.consolidate()  # compute the internal magnitudes
+            circuit_islands.append(island)
+
+    return circuit_islands
 
 
 def compile_time_circuit(circuit: MultiCircuit, apply_temperature=False,
@@ -1085,6 +1084,8 @@ def compile_time_circuit(circuit: MultiCircuit, apply_temperature=False,
                          opf_results: OptimalPowerFlowTimeSeriesResults = None) -> TimeCircuit:
     """
     Compile the information of a circuit and generate the pertinent power flow islands
+    The device attributes and profiles are gathered in one pass per device type and the
+    connectivity matrices are built directly from the index arrays.
     :param circuit: Circuit instance
     :param apply_temperature:
     :param branch_tolerance_mode:
@@ -1094,21 +1095,23 @@ def compile_time_circuit(circuit: MultiCircuit, apply_temperature=False,
 
     logger = Logger()
 
-    bus_dictionary = dict()
+    # index the buses by identity (the hash of the devices is their idtag as an hexadecimal number)
+    bus_dictionary = {id(bus): i for i, bus in enumerate(circuit.buses)}
+
+    # devices in compilation order (bus by bus) and the bus index of each one of them
+    loads, load_bus = get_devices_per_bus(circuit.buses, 'loads')
+    stagens, stagen_bus = get_devices_per_bus(circuit.buses, 'static_generators')
+    generators, gen_bus = get_devices_per_bus(circuit.buses, 'controlled_generators')
+    batteries, batt_bus = get_devices_per_bus(circuit.buses, 'batteries')
+    shunts, shunt_bus = get_devices_per_bus(circuit.buses, 'shunts')
 
     # Element count
     nbus = len(circuit.buses)
-    nload = 0
-    ngen = 0
-    n_batt = 0
-    nshunt = 0
-    nstagen = 0
-    for bus in circuit.buses:
-        nload += len(bus.loads)
-        ngen += len(bus.controlled_generators)
-        n_batt += len(bus.batteries)
-        nshunt += len(bus.shunts)
-        nstagen += len(bus.static_generators)
+    nload = len(loads)
+    ngen = len(generators)
+    n_batt = len(batteries)
+    nshunt = len(shunts)
+    nstagen = len(stagens)
 
     nline = len(circuit.lines)
     ntr2w = len(circuit.transformers2w)
@@ -1133,232 +1136,168 @@ def compile_time_circuit(circuit: MultiCircuit, apply_temperature=False,
                      apply_temperature=apply_temperature,
                      branch_tolerance_mode=branch_tolerance_mode)
 
-    # buses and it's connected elements (loads, generators, etc...)
-    i_ld = 0
-    i_gen = 0
-    i_batt = 0
-    i_sh = 0
-    i_stagen = 0
-    for i, bus in enumerate(circuit.buses):
-
-        # bus parameters
-        nc.bus_names[i] = bus.name
-        nc.bus_active[:, i] = bus.active_prof
-        nc.bus_types[i] = bus.determine_bus_type().value
-
-        nc.Vmin[i] = bus.Vmin
-        nc.Vmax[i] = bus.Vmax
-
-        # Add buses dictionary entry
-        bus_dictionary[bus] = i
-
-        for elm in bus.loads:
-            nc.load_names[i_ld] = elm.name
-            nc.load_active[:, i_ld] = elm.active_prof
-
-            if opf_results is None:
-                nc.load_s[:, i_ld] = elm.P_prof + 1j * elm.Q_prof
-            else:
-                nc.load_s[:, i_ld] = elm.P_prof + 1j * elm.Q_prof - opf_results.load_shedding[:, i_ld]
-
-            nc.C_bus_load[i, i_ld] = 1
-            i_ld += 1
-
-        for elm in bus.static_generators:
-            nc.static_generator_names[i_stagen] = elm.name
-            nc.static_generator_active[:, i_stagen] = elm.active_prof
-            nc.static_generator_s[:, i_stagen] = elm.P_prof + 1j * elm.Q_prof
-
-            nc.C_bus_static_generator[i, i_stagen] = 1
-            i_stagen += 1
-
-        for elm in bus.controlled_generators:
-
-            nc.generator_names[i_gen] = elm.name
-
-            nc.generator_active[:, i_gen] = elm.active_prof
-            nc.generator_pf[:, i_gen] = elm.Pf_prof
-            nc.generator_v[:, i_gen] = elm.Vset_prof
-            nc.generator_qmin[i_gen] = elm.Qmin
-            nc.generator_qmax[i_gen] = elm.Qmax
-            nc.generator_controllable[i_gen] = elm.is_controlled
-            nc.generator_installed_p[i_gen] = elm.Snom
-
-            if opf_results is None:
-                nc.generator_p[:, i_gen] = elm.P_prof
-            else:
-                nc.generator_p[:, i_gen] = opf_results.generator_power[:, i_gen] - opf_results.generator_shedding[:, i_gen]
-
-            nc.C_bus_gen[i, i_gen] = 1
-
-            if nc.Vbus[0, i].real == 1.0:
-                nc.Vbus[:, i] = elm.Vset_prof + 1j * 0
-            elif elm.Vset != nc.Vbus[0, i]:
-                logger.append('Different set points at ' + bus.name + ': ' + str(elm.Vset) + ' !=' + str(nc.Vbus[0, i]))
-            i_gen += 1
-
-        for elm in bus.batteries:
-            nc.battery_names[i_batt] = elm.name
-
-            nc.battery_active[:, i_batt] = elm.active_prof
-
-            nc.battery_pf[:, i_batt] = elm.Pf_prof
-            nc.battery_v[:, i_batt] = elm.Vset_prof
-            nc.battery_qmin[i_batt] = elm.Qmin
-            nc.battery_qmax[i_batt] = elm.Qmax
-            nc.battery_controllable[i_batt] = elm.is_controlled
-            nc.battery_installed_p[i_batt] = elm.Snom
-
-            if opf_results is None:
-                nc.battery_p[:, i_batt] = elm.P_prof
-            else:
-                nc.battery_p[:, i_batt] = opf_results.battery_power[:, i_batt]
-
-            nc.C_bus_batt[i, i_batt] = 1
-            nc.Vbus[:, i] *= elm.Vset_prof
-            i_batt += 1
-
-        for elm in bus.shunts:
-            nc.shunt_names[i_sh] = elm.name
-            nc.shunt_active[:, i_sh] = elm.active_prof
-            nc.shunt_admittance[:, i_sh] = elm.G_prof + 1j * elm.B
-
-            nc.C_bus_shunt[i, i_sh] = 1
-            i_sh += 1
+    # bus parameters
+    nc.bus_names[:] = [bus.name for bus in circuit.buses]
+    nc.bus_active[:] = np.array([bus.active_prof for bus in circuit.buses]).T
+    nc.bus_types[:] = [bus.determine_bus_type().value for bus in circuit.buses]
+    nc.Vmin[:] = [bus.Vmin for bus in circuit.buses]
+    nc.Vmax[:] = [bus.Vmax for bus in circuit.buses]
+
+    # loads
+    nc.load_names[:] = [elm.name for elm in loads]
+    nc.load_active[:] = np.array([elm.active_prof for elm in loads]).T
+    nc.load_s[:] = np.array([elm.P_prof + 1j * elm.Q_prof for elm in loads]).T
+    if opf_results is not None:
+        nc.load_s -= opf_results.load_shedding[:, :nload]
+    nc.C_bus_load = get_connectivity_matrix(load_bus, np.arange(nload), (nbus, nload), fmt='csr')
+
+    # static generators
+    nc.static_generator_names[:] = [elm.name for elm in stagens]
+    nc.static_generator_active[:] = np.array([elm.active_prof for elm in stagens]).T
+    nc.static_generator_s[:] = np.array([elm.P_prof + 1j * elm.Q_prof for elm in stagens]).T
+    nc.C_bus_static_generator = get_connectivity_matrix(stagen_bus, np.arange(nstagen), (nbus, nstagen), fmt='csr')
+
+    # generators
+    nc.generator_names[:] = [elm.name for elm in generators]
+    nc.generator_active[:] = np.array([elm.active_prof for elm in generators]).T
+    nc.generator_pf[:] = np.array([elm.Pf_prof for elm in generators]).T
+    nc.generator_v[:] = np.array([elm.Vset_prof for elm in generators]).T
+    nc.generator_qmin[:] = [elm.Qmin for elm in generators]
+    nc.generator_qmax[:] = [elm.Qmax for elm in generators]
+    nc.generator_controllable[:] = [elm.is_controlled for elm in generators]
+    nc.generator_installed_p[:] = [elm.Snom for elm in generators]
+    if opf_results is None:
+        nc.generator_p[:] = np.array([elm.P_prof for elm in generators]).T
+    else:
+        nc.generator_p[:] = opf_results.generator_power[:, :ngen] - opf_results.generator_shedding[:, :ngen]
+    nc.C_bus_gen = get_connectivity_matrix(gen_bus, np.arange(ngen), (nbus, ngen), fmt='csr')
+
+    # the generators set the bus voltage profile
+    ctrl = get_controlling_devices(gen_bus, nc.generator_v[0, :], nbus)
+    has_ctrl = ctrl > -1
+    nc.Vbus[:, has_ctrl] = nc.generator_v[:, ctrl[has_ctrl]]
+
+    # report the generators that disagree with the set point of their bus
+    for k in np.where(np.arange(ngen) > ctrl[gen_bus])[0]:
+        i = gen_bus[k]
+        if generators[k].Vset != nc.Vbus[0, i]:
+            logger.append('Different set points at ' + circuit.buses[i].name + ': ' +
+                          str(generators[k].Vset) + ' !=' + str(nc.Vbus[0, i]))
+
+    # batteries
+    nc.battery_names[:] = [elm.name for elm in batteries]
+    nc.battery_active[:] = np.array([elm.active_prof for elm in batteries]).T
+    nc.battery_pf[:] = np.array([elm.Pf_prof for elm in batteries]).T
+    nc.battery_v[:] = np.array([elm.Vset_prof for elm in batteries]).T
+    nc.battery_qmin[:] = [elm.Qmin for elm in batteries]
+    nc.battery_qmax[:] = [elm.Qmax for elm in batteries]
+    nc.battery_controllable[:] = [elm.is_controlled for elm in batteries]
+    nc.battery_installed_p[:] = [elm.Snom for elm in batteries]
+    if opf_results is None:
+        nc.battery_p[:] = np.array([elm.P_prof for elm in batteries]).T
+    else:
+        nc.battery_p[:] = opf_results.battery_power[:, :n_batt]
+    nc.C_bus_batt = get_connectivity_matrix(batt_bus, np.arange(n_batt), (nbus, n_batt), fmt='csr')
+
+    # the battery set points are applied over the bus voltage profile
+    np.multiply.at(nc.Vbus.T, batt_bus, nc.battery_v.T)
+
+    # shunts
+    nc.shunt_names[:] = [elm.name for elm in shunts]
+    nc.shunt_active[:] = np.array([elm.active_prof for elm in shunts]).T
+    nc.shunt_admittance[:] = np.array([elm.G_prof + 1j * elm.B for elm in shunts]).T
+    nc.C_bus_shunt = get_connectivity_matrix(shunt_bus, np.arange(nshunt), (nbus, nshunt), fmt='csr')
+
+    # branches: lines, 2-winding transformers and VSC in this order
+    branches = circuit.lines + circuit.transformers2w + circuit.vsc_converters
+    nbr = len(branches)
+    nc.branch_names[:] = [elm.name for elm in branches]
+    nc.branch_active[:] = np.array([elm.active_prof for elm in branches]).T
+    nc.branch_rates[:] = np.array([elm.rate_prof for elm in branches]).T
+    nc.F[:] = [bus_dictionary[id(elm.bus_from)] for elm in branches]
+    nc.T[:] = [bus_dictionary[id(elm.bus_to)] for elm in branches]
+    nc.C_branch_bus_f = get_connectivity_matrix(np.arange(nbr), nc.F, (nbr, nbus))
+    nc.C_branch_bus_t = get_connectivity_matrix(np.arange(nbr), nc.T, (nbr, nbus))
 
     # Compile the lines
-    for i, elm in enumerate(circuit.lines):
-        # generic stuff
-        nc.branch_names[i] = elm.name
-        nc.branch_active[:, i] = elm.active_prof
-        nc.branch_rates[:, i] = elm.rate_prof
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-        nc.C_branch_bus_f[i, f] = 1
-        nc.C_branch_bus_t[i, t] = 1
-        nc.F[i] = f
-        nc.T[i] = t
-
-        # impedance
-        nc.line_names[i] = elm.name
-        nc.line_R[i] = elm.R
-        nc.line_X[i] = elm.X
-        nc.line_B[i] = elm.B
-        nc.line_impedance_tolerance[i] = elm.tolerance
-        nc.C_line_bus[i, f] = 1
-        nc.C_line_bus[i, t] = 1
-
-        # Thermal correction
-        nc.line_temp_base[i] = elm.temp_base
-        nc.line_temp_oper[i] = elm.temp_oper
-        nc.line_alpha[i] = elm.alpha
+    a = 0
+    b = nline
+    nc.line_names[:] = nc.branch_names[a:b]
+    nc.line_R[:] = [elm.R for elm in circuit.lines]
+    nc.line_X[:] = [elm.X for elm in circuit.lines]
+    nc.line_B[:] = [elm.B for elm in circuit.lines]
+    nc.line_impedance_tolerance[:] = [elm.tolerance for elm in circuit.lines]
+    nc.line_temp_base[:] = [elm.temp_base for elm in circuit.lines]
+    nc.line_temp_oper[:] = [elm.temp_oper for elm in circuit.lines]
+    nc.line_alpha[:] = [elm.alpha for elm in circuit.lines]
+    nc.C_line_bus = get_connectivity_matrix(np.r_[np.arange(nline), np.arange(nline)],
+                                            np.r_[nc.F[a:b], nc.T[a:b]], (nline, nbus))
 
     # 2-winding transformers
-    for i, elm in enumerate(circuit.transformers2w):
-        ii = i + nline
-
-        # generic stuff
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-
-        nc.branch_names[ii] = elm.name
-        nc.branch_active[:, ii] = elm.active_prof
-        nc.branch_rates[:, ii] = elm.rate_prof
-        nc.C_branch_bus_f[ii, f] = 1
-        nc.C_branch_bus_t[ii, t] = 1
-        nc.F[ii] = f
-        nc.T[ii] = t
-
-        # impedance
-        nc.tr_names[i] = elm.name
-        nc.tr_R[i] = elm.R
-        nc.tr_X[i] = elm.X
-        nc.tr_G[i] = elm.G
-        nc.tr_B[i] = elm.B
-
-        nc.C_tr_bus[i, f] = 1
-        nc.C_tr_bus[i, t] = 1
-
-        # tap changer
-        nc.tr_tap_mod[i] = elm.tap_module
-        nc.tr_tap_ang[i] = elm.angle
-        nc.tr_is_bus_to_regulated[i] = elm.bus_to_regulated
-        nc.tr_tap_position[i] = elm.tap_changer.tap
-        nc.tr_min_tap[i] = elm.tap_changer.min_tap
-        nc.tr_max_tap[i] = elm.tap_changer.max_tap
-        nc.tr_tap_inc_reg_up[i] = elm.tap_changer.inc_reg_up
-        nc.tr_tap_inc_reg_down[i] = elm.tap_changer.inc_reg_down
-        nc.tr_vset[i] = elm.vset
-
-        nc.tr_bus_to_regulated_idx[i] = t if elm.bus_to_regulated else f
-
-        # virtual taps for transformers where the connection voltage is off
-        nc.tr_tap_f[i], nc.tr_tap_t[i] = elm.get_virtual_taps()
+    a = b
+    b += ntr2w
+    nc.tr_names[:] = nc.branch_names[a:b]
+    nc.tr_R[:] = [elm.R for elm in circuit.transformers2w]
+    nc.tr_X[:] = [elm.X for elm in circuit.transformers2w]
+    nc.tr_G[:] = [elm.G for elm in circuit.transformers2w]
+    nc.tr_B[:] = [elm.B for elm in circuit.transformers2w]
+    nc.C_tr_bus = get_connectivity_matrix(np.r_[np.arange(ntr2w), np.arange(ntr2w)],
+                                          np.r_[nc.F[a:b], nc.T[a:b]], (ntr2w, nbus))
+
+    # tap changer
+    nc.tr_tap_mod[:] = [elm.tap_module for elm in circuit.transformers2w]
+    nc.tr_tap_ang[:] = [elm.angle for elm in circuit.transformers2w]
+    nc.tr_is_bus_to_regulated[:] = [elm.bus_to_regulated for elm in circuit.transformers2w]
+    nc.tr_tap_position[:] = [elm.tap_changer.tap for elm in circuit.transformers2w]
+    nc.tr_min_tap[:] = [elm.tap_changer.min_tap for elm in circuit.transformers2w]
+    nc.tr_max_tap[:] = [elm.tap_changer.max_tap for elm in circuit.transformers2w]
+    nc.tr_tap_inc_reg_up[:] = [elm.tap_changer.inc_reg_up for elm in circuit.transformers2w]
+    nc.tr_tap_inc_reg_down[:] = [elm.tap_changer.inc_reg_down for elm in circuit.transformers2w]
+    nc.tr_vset[:] = [elm.vset for elm in circuit.transformers2w]
+    nc.tr_bus_to_regulated_idx[:] = np.where(nc.tr_is_bus_to_regulated, nc.T[a:b], nc.F[a:b])
+
+    # virtual taps for transformers where the connection voltage is off
+    if ntr2w:
+        nc.tr_tap_f[:], nc.tr_tap_t[:] = np.array([elm.get_virtual_taps() for elm in circuit.transformers2w]).T
 
     # VSC
-    for i, elm in enumerate(circuit.vsc_converters):
-        ii = i + nline + ntr2w
-
-        # generic stuff
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-
-        nc.branch_names[ii] = elm.name
-        nc.C_branch_bus_f[ii, f] = 1
-        nc.C_branch_bus_t[ii, t] = 1
-        nc.F[ii] = f
-        nc.T[ii] = t
-
-        nc.branch_active[:, ii] = elm.active_prof
-        nc.branch_rates[:, ii] = elm.rate_prof
-
-        # vsc values
-        nc.vsc_names[i] = elm.name
-        nc.vsc_R1[i] = elm.R1
-        nc.vsc_X1[i] = elm.X1
-        nc.vsc_Gsw[i] = elm.G0
-        nc.vsc_Beq[i] = elm.Beq
-        nc.vsc_m[i] = elm.m
-        nc.vsc_theta[i] = elm.theta
-
-        nc.C_vsc_bus[i, f] = 1
-        nc.C_vsc_bus[i, t] = 1
+    a = b
+    b += nvsc
+    nc.vsc_names[:] = nc.branch_names[a:b]
+    nc.vsc_R1[:] = [elm.R1 for elm in circuit.vsc_converters]
+    nc.vsc_X1[:] = [elm.X1 for elm in circuit.vsc_converters]
+    nc.vsc_Gsw[:] = [elm.G0 for elm in circuit.vsc_converters]
+    nc.vsc_Beq[:] = [elm.Beq for elm in circuit.vsc_converters]
+    nc.vsc_m[:] = [elm.m for elm in circuit.vsc_converters]
+    nc.vsc_theta[:] = [elm.theta for elm in circuit.vsc_converters]
+    nc.C_vsc_bus = get_connectivity_matrix(np.r_[np.arange(nvsc), np.arange(nvsc)],
+                                           np.r_[nc.F[a:b], nc.T[a:b]], (nvsc, nbus))
 
     # HVDC
+    hvdc_f = np.array([bus_dictionary[id(elm.bus_from)] for elm in circuit.hvdc_lines], dtype=int)
+    hvdc_t = np.array([bus_dictionary[id(elm.bus_to)] for elm in circuit.hvdc_lines], dtype=int)
+    nc.hvdc_names[:] = [elm.name for elm in circuit.hvdc_lines]
+    nc.hvdc_active[:] = np.array([elm.active_prof for elm in circuit.hvdc_lines]).T
+    nc.hvdc_rate[:] = np.array([elm.rate_prof for elm in circuit.hvdc_lines]).T
     for i, elm in enumerate(circuit.hvdc_lines):
-        ii = i + nline + ntr2w + nvsc
-
-        # generic stuff
-        f = bus_dictionary[elm.bus_from]
-        t = bus_dictionary[elm.bus_to]
-
-        # hvdc values
-        nc.hvdc_names[i] = elm.name
-
-        nc.hvdc_active[:, i] = elm.active_prof
-        nc.hvdc_rate[:, i] = elm.rate_prof
-
         nc.hvdc_Pf[:, i], nc.hvdc_Pt[:, i] = elm.get_from_and_to_power_profiles()
-
-        nc.hvdc_Vset_f[:, i] = elm.Vset_f_prof
-        nc.hvdc_Vset_t[:, i] = elm.Vset_t_prof
-
-        nc.hvdc_loss_factor[i] = elm.loss_factor
-        nc.hvdc_Qmin_f[i] = elm.Qmin_f
-        nc.hvdc_Qmax_f[i] = elm.Qmax_f
-        nc.hvdc_Qmin_t[i] = elm.Qmin_t
-        nc.hvdc_Qmax_t[i] = elm.Qmax_t
-
-        # hack the bus types to believe they are PV
-        nc.bus_types[f] = BusMode.PV.value
-        nc.bus_types[t] = BusMode.PV.value
-
-        # the the bus-hvdc line connectivity
-        nc.C_hvdc_bus_f[i, f] = 1
-        nc.C_hvdc_bus_t[i, t] = 1
+    nc.hvdc_Vset_f[:] = np.array([elm.Vset_f_prof for elm in circuit.hvdc_lines]).T
+    nc.hvdc_Vset_t[:] = np.array([elm.Vset_t_prof for elm in circuit.hvdc_lines]).T
+    nc.hvdc_loss_factor[:] = [elm.loss_factor for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmin_f[:] = [elm.Qmin_f for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmax_f[:] = [elm.Qmax_f for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmin_t[:] = [elm.Qmin_t for elm in circuit.hvdc_lines]
+    nc.hvdc_Qmax_t[:] = [elm.Qmax_t for elm in circuit.hvdc_lines]
+
+    # hack the bus types to believe they are PV
+    nc.bus_types[hvdc_f] = BusMode.PV.value
+    nc.bus_types[hvdc_t] = BusMode.PV.value
+
+    # the the bus-hvdc line connectivity
+    nc.C_hvdc_bus_f = get_connectivity_matrix(np.arange(nhvdc), hvdc_f, (nhvdc, nbus))
+    nc.C_hvdc_bus_t = get_connectivity_matrix(np.arange(nhvdc), hvdc_t, (nhvdc, nbus))
 
     # consolidate the information
     nc.consolidate()
 
     return nc
-
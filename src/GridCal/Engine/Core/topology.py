@@ -29,6 +29,8 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 from typing import List
+from collections import OrderedDict
+import hashlib
 import numpy as np
 import numba as nb
 from scipy.sparse import csc_matrix, diags
@@ -161,6 +163,327 @@ def get_adjacency_matrix(C_branch_bus_f, C_branch_bus_t, branch_active, bus_acti
     return C_bus_bus
 
 
+def get_topology_key(branch_active, bus_active):
+    """
+    Get a hashable key of a topology state
+    :param branch_active: array of branch states
+    :param bus_active: array of bus states
+    :return: bytes digest
+    """
+    h = hashlib.sha1()
+    h.update(np.packbits(np.asarray(branch_active) != 0).tobytes())
+    h.update(np.packbits(np.asarray(bus_active) != 0).tobytes())
+    h.update(np.array([np.size(branch_active), np.size(bus_active)], dtype=np.int64).tobytes())
+    return h.digest()
+
+
+class TopologyCache:
+    """
+    Least recently used cache of the topology processing results (island partition and
+    index maps of the islands) of a circuit, keyed by its branch and bus states (see get_topology_key)
+    """
+
+    def __init__(self, max_size=32):
+        """
+        Constructor
+        :param max_size: maximum number of stored topologies
+        """
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Get the stored value of a topology
+        :param key: topology key
+        :return: stored value or None if the topology is not stored
+        """
+        value = self.data.get(key, None)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """
+        Store the value of a topology, evicting the least recently used one if the cache is full
+        :param key: topology key
+        :param value: value to store
+        """
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all the stored topologies
+        """
+        self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+
+@nb.njit
+def dfs_low_link(nodes, first_tin, first_label, indptr, adj_bus, adj_edge, edge_active, bus_active,
+                 label, tin, tout, low, parent_edge, order, bridges):  # pragma: no cover
+    """
+    Iterative depth first search that numbers the buses in preorder and computes the low links
+    (Tarjan's bridge finding) of the islands reachable from the given buses.
+    The buses to visit must have tin = -1; the others are not modified.
+    :param nodes: buses where to start the search
+    :param first_tin: first preorder number to assign
+    :param first_label: first island label to assign
+    :param indptr: CSR pointers of the bus-branch adjacency (one entry per branch end)
+    :param adj_bus: neighbour bus of each adjacency entry
+    :param adj_edge: branch of each adjacency entry
+    :param edge_active: branch states
+    :param bus_active: bus states
+    :param label: island label of each bus (output)
+    :param tin: preorder number of each bus (output)
+    :param tout: end of the preorder range of the subtree of each bus (output)
+    :param low: low link of each bus (output)
+    :param parent_edge: branch that discovered each bus, -1 for the roots (output)
+    :param order: bus of each preorder number (output)
+    :param bridges: bridge flag of each branch (output)
+    :return: next free preorder number, next free label
+    """
+    n = len(tin)
+    stack = np.empty(n, dtype=np.int64)
+    ptr = np.empty(n, dtype=np.int64)
+    t = first_tin
+    lab = first_label
+
+    for r in nodes:
+        if tin[r] != -1:
+            continue
+
+        tin[r] = t
+        low[r] = t
+        order[t] = r
+        t += 1
+        label[r] = lab
+        parent_edge[r] = -1
+        for i in range(indptr[r], indptr[r + 1]):
+            bridges[adj_edge[i]] = False
+        ptr[r] = indptr[r] if bus_active[r] else indptr[r + 1]
+        sp = 0
+        stack[0] = r
+
+        while sp >= 0:
+            v = stack[sp]
+
+            if ptr[v] < indptr[v + 1]:
+                i = ptr[v]
+                ptr[v] += 1
+                e = adj_edge[i]
+                w = adj_bus[i]
+
+                if not edge_active[e] or e == parent_edge[v] or w == v or not bus_active[w]:
+                    continue
+
+                if tin[w] == -1:
+                    # tree branch: go down
+                    tin[w] = t
+                    low[w] = t
+                    order[t] = w
+                    t += 1
+                    label[w] = lab
+                    parent_edge[w] = e
+                    for j in range(indptr[w], indptr[w + 1]):
+                        bridges[adj_edge[j]] = False
+                    ptr[w] = indptr[w]
+                    sp += 1
+                    stack[sp] = w
+
+                elif tin[w] < low[v]:
+                    # back branch
+                    low[v] = tin[w]
+
+            else:
+                # all the neighbours are done: go up
+                tout[v] = t
+                sp -= 1
+                if sp >= 0:
+                    u = stack[sp]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+                    bridges[parent_edge[v]] = low[v] > tin[u]
+
+        lab += 1
+
+    return t, lab
+
+
+class ConnectivityStructure:
+    """
+    Depth first search forest of the bus-branch graph with the low links of every bus.
+    It tells whether disconnecting a branch splits its island (the branch is a bridge) and which buses
+    end up on each side without building the adjacency matrix or searching the islands again.
+    Switching a branch only searches again the islands of its buses.
+    """
+
+    def __init__(self, nbus, F, T, branch_active, bus_active=None):
+        """
+        Constructor
+        :param nbus: number of buses
+        :param F: from bus index of every branch
+        :param T: to bus index of every branch
+        :param branch_active: branch states
+        :param bus_active: bus states (all active if None)
+        """
+        self.nbus = nbus
+        self.nbr = len(F)
+        self.F = np.array(F, dtype=np.int64)
+        self.T = np.array(T, dtype=np.int64)
+        self.branch_active = np.array(branch_active, dtype=np.bool_)
+        self.bus_active = np.ones(nbus, dtype=np.bool_) if bus_active is None else np.array(bus_active,
+                                                                                          dtype=np.bool_)
+
+        # bus-branch adjacency (CSR, one entry per branch end)
+        src = np.r_[self.F, self.T]
+        srt = np.argsort(src, kind='mergesort')
+        self.adj_bus = np.r_[self.T, self.F][srt]
+        self.adj_edge = np.r_[np.arange(self.nbr), np.arange(self.nbr)].astype(np.int64)[srt]
+        self.indptr = np.r_[0, np.cumsum(np.bincount(src, minlength=nbus))].astype(np.int64)
+
+        self.compute()
+
+    @staticmethod
+    def from_circuit(circuit):
+        """
+        Build the structure of a compiled circuit
+        :param circuit: SnapshotCircuit instance
+        :return: ConnectivityStructure
+        """
+        return ConnectivityStructure(circuit.nbus, circuit.F, circuit.T, circuit.branch_active, circuit.bus_active)
+
+    def compute(self):
+        """
+        Search all the islands
+        """
+        n = self.nbus
+        self.label = np.zeros(n, dtype=np.int64)
+        self.tin = np.full(n, -1, dtype=np.int64)
+        self.tout = np.zeros(n, dtype=np.int64)
+        self.low = np.zeros(n, dtype=np.int64)
+        self.parent_edge = np.full(n, -1, dtype=np.int64)
+        self.order = np.zeros(2 * n, dtype=np.int64)
+        self.bridges = np.zeros(self.nbr, dtype=np.bool_)
+
+        # preorder range of every island
+        self.island_range = dict()
+
+        self.next_tin, self.next_label = 0, 0
+        self.search(np.arange(n, dtype=np.int64), 0)
+
+    def search(self, nodes, first_tin):
+        """
+        Search the islands of the given buses (their tin must be -1)
+        :param nodes: bus indices
+        :param first_tin: first preorder number to assign
+        """
+        first_label = self.next_label
+        last_tin, self.next_label = dfs_low_link(nodes, first_tin, first_label, self.indptr, self.adj_bus,
+                                                 self.adj_edge, self.branch_active, self.bus_active, self.label,
+                                                 self.tin, self.tout, self.low, self.parent_edge, self.order,
+                                                 self.bridges)
+        self.next_tin = max(self.next_tin, last_tin)
+
+        roots = nodes[self.parent_edge[nodes] == -1]
+        for r in roots:
+            self.island_range[self.label[r]] = (self.tin[r], self.tout[r])
+
+    def get_island_buses(self, lbl):
+        """
+        Get the buses of an island
+        :param lbl: island label
+        :return: array of bus indices (in preorder)
+        """
+        a, b = self.island_range[lbl]
+        return self.order[a:b]
+
+    def get_islands(self):
+        """
+        Get the islands
+        :return: list of sorted arrays of bus indices, sorted by their first bus (like find_islands)
+        """
+        islands = [np.sort(self.get_island_buses(lbl)) for lbl in self.island_range.keys()]
+        islands.sort(key=lambda x: x[0])
+        return islands
+
+    @property
+    def island_number(self):
+        return len(self.island_range)
+
+    def splits_island(self, k):
+        """
+        Does disconnecting the branch k split its island?
+        :param k: branch index
+        :return: bool
+        """
+        return bool(self.branch_active[k] and self.bridges[k])
+
+    def get_split(self, k):
+        """
+        Get the bus sets that disconnecting the branch k would produce
+        :param k: branch index
+        :return: None if the island is not split, otherwise a tuple with the island label, the buses that remain
+                 connected to the island root and the buses that are separated
+        """
+        if not self.splits_island(k):
+            return None
+
+        f, t = self.F[k], self.T[k]
+        child = t if self.parent_edge[t] == k else f
+        lbl = self.label[child]
+        a, b = self.island_range[lbl]
+        c0, c1 = self.tin[child], self.tout[child]
+
+        separated = np.sort(self.order[c0:c1])
+        remaining = np.sort(np.r_[self.order[a:c0], self.order[c1:b]])
+
+        return lbl, remaining, separated
+
+    def set_branch_state(self, k, active):
+        """
+        Switch a branch and update the islands of its buses
+        :param k: branch index
+        :param active: new state
+        """
+        active = bool(active)
+        if self.branch_active[k] == active:
+            return
+
+        self.branch_active[k] = active
+        labels = np.unique(self.label[[self.F[k], self.T[k]]])
+
+        if len(labels) == 1:
+            # same island: its preorder range is reused
+            a, b = self.island_range.pop(labels[0])
+            nodes = self.order[a:b].copy()
+            self.tin[nodes] = -1
+            self.search(nodes, a)
+
+        else:
+            # two islands are joined: the merged island is numbered after the used preorder numbers
+            nodes = np.concatenate([self.get_island_buses(lbl) for lbl in labels])
+            for lbl in labels:
+                self.island_range.pop(lbl)
+
+            if self.next_tin + len(nodes) > len(self.order):
+                # compact the preorder numbering
+                self.compute()
+                return
+
+            self.tin[nodes] = -1
+            self.search(nodes, self.next_tin)
+
+
 class Graph:
 
     def __init__(self, C_bus_bus, C_branch_bus, bus_states):
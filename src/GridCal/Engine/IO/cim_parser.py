@@ -14,21 +14,27 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
+import zipfile
+import xml.etree.ElementTree as ET
 from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Devices import *
 from math import sqrt
 
+RDF_NS = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+RDF_ID = RDF_NS + 'ID'
+RDF_ABOUT = RDF_NS + 'about'
+RDF_RESOURCE = RDF_NS + 'resource'
 
-def index_find(string, start, end):
+
+def local_name(tag):
     """
-    version of substring that matches
-    :param string: string
-    :param start: string to start splitting
-    :param end: string to end splitting
-    :return: string between start and end
+    Remove the namespace of an xml tag
+    :param tag: tag such as {http://iec.ch/TC57/2009/CIM-schema-cim14#}ACLineSegment.r
+    :return: tag without namespace (ACLineSegment.r)
     """
-    return string.partition(start)[2].partition(end)[0]
+    return tag.rpartition('}')[2]
 
 
 class GeneralContainer:
@@ -58,36 +64,26 @@ class GeneralContainer:
 
         self.containers = list()
 
-    def parse_line(self, line):
+    def parse_node(self, node):
         """
-        Parse xml line that eligibly belongs to this object
-        :param line: xml text line
+        Parse a property xml node of this object
+        (<cim:Class.prop>value</cim:Class.prop> or <cim:Class.prop rdf:resource="#id"/>)
+        :param node: xml element
         """
+        prop = local_name(node.tag).partition('.')[2].strip()
 
-        # the parsers are lists of 2 sets of separators
-        # the first separator tries to substring the property name
-        # the second tries to substring the property value
-        parsers = [[('.', '>'), ('>', '<')],
-                   [('.', ' rdf:resource'), ('rdf:resource="', '"')]]
-
-        for L1, L2 in parsers:
-            # try to parse the property
-            prop = index_find(line, L1[0], L1[1]).strip()
-
-            # try to parse the value
-            val = index_find(line, L2[0], L2[1])
+        if prop != "":
+            val = node.get(RDF_RESOURCE)
 
-            # remove the pound
-            if len(val) > 0:
-                if val[0] == '#':
-                    val = val[1:]
+            if val is None:
+                val = node.text if node.text is not None else ''
+                val = val.replace('\n', '')
 
-            val = val.replace('\n', '')
+            elif len(val) > 0 and val[0] == '#':
+                # remove the pound
+                val = val[1:]
 
-            if prop != "":
-                # if val not in ["", "\n"]:
-                # if val not in [ "\n"]:
-                self.properties[prop] = val
+            self.properties[prop] = val
 
     def merge(self, other):
         """
@@ -206,6 +202,14 @@ class SynchronousMachine(GeneralContainer):
 
 class CIMCircuit:
 
+    # container class of the CIM classes that need one other than GeneralContainer
+    class_dispatch = {'PowerTransformer': PowerTransformer,
+                      'ACLineSegment': ACLineSegment,
+                      'TransformerWinding': Winding,
+                      'PowerTransformerEnd': Winding,
+                      'ConformLoad': ConformLoad,
+                      'SynchronousMachine': SynchronousMachine}
+
     def __init__(self):
         """
         CIM circuit constructor
@@ -261,6 +265,8 @@ class CIMCircuit:
                         "VoltageLimit"
                         ]
 
+        self.classes_set = set(self.classes)
+
     def clear(self):
         """
         Clear the circuit
@@ -269,35 +275,6 @@ class CIMCircuit:
         self.elm_dict = dict()
         self.elements_by_type = dict()
 
-    @staticmethod
-    def check_type(xml, class_types, starter='<cim:', ender='</cim:'):
-        """
-        Checks if we are starting an object of the predefined types
-        :param xml: some text
-        :param class_types: list of CIM types
-        :param starter string to add prior to the class when opening an object
-        :param ender string to add prior to a class when closing an object
-        :return: start_recording, end_recording, the found type or None if no one was found
-        """
-
-        # for each type
-        for tpe in class_types:
-
-            # if the starter token is found: this is the beginning of an object
-            if starter + tpe + ' rdf:ID' in xml:
-                return True, False, tpe
-
-            # if the starter token is found: this is the beginning of an object (only in the topology definition)
-            elif starter + tpe + ' rdf:about' in xml:
-                return True, False, tpe
-
-            # if the ender token is found: this is the end of an object
-            elif ender + tpe + '>' in xml:
-                return False, True, tpe
-
-        # otherwise, this is neither the beginning nor the end of an object
-        return False, False, ""
-
     def find_references(self, recognised=set()):
         """
         Replaces the references of the classes given
@@ -315,8 +292,7 @@ class CIMCircuit:
                 if ref_code in self.elm_dict.keys():
 
                     # replace the reference by the corresponding object properties
-                    obj_idx = self.elm_dict[ref_code]
-                    ref_obj = self.elements[obj_idx]
+                    ref_obj = self.elm_dict[ref_code]
                     # element.properties[prop] = ref_obj
 
                     # add the element type to the recognised types because it is in the referenced dictionary
@@ -378,94 +354,83 @@ class CIMCircuit:
                     pass
                     # print('Not found ', prop, ref)
 
-    def parse_file(self, file_name, classes_=None):
+    def add_element(self, element: GeneralContainer):
         """
-        Parse CIM file and add all the recognised objects
-        :param file_name:  file name or path
-        :return:
+        Add a parsed object; if its id was already parsed (i.e. in another profile), the properties are merged
+        :param element: GeneralContainer instance
         """
-        if classes_ is None:
-            classes = self.classes
-        else:
-            classes = classes_
-        recording = False
-
-        disabled = False
+        existing = self.elm_dict.get(element.id, None)
 
-        # Read text file line by line
-        with open(file_name, 'r') as file_pointer:
-
-            for line in file_pointer:
-
-                if '<!--' in line:
-                    disabled = True
-
-                if not disabled:
-
-                    # determine if the line opens or closes and object
-                    # and of which type of the ones pre-specified
-                    start_rec, end_rec, tpe = self.check_type(line, classes)
-
-                    if tpe != "":
-                        # a recognisable object was found
-
-                        if start_rec:
-
-                            id = index_find(line, '"', '">').replace('#', '')
-
-                            # start recording object
-                            if tpe == 'PowerTransformer':
-                                element = PowerTransformer(id, tpe)
+        if existing is not None:
+            existing.merge(element)
+        else:
+            self.elm_dict[element.id] = element
+            self.elements.append(element)
 
-                            elif tpe == 'ACLineSegment':
-                                element = ACLineSegment(id, tpe)
+            if element.tpe not in self.elements_by_type.keys():
+                self.elements_by_type[element.tpe] = list()
 
-                            elif tpe == 'TransformerWinding':
-                                element = Winding(id, tpe)
+            self.elements_by_type[element.tpe].append(element)
 
-                            elif tpe == 'PowerTransformerEnd':
-                                element = Winding(id, tpe)
+    def parse_xml(self, source, classes=None):
+        """
+        Parse a CIM/XML document incrementally, keeping only the objects of the recognised classes
+        :param source: file name or file-like object
+        :param classes: set of classes to read (all the known classes if None)
+        """
+        if classes is None:
+            classes = self.classes_set
 
-                            elif tpe == 'ConformLoad':
-                                element = ConformLoad(id, tpe)
+        depth = 0
+        root = None
 
-                            elif tpe == 'SynchronousMachine':
-                                element = SynchronousMachine(id, tpe)
+        for event, node in ET.iterparse(source, events=('start', 'end')):
 
-                            else:
-                                element = GeneralContainer(id, tpe)
+            if event == 'start':
+                if root is None:
+                    root = node
+                depth += 1
+                continue
 
-                            recording = True
+            depth -= 1
 
-                        if end_rec:
-                            # stop recording object
-                            if recording:
+            if depth == 1:
+                # end of an object (a child of rdf:RDF)
+                tpe = local_name(node.tag)
 
-                                if element.id in self.elm_dict.keys():
-                                    idx = self.elm_dict[element.id]
-                                    self.elements[idx].merge(element)
-                                    # print('Merging!')
-                                else:
-                                    self.elm_dict[element.id] = len(self.elements)
-                                    self.elements.append(element)
+                if tpe in classes:
+                    id = node.get(RDF_ID)
+                    if id is None:
+                        id = node.get(RDF_ABOUT, '')
+                    id = id.replace('#', '')
 
-                                if tpe not in self.elements_by_type.keys():
-                                    self.elements_by_type[tpe] = list()
+                    element = self.class_dispatch.get(tpe, GeneralContainer)(id, tpe)
 
-                                self.elements_by_type[tpe].append(element)
+                    for child in node:
+                        element.parse_node(child)
 
-                                recording = False
+                    self.add_element(element)
 
-                    else:
-                        # process line
-                        if recording:
-                            element.parse_line(line)
-                else:
-                    # the line is a comment
-                    # print('#', line.replace('\n', ''))
+                # free the memory of the processed objects
+                root.clear()
 
-                    if '-->' in line:
-                        disabled = False
+    def parse_file(self, file_name, classes_=None):
+        """
+        Parse CIM file and add all the recognised objects.
+        The file may be a zip file with several profiles (EQ, TP, ...), they are read without extracting them
+        :param file_name:  file name or path
+        :param classes_: list of classes to read (all the known classes if None)
+        """
+        classes = None if classes_ is None else set(classes_)
+
+        if zipfile.is_zipfile(file_name):
+            with zipfile.ZipFile(file_name) as zip_file:
+                for name in zip_file.namelist():
+                    if os.path.splitext(name)[1].lower() in ['.xml', '.rdf']:
+                        with zip_file.open(name) as file_pointer:
+                            self.parse_xml(file_pointer, classes)
+        else:
+            self.parse_xml(file_name, classes)
 
 
 class CIMExport:
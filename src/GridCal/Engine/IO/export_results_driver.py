@@ -13,13 +13,146 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 import os
-from io import StringIO
+from io import StringIO, BytesIO
 import zipfile
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import h5py
 from PySide2.QtCore import QThread, Signal
 
-from GridCal.Engine.IO.zip_interface import save_data_frames_to_zip
 from GridCal.Engine.basic_structures import Logger
-from GridCal.Engine.Devices import DeviceType
+
+
+class ExportFormat(Enum):
+    CSV = 'Zip of csv files'
+    Numpy = 'Zip of numpy files'
+    Parquet = 'Zip of parquet files'
+    HDF5 = 'HDF5'
+
+
+# list of the export formats whose dependencies are installed
+available_export_formats = [ExportFormat.CSV, ExportFormat.Numpy, ExportFormat.HDF5]
+
+try:
+    import pyarrow
+    available_export_formats.insert(2, ExportFormat.Parquet)
+except ImportError:
+    pass
+
+
+def get_result_arrays(results, result_type):
+    """
+    Get the raw arrays of a result.
+    The selection of the arrays lives in the results mdl() method, which builds a Qt model, so this must be
+    called from the export thread and not from the serialization threads.
+    :param results: any GridCal results object
+    :param result_type: ResultTypes instance
+    :return: index, columns, data (or None if there are no results)
+    """
+    mdl = results.mdl(result_type=result_type)
+
+    if mdl is None:
+        return None
+
+    index, columns, data = mdl.get_data()
+    data = np.array(data)
+
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+
+    return index, columns, data
+
+
+def index_to_array(index):
+    """
+    Convert a results index into a numpy array that can be stored in binary formats
+    :param index: list, pandas Index or array
+    :return: numpy array (datetime64[ns] dates are given as int64 nanoseconds)
+    """
+    index = pd.Index(index)
+
+    if isinstance(index, pd.DatetimeIndex):
+        return index.values.astype('datetime64[ns]').astype(np.int64)
+    elif index.dtype == object:
+        return np.array([str(x) for x in index], dtype=np.str_)
+    else:
+        return index.values
+
+
+def result_to_bytes(export_format: ExportFormat, index, columns, data):
+    """
+    Serialize a result into bytes (this is done concurrently, so it must not touch shared state)
+    :param export_format: ExportFormat
+    :param index: array of row names
+    :param columns: list of column names
+    :param data: 2D array
+    :return: file extension, bytes
+    """
+    if export_format == ExportFormat.CSV:
+        with StringIO() as buffer:
+            pd.DataFrame(data=data, index=index, columns=columns).to_csv(buffer)
+            return '.csv', buffer.getvalue().encode('utf-8')
+
+    elif export_format == ExportFormat.Numpy:
+        with BytesIO() as buffer:
+            np.savez_compressed(buffer,
+                                index=index_to_array(index),
+                                columns=np.array([str(c) for c in columns], dtype=np.str_),
+                                data=data)
+            return '.npz', buffer.getvalue()
+
+    elif export_format == ExportFormat.Parquet:
+        # parquet does not support complex numbers: the real and imaginary parts are stored apart
+        columns = [str(c) for c in columns]
+        if np.iscomplexobj(data):
+            df = pd.concat([pd.DataFrame(data=data.real, columns=[c + ' (re)' for c in columns]),
+                            pd.DataFrame(data=data.imag, columns=[c + ' (im)' for c in columns])], axis=1)
+        else:
+            df = pd.DataFrame(data=data, columns=columns)
+        df.index = pd.Index(index)
+
+        with BytesIO() as buffer:
+            df.to_parquet(buffer, compression='snappy')
+            return '.parquet', buffer.getvalue()
+
+    else:
+        raise Exception('Not a zip export format: ' + str(export_format))
+
+
+def write_result_to_h5(group: h5py.Group, name, index, columns, data, compression_level=4):
+    """
+    Write a result into an HDF5 group as chunked and compressed datasets
+    :param group: h5py group (or file)
+    :param name: name of the result group
+    :param index: array of row names
+    :param columns: list of column names
+    :param data: 2D array
+    :param compression_level: gzip compression level (0~9)
+    """
+    grp = group.create_group(name)
+
+    nr, nc = data.shape
+    if data.size > 0:
+        # chunks of ~1 MB spanning complete rows (time steps), which is the usual reading pattern
+        rows_per_chunk = max(1, min(nr, 2 ** 20 // (nc * data.itemsize)))
+        grp.create_dataset('data', data=data, chunks=(rows_per_chunk, nc),
+                           compression='gzip', compression_opts=compression_level, shuffle=True)
+    else:
+        grp.create_dataset('data', data=data)
+
+    idx = index_to_array(index)
+    if idx.dtype.kind == 'U':
+        idx = np.char.encode(idx, 'utf-8')
+        grp.attrs['index_type'] = 'str'
+    elif isinstance(pd.Index(index), pd.DatetimeIndex):
+        grp.attrs['index_type'] = 'datetime64[ns]'
+    else:
+        grp.attrs['index_type'] = str(idx.dtype)
+    grp.create_dataset('index', data=idx)
+
+    grp.create_dataset('columns', data=np.array([str(c).encode('utf-8') for c in columns], dtype=np.bytes_))
 
 
 class ExportAllThread(QThread):
@@ -27,11 +160,13 @@ class ExportAllThread(QThread):
     progress_text = Signal(str)
     done_signal = Signal()
 
-    def __init__(self, circuit, simulations_list, file_name):
+    def __init__(self, circuit, simulations_list, file_name, export_format=ExportFormat.CSV, max_workers=None):
         """
         Constructor
         :param simulations_list: list of GridCal simulation drivers
-        :param file_name: name of the file where to save (.zip)
+        :param file_name: name of the file where to save (.zip or .h5)
+        :param export_format: ExportFormat
+        :param max_workers: number of threads used to serialize the results (None: as many as CPUs)
         """
         QThread.__init__(self)
 
@@ -41,6 +176,10 @@ class ExportAllThread(QThread):
 
         self.file_name = file_name
 
+        self.export_format = export_format
+
+        self.max_workers = max_workers
+
         self.valid = False
 
         self.logger = Logger()
@@ -49,56 +188,133 @@ class ExportAllThread(QThread):
 
         self.__cancel__ = False
 
-    def run(self):
+    def get_results_list(self):
         """
-        run the file save procedure
+        List the results to export
+        :return: list of (name, results object, result type)
         """
+        lst = list()
+        for driver in self.simulations_list:
+            for available_result in driver.results.available_results:
+                result_name, device_type = available_result.value
+                lst.append((driver.results.name + ' ' + result_name, driver.results, available_result))
+        return lst
 
-        # try:
-        path, fname = os.path.split(self.file_name)
+    def export_zip(self, results_list):
+        """
+        Serialize the results concurrently and write them into a zip file as they are ready
+        :param results_list: list of (name, results object, result type)
+        """
+        # the binary formats are compressed by the serializer already
+        compression = zipfile.ZIP_DEFLATED if self.export_format == ExportFormat.CSV else zipfile.ZIP_STORED
 
-        self.progress_text.emit('Flushing ' + fname + ' into ' + fname + '...')
+        def work(result_name, arrays):
+            ext, data = result_to_bytes(self.export_format, *arrays)
+            return result_name, ext, data
 
-        self.logger = Logger()
+        with zipfile.ZipFile(self.file_name, 'w', compression) as myzip:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+                # the arrays are gathered in this thread, the pool threads only serialize them
+                futures = list()
+                for result_name, results, result_type in results_list:
+
+                    if self.__cancel__:
+                        break
+
+                    arrays = get_result_arrays(results, result_type)
+                    if arrays is not None:
+                        futures.append(executor.submit(work, result_name, arrays))
+                    else:
+                        self.logger.add_info('No results for ' + result_name)
+
+                for k, future in enumerate(as_completed(futures)):
+
+                    if self.__cancel__:
+                        for f in futures:
+                            f.cancel()
+                        break
+
+                    result_name, ext, data = future.result()
+
+                    # the zip file is written from this thread only
+                    self.progress_text.emit('flushing ' + result_name)
+                    myzip.writestr(result_name + ext, data)
+
+                    self.progress_signal.emit((k + 1) / len(futures) * 100.0)
+
+    def export_h5(self, results_list):
+        """
+        Write the results into an HDF5 file as chunked and compressed datasets
+        (the compression is done by h5py while writing, so this is sequential)
+        :param results_list: list of (name, results object, result type)
+        """
+        n = len(results_list)
+
+        with h5py.File(self.file_name, 'w') as f:
+
+            for k, (result_name, results, result_type) in enumerate(results_list):
+
+                if self.__cancel__:
+                    break
 
-        names_dict = {DeviceType.BusDevice: self.circuit.bus_names,
-                      DeviceType.BranchDevice: self.circuit.branch_names,
-                      DeviceType.BusDevice.LoadDevice: self.circuit.get_load_names(),
-                      DeviceType.BusDevice.GeneratorDevice: self.circuit.get_controlled_generator_names(),
-                      DeviceType.BusDevice.BatteryDevice: self.circuit.get_battery_names()}
+                arrays = get_result_arrays(results, result_type)
 
-        # open zip file for writing
+                if arrays is not None:
+                    self.progress_text.emit('flushing ' + result_name)
+                    write_result_to_h5(f, result_name, *arrays)
+                else:
+                    self.logger.add_info('No results for ' + result_name)
+
+                self.progress_signal.emit((k + 1) / n * 100.0)
+
+    def remove_file(self):
+        """
+        Remove the (partially written) output file
+        """
         try:
-            with zipfile.ZipFile(self.file_name, 'w', zipfile.ZIP_DEFLATED) as myzip:
+            if os.path.exists(self.file_name):
+                os.remove(self.file_name)
+        except OSError as e:
+            self.logger.add('Could not remove the incomplete file ' + self.file_name + ': ' + str(e))
 
-                n = len(self.simulations_list)
+    def run(self):
+        """
+        run the file save procedure
+        """
 
-                for k, driver in enumerate(self.simulations_list):
+        path, fname = os.path.split(self.file_name)
 
-                    self.progress_signal.emit((k + 1) / n * 100.0)
+        self.progress_text.emit('Flushing results into ' + fname + '...')
 
-                    for available_result in driver.results.available_results:
+        self.logger = Logger()
 
-                        # ge the result type definition
-                        result_name, device_type = available_result.value
+        results_list = self.get_results_list()
 
-                        self.progress_text.emit('flushing ' + driver.results.name + ' ' + result_name)
+        if self.export_format not in available_export_formats:
+            self.logger.add('The export format ' + self.export_format.value + ' is not available, '
+                            'install its dependencies (i.e. pyarrow for parquet)')
 
-                        # save the DataFrame to the buffer
-                        mdl = driver.results.mdl(result_type=available_result)
+        else:
+            try:
+                if self.export_format == ExportFormat.HDF5:
+                    self.export_h5(results_list)
+                else:
+                    self.export_zip(results_list)
 
-                        if mdl is not None:
-                            with StringIO() as buffer:
-                                filename = driver.results.name + ' ' + result_name + '.csv'
-                                mdl.save_to_csv(buffer)
-                                myzip.writestr(filename, buffer.getvalue())
-                        else:
-                            self.logger.add_info('No results for ' + driver.results.name + ' - ' + result_name)
+            except PermissionError:
+                self.logger.add('Permission error.\nDo you have the file open?')
 
-        except PermissionError:
-            self.logger.add('Permission error.\nDo you have the file open?')
+            except Exception as e:
+                # do not leave an incomplete file behind
+                self.logger.add(str(e))
+                self.remove_file()
 
-        self.valid = True
+            else:
+                if self.__cancel__:
+                    self.remove_file()
+                else:
+                    self.valid = True
 
         # post events
         self.progress_text.emit('Done!')
@@ -106,4 +322,4 @@ class ExportAllThread(QThread):
         self.done_signal.emit()
 
     def cancel(self):
-        self.__cancel__ = True
\ No newline at end of file
+        self.__cancel__ = True
@@ -29,7 +29,8 @@ from GridCal.Engine.IO.ipa_parser import load_iPA
 from GridCal.Engine.IO.json_parser import parse_json, parse_json_data_v2
 from GridCal.Engine.IO.psse_parser import PSSeParser
 from GridCal.Engine.IO.cim_parser import CIMImport
-from GridCal.Engine.IO.zip_interface import save_data_frames_to_zip, open_data_frames_from_zip
+from GridCal.Engine.IO.zip_interface import save_data_frames_to_binary_zip, open_data_frames_from_zip, \
+    copy_memory_mapped_profiles
 from GridCal.Engine.IO.sqlite_interface import save_data_frames_to_sqlite, open_data_frames_from_sqlite
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 
@@ -151,7 +152,8 @@ class FileOpen:
                 self.circuit = parser.circuit
                 self.logger += parser.logger
 
-            elif file_extension.lower() == '.xml':
+            elif file_extension.lower() in ['.xml', '.zip']:
+                # CIM/XML, either a single file or a zip with the profiles
                 parser = CIMImport()
                 self.circuit = parser.load_cim_file(self.file_name)
                 self.logger += parser.logger
@@ -219,7 +221,7 @@ class FileSave:
 
     def save_zip(self):
         """
-        Save the circuit information in zip format
+        Save the circuit information in zip format (binary columns, see save_data_frames_to_binary_zip)
         :return: logger with information
         """
 
@@ -227,10 +229,14 @@ class FileSave:
 
         dfs = create_data_frames(self.circuit)
 
-        save_data_frames_to_zip(dfs,
-                                filename_zip=self.file_name,
-                                text_func=self.text_func,
-                                progress_func=self.progress_func)
+        # the profiles mapped from the file being replaced must be copied in memory first
+        for dev in self.circuit.objects_with_profiles:
+            copy_memory_mapped_profiles(self.circuit.get_elements_by_type(dev.device_type), self.file_name)
+
+        save_data_frames_to_binary_zip(dfs,
+                                       filename_zip=self.file_name,
+                                       text_func=self.text_func,
+                                       progress_func=self.progress_func)
 
         return logger
 
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 import os
+import weakref
 import h5py
 from h5py._hl.dataset import Dataset
 from h5py._hl.group import Group
@@ -109,6 +110,193 @@ def recursively_load_dict_contents_from_group(h5file, path):
     return ans
 
 
+class H5LazyArray:
+
+    def __init__(self, store: "H5TimeSeriesStore", name):
+        """
+        Array-like view of an HDF5 dataset: indexing reads (or writes) only the requested part,
+        while the numpy functions read the complete array
+        :param store: H5TimeSeriesStore that holds the dataset (the view survives the store being reopened)
+        :param name: name of the dataset
+        """
+        self.store = store
+        self.name = name
+
+    @property
+    def dataset(self) -> Dataset:
+        return self.store.file[self.name]
+
+    @property
+    def shape(self):
+        return self.dataset.shape
+
+    @property
+    def dtype(self):
+        return self.dataset.dtype
+
+    @property
+    def ndim(self):
+        return len(self.dataset.shape)
+
+    @property
+    def real(self):
+        return np.asarray(self).real
+
+    @property
+    def imag(self):
+        return np.asarray(self).imag
+
+    def __len__(self):
+        return self.dataset.shape[0]
+
+    def reshape(self, *shape):
+        return np.asarray(self).reshape(*shape)
+
+    def __getitem__(self, key):
+        return self.dataset[key]
+
+    def __setitem__(self, key, value):
+        self.dataset[key] = value
+
+    def __array__(self, dtype=None):
+        arr = self.dataset[()]
+        return arr if dtype is None else arr.astype(dtype)
+
+    def write_block(self, rows, cols, values):
+        """
+        Write a block of values at the intersection of some rows and columns
+        (h5py does not support fancy indexing on both dimensions)
+        :param rows: array of sorted row indices
+        :param cols: array of column indices
+        :param values: (len(rows), len(cols)) array
+        """
+        rows = np.asarray(rows)
+        cols = np.asarray(cols)
+
+        if len(rows) == 0 or len(cols) == 0:
+            return
+
+        r0, r1 = rows.min(), rows.max() + 1
+        contiguous_rows = (r1 - r0) == len(rows)
+        all_cols = len(cols) == self.shape[1] and (cols == np.arange(self.shape[1])).all()
+
+        if contiguous_rows and all_cols:
+            self.dataset[r0:r1, :] = values
+        else:
+            # read-modify-write the bounding block
+            c0, c1 = cols.min(), cols.max() + 1
+            block = self.dataset[r0:r1, c0:c1]
+            block[np.ix_(rows - r0, cols - c0)] = values
+            self.dataset[r0:r1, c0:c1] = block
+
+
+class H5TimeSeriesStore:
+
+    # stores open in this process by absolute file name: HDF5 refuses to open (or truncate) a file twice
+    open_stores = weakref.WeakValueDictionary()
+
+    def __init__(self, file_name, mode='r', cache_size=64 * 2 ** 20):
+        """
+        HDF5 store of time series results, where every variable is a (time, elements) chunked dataset.
+        A store previously opened on the same file is closed.
+        :param file_name: name of the HDF5 file
+        :param mode: h5py file mode
+        :param cache_size: size in bytes of the chunk cache of each dataset
+        """
+        self.file_name = file_name
+
+        self.cache_size = cache_size
+
+        key = os.path.abspath(file_name)
+        previous = H5TimeSeriesStore.open_stores.get(key, None)
+        if previous is not None:
+            previous.close()
+
+        self.file = h5py.File(file_name, mode, rdcc_nbytes=cache_size)
+        H5TimeSeriesStore.open_stores[key] = self
+
+    @staticmethod
+    def create(file_name, nt, variables, time_array=None, chunk_steps=256, compression_level=4,
+               cache_size=64 * 2 ** 20):
+        """
+        Create a store where the results can be written by blocks of time steps as they are computed.
+        The space of the datasets is only allocated when written.
+        :param file_name: name of the HDF5 file
+        :param nt: number of time steps
+        :param variables: dictionary {name: (number of elements, dtype, fill value)}
+        :param time_array: array of dates (optional)
+        :param chunk_steps: number of time steps of a chunk
+        :param compression_level: gzip compression level (0~9)
+        :param cache_size: size in bytes of the chunk cache of each dataset
+        :return: H5TimeSeriesStore
+        """
+        store = H5TimeSeriesStore(file_name, mode='w', cache_size=cache_size)
+
+        for name, (n, dtype, fill_value) in variables.items():
+
+            itemsize = np.dtype(dtype).itemsize
+            steps = max(1, min(chunk_steps, nt))
+
+            if n is None:
+                # one value per time step
+                shape = (nt,)
+                chunks = (steps,)
+            else:
+                # chunks of ~1 MB: the time block is kept and the elements are split if needed
+                shape = (nt, n)
+                chunks = (steps, max(1, min(n, 2 ** 20 // (steps * itemsize))))
+
+            if 0 in shape:
+                store.file.create_dataset(name, shape=shape, dtype=dtype)
+            else:
+                store.file.create_dataset(name, shape=shape, dtype=dtype, chunks=chunks,
+                                          fillvalue=np.array(fill_value, dtype=dtype)[()],
+                                          compression='gzip', compression_opts=compression_level, shuffle=True)
+
+        if time_array is not None:
+            store.file.create_dataset('time', data=pd.to_datetime(time_array).values.astype(np.int64))
+
+        return store
+
+    def __getitem__(self, name) -> H5LazyArray:
+        if name not in self.file:
+            raise KeyError(name)
+        return H5LazyArray(self, name)
+
+    def __contains__(self, name):
+        return name in self.file
+
+    def get_time(self):
+        """
+        Get the dates of the time steps
+        :return: DatetimeIndex or None
+        """
+        if 'time' in self.file:
+            return pd.to_datetime(self.file['time'][()])
+        else:
+            return None
+
+    def flush(self):
+        self.file.flush()
+
+    def reopen(self, mode='r'):
+        """
+        Close the file and open it again in another mode (i.e. read-only once the results are written)
+        :param mode: h5py file mode
+        """
+        self.close()
+        self.file = h5py.File(self.file_name, mode, rdcc_nbytes=self.cache_size)
+        H5TimeSeriesStore.open_stores[os.path.abspath(self.file_name)] = self
+
+    @property
+    def is_open(self):
+        return bool(self.file.id.valid)
+
+    def close(self):
+        if self.is_open:
+            self.file.close()
+
+
 if __name__ == '__main__':
 
     from GridCal.Engine.IO.file_handler import *
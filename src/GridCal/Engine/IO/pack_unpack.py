@@ -386,13 +386,14 @@ def data_frames_to_circuit(data: Dict):
 
                             if profile_name in data.keys():
 
-                                # get the profile DataFrame
+                                # get the profile DataFrame (or the memory mapped array of the binary format)
                                 dfp = data[profile_name]
+                                values = dfp.values if isinstance(dfp, pd.DataFrame) else dfp
 
-                                # for each object, set the profile
-                                for i in range(dfp.shape[1]):
-                                    profile = dfp.values[:, i]
-                                    setattr(devices[i], prop_prof, profile.astype(dtype))
+                                # for each object, set the profile (as a view, the memory mapped data is not read)
+                                for i in range(values.shape[1]):
+                                    profile = values[:, i]
+                                    setattr(devices[i], prop_prof, profile.astype(dtype, copy=False))
 
                             else:
                                 circuit.logger.append(prop + ' profile was not found in the data')
@@ -2190,6 +2190,152 @@ def interpret_line(line, splitter=','):
     return parsed
 
 
+# a field of a RAW record: quoted string or plain text, followed by a comma, a comment slash or the end of the line
+RAW_FIELD_RE = re.compile(r"""\s*('[^']*'|"[^"]*"|[^,/'"]*)\s*(,|/|$)""")
+
+# name of the section closed by a terminator record: "0 / END OF BUS DATA, BEGIN LOAD DATA"
+RAW_SECTION_END_RE = re.compile(r'end of (.*?) data')
+
+# default order of the sections, used when the terminator records have no comment
+RAW_SECTIONS = {33: ['bus', 'load', 'fixed shunt', 'generator', 'branch', 'transformer', 'area',
+                     'two-terminal dc', 'vsc dc line', 'impedance correction', 'multi-terminal dc',
+                     'multi-section line', 'zone', 'inter-area transfer', 'owner', 'facts device',
+                     'switched shunt', 'gne', 'induction machine'],
+                32: ['bus', 'load', 'fixed shunt', 'generator', 'branch', 'transformer', 'area',
+                     'two-terminal dc', 'vsc dc line', 'impedance correction', 'multi-terminal dc',
+                     'multi-section line', 'zone', 'inter-area transfer', 'owner', 'facts device',
+                     'switched shunt', 'gne'],
+                30: ['bus', 'load', 'fixed shunt', 'generator', 'branch', 'transformer', 'area',
+                     'two-terminal dc', 'vsc dc line', 'switched shunt', 'impedance correction',
+                     'multi-terminal dc', 'multi-section line', 'zone', 'inter-area transfer', 'owner',
+                     'facts device'],
+                29: ['bus', 'load', 'generator', 'branch', 'transformer', 'area', 'two-terminal dc',
+                     'vsc dc line', 'switched shunt', 'impedance correction', 'multi-terminal dc',
+                     'multi-section line', 'zone', 'inter-area transfer', 'owner', 'facts device']}
+
+
+def parse_raw_field(elm):
+    """
+    Parse a RAW field to an appropriate format (int, float or string)
+    :param elm: text
+    :return: int, float or string
+    """
+    try:
+        return int(elm)
+    except ValueError:
+        try:
+            return float(elm)
+        except ValueError:
+            return elm.strip()
+
+
+def split_raw_record(line):
+    """
+    Split a RAW record into typed fields (see interpret_line), respecting the quoted strings and
+    dropping the trailing comment
+    :param line: text of the record
+    :return: list of fields
+    """
+    if "'" not in line and '"' not in line:
+        return [parse_raw_field(elm) for elm in line.split('/', 1)[0].split(',')]
+
+    parsed = list()
+    pos = 0
+    n = len(line)
+    while pos <= n:
+        match = RAW_FIELD_RE.match(line, pos)
+        if match is None:
+            # unbalanced quotes: keep the rest of the line as text
+            parsed.append(line[pos:].strip())
+            break
+        parsed.append(parse_raw_field(match.group(1)))
+        if match.group(2) != ',':
+            break
+        pos = match.end()
+
+    return parsed
+
+
+def is_raw_section_end(line):
+    """
+    Is the line a section terminator record? ("0", "0 / END OF ... DATA" or "Q")
+    :param line: text
+    :return: bool
+    """
+    return line.split('/', 1)[0].strip() in ('0', 'Q', 'q')
+
+
+def detect_encoding(file_name, prefix_size=65536):
+    """
+    Guess the encoding of a text file from its first bytes
+    :param file_name: file name
+    :param prefix_size: number of bytes to examine
+    :return: encoding name
+    """
+    with open(file_name, 'rb') as f:
+        detection = chardet.detect(f.read(prefix_size))
+
+    return detection['encoding'] if detection['encoding'] is not None else 'latin-1'
+
+
+def read_raw_sections(file_name, logger: Logger):
+    """
+    Read a RAW file in one pass, splitting it into sections of typed records
+    :param file_name: file name
+    :param logger: Logger instance
+    :return: header fields, dictionary of sections {section name: list of records (lists of fields)}
+    """
+    encoding = detect_encoding(file_name)
+    sections_dict = dict()
+    header = list()
+    records = list()
+    version = None
+    k = 0
+
+    with open(file_name, 'r', encoding=encoding, errors='replace') as my_file:
+
+        n_header = 0
+        for line in my_file:
+
+            if line[0] == '@':
+                # comment
+                continue
+
+            if n_header < 3:
+                # case identification record and two title lines
+                if n_header == 0:
+                    header = split_raw_record(line)
+                    version = header[2] if len(header) > 2 else None
+                n_header += 1
+                continue
+
+            if is_raw_section_end(line):
+
+                if line.split('/', 1)[0].strip() in ('Q', 'q'):
+                    break
+
+                match = RAW_SECTION_END_RE.search(line.lower())
+                if match is not None:
+                    name = match.group(1).strip()
+                elif version in RAW_SECTIONS and k < len(RAW_SECTIONS[version]):
+                    name = RAW_SECTIONS[version][k]
+                else:
+                    name = 'section ' + str(k)
+                    logger.append('Could not identify the RAW section ' + str(k))
+
+                sections_dict[name] = records
+                records = list()
+                k += 1
+
+            elif ',' in line:
+                records.append(split_raw_record(line))
+
+            elif line.strip() != '':
+                logger.append('Skipped:' + line)
+
+    return header, sections_dict
+
+
 class PSSeParser:
 
     def __init__(self, file_name):
@@ -2214,49 +2360,6 @@ class PSSeParser:
         self.circuit.comments = 'Converted from the PSS/e .raw file ' \
                                 + os.path.basename(file_name) + '\n\n' + str(self.logger)
 
-    def read_and_split(self) -> (List[AnyStr], Dict[AnyStr, AnyStr]):
-        """
-        Read the text file and split it into sections
-        :return: list of sections, dictionary of sections by type
-        """
-
-        # make a guess of the file encoding
-        detection = chardet.detect(open(self.file_name, "rb").read())
-
-        # open the text file into a variable
-        txt = ''
-        with open(self.file_name, 'r', encoding=detection['encoding']) as my_file:
-            for line in my_file:
-                if line[0] != '@':
-                    txt += line
-
-        # split the text file into sections
-        sections = txt.split(' /')
-
-        sections_dict = dict()
-
-        str_a = 'End of'.lower()
-        str_b = 'data'.lower()
-
-        for i, sec in enumerate(sections):
-            data = sec.split('\n')
-            first = data.pop(0).lower()
-            if str_a in first:
-                if ',' in first:
-                    srch = first.split(',')[0]
-                else:
-                    srch = first
-                name = re.search(str_a + '(.*)' + str_b, srch).group(1).strip()
-                data2 = sections[i - 1].split('\n')[1:]
-
-                if name.lower() == 'bus':
-                    data2.pop(0)
-                    data2.pop(0)
-
-                sections_dict[name] = data2
-
-        return sections, sections_dict
-
     def parse_psse(self) -> (MultiCircuit, List[AnyStr]):
         """
         Parser implemented according to:
@@ -2269,10 +2372,10 @@ class PSSeParser:
 
         logger = Logger()
 
-        sections, sections_dict = self.read_and_split()
+        header, sections_dict = read_raw_sections(self.file_name, logger)
 
         # header -> new grid
-        grid = PSSeGrid(interpret_line(sections[0]))
+        grid = PSSeGrid(header[:6])
 
         if grid.REV not in self.versions:
             logger.append('The PSSe version is not compatible. Compatible versions are:' + str(self.versions))
@@ -2329,45 +2432,32 @@ class PSSeParser:
             objects_list, ObjectT, lines_per_object = values
 
             if key in sections_dict.keys():
-                lines = sections_dict[key]
+                records = sections_dict[key]
 
-                # iterate ove the object's lines to pack them as expected (normally 1 per object except transformers...)
+                # iterate ove the object's records to pack them as expected (normally 1 per object except transformers...)
                 l = 0
-                while l < len(lines):
+                while l < len(records):
 
                     lines_per_object2 = lines_per_object
 
                     if version in [29, 30, 32, 33] and key == 'transformer':
                         # as you know the PSS/e raw format is nuts, that is why for v29 (onwards probably)
                         # the transformers may have 4 or 5 lines to define them
-                        if (l + 1) < len(lines):
-                            dta = lines[l + 1].split(',')
-                            if len(dta) > 3:
+                        if (l + 1) < len(records):
+                            if len(records[l + 1]) > 3:
                                 # 3 - windings
                                 lines_per_object2 = 5
                             else:
                                 # 2-windings
                                 lines_per_object2 = 4
 
-                    if ',' in lines[l]:
-                        data = list()
-                        for k in range(lines_per_object2):
-                            data.append(interpret_line(lines[l + k]))
-
-                        # pick the line that matches the object and split it by line returns \n
-                        # object_lines = line.split('\n')
-
-                        # interpret each line of the object and store into data
-                        # data is a vector of vectors with data definitions
-                        # for the buses, branches, loads etc. data contains 1 vector,
-                        # for the transformers data contains 4 vectors
-                        # data = [interpret_line(object_lines[k]) for k in range(lines_per_object)]
-
-                        # pass the data to the according object to assign it to the matching variables
-                        objects_list.append(ObjectT(data, version, logger))
+                    # data is a vector of vectors with data definitions (already typed):
+                    # for the buses, branches, loads etc. data contains 1 vector,
+                    # for the transformers data contains 4 vectors
+                    data = records[l:l + lines_per_object2]
 
-                    else:
-                        logger.append('Skipped:' + lines[l])
+                    # pass the data to the according object to assign it to the matching variables
+                    objects_list.append(ObjectT(data, version, logger))
 
                     # add lines
                     l += lines_per_object2
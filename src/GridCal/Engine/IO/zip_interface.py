@@ -15,7 +15,10 @@
 
 from io import StringIO
 import os
+import json
+import struct
 from random import randint, seed
+import numpy as np
 import pandas as pd
 import zipfile
 from typing import List, Dict
@@ -82,6 +85,10 @@ def open_data_frames_from_zip(file_name_zip, text_func=None, progress_func=None)
 
     names = zip_file_pointer.namelist()
 
+    if BINARY_MANIFEST in names:
+        return open_data_frames_from_binary_zip(zip_file_pointer, file_name_zip,
+                                                text_func=text_func, progress_func=progress_func)
+
     n = len(names)
     data = dict()
 
@@ -125,6 +132,239 @@ def open_data_frames_from_zip(file_name_zip, text_func=None, progress_func=None)
     return data
 
 
+########################################################################################################################
+# Binary (columnar) format
+########################################################################################################################
+
+BINARY_MANIFEST = 'manifest.json'
+
+
+def to_typed_column(values):
+    """
+    Convert a column of text values into the narrowest type among int, float, bool and str
+    (like the type inference of pd.read_csv)
+    :param values: array of values
+    :return: typed array
+    """
+    if values.dtype.kind in 'biufcM':
+        return values
+
+    s = values.astype(str)
+
+    try:
+        return s.astype(np.int64)
+    except (ValueError, OverflowError):
+        pass
+
+    try:
+        return np.where((s == '') | (s == 'None'), 'nan', s).astype(float)
+    except ValueError:
+        pass
+
+    if len(s) > 0 and np.all((s == 'True') | (s == 'False')):
+        return s == 'True'
+
+    return s
+
+
+def write_npy_to_zip(myzip: zipfile.ZipFile, name, arr, compress=True):
+    """
+    Write an array as a .npy member of a zip file
+    :param myzip: ZipFile open for writing
+    :param name: member name
+    :param arr: numpy array (without objects)
+    :param compress: deflate the member? (the uncompressed members can be memory mapped)
+    """
+    info = zipfile.ZipInfo(name)
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with myzip.open(info, 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, np.ascontiguousarray(arr), allow_pickle=False)
+
+
+def save_data_frames_to_binary_zip(dfs: Dict[str, pd.DataFrame], filename_zip="file.gridcal",
+                                   text_func=None, progress_func=None):
+    """
+    Save a dictionary of DataFrames to a zip file as typed binary columns (.npy members):
+    the tables are stored column by column and the profiles (*_prof) as uncompressed (devices, time) matrices
+    so that they can be memory mapped when opening.
+    The file is written to a temporary file first, because the file being replaced may be memory mapped:
+    the profiles mapped from it must be released before (see copy_memory_mapped_profiles).
+    :param dfs: dictionary of pandas dataFrames {name: DataFrame}
+    :param filename_zip: file name where to save all
+    :param text_func: pointer to function that prints the names
+    :param progress_func: pointer to function that prints the progress 0~100
+    """
+    n = len(dfs)
+    manifest = {'format': 'GridCal binary', 'version': 1, 'tables': dict(), 'profiles': dict()}
+    tmp_file_name = filename_zip + '.tmp'
+
+    with zipfile.ZipFile(tmp_file_name, 'w', zipfile.ZIP_DEFLATED) as myzip:
+
+        for i, (name, df) in enumerate(dfs.items()):
+
+            if text_func is not None:
+                text_func('Flushing ' + name + ' to ' + filename_zip + '...')
+
+            if progress_func is not None:
+                progress_func((i + 1) / n * 100)
+
+            values = df.values
+
+            if name.endswith('_prof') and values.dtype != object:
+                # profile matrix: one contiguous row per device
+                member = 'profiles/' + name + '.npy'
+                write_npy_to_zip(myzip, member, values.T, compress=False)
+                manifest['profiles'][name] = {'member': member, 'columns': [str(c) for c in df.columns]}
+
+            elif name == 'config' or (values.dtype == object and name.endswith('_prof')):
+                # small or non typed tables stay as csv
+                with StringIO() as buffer:
+                    df.to_csv(buffer, index=False)
+                    myzip.writestr(name + '.csv', buffer.getvalue())
+
+            else:
+                members = list()
+                for j, col in enumerate(df.columns):
+                    member = 'tables/' + name + '/' + str(j) + '.npy'
+                    write_npy_to_zip(myzip, member, to_typed_column(df[col].values))
+                    members.append(member)
+                manifest['tables'][name] = {'members': members, 'columns': [str(c) for c in df.columns]}
+
+        myzip.writestr(BINARY_MANIFEST, json.dumps(manifest))
+
+    os.replace(tmp_file_name, filename_zip)
+
+
+def is_memory_mapped_from(arr, file_name_zip):
+    """
+    Check if an array (or any of the arrays it is a view of) is memory mapped from a file
+    :param arr: numpy array
+    :param file_name_zip: name of the zip file
+    :return: True / False
+    """
+    path = os.path.normcase(os.path.abspath(file_name_zip))
+    while isinstance(arr, np.ndarray):
+        if isinstance(arr, np.memmap) and arr.filename is not None:
+            if os.path.normcase(arr.filename) == path:
+                return True
+        arr = arr.base
+    return False
+
+
+def copy_memory_mapped_profiles(devices, file_name_zip):
+    """
+    Replace the profiles memory mapped from a zip file by copies in memory, this releases the file mappings
+    so that the file can be replaced (Windows does not allow replacing a mapped file)
+    :param devices: list of devices with profiles
+    :param file_name_zip: name of the zip file
+    """
+    for elm in devices:
+        if elm.properties_with_profile is not None:
+            for profile_property in elm.properties_with_profile.values():
+                arr = getattr(elm, profile_property, None)
+                if is_memory_mapped_from(arr, file_name_zip):
+                    setattr(elm, profile_property, np.array(arr))
+
+
+def get_zip_member_offset(file_name_zip, info: zipfile.ZipInfo):
+    """
+    Get the position of the data of an uncompressed zip member within the file
+    :param file_name_zip: name of the zip file
+    :param info: ZipInfo of the member
+    :return: offset in bytes
+    """
+    with open(file_name_zip, 'rb') as fp:
+        fp.seek(info.header_offset)
+        header = fp.read(30)  # local file header
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+
+    return info.header_offset + 30 + name_len + extra_len
+
+
+def memory_map_npy_member(file_name_zip, info: zipfile.ZipInfo):
+    """
+    Memory map (copy on write) a .npy member stored without compression
+    :param file_name_zip: name of the zip file
+    :param info: ZipInfo of the member
+    :return: numpy memmap (or array if empty)
+    """
+    offset = get_zip_member_offset(file_name_zip, info)
+
+    with open(file_name_zip, 'rb') as fp:
+        fp.seek(offset)
+        version = np.lib.format.read_magic(fp)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fp)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fp)
+        data_offset = fp.tell()
+
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+
+    return np.memmap(file_name_zip, dtype=dtype, mode='c', offset=data_offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def open_data_frames_from_binary_zip(zip_file_pointer: zipfile.ZipFile, file_name_zip,
+                                     text_func=None, progress_func=None):
+    """
+    Open the tables of a binary GridCal zip file.
+    The profiles are not read: they are memory mapped and returned as (time, devices) arrays
+    whose columns are views of the file, so the data is only loaded when it is used.
+    :param zip_file_pointer: ZipFile
+    :param file_name_zip: name of the zip file
+    :param text_func: pointer to function that prints the names
+    :param progress_func: pointer to function that prints the progress 0~100
+    :return: dictionary of DataFrames (and profile arrays)
+    """
+    manifest = json.loads(zip_file_pointer.read(BINARY_MANIFEST))
+    data = dict()
+
+    n = len(manifest['tables']) + len(manifest['profiles']) + 1
+    i = 0
+
+    # csv members (configuration)
+    for file_name in zip_file_pointer.namelist():
+        name, extension = os.path.splitext(file_name)
+        if extension == '.csv':
+            file_pointer = zip_file_pointer.open(file_name)
+            if name.lower() == "config":
+                df = pd.read_csv(file_pointer, index_col=0)
+                data = parse_config_df(df, data)
+            else:
+                df = pd.read_csv(file_pointer)
+            data[name] = df
+    i += 1
+
+    for name, entry in manifest['tables'].items():
+
+        if text_func is not None:
+            text_func('Unpacking ' + name + ' from ' + file_name_zip)
+
+        if progress_func is not None:
+            progress_func(i / n * 100)
+
+        columns = dict()
+        for col, member in zip(entry['columns'], entry['members']):
+            with zip_file_pointer.open(member) as f:
+                columns[col] = np.lib.format.read_array(f, allow_pickle=False)
+
+        data[name] = pd.DataFrame(columns, columns=entry['columns'])
+        i += 1
+
+    for name, entry in manifest['profiles'].items():
+
+        if progress_func is not None:
+            progress_func(i / n * 100)
+
+        # (devices, time) on disk: the transposed view has one contiguous column per device
+        data[name] = memory_map_npy_member(file_name_zip, zip_file_pointer.getinfo(entry['member'])).T
+        i += 1
+
+    return data
+
+
 if __name__ == '__main__':
 
     # Generate some random values to put in the csv file.
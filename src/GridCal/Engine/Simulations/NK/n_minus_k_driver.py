@@ -13,17 +13,20 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 import time
-import datetime
+import multiprocessing
 import numpy as np
-import pandas as pd
-from itertools import combinations
+from itertools import combinations, chain
+from scipy.special import comb
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit, split_time_circuit_into_islands, TimeCircuit
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, SolverType, single_island_pf
-from GridCal.Engine.Simulations.NK.n_minus_k_results import NMinusKResults
+from GridCal.Engine.Core.topology import ConnectivityStructure
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands, SnapshotCircuit
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, single_island_pf
+from GridCal.Engine.Simulations.PTDF.linear_factors import make_dc_matrices, factorize_dc_matrix, make_lodf, \
+    make_lodf_columns, make_transfer_sensitivities, get_n1_flows, get_double_outage_flows, get_multiple_outage_flows
+from GridCal.Engine.Simulations.NK.n_minus_k_results import ContingencyAnalysisResults
 
 
 def enumerate_states_n_k(m, k=1):
@@ -51,91 +54,237 @@ def enumerate_states_n_k(m, k=1):
     return np.array(states), indices
 
 
-def set_base_profile(nc: TimeCircuit):
+def iterate_contingencies_n_k(branch_idx, k=1):
     """
-    Re-index all the time based profiles
-    :return: Nothing, this is done in-place
+    Generate the failed branches of the N-1 ... N-k states (the base state is not included)
+    without materializing the states
+    :param branch_idx: indices of the candidate branches
+    :param k: failure level
+    :return: generator of tuples of failed branch indices
     """
-    now = datetime.datetime.now()
-    dte = datetime.datetime(year=now.year, month=1, day=1, hour=0)
-    nc.time_array = pd.to_datetime([dte])
-    nc.ntime = len(nc.time_array)
+    for k1 in range(1, k + 1):
+        for failed in combinations(branch_idx, k1):
+            yield failed
 
-    # branch
-    nc.branch_active_prof = nc.branch_active.reshape(1, -1)  # np.zeros((n_time, n_br), dtype=int)
-    nc.temp_oper_prof = nc.line_temp_oper.reshape(1, -1)  # np.zeros((n_time, n_br), dtype=float)
-    nc.br_rate_profile = nc.branch_rates.reshape(1, -1)  # np.zeros((n_time, n_br), dtype=float)
 
-    # load
-    nc.load_active_prof = nc.load_active.reshape(1, -1)  # np.zeros((n_time, n_ld), dtype=bool)
+def get_number_of_contingencies_n_k(m, k=1):
+    """
+    Number of N-1 ... N-k states (the base state is not included)
+    :param m: number of candidate branches
+    :param k: failure level
+    :return: integer
+    """
+    return int(sum(comb(m, k1, exact=True) for k1 in range(1, k + 1)))
 
-    nc.load_power_profile = nc.load_s.reshape(1, -1)  # np.zeros((n_time, n_ld), dtype=complex)
 
-    # battery
-    nc.battery_active_prof = nc.battery_active.reshape(1, -1)  # np.zeros((n_time, n_batt), dtype=bool)
-    nc.battery_power_profile = nc.battery_p.reshape(1, -1)  # np.zeros((n_time, n_batt), dtype=float)
-    nc.battery_voltage_profile = nc.battery_v.reshape(1, -1)  # np.zeros((n_time, n_batt), dtype=float)
+def get_chunks(iterable, chunk_size):
+    """
+    Group the elements of an iterable in lists of bounded size
+    :param iterable: any iterable
+    :param chunk_size: maximum size of the lists
+    :return: generator of lists
+    """
+    chunk = list()
+    for elm in iterable:
+        chunk.append(elm)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = list()
 
-    # static generator
-    nc.static_gen_active_prof = nc.static_generator_active.reshape(1, -1)  # np.zeros((n_time, n_sta_gen), dtype=bool)
-    nc.static_gen_power_profile = nc.static_generator_s.reshape(1, -1)  # np.zeros((n_time, n_sta_gen), dtype=complex)
+    if len(chunk) > 0:
+        yield chunk
 
-    # controlled generator
-    nc.generator_active_prof = nc.generator_active.reshape(1, -1)  # np.zeros((n_time, n_gen), dtype=bool)
-    nc.generator_power_profile = nc.generator_p.reshape(1, -1)  # np.zeros((n_time, n_gen), dtype=float)
-    nc.generator_power_factor_profile = nc.generator_pf.reshape(1, -1)  # np.zeros((n_time, n_gen), dtype=float)
-    nc.generator_voltage_profile = nc.generator_v.reshape(1, -1)  # np.zeros((n_time, n_gen), dtype=float)
 
-    # shunt
-    nc.shunt_active_prof = nc.shunt_active.reshape(1, -1)  # np.zeros((n_time, n_sh), dtype=bool)
-    nc.shunt_admittance_profile = nc.shunt_admittance.reshape(1, -1)  # np.zeros((n_time, n_sh), dtype=complex)
+class NMinusKOptions:
 
+    def __init__(self, use_multi_threading, linear_screening=False, screening_threshold=1.0, k=1,
+                 contingency_pairs=None, ac_verification=True, chunk_size=256, top_n=5, islanding_tolerance=1e-8,
+                 store_otdf=True):
+        """
+        N-k options
+        :param use_multi_threading: run the AC power flows of the contingencies in parallel processes?
+        :param linear_screening: screen the contingencies with the LODF instead of running a power flow per state
+        :param screening_threshold: post-contingency loading (p.u.) above which a contingency is flagged
+        :param k: failure level (1 for N-1, 2 for N-2, ...), all the combinations of active branches are evaluated
+        :param contingency_pairs: list of additional branch index pairs to evaluate as N-2 contingencies
+        :param ac_verification: run an AC power flow for the flagged and the islanding contingencies?
+                                (linear screening)
+        :param chunk_size: number of contingencies evaluated at once (the memory is bounded by nbr x chunk_size)
+        :param top_n: number of worst contingencies to keep per branch
+        :param islanding_tolerance: tolerance of the LODF denominator under which an outage splits the grid
+        :param store_otdf: keep the dense OTDF matrix of the N-1 contingencies in the results?
+        """
+        self.use_multi_threading = use_multi_threading
 
-def re_index_time(nc: TimeCircuit, t_idx):
-    """
-    Re-index all the time based profiles
-    :param t_idx: new indices of the time profiles
-    :return: Nothing, this is done in-place
-    """
+        self.linear_screening = linear_screening
 
-    nc.time_array = nc.time_array[t_idx]
-    nc.ntime = len(t_idx)
+        self.screening_threshold = screening_threshold
 
-    # branch
-    nc.branch_active_prof = nc.branch_active[t_idx, :]  # np.zeros((n_time, n_br), dtype=int)
-    # nc.temp_oper_prof = nc.line_temp_oper[t_idx, :]  # np.zeros((n_time, n_br), dtype=float)
-    nc.br_rate_profile = nc.branch_rates[t_idx, :]  # np.zeros((n_time, n_br), dtype=float)
+        self.k = k
 
-    # load
-    nc.load_active_prof = nc.load_active[t_idx, :]  # np.zeros((n_time, n_ld), dtype=bool)
+        self.contingency_pairs = contingency_pairs
 
-    nc.load_power_profile = nc.load_s[t_idx, :]  # np.zeros((n_time, n_ld), dtype=complex)
+        self.ac_verification = ac_verification
 
-    # battery
-    nc.battery_active_prof = nc.battery_active[t_idx, :]  # np.zeros((n_time, n_batt), dtype=bool)
-    nc.battery_power_profile = nc.battery_p[t_idx, :]  # np.zeros((n_time, n_batt), dtype=float)
-    nc.battery_voltage_profile = nc.battery_v[t_idx, :]  # np.zeros((n_time, n_batt), dtype=float)
+        self.chunk_size = chunk_size
 
-    # static generator
-    nc.static_gen_active_prof = nc.static_generator_active[t_idx, :]  # np.zeros((n_time, n_sta_gen), dtype=bool)
-    nc.static_gen_power_profile = nc.static_generator_s[t_idx, :]  # np.zeros((n_time, n_sta_gen), dtype=complex)
+        self.top_n = top_n
 
-    # controlled generator
-    nc.generator_active_prof = nc.generator_active[t_idx, :]  # np.zeros((n_time, n_gen), dtype=bool)
-    nc.generator_power_profile = nc.generator_p[t_idx, :]  # np.zeros((n_time, n_gen), dtype=float)
-    nc.generator_power_factor_profile = nc.generator_pf[t_idx, :]  # np.zeros((n_time, n_gen), dtype=float)
-    nc.generator_voltage_profile = nc.generator_v[t_idx, :]  # np.zeros((n_time, n_gen), dtype=float)
+        self.islanding_tolerance = islanding_tolerance
 
-    # shunt
-    nc.shunt_active_prof = nc.shunt_active[t_idx, :]  # np.zeros((n_time, n_sh), dtype=bool)
-    nc.shunt_admittance_profile = nc.shunt_admittance[t_idx, :]  # np.zeros((n_time, n_sh), dtype=complex)
+        self.store_otdf = store_otdf
 
 
-class NMinusKOptions:
+class ContingencyIsland:
 
-    def __init__(self, use_multi_threading):
+    def __init__(self, island: SnapshotCircuit, flows, rates, linear=True):
+        """
+        Island prepared for the evaluation of contingencies
+        :param island: SnapshotCircuit island
+        :param flows: pre-contingency branch active power (MW)
+        :param rates: branch rates (MW)
+        :param linear: compute the DC sensitivity structures? (they are shared by all the contingencies)
+        """
+        self.island = island
 
-        self.use_multi_threading = use_multi_threading
+        self.flows = flows
+
+        self.rates = rates
+
+        if linear:
+            self.Bbus, self.Bf, self.A = make_dc_matrices(island)
+            self.lu = factorize_dc_matrix(self.Bbus, island.pqpv)
+        else:
+            self.Bbus, self.Bf, self.A, self.lu = None, None, None, None
+
+        # bridges of the island (built on the first AC evaluation)
+        self.connectivity = None
+
+    def get_linear_flows(self, outages, tol):
+        """
+        Post-contingency flows estimated with the linear sensitivities
+        :param outages: list of tuples of local indices of the failed branches
+        :param tol: islanding tolerance
+        :return: flows (m, c), islanding flags (c)
+        """
+        nc = len(outages)
+        post = np.empty((self.island.nbr, nc))
+        islanding = np.zeros(nc, dtype=bool)
+        pqpv = self.island.pqpv
+
+        lengths = np.array([len(o) for o in outages])
+
+        # simple outages
+        s = np.where(lengths == 1)[0]
+        if len(s) > 0:
+            br_idx = np.array([outages[i][0] for i in s], dtype=int)
+            LODF, islanding[s] = make_lodf_columns(self.Bf, self.A, self.lu, pqpv, br_idx, tol=tol)
+            post[:, s] = get_n1_flows(self.flows, LODF, br_idx)
+            post[br_idx, s] = 0.0
+
+        # double outages (the sensitivities of the repeated branches are computed once)
+        d = np.where(lengths == 2)[0]
+        if len(d) > 0:
+            a = np.array([outages[i][0] for i in d], dtype=int)
+            b = np.array([outages[i][1] for i in d], dtype=int)
+            u, inv = np.unique(np.r_[a, b], return_inverse=True)
+            M = make_transfer_sensitivities(self.Bf, self.A, self.lu, pqpv, u)
+            post[:, d], islanding[d] = get_double_outage_flows(self.flows, M[:, inv[:len(d)]], M[:, inv[len(d):]],
+                                                               a, b, tol=tol)
+
+        # higher order outages
+        for i in np.where(lengths > 2)[0]:
+            br_idx = np.array(outages[i], dtype=int)
+            M = make_transfer_sensitivities(self.Bf, self.A, self.lu, pqpv, br_idx)
+            flows = get_multiple_outage_flows(self.flows, M, br_idx, tol=tol)
+
+            if flows is None:
+                flows = self.flows.copy()
+                flows[br_idx] = 0.0
+                islanding[i] = True
+
+            post[:, i] = flows
+
+        return post, islanding
+
+    def get_ac_flows(self, outages, options: PowerFlowOptions, logger: Logger):
+        """
+        Post-contingency flows computed with AC power flows
+        :param outages: list of tuples of local indices of the failed branches
+        :param options: PowerFlowOptions instance
+        :param logger: Logger instance
+        :return: flows (m, c), islanding flags (c)
+        """
+        nc = len(outages)
+        post = np.zeros((self.island.nbr, nc))
+        islanding = np.zeros(nc, dtype=bool)
+
+        if self.connectivity is None:
+            self.connectivity = ConnectivityStructure.from_circuit(self.island)
+
+        for i, outage in enumerate(outages):
+            br_idx = np.array(outage, dtype=int)
+
+            # disconnect the branches
+            active = self.island.branch_active[br_idx].copy()
+            self.island.branch_active[br_idx] = 0
+            self.island.update_admittance_matrices(br_idx)
+
+            if len(br_idx) == 1 and not self.connectivity.splits_island(br_idx[0]):
+                # the branch is not a bridge: the island is solved as it is
+                islanding[i] = False
+                if len(self.island.vd) > 0:
+                    res = single_island_pf(circuit=self.island,
+                                           Vbus=self.island.Vbus,
+                                           Sbus=self.island.Sbus,
+                                           Ibus=self.island.Ibus,
+                                           branch_rates=self.island.branch_rates,
+                                           options=options,
+                                           logger=logger)
+                    post[:, i] = res.Sbranch.real
+
+            else:
+                # the outage may split the island
+                sub_islands = split_into_islands(numeric_circuit=self.island,
+                                                 ignore_single_node_islands=options.ignore_single_node_islands)
+                islanding[i] = len(sub_islands) > 1
+
+                for sub_island in sub_islands:
+
+                    if len(sub_island.vd) > 0:
+                        res = single_island_pf(circuit=sub_island,
+                                               Vbus=sub_island.Vbus,
+                                               Sbus=sub_island.Sbus,
+                                               Ibus=sub_island.Ibus,
+                                               branch_rates=sub_island.branch_rates,
+                                               options=options,
+                                               logger=logger)
+                        if sub_island is self.island:
+                            # the outage did not split the island (its original indices refer to the whole grid)
+                            post[:, i] = res.Sbranch.real
+                        else:
+                            # the original indices of the sub-islands refer to this island
+                            post[sub_island.original_branch_idx, i] = res.Sbranch.real
+
+            # restore the island
+            self.island.branch_active[br_idx] = active
+            self.island.update_admittance_matrices(br_idx)
+
+        return post, islanding
+
+
+def ac_contingencies_worker(island: SnapshotCircuit, outages, options: PowerFlowOptions):
+    """
+    Process-pool worker that computes the post-contingency flows of a set of outages of an island with AC power flows
+    :param island: SnapshotCircuit island
+    :param outages: list of tuples of local indices of the failed branches
+    :param options: PowerFlowOptions instance
+    :return: flows (m, c), islanding flags (c), Logger
+    """
+    logger = Logger()
+    c_island = ContingencyIsland(island, flows=None, rates=None, linear=False)
+    post, islanding = c_island.get_ac_flows(outages, options, logger)
+    return post, islanding, logger
 
 
 class NMinusK(QThread):
@@ -163,9 +312,7 @@ class NMinusK(QThread):
         self.pf_options = pf_options
 
         # N-K results
-        self.results = NMinusKResults(n=0, m=0, nt=0, n_tr=0, bus_names=(),
-                                      branch_names=(), transformer_names=(), bus_types=(),
-                                      time_array=None, states=None)
+        self.results = None
 
         # set cancel state
         self.__cancel__ = False
@@ -178,6 +325,9 @@ class NMinusK(QThread):
 
         self.branch_names = list()
 
+        # process pool of the AC evaluations (multi-threading)
+        self.pool = None
+
     def get_steps(self):
         """
         Get variations list of strings
@@ -187,273 +337,251 @@ class NMinusK(QThread):
         else:
             return list()
 
-    def n_minus_k(self, k=1, indices=None, vmin=0, states_number_limit=None):
+    def get_contingencies(self, numerical_circuit: SnapshotCircuit, k=1):
         """
-        Run N-K simulation in series
-        :param k: Parameter level (1 for n-1, 2 for n-2, etc...)
-        :param indices: time indices {np.array([0])}
-        :param vmin: minimum nominal voltage to allow (filters out branches and buses below)
-        :param states_number_limit: limit the amount of states
-        :return: Nothing, saves a report
+        Get the contingencies to evaluate
+        :param numerical_circuit: SnapshotCircuit instance
+        :param k: failure level
+        :return: generator of tuples of failed branch indices, number of contingencies
         """
+        branch_idx = np.where(numerical_circuit.branch_active)[0]
 
-        self.progress_text.emit("Filtering elements by voltage")
-
-        # filter branches
-        branch_names = list()
-        branch_index = list()
-        branches = list()  # list of filtered branches
-        for i, branch in enumerate(self.grid.lines):
-            if branch.bus_from.Vnom > vmin or branch.bus_to.Vnom > vmin:
-                branch_names.append(branch.name)
-                branch_index.append(i)
-                branches.append(branch)
-        branch_index = np.array(branch_index)
-
-        self.branch_names = branch_names
-
-        # filter buses
-        bus_names = list()
-        bus_index = list()
-        for i, bus in enumerate(self.grid.buses):
-            if bus.Vnom > vmin:
-                bus_names.append(bus.name)
-                bus_index.append(i)
-        bus_index = np.array(bus_index)
-
-        # get N-k states
-        self.progress_text.emit("Enumerating states")
-        states, failed_indices = enumerate_states_n_k(m=len(branch_names), k=k)
-
-        # limit states for memory reasons
-        if states_number_limit is not None:
-            states = states[:states_number_limit, :]
-            failed_indices = failed_indices[:states_number_limit]
-
-        # compile the multi-circuit
-        self.progress_text.emit("Compiling assets...")
-        self.progress_signal.emit(0)
-
-        numerical_circuit = compile_time_circuit(circuit=self.grid,
-                                                 apply_temperature=self.pf_options.apply_temperature_correction,
-                                                 branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
-
-        # re-index the profile (this is essential for time-compatibility)
-        self.progress_signal.emit(100)
-
-        # if no base profile time is given, pick the base values
-        if indices is None:
-            time_indices = np.array([0])
-            set_base_profile(numerical_circuit)
-        else:
-            time_indices = indices
-
-        # construct the profile indices
-        profile_indices = np.tile(time_indices, len(states))
-        re_index_time(numerical_circuit, t_idx=profile_indices)
-
-        # set the branch states
-        numerical_circuit.branch_active[:, branch_index] = np.tile(states, (len(time_indices), 1))
+        contingencies = iterate_contingencies_n_k(branch_idx, k)
+        n = get_number_of_contingencies_n_k(len(branch_idx), k)
 
-        # initialize the power flow
-        pf_options = PowerFlowOptions(solver_type=SolverType.LACPF)
+        if self.options.contingency_pairs is not None:
+            contingencies = chain(contingencies, (tuple(pair) for pair in self.options.contingency_pairs))
+            n += len(self.options.contingency_pairs)
 
-        # initialize the grid time series results we will append the island results with another function
-        n = self.grid.get_bus_number()
-        m = self.grid.get_branch_number()
-        nt = len(profile_indices)
+        return contingencies, n
 
-        n_k_results = NMinusKResults(n, m, nt, time_array=numerical_circuit.time_array)
-
-        # do the topological computation
-        self.progress_text.emit("Compiling topology...")
-        self.progress_signal.emit(0.0)
-
-        calc_inputs = split_time_circuit_into_islands(numeric_circuit=numerical_circuit,
-                                                      ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
-
-        n_k_results.bus_types = numerical_circuit.bus_types
-
-        self.progress_text.emit("Simulating states...")
-        npart = len(calc_inputs)
-        k = 1
-
-        # For every island, run the time series
-        for island_index, calculation_input in enumerate(calc_inputs):
-
-            self.progress_signal.emit((island_index + 1) / npart * 100.0)
-
-            # find the original indices
-            bus_original_idx = calculation_input.original_bus_idx
-            branch_original_idx = calculation_input.original_branch_idx
-
-            # declare a results object for the partition
-            # nt = calculation_input.ntime
-            nt = len(calculation_input.original_time_idx)
-            n = calculation_input.nbus
-            m = calculation_input.nbr
-            partial_results = NMinusKResults(n, m, nt)
-            last_voltage = calculation_input.Vbus
-
-            # traverse the time profiles of the partition and simulate each time step
-            for it, t in enumerate(calculation_input.original_time_idx):
-                # set the power values
-                # if the storage dispatch option is active, the batteries power is not included
-                # therefore, it shall be included after processing
-
-                I = calculation_input.Ibus[:, it]
-                S = calculation_input.Sbus[:, it]
-                branch_rates = calculation_input.branch_rates[it, :]
-
-                # run power flow at the circuit
-                res = single_island_pf(circuit=calculation_input, Vbus=last_voltage, Sbus=S, Ibus=I,
-                                       branch_rates=branch_rates, options=pf_options, logger=self.logger)
-
-                # Recycle voltage solution
-                last_voltage = res.voltage
+    def prepare_islands(self, numerical_circuit: SnapshotCircuit, results: ContingencyAnalysisResults, linear):
+        """
+        Solve the base case of every island and prepare them for the evaluation of contingencies
+        :param numerical_circuit: SnapshotCircuit instance
+        :param results: ContingencyAnalysisResults instance where to store the base case
+        :param linear: compute the linear sensitivities?
+        :return: list of ContingencyIsland (None for the islands without slack), island of every branch,
+                 local index of every branch
+        """
+        islands = split_into_islands(numeric_circuit=numerical_circuit,
+                                     ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
+
+        branch_island = np.full(numerical_circuit.nbr, -1, dtype=int)
+        branch_local_idx = np.full(numerical_circuit.nbr, -1, dtype=int)
+
+        contingency_islands = list()
+        for i, island in enumerate(islands):
+
+            if len(island.vd) == 0:
+                self.logger.append('There are no slack nodes in the island ' + str(i))
+                contingency_islands.append(None)
+                continue
+
+            res = single_island_pf(circuit=island,
+                                   Vbus=island.Vbus,
+                                   Sbus=island.Sbus,
+                                   Ibus=island.Ibus,
+                                   branch_rates=island.branch_rates,
+                                   options=self.pf_options,
+                                   logger=self.logger)
+
+            flows = res.Sbranch.real
+            rates = island.branch_rates + 1e-9
+            contingency_islands.append(ContingencyIsland(island, flows, rates, linear=linear))
+
+            br_idx = island.original_branch_idx
+            branch_island[br_idx] = i
+            branch_local_idx[br_idx] = np.arange(island.nbr)
+            results.base_flow[br_idx] = flows
+            results.base_loading[br_idx] = np.abs(flows) / rates
+
+        return contingency_islands, branch_island, branch_local_idx
+
+    def evaluate_contingencies(self, contingencies, contingency_islands, branch_island, branch_local_idx,
+                               results: ContingencyAnalysisResults, linear, update_top=True):
+        """
+        Evaluate a chunk of contingencies and store the results
+        The outages are split by island, since the islands are independent, the branches of the islands
+        without outages keep their base flows and are not considered.
+        :param contingencies: list of tuples of failed branch indices
+        :param contingency_islands: list of ContingencyIsland
+        :param branch_island: island of every branch
+        :param branch_local_idx: local index of every branch in its island
+        :param results: ContingencyAnalysisResults instance
+        :param linear: use the linear sensitivities? otherwise the AC power flow is used
+        :param update_top: merge the results into the top-n worst cases of every branch?
+        :return: contingency array, max loading, worst branch and islanding flag of every contingency
+        """
+        nc = len(contingencies)
+        contingency_arr = results.get_contingency_array(contingencies)
+        max_loading = np.zeros(nc)
+        worst_branch = np.zeros(nc, dtype=int)
+        islanding = np.zeros(nc, dtype=bool)
+        method = 'LODF' if linear else 'AC'
+
+        # split the outages by island
+        parts = dict()
+        for pos, contingency in enumerate(contingencies):
+            br = np.array(contingency, dtype=int)
+            for i in np.unique(branch_island[br]):
+                if i > -1 and contingency_islands[i] is not None:
+                    if i not in parts:
+                        parts[i] = (list(), list())
+                    parts[i][0].append(pos)
+                    parts[i][1].append(tuple(branch_local_idx[br[branch_island[br] == i]]))
+
+        for i, (pos, outages) in parts.items():
+            c_island = contingency_islands[i]
+            pos = np.array(pos, dtype=int)
+            original_idx = c_island.island.original_branch_idx
+
+            if linear:
+                post, isl = c_island.get_linear_flows(outages, self.options.islanding_tolerance)
+            elif self.pool is not None:
+                post, isl = self.get_ac_flows_parallel(c_island, outages)
+            else:
+                post, isl = c_island.get_ac_flows(outages, self.pf_options, self.logger)
+
+            loading = np.abs(post) / c_island.rates[:, np.newaxis]
+
+            worst = np.argmax(loading, axis=0)
+            mx = loading[worst, np.arange(len(pos))]
+            upd = mx > max_loading[pos]
+            max_loading[pos[upd]] = mx[upd]
+            worst_branch[pos[upd]] = original_idx[worst[upd]]
+            islanding[pos] |= isl
+
+            if update_top:
+                results.update_top(original_idx, post, loading, contingency_arr[pos])
+
+                # the N-1 contingencies give the OTDF rows of their failed branch
+                single = np.array([len(contingencies[p]) == 1 for p in pos], dtype=bool)
+                if single.any():
+                    failed = original_idx[[outages[j][0] for j in np.where(single)[0]]]
+                    results.set_otdf(failed, original_idx, post[:, single])
+
+            r, k = np.where(loading > self.options.screening_threshold)
+            results.add_violations(contingency_arr[pos[k]], original_idx[r], post[r, k], loading[r, k], method)
+
+        return contingency_arr, max_loading, worst_branch, islanding
+
+    def get_ac_flows_parallel(self, c_island: ContingencyIsland, outages):
+        """
+        Post-contingency flows computed with AC power flows, the outages are split among the pool processes
+        :param c_island: ContingencyIsland instance
+        :param outages: list of tuples of local indices of the failed branches
+        :return: flows (m, c), islanding flags (c)
+        """
+        n_parts = min(multiprocessing.cpu_count(), len(outages))
+        parts = [[outages[i] for i in idx] for idx in np.array_split(np.arange(len(outages)), n_parts)]
 
-                # store circuit results at the time index 't'
-                partial_results.set_at(it, res)
+        returns = self.pool.starmap(ac_contingencies_worker,
+                                    [(c_island.island, part, self.pf_options) for part in parts])
 
-            # merge the circuit's results
-            n_k_results.apply_from_island(partial_results, bus_original_idx, branch_original_idx,
-                                          calculation_input.original_time_idx, 'TS')
+        for post, isl, logger in returns:
+            self.logger += logger
 
-            k += 1
+        post = np.concatenate([r[0] for r in returns], axis=1)
+        islanding = np.concatenate([r[1] for r in returns])
 
-        return n_k_results
+        return post, islanding
 
-    def n_minus_k_mt(self, k=1, indices=None, vmin=200, states_number_limit=None):
+    def contingency_analysis(self, linear) -> ContingencyAnalysisResults:
         """
-        Run N-K simulation in series
-        :param k: Parameter level (1 for n-1, 2 for n-2, etc...)
-        :param indices: time indices {np.array([0])}
-        :param vmin: minimum nominal voltage to allow (filters out branches and buses below)
-        :param states_number_limit: limit the amount of states
-        :return: Nothing, saves a report
+        Contingency analysis streaming the N-k contingencies in chunks through the solver, the memory is bounded
+        by the chunk size and the results are accumulated incrementally.
+        In linear mode, the AC base case is solved once per island, the DC matrices are factorized once per island,
+        the contingencies are screened with the LODF and only the flagged ones (overloads over the threshold or
+        islanding) are verified with a full AC power flow.
+        :param linear: screen with the linear sensitivities? otherwise every contingency runs an AC power flow
+        :return: ContingencyAnalysisResults
         """
-        self.progress_text.emit("Filtering elements by voltage")
-
-        # filter branches
-        branch_names = list()
-        branch_index = list()
-        branches = list()  # list of filtered branches
-        for i, branch in enumerate(self.grid.lines):
-            if branch.bus_from.Vnom > vmin or branch.bus_to.Vnom > vmin:
-                branch_names.append(branch.name)
-                branch_index.append(i)
-                branches.append(branch)
-        branch_index = np.array(branch_index)
-
-        # filter buses
-        bus_names = list()
-        bus_index = list()
-        for i, bus in enumerate(self.grid.buses):
-            if bus.Vnom > vmin:
-                bus_names.append(bus.name)
-                bus_index.append(i)
-        bus_index = np.array(bus_index)
-
-        # get N-k states
-        self.progress_text.emit("Enumerating states")
-        states, failed_indices = enumerate_states_n_k(m=len(branch_names), k=k)
-
-        # limit states for memory reasons
-        if states_number_limit is not None:
-            states = states[:states_number_limit, :]
-            failed_indices = failed_indices[:states_number_limit]
-
-        # compile the multi-circuit
-        self.progress_text.emit("Compiling assets...")
-        self.progress_signal.emit(0)
-        numerical_circuit = self.grid.compile_time_series()
-
-        # if no base profile time is given, pick the base values
-        if indices is None:
-            time_indices = np.array([0])
-            numerical_circuit.set_base_profile()
-        else:
-            time_indices = indices
+        self.progress_text.emit('Compiling...')
+        self.progress_signal.emit(0.0)
 
-        # re-index the profile (this is essential for time-compatibility)
-        self.progress_signal.emit(100)
-        # construct the profile indices
-        profile_indices = np.tile(time_indices, len(states))
-        numerical_circuit.re_index_time(t_idx=profile_indices)
+        numerical_circuit = compile_snapshot_circuit(circuit=self.grid,
+                                                     apply_temperature=self.pf_options.apply_temperature_correction,
+                                                     branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
 
-        # set the branch states
-        numerical_circuit.branch_active_prof[:, branch_index] = np.tile(states, (len(time_indices), 1))
+        contingencies, n = self.get_contingencies(numerical_circuit, k=self.options.k)
 
-        # initialize the power flow
-        pf_options = PowerFlowOptions(solver_type=SolverType.LACPF)
+        max_k = self.options.k
+        if self.options.contingency_pairs is not None and len(self.options.contingency_pairs):
+            max_k = max(max_k, max(len(pair) for pair in self.options.contingency_pairs))
 
-        # initialize the grid time series results we will append the island results with another function
-        n = len(self.grid.buses)
-        m = self.circuit.get_branch_number()
-        nt = len(profile_indices)
+        results = ContingencyAnalysisResults(nbr=numerical_circuit.nbr,
+                                             branch_names=numerical_circuit.branch_names,
+                                             top_n=self.options.top_n,
+                                             max_k=max_k,
+                                             store_otdf=self.options.store_otdf)
 
-        n_k_results = NMinusKResults(n, m, nt, time_array=numerical_circuit.time_array, states=states)
+        self.branch_names = numerical_circuit.branch_names
 
-        # do the topological computation
-        self.progress_text.emit("Compiling topology...")
-        self.progress_signal.emit(0.0)
-        calc_inputs_dict = numerical_circuit.compute(ignore_single_node_islands=pf_options.ignore_single_node_islands)
+        self.progress_text.emit('Solving the base case...')
+        contingency_islands, branch_island, branch_local_idx = self.prepare_islands(numerical_circuit, results, linear)
 
-        n_k_results.bus_types = numerical_circuit.bus_types
+        self.progress_text.emit('Evaluating contingencies...')
+        flagged = list()
+        n_done = 0
+        for chunk in get_chunks(contingencies, self.options.chunk_size):
 
-        # for each partition of the profiles...
-        self.progress_text.emit("Simulating states...")
-        for t_key, calc_inputs in calc_inputs_dict.items():
+            if self.__cancel__:
+                return results
 
-            # For every island, run the time series
-            for island_index, calculation_input in enumerate(calc_inputs):
+            arr, max_loading, worst_branch, islanding = self.evaluate_contingencies(chunk,
+                                                                                    contingency_islands,
+                                                                                    branch_island,
+                                                                                    branch_local_idx,
+                                                                                    results,
+                                                                                    linear=linear)
 
-                # find the original indices
-                bus_original_idx = calculation_input.original_bus_idx
-                branch_original_idx = calculation_input.original_branch_idx
+            f = np.where((max_loading > self.options.screening_threshold) | islanding)[0]
+            results.add_summary(arr[f], max_loading[f], worst_branch[f], islanding[f], 'LODF' if linear else 'AC')
+            flagged += [chunk[i] for i in f]
 
-                # if there are valid profiles...
-                if self.grid.time_profile is not None:
+            results.n_contingencies += len(chunk)
+            n_done += len(chunk)
+            self.progress_signal.emit(n_done / max(n, 1) * 100.0)
 
-                    # declare a results object for the partition
-                    # nt = calculation_input.ntime
-                    nt = len(calculation_input.original_time_idx)
-                    n = calculation_input.nbus
-                    m = calculation_input.nbr
-                    partial_results = NMinusKResults(n, m, nt)
-                    last_voltage = calculation_input.Vbus
+        # AC verification of the flagged contingencies
+        if linear and self.options.ac_verification and len(flagged) > 0:
+            self.progress_text.emit('Verifying the flagged contingencies...')
 
-                    # traverse the time profiles of the partition and simulate each time step
-                    for it, t in enumerate(calculation_input.original_time_idx):
-                        self.progress_signal.emit(it / nt * 100.0)
+            n_done = 0
+            for chunk in get_chunks(flagged, self.options.chunk_size):
 
-                        # set the power values
-                        # if the storage dispatch option is active, the batteries power is not included
-                        # therefore, it shall be included after processing
-                        Ysh = calculation_input.Ysh_prof[:, it]
-                        I = calculation_input.Ibus_prof[:, it]
-                        S = calculation_input.Sbus_prof[:, it]
-                        branch_rates = calculation_input.branch_rates_prof[it, :]
+                if self.__cancel__:
+                    return results
 
-                        # run power flow at the circuit
-                        res = single_island_pf(circuit=calculation_input, Vbus=last_voltage, Sbus=S, Ibus=I,
-                                               branch_rates=branch_rates, options=pf_options, logger=self.logger)
+                arr, max_loading, worst_branch, islanding = self.evaluate_contingencies(chunk,
+                                                                                        contingency_islands,
+                                                                                        branch_island,
+                                                                                        branch_local_idx,
+                                                                                        results,
+                                                                                        linear=False,
+                                                                                        update_top=False)
 
-                        # Recycle voltage solution
-                        last_voltage = res.voltage
+                results.add_summary(arr, max_loading, worst_branch, islanding, 'AC')
 
-                        # store circuit results at the time index 't'
-                        partial_results.set_at(it, res)
+                n_done += len(chunk)
+                self.progress_signal.emit(n_done / len(flagged) * 100.0)
 
-                    # merge the circuit's results
+        return results
 
-                    n_k_results.apply_from_island(partial_results, bus_original_idx, branch_original_idx,
-                                                  calculation_input.original_time_idx, 'TS')
-                else:
-                    self.progress_text.emit('There are no profiles')
-                    self.logger.append('There are no profiles')
+    def n_minus_k(self):
+        """
+        Run the N-k contingency analysis with an AC power flow per contingency
+        :return: ContingencyAnalysisResults
+        """
+        return self.contingency_analysis(linear=False)
 
-        return n_k_results
+    def n_minus_k_linear(self):
+        """
+        Run the N-k contingency analysis with linear sensitivities (LODF) and AC verification
+        :return: ContingencyAnalysisResults
+        """
+        return self.contingency_analysis(linear=True)
 
     def run(self):
         """
@@ -461,39 +589,47 @@ class NMinusK(QThread):
         :return:
         """
         start = time.time()
-        if self.options.use_multi_threading:
-            self.results = self.n_minus_k_mt(k=1, indices=None, vmin=0, states_number_limit=None)
-
-        else:
-            self.results = self.n_minus_k(k=1, indices=None, vmin=0, states_number_limit=None)
 
-        self.progress_text.emit('Computing OTDF...')
-        if self.results is not None:
-            self.results.branch_names = np.array([b.name for b in self.grid.lines])
-            self.results.otdf = self.get_otdf(failure_flow_limit=1.0/100.0)
+        if self.options.use_multi_threading:
+            self.pool = multiprocessing.Pool()
+
+        try:
+            if self.options.linear_screening:
+                self.results = self.n_minus_k_linear()
+            else:
+                self.results = self.n_minus_k()
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
 
         end = time.time()
         self.elapsed = end - start
         self.progress_text.emit('Done!')
         self.done_signal.emit()
 
-    def get_otdf(self, failure_flow_limit=0.0):
+    def get_otdf(self):
         """
-        Outage Transfer Distribution Factors (OTDF)
+        Outage Transfer Distribution Factors (OTDF), the DC linear approximation (LODF) is used.
+        Beware that this is a dense (nbr, nbr) matrix.
         :return: OTDF matrix with the failures as rows
         """
-        if self.results is None:
-            return None
-        else:
-            p_branch = self.results.Sbranch.real
-            m = p_branch.shape[1]
-            otdf = np.zeros((m, m))
-            for i in range(m):
-                # (power of line_i at the base - power of line_i at the failure) / power of the failed line at the base
-                if abs(p_branch[0, i]) >= failure_flow_limit:
-                    otdf[i, :] = (p_branch[i + 1, :] - p_branch[0, :]) / (p_branch[0, i] + 1e-12)
+        numerical_circuit = compile_snapshot_circuit(circuit=self.grid,
+                                                     apply_temperature=self.pf_options.apply_temperature_correction,
+                                                     branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
+
+        islands = split_into_islands(numeric_circuit=numerical_circuit,
+                                     ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
+
+        otdf = np.zeros((numerical_circuit.nbr, numerical_circuit.nbr))
+        for island in islands:
+            if len(island.vd) > 0:
+                Bbus, Bf, A = make_dc_matrices(island)
+                LODF, islanding = make_lodf(Bbus, Bf, A, island.pqpv, tol=self.options.islanding_tolerance)
+                otdf[np.ix_(island.original_branch_idx, island.original_branch_idx)] = LODF.T
 
-            return otdf
+        return otdf
 
     def cancel(self):
         self.__cancel__ = True
@@ -501,33 +637,17 @@ class NMinusK(QThread):
 
 if __name__ == '__main__':
     import os
-    import pandas as pd
     from GridCal.Engine import FileOpen, SolverType
 
-    # fname = '/home/santi/Documentos/GitHub/GridCal/Grids_and_profiles/grids/Lynn 5 Bus pv.gridcal'
-    # fname = '/home/santi/Documentos/GitHub/GridCal/Grids_and_profiles/grids/IEEE39_1W.gridcal'
-    # fname = '/home/santi/Documentos/GitHub/GridCal/Grids_and_profiles/grids/grid_2_islands.xlsx'
-    # fname = '/home/santi/Documentos/GitHub/GridCal/Grids_and_profiles/grids/2869 Pegase.gridcal'
     fname = os.path.join('..', '..', '..', '..', '..', 'Grids_and_profiles', 'grids', 'IEEE 30 Bus with storage.xlsx')
-    # fname = os.path.join('..', '..', '..', '..', '..', 'Grids_and_profiles', 'grids', '2869 Pegase.gridcal')
 
     main_circuit = FileOpen(fname).open()
 
-    pf_options_ = PowerFlowOptions(solver_type=SolverType.LACPF)
-    options_ = NMinusKOptions(use_multi_threading=False)
+    pf_options_ = PowerFlowOptions(solver_type=SolverType.NR)
+    options_ = NMinusKOptions(use_multi_threading=False, linear_screening=True, k=2)
     simulation = NMinusK(grid=main_circuit, options=options_, pf_options=pf_options_)
     simulation.run()
 
-    otdf_ = simulation.get_otdf()
-
-    # save the result
-    br_names = [b.name for b in main_circuit.branches]
-    br_names2 = ['#' + b.name for b in main_circuit.branches]
-    w = pd.ExcelWriter('OTDF IEEE30.xlsx')
-    pd.DataFrame(data=simulation.results.Sbranch.real,
-                 columns=br_names,
-                 index=['base'] + br_names2).to_excel(w, sheet_name='branch power')
-    pd.DataFrame(data=otdf_,
-                 columns=br_names,
-                 index=br_names2).to_excel(w, sheet_name='OTDF')
-    w.save()
\ No newline at end of file
+    print('Evaluated contingencies:', simulation.results.n_contingencies)
+    print(simulation.results.get_summary_data_frame())
+    print(simulation.results.get_violations_data_frame())
@@ -398,3 +398,222 @@ class NMinusKResults(PowerFlowResults):
 
         else:
             return None
+
+
+class ContingencyAnalysisResults:
+
+    def __init__(self, nbr, branch_names, top_n=5, max_k=1, base_flow=None, base_loading=None, store_otdf=True):
+        """
+        Results of the contingency analysis, filled incrementally chunk by chunk so that the memory does not
+        depend on the number of contingencies: only the top-n worst loadings of every branch, the violations
+        and the flagged contingencies are kept.
+        :param nbr: number of branches
+        :param branch_names: array of branch names
+        :param top_n: number of worst contingencies to keep per branch
+        :param max_k: maximum number of failed branches per contingency
+        :param base_flow: pre-contingency branch active power (MW)
+        :param base_loading: pre-contingency branch loading (p.u.)
+        :param store_otdf: keep the dense (nbr, nbr) OTDF matrix of the N-1 contingencies?
+        """
+        self.name = 'Contingency analysis'
+
+        self.nbr = nbr
+
+        self.branch_names = np.array(branch_names)
+
+        self.top_n = top_n
+
+        self.max_k = max_k
+
+        self.base_flow = np.zeros(nbr) if base_flow is None else base_flow
+
+        self.base_loading = np.zeros(nbr) if base_loading is None else base_loading
+
+        # number of evaluated contingencies
+        self.n_contingencies = 0
+
+        # worst post-contingency loading (p.u.) and flow (MW) of every branch, sorted in descending order
+        self.top_loading = np.zeros((nbr, top_n))
+        self.top_flow = np.zeros((nbr, top_n))
+
+        # failed branches of the worst contingencies of every branch (padded with -1)
+        self.top_contingency = np.full((nbr, top_n, max_k), -1, dtype=int)
+
+        # rows of the violations table: (failed branches, branch, flow, loading, method)
+        self.violations = list()
+
+        # rows of the flagged contingencies table: (failed branches, max loading, worst branch, islanding, method)
+        self.summary = list()
+
+        # Outage Transfer Distribution Factors of the N-1 contingencies, with the failures as rows
+        self.otdf = np.zeros((nbr, nbr)) if store_otdf else None
+
+        self.available_results = [ResultTypes.ContingencyMaxLoading,
+                                  ResultTypes.ContingencyWorstCases,
+                                  ResultTypes.ContingencyViolations]
+
+        if store_otdf:
+            self.available_results.append(ResultTypes.OTDF)
+
+    def get_contingency_array(self, contingencies):
+        """
+        Pack a list of contingencies in an array
+        :param contingencies: list of tuples of failed branch indices
+        :return: integer array (len(contingencies), max_k) padded with -1
+        """
+        arr = np.full((len(contingencies), self.max_k), -1, dtype=int)
+        for i, c in enumerate(contingencies):
+            arr[i, :len(c)] = c
+        return arr
+
+    def get_contingency_name(self, failed):
+        """
+        Name of a contingency
+        :param failed: array of failed branch indices (padded with -1)
+        :return: string
+        """
+        return ' & '.join(str(self.branch_names[i]) for i in failed if i > -1)
+
+    def update_top(self, br_idx, flows, loading, contingencies):
+        """
+        Merge the post-contingency loading of a chunk of contingencies into the top-n worst cases
+        :param br_idx: indices of the branches (m)
+        :param flows: post-contingency flows (m, c)
+        :param loading: post-contingency loading (m, c)
+        :param contingencies: contingency array of the chunk (c, max_k)
+        """
+        nc = loading.shape[1]
+
+        all_loading = np.c_[self.top_loading[br_idx, :], loading]
+        all_flow = np.c_[self.top_flow[br_idx, :], flows]
+
+        idx = np.argsort(-all_loading, axis=1, kind='stable')[:, :self.top_n]
+        rows = np.arange(len(br_idx))[:, np.newaxis]
+
+        # contingency of every candidate column: the current ones, then the ones of the chunk
+        cont = np.concatenate((self.top_contingency[br_idx, :, :],
+                               np.broadcast_to(contingencies, (len(br_idx), nc, self.max_k))), axis=1)
+
+        self.top_loading[br_idx, :] = all_loading[rows, idx]
+        self.top_flow[br_idx, :] = all_flow[rows, idx]
+        self.top_contingency[br_idx, :, :] = cont[rows, idx, :]
+
+    def add_violations(self, contingencies, br_idx, flows, loading, method):
+        """
+        Register the overloaded branches
+        :param contingencies: contingency array row of each violation
+        :param br_idx: indices of the overloaded branches
+        :param flows: post-contingency flows of the overloaded branches (MW)
+        :param loading: post-contingency loading of the overloaded branches (p.u.)
+        :param method: 'LODF' or 'AC'
+        """
+        for c, i, f, l in zip(contingencies, br_idx, flows, loading):
+            self.violations.append((tuple(c), i, f, l, method))
+
+    def add_summary(self, contingencies, max_loading, worst_branch, islanding, method):
+        """
+        Register the flagged contingencies
+        :param contingencies: contingency array rows
+        :param max_loading: maximum post-contingency loading (p.u.)
+        :param worst_branch: index of the most loaded branch
+        :param islanding: does the contingency split the grid?
+        :param method: 'LODF' or 'AC'
+        """
+        for c, l, i, isl in zip(contingencies, max_loading, worst_branch, islanding):
+            self.summary.append((tuple(c), l, i, isl, method))
+
+    def set_otdf(self, failed, br_idx, flows, failure_flow_limit=1e-2):
+        """
+        Set the OTDF rows of N-1 contingencies from their post-contingency flows:
+        (flow of the branch after the failure - base flow of the branch) / base flow of the failed branch
+        :param failed: indices of the failed branch of every contingency (c)
+        :param br_idx: indices of the branches of the flows (m)
+        :param flows: post-contingency flows (m, c)
+        :param failure_flow_limit: base flow (MW) of the failed branch under which its row is left as zero
+        """
+        if self.otdf is None:
+            return
+
+        base = self.base_flow[failed]
+        ok = np.abs(base) >= failure_flow_limit
+        delta = flows[:, ok] - self.base_flow[br_idx][:, np.newaxis]
+        self.otdf[np.ix_(failed[ok], br_idx)] = (delta / base[ok]).T
+
+    def get_violations_data_frame(self):
+        """
+        Get the table of post-contingency overloads
+        :return: DataFrame
+        """
+        cols = ['Contingency', 'Branch', 'Base flow (MW)', 'Flow (MW)', 'Loading (%)', 'Method']
+        data = [(self.get_contingency_name(c), self.branch_names[i], self.base_flow[i], f, l * 100.0, method)
+                for c, i, f, l, method in self.violations]
+        return pd.DataFrame(data=data, columns=cols)
+
+    def get_summary_data_frame(self):
+        """
+        Get the table of flagged contingencies
+        :return: DataFrame
+        """
+        cols = ['Contingency', 'Max loading (%)', 'Worst branch', 'Islanding', 'Method']
+        data = [(self.get_contingency_name(c), l * 100.0, self.branch_names[i], isl, method)
+                for c, l, i, isl, method in self.summary]
+        return pd.DataFrame(data=data, columns=cols)
+
+    def get_top_data_frame(self):
+        """
+        Get the table of the worst contingencies of every branch
+        :return: DataFrame
+        """
+        data = dict()
+        for j in range(self.top_n):
+            data['Contingency ' + str(j + 1)] = [self.get_contingency_name(c) for c in self.top_contingency[:, j, :]]
+            data['Loading ' + str(j + 1) + ' (%)'] = self.top_loading[:, j] * 100.0
+        return pd.DataFrame(data=data, index=self.branch_names)
+
+    def mdl(self, result_type: ResultTypes, indices=None, names=None) -> "ResultsModel":
+        """
+        Get the results model
+        :param result_type: ResultTypes
+        :param indices: indices of the branches to show
+        :param names: not used, kept for compatibility
+        :return: ResultsModel
+        """
+        if indices is None:
+            indices = np.arange(self.nbr)
+
+        if result_type == ResultTypes.ContingencyMaxLoading:
+            data = np.c_[self.base_loading[indices], self.top_loading[indices, :]] * 100.0
+            columns = ['Base'] + ['Top ' + str(j + 1) for j in range(self.top_n)]
+            index = self.branch_names[indices]
+            y_label = '(%)'
+            title = result_type.value[0]
+
+        elif result_type == ResultTypes.ContingencyWorstCases:
+            df = self.get_top_data_frame().iloc[indices]
+            data = df.values
+            columns = df.columns.values
+            index = df.index.values
+            y_label = ''
+            title = result_type.value[0]
+
+        elif result_type == ResultTypes.ContingencyViolations:
+            df = self.get_violations_data_frame()
+            data = df.values
+            columns = df.columns.values
+            index = df.index.values
+            y_label = ''
+            title = result_type.value[0]
+
+        elif result_type == ResultTypes.OTDF:
+            data = self.otdf[indices, :]
+            columns = self.branch_names
+            index = self.branch_names[indices]
+            y_label = '(p.u.)'
+            title = result_type.value[0]
+
+        else:
+            raise Exception('Result type not understood:' + str(result_type))
+
+        # assemble model
+        mdl = ResultsModel(data=data, index=index, columns=columns, title=title, ylabel=y_label)
+        return mdl
@@ -22,6 +22,7 @@ from GridCal.Engine.basic_structures import MIPSolvers
 from GridCal.Engine.Core.time_series_opf_data import OpfTimeCircuit, split_opf_time_circuit_into_islands
 
 from GridCal.ThirdParty.pulp import *
+import scipy.sparse as sp
 
 
 def get_objective_function(Pg, Pb, LSlack, FSlack1, FSlack2,
@@ -355,6 +356,236 @@ class OpfDcTimeSeries(OpfTimeSeries):
         return problem
 
 
+
+def get_time_kron_triplets(M, var_idx, nt, scale=1.0):
+    """
+    Get the COO triplets of the block (M ⊗ I_nt) applied to a block of variables
+    :param M: sparse matrix (k, d) relating the restrictions with the devices
+    :param var_idx: array of variable indices (d, nt)
+    :param nt: number of time steps
+    :param scale: factor applied to the coefficients
+    :return: local rows (k * nt, ordered as restriction * nt + t), variable indices, coefficients
+    """
+    K = sp.kron(sp.csr_matrix(M), sp.identity(nt, format='csr'), format='coo')
+    return K.row, var_idx.ravel()[K.col], K.data * scale
+
+
+class OpfDcTimeSeriesSparse(OpfTimeSeries):
+
+    def __init__(self, numerical_circuit: OpfTimeCircuit, start_idx, end_idx, solver: MIPSolvers = MIPSolvers.CBC,
+                 batteries_energy_0=None, in_process=False):
+        """
+        DC time series linear optimal power flow assembled directly as sparse matrices.
+        This is the same problem as OpfDcTimeSeries without creating PuLP objects.
+        :param numerical_circuit: NumericalCircuit instance
+        :param start_idx: start index of the time series
+        :param end_idx: end index of the time series
+        :param solver: MIP solver to use (only CBC is supported through MPS files)
+        :param batteries_energy_0: initial state of the batteries, if None the default values are taken
+        :param in_process: solve with scipy's HiGHS interface instead of an external solver
+        """
+        OpfTimeSeries.__init__(self, numerical_circuit=numerical_circuit, start_idx=start_idx, end_idx=end_idx,
+                               solver=solver)
+
+        self.in_process = in_process
+
+        self.Bseries = None
+
+        # build the formulation
+        self.problem = self.formulate(batteries_energy_0=batteries_energy_0)
+
+    def formulate(self, batteries_energy_0=None):
+        """
+        Formulate the DC OPF time series in the non-sequential fashion (all to the solver at once)
+        :param batteries_energy_0: initial energy state of the batteries (if none, the default is taken)
+        :return: LpSparseProblem instance
+        """
+
+        # general indices
+        n = self.numerical_circuit.nbus
+        m = self.numerical_circuit.nbr
+        ng = self.numerical_circuit.ngen
+        nb = self.numerical_circuit.nbatt
+        nl = self.numerical_circuit.nload
+        nt = self.end_idx - self.start_idx
+        a = self.start_idx
+        b = self.end_idx
+        Sbase = self.numerical_circuit.Sbase
+
+        # battery
+        Capacity = self.numerical_circuit.battery_enom / Sbase
+        minSoC = self.numerical_circuit.battery_min_soc
+        maxSoC = self.numerical_circuit.battery_max_soc
+        if batteries_energy_0 is None:
+            SoC0 = self.numerical_circuit.battery_soc_0
+        else:
+            SoC0 = (batteries_energy_0 / Sbase) / Capacity
+        Pb_max = self.numerical_circuit.battery_pmax / Sbase
+        Pb_min = self.numerical_circuit.battery_pmin / Sbase
+        Efficiency = (self.numerical_circuit.battery_discharge_efficiency + self.numerical_circuit.battery_charge_efficiency) / 2.0
+        cost_b = self.numerical_circuit.battery_cost[a:b, :].transpose()
+
+        # generator
+        Pg_max = self.numerical_circuit.generator_pmax / Sbase
+        Pg_min = self.numerical_circuit.generator_pmin / Sbase
+        P_profile = self.numerical_circuit.generator_p[a:b, :].transpose() / Sbase
+        cost_g = self.numerical_circuit.generator_cost[a:b, :].transpose()
+        enabled_for_dispatch = self.numerical_circuit.generator_dispatchable
+
+        # load
+        Pl = (self.numerical_circuit.load_active[a:b, :] * self.numerical_circuit.load_s.real[a:b, :]).transpose() / Sbase
+        cost_l = self.numerical_circuit.load_cost[a:b, :].transpose()
+
+        # branch
+        branch_ratings = self.numerical_circuit.branch_rates[a:b, :].transpose() / Sbase
+        Bseries = (self.numerical_circuit.branch_active[a:b, :] * (
+                    1 / (self.numerical_circuit.branch_R + 1j * self.numerical_circuit.branch_X))).imag.transpose()
+        cost_br = self.numerical_circuit.branch_cost[a:b, :].transpose()
+
+        # Compute time delta in hours
+        dt = np.zeros(nt)  # here nt = end_idx - start_idx
+        for t in range(1, nt):
+            dt[t - 1] = (self.numerical_circuit.time_array[a + t] - self.numerical_circuit.time_array[a + t - 1]).seconds / 3600
+
+        # declare problem
+        problem = LpSparseProblem(name='DC_OPF_Time_Series')
+
+        # create LP variables (arrays of variable indices)
+        Pg = problem.add_variables(shape=(ng, nt), lower=Pg_min, upper=Pg_max)
+        Pb = problem.add_variables(shape=(nb, nt), lower=Pb_min, upper=Pb_max)
+        E = problem.add_variables(shape=(nb, nt), lower=Capacity * minSoC, upper=Capacity * maxSoC)
+        load_slack = problem.add_variables(shape=(nl, nt), lower=0, upper=None)
+        theta = problem.add_variables(shape=(n, nt), lower=-3.14, upper=3.14)
+        branch_rating_slack1 = problem.add_variables(shape=(m, nt), lower=0, upper=None)
+        branch_rating_slack2 = problem.add_variables(shape=(m, nt), lower=0, upper=None)
+
+        # add the objective function
+        problem.add_cost(Pg, cost_g)
+        problem.add_cost(Pb, cost_b)
+        problem.add_cost(load_slack, cost_l)
+        problem.add_cost(branch_rating_slack1, cost_br)
+        problem.add_cost(branch_rating_slack2, cost_br)
+
+        # set the fixed generation values
+        idx = np.where(enabled_for_dispatch == False)[0]
+        problem.fix_variables(Pg[idx, :], P_profile[idx, :])
+
+        # nodal power balance: B theta - Cg Pg - Cb Pb - Cl LSlack = - Cl Pl
+        nodal_restrictions = np.full((n, nt), -1, dtype=int)
+        Pl_bus = self.numerical_circuit.C_bus_load * Pl
+        for i, calc_inpt in enumerate(split_opf_time_circuit_into_islands(self.numerical_circuit)):
+
+            bus_idx = np.array(calc_inpt.original_bus_idx)
+
+            blocks = [get_time_kron_triplets(calc_inpt.Ybus.imag, theta[bus_idx, :], nt),
+                      get_time_kron_triplets(self.numerical_circuit.C_bus_gen[bus_idx, :], Pg, nt, -1.0),
+                      get_time_kron_triplets(self.numerical_circuit.C_bus_batt[bus_idx, :], Pb, nt, -1.0),
+                      get_time_kron_triplets(self.numerical_circuit.C_bus_load[bus_idx, :], load_slack, nt, -1.0)]
+
+            rows = problem.add_restrictions(rows=np.concatenate([blk[0] for blk in blocks]),
+                                            cols=np.concatenate([blk[1] for blk in blocks]),
+                                            vals=np.concatenate([blk[2] for blk in blocks]),
+                                            rhs=-Pl_bus[bus_idx, :],
+                                            op='=')
+            nodal_restrictions[bus_idx, :] = rows.reshape((len(bus_idx), nt))
+
+            # slack angles equal to zero
+            problem.fix_variables(theta[bus_idx[calc_inpt.vd], :], 0.0)
+
+        # branch loading restrictions: Bseries (theta_f - theta_t) - FSlack <= Fmax (in both senses)
+        Bs = Bseries.ravel()
+        theta_f = theta[self.numerical_circuit.F, :].ravel()
+        theta_t = theta[self.numerical_circuit.T, :].ravel()
+        r = np.arange(m * nt)
+        for th1, th2, slack in [(theta_f, theta_t, branch_rating_slack1), (theta_t, theta_f, branch_rating_slack2)]:
+            problem.add_restrictions(rows=np.r_[r, r, r],
+                                     cols=np.r_[th1, th2, slack.ravel()],
+                                     vals=np.r_[Bs, -Bs, -np.ones(m * nt)],
+                                     rhs=branch_ratings,
+                                     op='<=')
+
+        # if there are batteries, add the batteries
+        if nb > 0:
+            # set the initial state of charge
+            problem.fix_variables(E[:, 0], SoC0 * Capacity)
+
+            # set the energy values for t=1:nt: E(t) - E(t-1) + dt * Pb(t) / eff = 0
+            if nt > 1:
+                r = np.arange(nb * (nt - 1))
+                coeff = dt[np.newaxis, :nt - 1] / Efficiency[:, np.newaxis]
+                problem.add_restrictions(rows=np.r_[r, r, r],
+                                         cols=np.r_[E[:, 1:].ravel(), E[:, :-1].ravel(), Pb[:, 1:].ravel()],
+                                         vals=np.r_[np.ones(len(r)), -np.ones(len(r)), coeff.ravel()],
+                                         rhs=np.zeros(len(r)),
+                                         op='=')
+
+        # Assign variables to keep
+        # transpose them to be in the format of GridCal: time, device
+        self.theta = theta.transpose()
+        self.Pg = Pg.transpose()
+        self.Pb = Pb.transpose()
+        self.Pl = Pl.transpose()
+        self.E = E.transpose()
+        self.load_shedding = load_slack.transpose()
+        self.overloads = (branch_rating_slack1, branch_rating_slack2)
+        self.rating = branch_ratings.T
+        self.nodal_restrictions = nodal_restrictions
+        self.Bseries = Bseries
+
+        return problem
+
+    def solve(self, msg=False):
+        """
+        Solve the problem and compute the derived magnitudes
+        :param msg: show the solver output
+        :return: status string
+        """
+        if self.in_process:
+            status = self.problem.solve_linprog()
+
+        elif self.solver == MIPSolvers.CBC:
+            status = self.problem.solve_cbc(msg=msg, fracGap=0.00001, threads=self.threads)
+
+        else:
+            raise Exception('Solver not supported by the sparse formulation! ' + str(self.solver))
+
+        x = self.problem.x
+        theta = x[self.theta.T]
+        self.s_from = (self.Bseries * (theta[self.numerical_circuit.F, :] - theta[self.numerical_circuit.T, :])).T
+        self.s_to = -self.s_from
+        if isinstance(self.overloads, tuple):
+            self.overloads = (x[self.overloads[0]] + x[self.overloads[1]]).T
+
+        return LpStatus[status]
+
+    def extract2D(self, arr, make_abs=False):
+        """
+        Extract the values of a 2D array of variable indices (numeric arrays are returned as they are)
+        :param arr: 2D array of variable indices or values
+        :param make_abs: substitute the result by its abs value
+        :return: 2D numpy array
+        """
+        if arr.dtype.kind in 'iu':
+            val = self.problem.x[arr]
+        else:
+            val = np.array(arr, dtype=float)
+
+        if make_abs:
+            val = np.abs(val)
+
+        return val
+
+    def get_shadow_prices(self):
+        """
+        Extract the nodal prices from the duals of the nodal power balance restrictions
+        :return: 2D numpy array (time, bus)
+        """
+        val = np.zeros(self.nodal_restrictions.shape)
+        mask = self.nodal_restrictions >= 0
+        val[mask] = - self.problem.duals[self.nodal_restrictions[mask]]
+        return val.transpose()
+
+
 if __name__ == '__main__':
 
     from GridCal.Engine import *
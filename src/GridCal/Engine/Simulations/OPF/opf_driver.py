@@ -39,7 +39,8 @@ class OptimalPowerFlowOptions:
                  grouping: TimeGrouping = TimeGrouping.NoGrouping,
                  mip_solver=MIPSolvers.CBC,
                  faster_less_accurate=False,
-                 power_flow_options=None, bus_types=None):
+                 power_flow_options=None, bus_types=None,
+                 sparse_formulation=False, in_process_solver=False, parallel_groups=False, overlap_steps=0):
         """
         Optimal power flow options
         :param verbose:
@@ -49,6 +50,13 @@ class OptimalPowerFlowOptions:
         :param faster_less_accurate:
         :param power_flow_options:
         :param bus_types:
+        :param sparse_formulation: assemble the DC OPF time series directly as sparse matrices
+        :param in_process_solver: solve the sparse formulation with scipy (HiGHS) instead of an external solver
+        :param parallel_groups: solve the time groups in parallel in a process pool
+                                (the groups with batteries are coupled and run sequentially unless overlap_steps > 0)
+        :param overlap_steps: time steps solved before every parallel group with batteries, starting from the
+                              default state of charge, to approximate the state of charge at the start of the group
+                              (these leading steps are discarded)
         """
         self.verbose = verbose
 
@@ -64,6 +72,14 @@ class OptimalPowerFlowOptions:
 
         self.bus_types = bus_types
 
+        self.sparse_formulation = sparse_formulation
+
+        self.in_process_solver = in_process_solver
+
+        self.parallel_groups = parallel_groups
+
+        self.overlap_steps = overlap_steps
+
 
 class OptimalPowerFlow(QThread):
     progress_signal = Signal(float)
@@ -184,6 +184,9 @@ class OpfTimeSeries:
         self.end_idx = end_idx
         self.solver = solver
 
+        # number of threads of the solver (None: solver default)
+        self.threads = None
+
         self.theta = None
         self.Pg = None
         self.Pb = None
@@ -196,7 +199,8 @@ class OpfTimeSeries:
         self.load_shedding = None
         self.nodal_restrictions = None
 
-        self.problem = self.formulate()
+        # the problem is formulated by the derived classes (they need extra arguments)
+        self.problem = None
 
     def formulate(self):
         """
@@ -215,7 +219,7 @@ class OpfTimeSeries:
         """
 
         if self.solver == MIPSolvers.CBC:
-            params = PULP_CBC_CMD(fracGap=0.00001, threads=None, msg=msg)
+            params = PULP_CBC_CMD(fracGap=0.00001, threads=self.threads, msg=msg)
 
         elif self.solver == MIPSolvers.SCIP:
             params = SCIP_CMD(msg=msg)
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
 import pandas as pd
 import time
 from PySide2.QtCore import QThread, Signal
@@ -22,13 +23,108 @@ from GridCal.Engine.basic_structures import TimeGrouping, get_time_groups
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import SolverType
 from GridCal.Engine.Simulations.OPF.opf_driver import OptimalPowerFlowOptions
-from GridCal.Engine.Simulations.OPF.dc_opf_ts import OpfDcTimeSeries
+from GridCal.Engine.Simulations.OPF.dc_opf_ts import OpfDcTimeSeries, OpfDcTimeSeriesSparse
 from GridCal.Engine.Simulations.OPF.ac_opf_ts import OpfAcTimeSeries
 from GridCal.Engine.Simulations.OPF.simple_dispatch_ts import OpfSimpleTimeSeries
 from GridCal.Engine.Core.time_series_opf_data import compile_opf_time_circuit
 from GridCal.Engine.Simulations.OPF.opf_ts_results import OptimalPowerFlowTimeSeriesResults
 
 
+def get_opf_time_series_problem(numerical_circuit, options: OptimalPowerFlowOptions, start_, end_,
+                                batteries_energy_0=None):
+    """
+    Formulate the time series OPF problem of an interval (Simple_OPF excluded, it is not formulated)
+    :param numerical_circuit: OpfTimeCircuit instance
+    :param options: OptimalPowerFlowOptions instance
+    :param start_: start index
+    :param end_: end index (not included)
+    :param batteries_energy_0: initial state of the batteries, if None the default values are taken
+    :return: OpfTimeSeries derived instance or None if the solver is not supported
+    """
+    if options.solver == SolverType.DC_OPF and options.sparse_formulation:
+
+        # DC optimal power flow assembled as sparse matrices
+        return OpfDcTimeSeriesSparse(numerical_circuit=numerical_circuit,
+                                     start_idx=start_,
+                                     end_idx=end_,
+                                     solver=options.mip_solver,
+                                     batteries_energy_0=batteries_energy_0,
+                                     in_process=options.in_process_solver)
+
+    elif options.solver == SolverType.DC_OPF:
+
+        # DC optimal power flow
+        return OpfDcTimeSeries(numerical_circuit=numerical_circuit,
+                               start_idx=start_,
+                               end_idx=end_,
+                               solver=options.mip_solver,
+                               batteries_energy_0=batteries_energy_0)
+
+    elif options.solver == SolverType.AC_OPF:
+
+        # AC optimal power flow
+        return OpfAcTimeSeries(numerical_circuit=numerical_circuit,
+                               start_idx=start_,
+                               end_idx=end_,
+                               solver=options.mip_solver,
+                               batteries_energy_0=batteries_energy_0)
+
+    else:
+        return None
+
+
+def get_opf_time_series_solution(problem, skip=0):
+    """
+    Get the results of a solved time series OPF problem
+    :param problem: OpfTimeSeries derived instance (solved)
+    :param skip: number of leading time steps to discard (they only set the initial state of the batteries)
+    :return: dictionary of (time, device) arrays
+    """
+    return {'voltage': problem.get_voltage()[skip:, :],
+            'load_shedding': problem.get_load_shedding()[skip:, :],
+            'battery_power': problem.get_battery_power()[skip:, :],
+            'battery_energy': problem.get_battery_energy()[skip:, :],
+            'generator_power': problem.get_generator_power()[skip:, :],
+            'Sbranch': problem.get_branch_power()[skip:, :],
+            'overloads': problem.get_overloads()[skip:, :],
+            'loading': problem.get_loading()[skip:, :],
+            'shadow_prices': problem.get_shadow_prices()[skip:, :]}
+
+
+# circuit of the OPF worker processes (set once per process by the pool initializer)
+_opf_worker_circuit = None
+
+
+def opf_group_worker_init(numerical_circuit):
+    """
+    Process pool initializer: keep the numerical circuit in the worker process
+    :param numerical_circuit: OpfTimeCircuit instance
+    """
+    global _opf_worker_circuit
+    _opf_worker_circuit = numerical_circuit
+
+
+def opf_group_worker(options: OptimalPowerFlowOptions, start_, end_, threads, run_start=None):
+    """
+    Process pool worker that solves the OPF of one time group
+    :param options: OptimalPowerFlowOptions instance
+    :param start_: start index
+    :param end_: end index (not included)
+    :param threads: number of solver threads
+    :param run_start: first time index of the formulation (run_start < start_ with an overlapping horizon,
+                      the leading steps are discarded), if None start_ is taken
+    :return: start_, end_, dictionary of results, status
+    """
+    if run_start is None:
+        run_start = start_
+
+    problem = get_opf_time_series_problem(_opf_worker_circuit, options, run_start, end_)
+    problem.threads = threads
+    status = problem.solve()
+
+    return start_, end_, get_opf_time_series_solution(problem, skip=start_ - run_start), status
+
+
 class OptimalPowerFlowTimeSeries(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
@@ -88,6 +184,8 @@ class OptimalPowerFlowTimeSeries(QThread):
 
         self.elapsed = 0.0
 
+        self.pool = None
+
     def reset_results(self):
         """
         Clears the results
@@ -113,39 +211,25 @@ class OptimalPowerFlowTimeSeries(QThread):
         """
         return [l.strftime('%d-%m-%Y %H:%M') for l in pd.to_datetime(self.grid.time_profile)]
 
-    def opf(self, start_, end_, remote=False, batteries_energy_0=None):
+    def opf(self, start_, end_, remote=False, batteries_energy_0=None, results_start=None):
         """
         Run a power flow for every circuit
         :param start_: start index
         :param end_: end index
         :param remote: is this function being called from the time series?
         :param batteries_energy_0: initial state of the batteries, if None the default values are taken
+        :param results_start: first time index stored in the results, if None start_ is taken
+                              (the leading steps only set the initial state of the batteries)
         :return: OptimalPowerFlowResults object
         """
+        if results_start is None:
+            results_start = start_
 
         if not remote:
             self.progress_signal.emit(0.0)
             self.progress_text.emit('Formulating problem...')
 
-        if self.options.solver == SolverType.DC_OPF:
-
-            # DC optimal power flow
-            problem = OpfDcTimeSeries(numerical_circuit=self.numerical_circuit,
-                                      start_idx=start_,
-                                      end_idx=end_,
-                                      solver=self.options.mip_solver,
-                                      batteries_energy_0=batteries_energy_0)
-
-        elif self.options.solver == SolverType.AC_OPF:
-
-            # AC optimal power flow
-            problem = OpfAcTimeSeries(numerical_circuit=self.numerical_circuit,
-                                      start_idx=start_,
-                                      end_idx=end_,
-                                      solver=self.options.mip_solver,
-                                      batteries_energy_0=batteries_energy_0)
-
-        elif self.options.solver == SolverType.Simple_OPF:
+        if self.options.solver == SolverType.Simple_OPF:
 
             # AC optimal power flow
             problem = OpfSimpleTimeSeries(numerical_circuit=self.numerical_circuit,
@@ -156,6 +240,10 @@ class OptimalPowerFlowTimeSeries(QThread):
                                           prog_func=self.progress_signal.emit)
 
         else:
+            problem = get_opf_time_series_problem(self.numerical_circuit, self.options, start_, end_,
+                                                  batteries_energy_0=batteries_energy_0)
+
+        if problem is None:
             self.logger.append('Solver not supported in this mode: ' + str(self.options.solver))
             return
 
@@ -165,55 +253,147 @@ class OptimalPowerFlowTimeSeries(QThread):
 
         # solve the problem
         status = problem.solve()
-        print("Status:", status)
-
-        a = start_
-        b = end_
-        self.results.voltage[a:b, :] = problem.get_voltage()
-        self.results.load_shedding[a:b, :] = problem.get_load_shedding()
-        self.results.battery_power[a:b, :] = problem.get_battery_power()
-        self.results.battery_energy[a:b, :] = problem.get_battery_energy()
-        self.results.generator_power[a:b, :] = problem.get_generator_power()
-        self.results.Sbranch[a:b, :] = problem.get_branch_power()
-        self.results.overloads[a:b, :] = problem.get_overloads()
-        self.results.loading[a:b, :] = problem.get_loading()
-        self.results.shadow_prices[a:b, :] = problem.get_shadow_prices()
+
+        self.set_results(results_start, end_, get_opf_time_series_solution(problem, skip=results_start - start_))
+        self.set_status(results_start, end_, status)
 
         return self.results
 
-    def opf_by_groups(self):
+    def set_results(self, start_, end_, solution):
         """
-        Run the OPF by groups
+        Write the solution of a time interval in place into the results matrices
+        :param start_: start index
+        :param end_: end index (not included)
+        :param solution: dictionary of (time, device) arrays (see get_opf_time_series_solution)
         """
+        for name, values in solution.items():
+            getattr(self.results, name)[start_:end_, :] = values
 
-        self.progress_signal.emit(0.0)
-        self.progress_text.emit('Making groups...')
+    def set_status(self, start_, end_, status):
+        """
+        Store the convergence of a time interval from the status of its solution and log the intervals
+        that were not solved to optimality
+        :param start_: start index
+        :param end_: end index (not included)
+        :param status: solution status string (LpStatus), None if the problem does not report it
+        """
+        if status is None:
+            return
+
+        self.results.converged[start_:end_] = status == 'Optimal'
 
+        if status != 'Optimal':
+            self.logger.append('The OPF of the time steps ' + str(start_) + ' to ' + str(end_ - 1) +
+                               ' is ' + str(status))
+
+    def get_group_intervals(self):
+        """
+        Get the time groups within the start:end boundaries
+        :return: list of (start, end) indices, the end is the first index of the next group (not included)
+        """
         # get the partition points of the time series
         groups = get_time_groups(t_array=self.grid.time_profile, grouping=self.options.grouping)
 
-        n = len(groups)
-        i = 1
-        energy_0 = None
-        while i < n and not self.__cancel__:
-
+        intervals = list()
+        for i in range(1, len(groups)):
             start_ = groups[i - 1]
             end_ = groups[i]
+            if start_ >= self.start_ and end_ <= self.end_:
+                intervals.append((start_, end_))
 
-            print(start_, ':', end_, ' [', end_ - start_, ']')
+        # the last group includes the last time step
+        if len(intervals) and intervals[-1][1] == len(self.grid.time_profile) - 1:
+            intervals[-1] = (intervals[-1][0], intervals[-1][1] + 1)
 
-            if start_ >= self.start_ and end_ <= self.end_:
+        return intervals
 
-                # run an opf for the group interval only if the group is within the start:end boundaries
-                self.opf(start_=start_, end_=end_ + 1, remote=True, batteries_energy_0=energy_0)
+    def opf_by_groups(self):
+        """
+        Run the OPF by groups.
+        With batteries, every group is formulated from the last time step of the previous group, whose energy
+        is fixed, so that the state of charge is continuous across the group boundaries (that step is discarded).
+        """
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Making groups...')
+
+        intervals = self.get_group_intervals()
+        has_batteries = self.numerical_circuit.nbatt > 0
+
+        previous_end = None
+        for i, (start_, end_) in enumerate(intervals):
+
+            if self.__cancel__:
+                break
+
+            self.progress_text.emit('Running OPF for the time group ' + str(i + 1) + ' in external solver...')
+
+            if has_batteries and previous_end == start_:
+                # chain the state of charge of the previous group
+                run_start = start_ - 1
+                energy_0 = self.results.battery_energy[run_start, :]
+            else:
+                run_start = start_
+                energy_0 = None
+
+            self.opf(start_=run_start, end_=end_, remote=True, batteries_energy_0=energy_0, results_start=start_)
 
-            energy_0 = self.results.battery_energy[end_ - 1, :]
+            previous_end = end_
 
-            self.progress_text.emit('Running OPF for the time group ' + str(i) + ' in external solver...')
-            progress = ((start_ - self.start_ + 1) / (self.end_ - self.start_)) * 100
+            progress = ((end_ - self.start_) / (self.end_ - self.start_)) * 100
             self.progress_signal.emit(progress)
 
-            i += 1
+    def opf_by_groups_parallel(self):
+        """
+        Run the OPF of the time groups in parallel in a process pool.
+        The groups are only independent without batteries. With batteries, every group is formulated with
+        options.overlap_steps extra leading steps that start from the default state of charge (overlapping horizon),
+        so the state of charge at the start of the group is approximated and the groups are independent again;
+        without overlap the state of charge is chained from one group to the next and the groups run sequentially.
+        """
+        has_batteries = self.numerical_circuit.nbatt > 0
+        overlap = self.options.overlap_steps
+
+        if has_batteries and overlap <= 0:
+            self.logger.append('The time groups with batteries are solved sequentially (no overlap_steps)')
+            self.opf_by_groups()
+            return
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Making groups...')
+
+        intervals = self.get_group_intervals()
+
+        if len(intervals) == 0:
+            return
+
+        n_cores = multiprocessing.cpu_count()
+        n_workers = min(n_cores, len(intervals))
+        threads = max(1, n_cores // n_workers)
+
+        self._groups_done = 0
+
+        def on_done(res):
+            start_, end_, solution, status = res
+            self.set_results(start_, end_, solution)
+            self.set_status(start_, end_, status)
+            self._groups_done += 1
+            self.progress_text.emit('Solved the time group ' + str(self._groups_done) + ' of ' + str(len(intervals)))
+            self.progress_signal.emit(self._groups_done / len(intervals) * 100.0)
+
+        self.progress_text.emit('Running ' + str(len(intervals)) + ' time groups in parallel...')
+        self.pool = multiprocessing.Pool(processes=n_workers,
+                                         initializer=opf_group_worker_init,
+                                         initargs=(self.numerical_circuit, ))
+        for start_, end_ in intervals:
+            run_start = max(self.start_, start_ - overlap) if has_batteries else start_
+            self.pool.apply_async(func=opf_group_worker,
+                                  args=(self.options, start_, end_, threads, run_start),
+                                  callback=on_done,
+                                  error_callback=lambda e: self.logger.append('OPF group error: ' + str(e)))
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
 
     def run(self):
         """
@@ -225,6 +405,8 @@ class OptimalPowerFlowTimeSeries(QThread):
 
         if self.options.grouping == TimeGrouping.NoGrouping:
             self.opf(start_=self.start_, end_=self.end_)
+        elif self.options.parallel_groups and self.options.solver != SolverType.Simple_OPF:
+            self.opf_by_groups_parallel()
         else:
             self.opf_by_groups()
 
@@ -237,6 +419,8 @@ class OptimalPowerFlowTimeSeries(QThread):
 
     def cancel(self):
         self.__cancel__ = True
+        if self.pool is not None:
+            self.pool.terminate()
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Cancelled!')
         self.done_signal.emit()
@@ -0,0 +1,339 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
+
+
+def make_dc_matrices(circuit: SnapshotCircuit):
+    """
+    Compute the DC power flow matrices of a circuit (island)
+    :param circuit: SnapshotCircuit instance
+    :return: Bbus (n, n), Bf (m, n), A (m, n) in CSC format
+    """
+    # series reactance of the branches in the order of the circuit (lines, transformers, vsc, dc lines)
+    x = np.r_[circuit.line_X, circuit.tr_X, circuit.vsc_X1, circuit.dc_line_R]
+    b = circuit.branch_active / (x + 1e-20)
+
+    A = sp.csc_matrix(circuit.C_branch_bus_f - circuit.C_branch_bus_t, dtype=float)
+    Bf = sp.csc_matrix(sp.diags(b) * A)
+    Bbus = sp.csc_matrix(A.T * Bf)
+
+    return Bbus, Bf, A
+
+
+def factorize_dc_matrix(Bbus, pqpv):
+    """
+    Factorize the reduced (non-slack) susceptance matrix
+    :param Bbus: DC susceptance matrix
+    :param pqpv: array of non-slack bus indices
+    :return: SuperLU factorization object
+    """
+    return splu(sp.csc_matrix(Bbus[np.ix_(pqpv, pqpv)]))
+
+
+def get_sensitivity_columns(n, solve_columns, threshold=0.0, chunk_size=None):
+    """
+    Assemble sensitivity matrices column block by column block, each block is computed with a multi-RHS solve
+    :param n: number of columns
+    :param solve_columns: function that returns a tuple of dense blocks of columns given an array of column indices
+    :param threshold: absolute value under which the sensitivities are dropped, if > 0 CSC matrices are returned
+    :param chunk_size: number of columns per block (all at once if None)
+    :return: tuple of dense matrices (or CSC matrices if threshold > 0)
+    """
+    if chunk_size is None or chunk_size <= 0:
+        chunk_size = max(n, 1)
+
+    blocks = None
+    for a in range(0, n, chunk_size):
+        res = solve_columns(np.arange(a, min(a + chunk_size, n)))
+
+        if blocks is None:
+            blocks = [list() for _ in res]
+
+        for lst, block in zip(blocks, res):
+            if threshold > 0:
+                block[np.abs(block) < threshold] = 0.0
+                lst.append(sp.csc_matrix(block))
+            else:
+                lst.append(block)
+
+    if threshold > 0:
+        return tuple(sp.hstack(lst, format='csc') for lst in blocks)
+    else:
+        return tuple(np.hstack(lst) for lst in blocks)
+
+
+def make_ptdf(Bbus, Bf, pqpv, lu=None, threshold=0.0, chunk_size=None):
+    """
+    Power Transfer Distribution Factors: sensitivity of the branch flows to the bus injections
+    (the slack buses absorb the injections, so their columns are zero)
+    :param Bbus: DC susceptance matrix
+    :param Bf: DC branch-bus susceptance matrix
+    :param pqpv: array of non-slack bus indices
+    :param lu: factorization of Bbus[pqpv, pqpv], computed if not given
+    :param threshold: absolute value under which the factors are dropped, if > 0 a CSC matrix is returned
+    :param chunk_size: number of buses solved at once (all at once if None)
+    :return: PTDF matrix (m, n)
+    """
+    if lu is None:
+        lu = factorize_dc_matrix(Bbus, pqpv)
+
+    n = Bbus.shape[0]
+    pqpv = np.array(pqpv, dtype=int)
+    Bf_pqpv = Bf[:, pqpv]
+
+    # position of every bus in the reduced system (-1 for the slack buses)
+    pos = np.full(n, -1, dtype=int)
+    pos[pqpv] = np.arange(len(pqpv))
+
+    def solve_columns(bus_idx):
+        k = np.where(pos[bus_idx] > -1)[0]
+        rhs = np.zeros((len(pqpv), len(bus_idx)))
+        rhs[pos[bus_idx[k]], k] = 1.0
+        return Bf_pqpv * lu.solve(rhs),
+
+    PTDF, = get_sensitivity_columns(n, solve_columns, threshold=threshold, chunk_size=chunk_size)
+
+    return PTDF
+
+
+def dSf_dV(Yf, V, Cf):
+    """
+    Derivatives of the "from" branch power flows w.r.t. the voltage angles and modules
+    :param Yf: "from" admittance matrix
+    :param V: array of bus voltages
+    :param Cf: "from" branch-bus connectivity matrix
+    :return: dSf_dVa, dSf_dVm (m, n) CSC matrices
+    """
+    Vnorm = V / np.abs(V)
+    If = Yf * V
+    Vf = Cf * V
+
+    Cf_V = Cf * sp.diags(V)
+    Cf_Vnorm = Cf * sp.diags(Vnorm)
+
+    dSf_dVa = 1j * (sp.diags(np.conj(If)) * Cf_V - sp.diags(Vf) * np.conj(Yf * sp.diags(V)))
+    dSf_dVm = sp.diags(Vf) * np.conj(Yf * sp.diags(Vnorm)) + sp.diags(np.conj(If)) * Cf_Vnorm
+
+    return sp.csc_matrix(dSf_dVa), sp.csc_matrix(dSf_dVm)
+
+
+def make_ac_ptdf(Ybus, Yf, Cf, V, Ibus, pq, pv, threshold=0.0, chunk_size=None):
+    """
+    Power Transfer Distribution Factors linearized at an AC operating point:
+    active power sensitivity of the branch flows and voltage module sensitivity of the buses to the
+    active power injections (the slack buses absorb the injections)
+    :param Ybus: admittance matrix
+    :param Yf: "from" admittance matrix
+    :param Cf: "from" branch-bus connectivity matrix
+    :param V: array of bus voltages of the operating point
+    :param Ibus: array of current injections
+    :param pq: array of pq bus indices
+    :param pv: array of pv bus indices
+    :param threshold: absolute value under which the factors are dropped, if > 0 CSC matrices are returned
+    :param chunk_size: number of buses solved at once (all at once if None)
+    :return: PTDF matrix (m, n), voltage module sensitivity matrix (n, n)
+    """
+    n = len(V)
+    pq = np.array(pq, dtype=int)
+    pvpq = np.r_[pv, pq].astype(int)
+    npvpq = len(pvpq)
+
+    J = Jacobian(Ybus, V, Ibus, pq, pvpq)
+    lu = splu(sp.csc_matrix(J))
+
+    dSf_dVa, dSf_dVm = dSf_dV(Yf, V, Cf)
+    dPf_dVa = dSf_dVa[:, pvpq].real
+    dPf_dVm = dSf_dVm[:, pq].real
+
+    pos = np.full(n, -1, dtype=int)
+    pos[pvpq] = np.arange(npvpq)
+
+    def solve_columns(bus_idx):
+        # unit active power injection at every bus of the block
+        k = np.where(pos[bus_idx] > -1)[0]
+        rhs = np.zeros((J.shape[0], len(bus_idx)))
+        rhs[pos[bus_idx[k]], k] = 1.0
+        dx = lu.solve(rhs)
+
+        dVm = np.zeros((n, len(bus_idx)))
+        dVm[pq, :] = dx[npvpq:, :]
+
+        return dPf_dVa * dx[:npvpq, :] + dPf_dVm * dx[npvpq:, :], dVm
+
+    return get_sensitivity_columns(n, solve_columns, threshold=threshold, chunk_size=chunk_size)
+
+
+def make_transfer_sensitivities(Bf, A, lu, pqpv, br_idx):
+    """
+    Flow change in every branch for a unit transfer between the terminals of the given branches,
+    this is PTDF · A[br_idx, :]ᵀ, computed without forming the PTDF matrix
+    :param Bf: DC branch-bus susceptance matrix
+    :param A: branch-bus incidence matrix (Cf - Ct)
+    :param lu: factorization of Bbus[pqpv, pqpv]
+    :param pqpv: array of non-slack bus indices
+    :param br_idx: array of branch indices
+    :return: dense matrix (m, len(br_idx))
+    """
+    rhs = A[br_idx, :][:, pqpv].T.toarray()
+    theta = lu.solve(rhs)
+    return Bf[:, pqpv] * theta
+
+
+def make_lodf_columns(Bf, A, lu, pqpv, br_idx, tol=1e-8):
+    """
+    Line Outage Distribution Factors of a set of branches:
+    LODF[l, c] is the fraction of the pre-outage flow of the branch c that goes through l when c is lost
+    :param Bf: DC branch-bus susceptance matrix
+    :param A: branch-bus incidence matrix (Cf - Ct)
+    :param lu: factorization of Bbus[pqpv, pqpv]
+    :param pqpv: array of non-slack bus indices
+    :param br_idx: array of outaged branch indices
+    :param tol: tolerance under which the outage is considered to split the grid
+    :return: LODF columns (m, len(br_idx)), islanding flags (len(br_idx))
+    """
+    br_idx = np.array(br_idx, dtype=int)
+    M = make_transfer_sensitivities(Bf, A, lu, pqpv, br_idx)
+    return get_lodf_from_transfer_sensitivities(M, br_idx, tol=tol)
+
+
+def get_lodf_from_transfer_sensitivities(M, br_idx, tol=1e-8):
+    """
+    Normalize the transfer sensitivities of a set of branches into their LODF columns
+    :param M: dense transfer sensitivities (m, c), see make_transfer_sensitivities
+    :param br_idx: array of outaged branch indices (c)
+    :param tol: tolerance under which the outage is considered to split the grid
+    :return: LODF columns (m, c), islanding flags (c)
+    """
+    k = np.arange(len(br_idx))
+
+    den = 1.0 - M[br_idx, k]
+    islanding = np.abs(den) < tol
+    den[islanding] = 1.0
+
+    LODF = M / den
+    LODF[:, islanding] = 0.0
+    LODF[br_idx, k] = -1.0
+
+    return LODF, islanding
+
+
+def make_lodf(Bbus, Bf, A, pqpv, lu=None, tol=1e-8):
+    """
+    Full Line Outage Distribution Factors matrix (dense m x m, use make_lodf_columns for large grids)
+    :param Bbus: DC susceptance matrix
+    :param Bf: DC branch-bus susceptance matrix
+    :param A: branch-bus incidence matrix (Cf - Ct)
+    :param pqpv: array of non-slack bus indices
+    :param lu: factorization of Bbus[pqpv, pqpv], computed if not given
+    :param tol: tolerance under which the outage is considered to split the grid
+    :return: LODF matrix (m, m), islanding flags (m)
+    """
+    if lu is None:
+        lu = factorize_dc_matrix(Bbus, pqpv)
+
+    return make_lodf_columns(Bf, A, lu, pqpv, np.arange(Bf.shape[0]), tol=tol)
+
+
+def make_lodf_from_ptdf(PTDF, Cf, Ct, tol=1e-8):
+    """
+    Line Outage Distribution Factors derived from an existing PTDF matrix
+    :param PTDF: PTDF matrix (m, n), dense or sparse
+    :param Cf: "from" branch-bus connectivity matrix
+    :param Ct: "to" branch-bus connectivity matrix
+    :param tol: tolerance under which the outage is considered to split the grid
+    :return: LODF matrix (m, m), islanding flags (m)
+    """
+    A = sp.csc_matrix(Cf - Ct, dtype=float)
+    M = PTDF * A.T if sp.issparse(PTDF) else A.dot(PTDF.T).T
+    if sp.issparse(M):
+        M = M.toarray()
+    return get_lodf_from_transfer_sensitivities(np.array(M), np.arange(M.shape[0]), tol=tol)
+
+
+def get_n1_flows(flows, LODF, br_idx):
+    """
+    Post-contingency flows of a set of simple outages
+    :param flows: pre-contingency branch flows (m)
+    :param LODF: LODF columns of the outaged branches (m, c)
+    :param br_idx: indices of the outaged branches (c)
+    :return: post-contingency flows (m, c)
+    """
+    return flows[:, np.newaxis] + LODF * flows[br_idx][np.newaxis, :]
+
+
+def get_multiple_outage_flows(flows, M, br_idx, tol=1e-8):
+    """
+    Post-contingency flows of the simultaneous outage of several branches
+    F = F0 + M_C · (I - M_CC)⁻¹ · F0_C
+    :param flows: pre-contingency branch flows (m)
+    :param M: transfer sensitivities of the outaged branches (m, c), see make_transfer_sensitivities
+    :param br_idx: indices of the outaged branches (c)
+    :param tol: tolerance under which the outage is considered to split the grid
+    :return: post-contingency flows (m) or None if the outage splits the grid
+    """
+    k = len(br_idx)
+    if k == 0:
+        return flows.copy()
+
+    D = np.eye(k) - M[br_idx, :]
+
+    # a (near) singular D means that the outage leaves part of the grid disconnected
+    if np.linalg.cond(D) > 1.0 / tol:
+        return None
+
+    x = np.linalg.solve(D, flows[br_idx])
+    post = flows + M.dot(x)
+    post[br_idx] = 0.0
+    return post
+
+
+def get_double_outage_flows(flows, Ma, Mb, a, b, tol=1e-8):
+    """
+    Post-contingency flows of a set of double outages (the 2x2 systems are solved in closed form)
+    :param flows: pre-contingency branch flows (m)
+    :param Ma: transfer sensitivities of the first outaged branch of each pair (m, c)
+    :param Mb: transfer sensitivities of the second outaged branch of each pair (m, c)
+    :param a: indices of the first outaged branch of each pair (c)
+    :param b: indices of the second outaged branch of each pair (c)
+    :param tol: tolerance under which the outage is considered to split the grid
+    :return: post-contingency flows (m, c), islanding flags (c)
+    """
+    k = np.arange(len(a))
+
+    # D = I - M_CC
+    d11 = 1.0 - Ma[a, k]
+    d12 = -Mb[a, k]
+    d21 = -Ma[b, k]
+    d22 = 1.0 - Mb[b, k]
+    det = d11 * d22 - d12 * d21
+
+    islanding = np.abs(det) < tol
+    det[islanding] = 1.0
+
+    x1 = (d22 * flows[a] - d12 * flows[b]) / det
+    x2 = (d11 * flows[b] - d21 * flows[a]) / det
+    x1[islanding] = 0.0
+    x2[islanding] = 0.0
+
+    post = flows[:, np.newaxis] + Ma * x1 + Mb * x2
+    post[a, k] = 0.0
+    post[b, k] = 0.0
+
+    return post, islanding
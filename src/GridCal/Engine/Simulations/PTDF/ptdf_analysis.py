@@ -30,6 +30,12 @@ class PtdfGroupMode(Enum):
     ByGenLoad = 'By Generator and Load'
 
 
+class PtdfMethod(Enum):
+    Linear = 'DC linear'
+    LinearAC = 'AC linearized'
+    Perturbation = 'Power flow perturbation'
+
+
 def group_generators_by_technology(circuit: MultiCircuit):
     """
     Compose a dictionary of generator groups
@@ -14,12 +14,17 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 import time
 import multiprocessing
+import numpy as np
+import scipy.sparse as sp
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
-from GridCal.Engine.Simulations.PTDF.ptdf_analysis import get_ptdf_variations, power_flow_worker, PtdfGroupMode
+from GridCal.Engine.Simulations.PTDF.ptdf_analysis import get_ptdf_variations, power_flow_worker, PtdfGroupMode, \
+    PtdfMethod
+from GridCal.Engine.Simulations.PTDF.linear_factors import make_dc_matrices, make_ptdf, make_ac_ptdf
 from GridCal.Engine.Simulations.PTDF.ptdf_results import PTDFResults
 from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
 
@@ -28,15 +33,50 @@ from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split
 ########################################################################################################################
 
 
+def assemble_island_blocks(blocks, shape, sparse):
+    """
+    Assemble the matrices computed per island into the matrix of the whole grid
+    :param blocks: list of (row indices, column indices, matrix) of every island
+    :param shape: shape of the grid matrix
+    :param sparse: return a CSC matrix? (the blocks are expected to be sparse too)
+    :return: dense or CSC matrix
+    """
+    if sparse:
+        rows = list()
+        cols = list()
+        data = list()
+        for row_idx, col_idx, block in blocks:
+            block = block.tocoo()
+            rows.append(row_idx[block.row])
+            cols.append(col_idx[block.col])
+            data.append(block.data)
+
+        if len(data) == 0:
+            return sp.csc_matrix(shape)
+
+        return sp.csc_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=shape)
+
+    else:
+        M = np.zeros(shape)
+        for row_idx, col_idx, block in blocks:
+            M[np.ix_(row_idx, col_idx)] = block
+        return M
+
+
 class PTDFOptions:
 
     def __init__(self, group_mode: PtdfGroupMode = PtdfGroupMode.ByGenLoad,
-                 power_increment=100.0, use_multi_threading=False):
+                 power_increment=100.0, use_multi_threading=False,
+                 method: PtdfMethod = PtdfMethod.Perturbation, threshold=0.0, chunk_size=1000):
         """
         Power Transfer Distribution Factors's options
         :param group_mode: Grouping type
         :param power_increment: Amount of power to change in MVA
-        :param use_multi_threading: use multi-threading?
+        :param use_multi_threading: use multi-threading? (perturbation method)
+        :param method: PTDF computation method, the analytical methods compute the bus to branch PTDF matrix
+                       from a single factorization and aggregate it by groups
+        :param threshold: absolute sensitivity under which the PTDF entries are dropped (sparse storage if > 0)
+        :param chunk_size: number of buses solved at once by the analytical methods
         """
         self.group_mode = group_mode
 
@@ -44,6 +84,12 @@ class PTDFOptions:
 
         self.use_multi_threading = use_multi_threading
 
+        self.method = method
+
+        self.threshold = threshold
+
+        self.chunk_size = chunk_size
+
 
 class PTDF(QThread):
     progress_signal = Signal(float)
@@ -161,6 +207,118 @@ class PTDF(QThread):
 
         return results
 
+    def ptdf_analytical(self, circuit: MultiCircuit, options: PowerFlowOptions, group_mode: PtdfGroupMode,
+                        power_amount, text_func=None, prog_func=None):
+        """
+        Power Transfer Distribution Factors analysis computing the bus to branch PTDF matrix from a single
+        factorization per island (DC or AC linearized at the base power flow) and aggregating it by groups
+        :param circuit: MultiCircuit instance
+        :param options: power flow options
+        :param group_mode: group mode
+        :param power_amount: amount o power to vary in MW
+        :param text_func: text function to display progress
+        :param prog_func: progress function to display progress [0~100]
+        :return: PTDFResults
+        """
+        if text_func is not None:
+            text_func('Compiling...')
+
+        # compile to arrays
+        numerical_circuit = compile_snapshot_circuit(circuit=circuit,
+                                                     apply_temperature=options.apply_temperature_correction,
+                                                     branch_tolerance_mode=options.branch_impedance_tolerance_mode,
+                                                     opf_results=self.opf_results)
+
+        calculation_inputs = split_into_islands(numeric_circuit=numerical_circuit,
+                                                ignore_single_node_islands=options.ignore_single_node_islands)
+
+        # compute the variations
+        delta_of_power_variations = get_ptdf_variations(circuit=circuit,
+                                                        numerical_circuit=numerical_circuit,
+                                                        group_mode=group_mode,
+                                                        power_amount=power_amount)
+
+        # declare the PTDF results
+        results = PTDFResults(n_variations=len(delta_of_power_variations) - 1,
+                              n_br=numerical_circuit.nbr,
+                              n_bus=numerical_circuit.nbus,
+                              br_names=numerical_circuit.branch_names,
+                              bus_names=numerical_circuit.bus_names,
+                              bus_types=numerical_circuit.bus_types)
+
+        if text_func is not None:
+            text_func('Running the base power flow...')
+
+        # base power flow
+        returns = dict()
+        power_flow_worker(variation=0,
+                          nbus=numerical_circuit.nbus,
+                          nbr=numerical_circuit.nbr,
+                          n_tr=numerical_circuit.ntr,
+                          bus_names=numerical_circuit.bus_names,
+                          branch_names=numerical_circuit.branch_names,
+                          transformer_names=numerical_circuit.tr_names,
+                          bus_types=numerical_circuit.bus_types,
+                          calculation_inputs=calculation_inputs,
+                          options=options,
+                          dP=np.zeros(numerical_circuit.nbus),
+                          return_dict=returns)
+
+        results.default_pf_results, log = returns[0]
+        results.logger += log
+
+        if text_func is not None:
+            text_func('Computing the PTDF...')
+
+        # compute the sensitivities of every island and place them in the grid matrices
+        sparse = self.options.threshold > 0
+        linear_ac = self.options.method == PtdfMethod.LinearAC
+        ptdf_blocks = list()
+        vtdf_blocks = list()
+        for i, island in enumerate(calculation_inputs):
+
+            if len(island.vd) > 0:
+
+                if linear_ac:
+                    V = results.default_pf_results.voltage[island.original_bus_idx]
+                    PTDF, VTDF = make_ac_ptdf(Ybus=island.Ybus,
+                                              Yf=island.Yf,
+                                              Cf=island.C_branch_bus_f,
+                                              V=V,
+                                              Ibus=island.Ibus,
+                                              pq=island.pq,
+                                              pv=island.pv,
+                                              threshold=self.options.threshold,
+                                              chunk_size=self.options.chunk_size)
+                    vtdf_blocks.append((island.original_bus_idx, island.original_bus_idx, VTDF))
+                else:
+                    Bbus, Bf, A = make_dc_matrices(island)
+                    PTDF = make_ptdf(Bbus=Bbus,
+                                     Bf=Bf,
+                                     pqpv=island.pqpv,
+                                     threshold=self.options.threshold,
+                                     chunk_size=self.options.chunk_size)
+
+                ptdf_blocks.append((island.original_branch_idx, island.original_bus_idx, PTDF))
+
+            if prog_func is not None:
+                prog_func((i + 1) / len(calculation_inputs) * 100.0)
+
+            if self.__cancel__:
+                return results
+
+        results.PTDF = assemble_island_blocks(ptdf_blocks, (numerical_circuit.nbr, numerical_circuit.nbus), sparse)
+        if linear_ac:
+            results.VTDF = assemble_island_blocks(vtdf_blocks, (numerical_circuit.nbus, numerical_circuit.nbus), sparse)
+        results.Cf = numerical_circuit.C_branch_bus_f
+        results.Ct = numerical_circuit.C_branch_bus_t
+        results.available_results.append(ResultTypes.OTDF)
+
+        # aggregate the sensitivities by the groups of the variations
+        results.set_variations(delta_of_power_variations[1:], Sbase=numerical_circuit.Sbase)
+
+        return results
+
     def ptdf_multi_treading(self, circuit: MultiCircuit, options: PowerFlowOptions, group_mode: PtdfGroupMode,
                             power_amount, text_func=None, prog_func=None):
         """
@@ -275,7 +433,15 @@ class PTDF(QThread):
         Run thread
         """
         start = time.time()
-        if self.options.use_multi_threading:
+        if self.options.method in [PtdfMethod.Linear, PtdfMethod.LinearAC]:
+
+            self.results = self.ptdf_analytical(circuit=self.grid, options=self.pf_options,
+                                                group_mode=self.options.group_mode,
+                                                power_amount=self.options.power_increment,
+                                                text_func=self.progress_text.emit,
+                                                prog_func=self.progress_signal.emit)
+
+        elif self.options.use_multi_threading:
 
             self.results = self.ptdf_multi_treading(circuit=self.grid, options=self.pf_options,
                                                     group_mode=self.options.group_mode,
@@ -323,7 +489,8 @@ if __name__ == '__main__':
     main_circuit = FileOpen(fname).open()
 
     pf_options = PowerFlowOptions(solver_type=SolverType.DC)
-    options_ = PTDFOptions(group_mode=PtdfGroupMode.ByGenLoad, power_increment=10, use_multi_threading=False)
+    options_ = PTDFOptions(group_mode=PtdfGroupMode.ByGenLoad, power_increment=10, use_multi_threading=False,
+                           method=PtdfMethod.Perturbation)
     simulation = PTDF(grid=main_circuit, options=options_, pf_options=pf_options)
     simulation.run()
     ptdf_df = simulation.results.get_flows_data_frame()
@@ -332,7 +499,8 @@ if __name__ == '__main__':
 
     print()
     a = time.time()
-    options_ = PTDFOptions(group_mode=PtdfGroupMode.ByGenLoad, power_increment=10, use_multi_threading=True)
+    options_ = PTDFOptions(group_mode=PtdfGroupMode.ByGenLoad, power_increment=10, use_multi_threading=False,
+                           method=PtdfMethod.Linear)
     simulation = PTDF(grid=main_circuit, options=options_, pf_options=pf_options)
     simulation.run()
     ptdf_df = simulation.results.get_flows_data_frame()
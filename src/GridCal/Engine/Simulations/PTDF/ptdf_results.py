@@ -19,6 +19,7 @@ import pandas as pd
 from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults
+from GridCal.Engine.Simulations.PTDF.linear_factors import make_lodf_from_ptdf
 from GridCal.Gui.GuiFunctions import ResultsModel
 
 
@@ -80,6 +81,18 @@ class PTDFResults:
         self.flows_sensitivity_matrix = None
         self.voltage_sensitivity_matrix = None
 
+        # bus to branch sensitivity matrix (n_br, n_bus) of the analytical methods (dense or sparse)
+        self.PTDF = None
+
+        # bus to bus voltage module sensitivity matrix (n_bus, n_bus) of the AC linearized method
+        self.VTDF = None
+
+        # branch-bus connectivity, used to derive the LODF
+        self.Cf = None
+        self.Ct = None
+
+        self.LODF = None
+
         self.available_results = [ResultTypes.PTDFBranchesSensitivity,
                                   ResultTypes.PTDFBusVoltageSensitivity]
 
@@ -115,6 +128,61 @@ class PTDFResults:
         delta = (np.abs(self.pf_results[i].voltage) - v0)
         return delta / (self.variations[i].original_power + 1e-20)
 
+    def set_variations(self, variations, Sbase):
+        """
+        Set the variations of an analytical PTDF and aggregate the bus sensitivities into them
+        :param variations: list of PTDFVariation (excluding the default one)
+        :param Sbase: base power (MVA) of the per unit variations
+        """
+        self.variations = variations
+        self.n_variations = len(variations)
+
+        # per unit power subtracted from each bus in every variation
+        dP = np.array([v.dP for v in variations]).reshape(-1, self.n_bus)
+        power = np.array([v.original_power + 1e-20 for v in variations])[:, np.newaxis]
+
+        # the injections decrease by dP: the flows change by -PTDF·dP (p.u.) and the voltages by -VTDF·dP
+        self.flows_sensitivity_matrix = -self.PTDF.dot(dP.T).T * Sbase / power
+
+        if self.VTDF is not None:
+            self.voltage_sensitivity_matrix = -self.VTDF.dot(dP.T).T / power
+        else:
+            self.voltage_sensitivity_matrix = np.zeros((self.n_variations, self.n_bus))
+
+    def get_branch_flows_at(self, i):
+        """
+        Get the branch power of a variation
+        :param i: variation index
+        :return: array of branch power (MVA)
+        """
+        if self.PTDF is None:
+            return self.pf_results[i].Sbranch
+        else:
+            return self.default_pf_results.Sbranch + self.flows_sensitivity_matrix[i, :] * self.variations[i].original_power
+
+    def get_voltage_at(self, i):
+        """
+        Get the bus voltages of a variation
+        :param i: variation index
+        :return: array of complex voltages (p.u.)
+        """
+        if self.PTDF is None:
+            return self.pf_results[i].voltage
+        else:
+            v0 = self.default_pf_results.voltage
+            vm = np.abs(v0) + self.voltage_sensitivity_matrix[i, :] * self.variations[i].original_power
+            return vm * np.exp(1j * np.angle(v0))
+
+    def get_lodf(self):
+        """
+        Get the Line Outage Distribution Factors derived from the PTDF matrix
+        :return: LODF matrix (n_br, n_br)
+        """
+        if self.LODF is None and self.PTDF is not None:
+            self.LODF, islanding = make_lodf_from_ptdf(self.PTDF, self.Cf, self.Ct)
+
+        return self.LODF
+
     def get_var_names(self):
         """
         Get variation names
@@ -127,6 +195,10 @@ class PTDFResults:
         Consolidate results in matrix
         :return:
         """
+        if self.PTDF is not None:
+            # the analytical methods aggregate the sensitivities when setting the variations
+            return
+
         self.flows_sensitivity_matrix = np.zeros((self.n_variations, self.n_br))
         for i in range(self.n_variations):
             self.flows_sensitivity_matrix[i, :] = self.get_branch_sensitivity_at(i)
@@ -178,6 +250,16 @@ class PTDFResults:
             y_label = '(p.u.)'
             title = 'Buses voltage sensitivity'
 
+        elif result_type == ResultTypes.OTDF:
+            y = self.get_lodf().T
+            y_label = '(p.u.)'
+            title = 'Line outage distribution factors'
+
+            # the failed branches are the rows
+            mdl = ResultsModel(data=y, index=self.br_names, columns=self.br_names, title=title,
+                               ylabel=y_label, units=y_label)
+            return mdl
+
         else:
             labels = []
             y = np.zeros(0)
@@ -17,7 +17,6 @@ import json
 import pandas as pd
 import numpy as np
 import scipy.sparse as sp
-from scipy.sparse.linalg import spsolve, factorized
 import time
 
 from PySide2.QtCore import QThread, Signal
@@ -27,9 +26,9 @@ from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowRes
 from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
-from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver
-from GridCal.Engine.Simulations.PTDF.ptdf_driver import PTDF, PTDFOptions, PtdfGroupMode
+from GridCal.Engine.Simulations.sparse_solve import FactorizationCache, get_factorization_cache
+from GridCal.Engine.Simulations.PTDF.ptdf_driver import PTDF, PTDFOptions, PtdfGroupMode, PtdfMethod
 from GridCal.Gui.GuiFunctions import ResultsModel
 from GridCal.Engine.Core.time_series_opf_data import compile_opf_time_circuit, split_opf_time_circuit_into_islands
 
@@ -169,88 +168,230 @@ class PtdfTimeSeriesResults:
         return ResultsModel(data=data, index=index, columns=labels, title=title, ylabel=y_label, units=y_label)
 
 
-def compute_ptdf(Ybus, Yf, Yt, Cf, Ct, V, Ibus, Sbus, pq, pv):
+class JacobianStructure:
     """
+    Sparsity structure and numeric buffers of the polar Jacobian and of the branch power derivatives of an island.
 
-    :param Ybus:
-    :param Yf:
-    :param Yt:
-    :param Cf:
-    :param Ct:
-    :param V:
-    :param Ibus:
-    :param Sbus:
-    :param pq:
-    :param pv:
-    :return:
+    The structure (patterns, positions of the diagonal entries and the map from the bus power derivatives
+    to the Jacobian blocks) is computed once; afterwards the derivatives are evaluated directly on the
+    data arrays, so a new operating point only costs a numeric update and a numeric refactorization
+    that reuses the symbolic analysis of the first factorization (see FactorizationCache).
     """
-    n = len(V)
-    # set up indexing for updating V
-    pvpq = np.r_[pv, pq]
-    npv = len(pv)
-    npq = len(pq)
-    # j1:j2 - V angle of pv and pq buses
-    j1 = 0
-    j2 = npv + npq
-    # j2:j3 - V mag of pq buses
-    j3 = j2 + npq
-
-    # compute the Jacobian
-    J = Jacobian(Ybus, V, Ibus, pq, pvpq)
 
-    # compute the power increment (f)
-    Scalc = V * np.conj(Ybus * V - Ibus)
-    dS = Scalc - Sbus
-    f = np.r_[dS[pvpq].real, dS[pq].imag]
+    def __init__(self, Ybus, Yf, Yt, Cf, Ct, pq, pv, factorization_cache: FactorizationCache = None):
+        """
+        JacobianStructure constructor
+        :param Ybus: Admittance matrix
+        :param Yf: Admittance matrix of the branches with the "from" buses
+        :param Yt: Admittance matrix of the branches with the "to" buses
+        :param Cf: Connectivity matrix of the branches with the "from" buses
+        :param Ct: Connectivity matrix of the branches with the "to" buses
+        :param pq: Array with the indices of the PQ buses
+        :param pv: Array with the indices of the PV buses
+        :param factorization_cache: FactorizationCache that keeps the symbolic analysis of the Jacobian
+                                    (a new one is created if None)
+        """
+        self.Ybus = sp.csc_matrix(Ybus)
+
+        self.pq = np.array(pq, dtype=int)
+        self.pv = np.array(pv, dtype=int)
+        self.pvpq = np.r_[self.pv, self.pq]
+        self.npvpq = len(self.pvpq)
+        self.n = self.Ybus.shape[0]
+
+        # bus pattern: the pattern of Ybus plus the full diagonal (abs values so that nothing cancels out)
+        P = sp.csc_matrix(abs(self.Ybus)) + sp.identity(self.n, format='csc')
+        P.sort_indices()
+        self.bus_rows = P.indices.copy()
+        self.bus_cols = np.repeat(np.arange(self.n), np.diff(P.indptr))
+        self.bus_y_conj = np.conj(np.asarray(self.Ybus[self.bus_rows, self.bus_cols]).ravel())
+        self.bus_diag = np.where(self.bus_rows == self.bus_cols)[0]
+        self.bus_diag_idx = self.bus_rows[self.bus_diag]
+
+        # assemble the Jacobian once with the labels of the entries of dS_dVa and dS_dVm to get the map
+        nnz = P.nnz
+        pvpq_, pq_ = self.pvpq, self.pq
+        blocks = list()
+        for b, (rows, cols) in enumerate([(pvpq_, pvpq_), (pvpq_, pq_), (pq_, pvpq_), (pq_, pq_)]):
+            L = P.copy()
+            L.data = np.arange(nnz, dtype=float) + 1.0 + b * nnz
+            blocks.append(L[np.ix_(rows, cols)])
+
+        self.J = sp.vstack([sp.hstack([blocks[0], blocks[1]]),
+                            sp.hstack([blocks[2], blocks[3]])], format='csc')
+        self.J.sort_indices()
+        code = self.J.data.astype(int) - 1
+        block = code // nnz
+        self.J_pos = [np.where(block == b)[0] for b in range(4)]
+        self.J_src = [code[pos] % nnz for pos in self.J_pos]
+
+        # branch pattern: union of the patterns of Yf, Yt, Cf and Ct
+        Pbr = sp.csc_matrix(abs(Yf)) + sp.csc_matrix(abs(Yt)) + sp.csc_matrix(Cf) + sp.csc_matrix(Ct)
+        Pbr.sort_indices()
+        self.br_shape = Pbr.shape
+        self.br_indptr = Pbr.indptr.copy()
+        self.br_indices = Pbr.indices.copy()
+        self.br_rows = Pbr.indices.copy()
+        self.br_cols = np.repeat(np.arange(self.n), np.diff(Pbr.indptr))
+        self.yf_conj = np.conj(np.asarray(sp.csc_matrix(Yf)[self.br_rows, self.br_cols]).ravel())
+        self.yt_conj = np.conj(np.asarray(sp.csc_matrix(Yt)[self.br_rows, self.br_cols]).ravel())
+        self.Yf = sp.csr_matrix(Yf)
+        self.Yt = sp.csr_matrix(Yt)
+        self.Cf = sp.csr_matrix(Cf)
+        self.Ct = sp.csr_matrix(Ct)
+        F = np.asarray(self.Cf.argmax(axis=1)).ravel()
+        T = np.asarray(self.Ct.argmax(axis=1)).ravel()
+        self.is_f = (self.br_cols == F[self.br_rows]).astype(float)
+        self.is_t = (self.br_cols == T[self.br_rows]).astype(float)
+
+        # numeric buffers
+        self.dS_dVa = np.zeros(nnz, dtype=complex)
+        self.dS_dVm = np.zeros(nnz, dtype=complex)
+
+        # factorization
+        self.factorization_cache = get_factorization_cache() if factorization_cache is None else factorization_cache
+        self.lu_solve = None
+        self.V_fact = None
+        self.n_factorizations = 0
+
+    def update_jacobian(self, V, Ibus):
+        """
+        Update the numeric values of the Jacobian at an operating point
+        :param V: Array of nodal voltages
+        :param Ibus: Array of nodal current injections
+        :return: Jacobian (CSC), its data array is reused between calls
+        """
+        I = self.Ybus * V - Ibus
+        Vnorm = V / np.abs(V)
+        r, c, d = self.bus_rows, self.bus_cols, self.bus_diag
 
-    # solve the voltage increment
-    dx = spsolve(J, f)
+        # dS_dVm = diag(V) * conj(Ybus * diag(Vnorm)) + conj(diag(I)) * diag(Vnorm)
+        self.dS_dVm[:] = V[r] * self.bus_y_conj * np.conj(Vnorm[c])
+        self.dS_dVm[d] += np.conj(I[self.bus_diag_idx]) * Vnorm[self.bus_diag_idx]
 
-    # reassign the solution vector
-    dVa = np.zeros(n)
-    dVm = np.zeros(n)
-    dVa[pvpq] = dx[j1:j2]
-    dVm[pq] = dx[j2:j3]
+        # dS_dVa = 1j * diag(V) * conj(diag(I) - Ybus * diag(V))
+        self.dS_dVa[:] = -1j * V[r] * self.bus_y_conj * np.conj(V[c])
+        self.dS_dVa[d] += 1j * V[self.bus_diag_idx] * np.conj(I[self.bus_diag_idx])
 
-    # compute branch derivatives
+        self.J.data[self.J_pos[0]] = self.dS_dVa[self.J_src[0]].real
+        self.J.data[self.J_pos[1]] = self.dS_dVm[self.J_src[1]].real
+        self.J.data[self.J_pos[2]] = self.dS_dVa[self.J_src[2]].imag
+        self.J.data[self.J_pos[3]] = self.dS_dVm[self.J_src[3]].imag
 
-    If = Yf * V
-    It = Yt * V
-    E = V / np.abs(V)
-    Vdiag = sp.diags(V)
-    Vdiag_conj = sp.diags(np.conj(V))
-    Ediag = sp.diags(E)
-    Ediag_conj = sp.diags(np.conj(E))
-    If_diag_conj = sp.diags(np.conj(If))
-    It_diag_conj = sp.diags(np.conj(It))
-    Yf_conj = Yf.copy()
-    Yf_conj.data = np.conj(Yf_conj.data)
-    Yt_conj = Yt.copy()
-    Yt_conj.data = np.conj(Yt_conj.data)
-
-    dSf_dVa = 1j * (If_diag_conj * Cf * Vdiag - sp.diags(Cf * V) * Yf_conj * Vdiag_conj)
-    dSf_dVm = If_diag_conj * Cf * Ediag - sp.diags(Cf * V) * Yf_conj * Ediag_conj
-
-    dSt_dVa = 1j * (It_diag_conj * Ct * Vdiag - sp.diags(Ct * V) * Yt_conj * Vdiag_conj)
-    dSt_dVm = It_diag_conj * Ct * Ediag - sp.diags(Ct * V) * Yt_conj * Ediag_conj
+        return self.J
 
-    # compute the PTDF
+    def factorize(self, V, Ibus, tolerance=0.0):
+        """
+        Update and factorize the Jacobian at an operating point.
+        If the voltage did not move more than the tolerance since the last factorization, that one is kept.
+        :param V: Array of nodal voltages
+        :param Ibus: Array of nodal current injections
+        :param tolerance: maximum voltage deviation (p.u.) to keep the previous factorization
+        :return: True if the Jacobian was factorized
+        """
+        if self.lu_solve is not None and np.max(np.abs(V - self.V_fact)) <= tolerance:
+            return False
+
+        J = self.update_jacobian(V, Ibus)
+
+        # numeric factorization (the symbolic analysis of the pattern is computed once)
+        self.lu_solve = self.factorization_cache.factorize(J)
+
+        self.V_fact = V.copy()
+        self.n_factorizations += 1
+
+        return True
+
+    def solve(self, f):
+        """
+        Solve J x = f with the current factorization
+        :param f: right hand side
+        :return: x
+        """
+        return self.lu_solve(f)
+
+    def get_increments(self, dx):
+        """
+        Scatter the solution of the Jacobian system into the bus angle and module increments
+        :param dx: solution vector
+        :return: dVa, dVm
+        """
+        dVa = np.zeros(self.n)
+        dVm = np.zeros(self.n)
+        dVa[self.pvpq] = dx[:self.npvpq]
+        dVm[self.pq] = dx[self.npvpq:]
+        return dVa, dVm
+
+    def get_branch_derivatives(self, V):
+        """
+        Evaluate the branch power derivatives on the data of the branch pattern
+        :param V: Array of nodal voltages
+        :return: data of dSf_dVa, dSf_dVm, dSt_dVa, dSt_dVm
+        """
+        r, c = self.br_rows, self.br_cols
+        Vnorm = V / np.abs(V)
+        Vf = self.Cf * V
+        Vt = self.Ct * V
+        If_conj = np.conj(self.Yf * V)
+        It_conj = np.conj(self.Yt * V)
+        V_conj = np.conj(V)
+        Vnorm_conj = np.conj(Vnorm)
+
+        dSf_dVa = 1j * (self.is_f * If_conj[r] * V[c] - Vf[r] * self.yf_conj * V_conj[c])
+        dSf_dVm = self.is_f * If_conj[r] * Vnorm[c] + Vf[r] * self.yf_conj * Vnorm_conj[c]
+        dSt_dVa = 1j * (self.is_t * It_conj[r] * V[c] - Vt[r] * self.yt_conj * V_conj[c])
+        dSt_dVm = self.is_t * It_conj[r] * Vnorm[c] + Vt[r] * self.yt_conj * Vnorm_conj[c]
+
+        return dSf_dVa, dSf_dVm, dSt_dVa, dSt_dVm
+
+    def get_branch_matrix(self, data):
+        """
+        Compose a sparse matrix with the branch pattern
+        :param data: data array
+        :return: CSC matrix (branches, buses)
+        """
+        return sp.csc_matrix((data, self.br_indices, self.br_indptr), shape=self.br_shape)
 
-    dVmf = Cf * dVm
-    dVaf = Cf * dVa
-    dPf_dVa = dSf_dVa.real
-    dPf_dVm = dSf_dVm.real
 
-    dVmt = Ct * dVm
-    dVat = Ct * dVa
-    dPt_dVa = dSt_dVa.real
-    dPt_dVm = dSt_dVm.real
+def compute_ptdf(Ybus, Yf, Yt, Cf, Ct, V, Ibus, Sbus, pq, pv, structure: JacobianStructure = None):
+    """
+    Compute the branch power variation matrix of a Newton step from the operating point V
+    :param Ybus: Admittance matrix
+    :param Yf: Admittance matrix of the branches with the "from" buses
+    :param Yt: Admittance matrix of the branches with the "to" buses
+    :param Cf: Connectivity matrix of the branches with the "from" buses
+    :param Ct: Connectivity matrix of the branches with the "to" buses
+    :param V: Array of nodal voltages
+    :param Ibus: Array of nodal current injections
+    :param Sbus: Array of nodal power injections
+    :param pq: Array with the indices of the PQ buses
+    :param pv: Array with the indices of the PV buses
+    :param structure: JacobianStructure of the same grid to reuse between calls (optional)
+    :return: PTDF sparse matrix (branches, buses)
+    """
+    if structure is None:
+        structure = JacobianStructure(Ybus, Yf, Yt, Cf, Ct, pq, pv)
 
-    PTDF = sp.diags(dVmf) * dPf_dVm + sp.diags(dVmt) * dPt_dVm + sp.diags(dVaf) * dPf_dVa + sp.diags(dVat) * dPt_dVa
+    # compute and factorize the Jacobian
+    structure.factorize(V, Ibus)
 
-    return PTDF
+    # compute the power increment (f)
+    Scalc = V * np.conj(structure.Ybus * V - Ibus)
+    dS = Scalc - Sbus
+    f = np.r_[dS[structure.pvpq].real, dS[structure.pq].imag]
 
+    # solve the voltage increment
+    dVa, dVm = structure.get_increments(structure.solve(f))
 
+    # compute branch derivatives
+    dSf_dVa, dSf_dVm, dSt_dVa, dSt_dVm = structure.get_branch_derivatives(V)
+
+    # compute the PTDF
+    r = structure.br_rows
+    data = (structure.Cf * dVm)[r] * dSf_dVm.real + (structure.Ct * dVm)[r] * dSt_dVm.real + \
+           (structure.Cf * dVa)[r] * dSf_dVa.real + (structure.Ct * dVa)[r] * dSt_dVa.real
+
+    return structure.get_branch_matrix(data)
 
 
 class PtdfTimeSeries(QThread):
@@ -259,11 +400,15 @@ class PtdfTimeSeries(QThread):
     done_signal = Signal()
     name = 'PTDF Time Series'
 
-    def __init__(self, grid: MultiCircuit, pf_options: PowerFlowOptions, start_=0, end_=None, power_delta=10):
+    def __init__(self, grid: MultiCircuit, pf_options: PowerFlowOptions, start_=0, end_=None, power_delta=10,
+                 use_jacobian_mode=False, factorization_tolerance=0.0):
         """
         TimeSeries constructor
         @param grid: MultiCircuit instance
         @param pf_options: PowerFlowOptions instance
+        @param use_jacobian_mode: track the operating point with the Jacobian instead of using a nodal PTDF
+        @param factorization_tolerance: in jacobian mode, maximum voltage deviation (p.u.) from the last
+                                        factorized operating point for which that factorization is reused
         """
         QThread.__init__(self)
 
@@ -282,6 +427,10 @@ class PtdfTimeSeries(QThread):
 
         self.power_delta = power_delta
 
+        self.use_jacobian_mode = use_jacobian_mode
+
+        self.factorization_tolerance = factorization_tolerance
+
         self.elapsed = 0
 
         self.logger = Logger()
@@ -317,7 +466,8 @@ class PtdfTimeSeries(QThread):
 
             options_ = PTDFOptions(group_mode=PtdfGroupMode.ByNode,
                                    power_increment=self.power_delta,
-                                   use_multi_threading=False)
+                                   use_multi_threading=False,
+                                   method=PtdfMethod.LinearAC)
 
             # run a node based PTDF
             self.ptdf_driver = PTDF(grid=self.grid,
@@ -428,7 +578,9 @@ class PtdfTimeSeries(QThread):
 
     def run_jacobian_mode(self, time_indices) -> PtdfTimeSeriesResults:
         """
-        Run the PTDF with the illinois formulation
+        Run the time series by tracking the operating point with one Newton step per time step.
+        The Jacobian structure is built once per island and only its values are updated; the factorization
+        is kept while the voltage stays within self.factorization_tolerance of the factorized point.
         :return: TimeSeriesResults instance
         """
 
@@ -447,71 +599,67 @@ class PtdfTimeSeries(QThread):
         # if there are valid profiles...
         if self.grid.time_profile is not None:
 
-            # run a power flow to get the initial branch power and compose the second branch power with the increment
+            # run a power flow to get the initial operating point
             driver = PowerFlowDriver(grid=self.grid, options=self.pf_options)
             driver.run()
 
             # compile the islands
             islands = split_opf_time_circuit_into_islands(nc)
 
-            # compose the power injections
-            Sbus_0 = driver.results.Sbus
-            Pbus_0 = Sbus_0.real
             V_0 = driver.results.voltage
-            Pbr_0 = driver.results.Sbranch.real
 
-            for island in islands:
-
-                V = island.Vbus[0, :]
-                Ibus = island.Ibus[:, 0]
+            # symbolic analyses of the Jacobians of the islands
+            factorization_cache = get_factorization_cache()
 
+            for island in islands:
 
-                n = len(V)
-                # set up indexing for updating V
-                pvpq = np.r_[island.pv, island.pq]
-                npv = len(island.pv)
-                npq = len(island.pq)
-                # j1:j2 - V angle of pv and pq buses
-                j1 = 0
-                j2 = npv + npq
-                # j2:j3 - V mag of pq buses
-                j3 = j2 + npq
+                structure = JacobianStructure(Ybus=island.Ybus,
+                                              Yf=island.Yf,
+                                              Yt=island.Yt,
+                                              Cf=island.C_branch_bus_f,
+                                              Ct=island.C_branch_bus_t,
+                                              pq=island.pq,
+                                              pv=island.pv,
+                                              factorization_cache=factorization_cache)
 
-                # compute the Jacobian
-                J = Jacobian(island.Ybus, V, Ibus, island.pq, pvpq)
-                Jfact = factorized(J)
-                dVa = np.zeros(n)
-                dVm = np.zeros(n)
+                V = V_0[island.original_bus_idx].copy()
+                Vm = np.abs(V)
+                Va = np.angle(V)
 
                 # run the PTDF time series
                 for k, t_idx in enumerate(time_indices):
-                    # dP = Pbus_0[island.original_bus_idx] - island.Sbus[:, t_idx].real
 
-                    # compute the power increment (f)
-                    dS = Sbus_0 - island.Sbus[:, t_idx]
-                    # dS = island.Sbus[:, t_idx]
-                    f = np.r_[dS[pvpq].real, dS[island.pq].imag]
+                    if self.__cancel__:
+                        break
+
+                    Ibus = island.Ibus[:, t_idx]
+                    Sbus = island.Sbus[:, t_idx]
+
+                    # numeric update and refactorization (only if the voltage moved enough)
+                    structure.factorize(V, Ibus, tolerance=self.factorization_tolerance)
 
-                    # solve the voltage increment
-                    dx = Jfact(f)
+                    # compute the power increment (f)
+                    Scalc = V * np.conj(structure.Ybus * V - Ibus)
+                    dS = Scalc - Sbus
+                    f = np.r_[dS[structure.pvpq].real, dS[structure.pq].imag]
 
-                    # reassign the solution vector
-                    dVa[pvpq] = dx[j1:j2]
-                    dVm[island.pq] = dx[j2:j3]
-                    dV = dVm * np.exp(1j * dVa)
-                    V = V_0 - dV
+                    # solve the voltage increment and update the operating point
+                    dVa, dVm = structure.get_increments(structure.solve(f))
+                    Va -= dVa
+                    Vm -= dVm
+                    V = Vm * np.exp(1j * Va)
 
                     Vf = island.C_branch_bus_f * V
                     If = np.conj(island.Yf * V)
                     Sf = (Vf * If) * island.Sbase
 
-                    results.voltage[k, island.original_bus_idx] = np.abs(V)
+                    results.voltage[k, island.original_bus_idx] = Vm
 
                     results.Sbranch[k, island.original_branch_idx] = Sf.real
 
                     results.loading[k, island.original_branch_idx] = Sf.real / (nc.branch_rates[t_idx, island.original_branch_idx] + 1e-9)
 
-                    results.S[k, island.original_bus_idx] = island.Sbus[:, t_idx].real
+                    results.S[k, island.original_bus_idx] = Sbus.real * island.Sbase
 
                     progress = ((t_idx - self.start_ + 1) / (self.end_ - self.start_)) * 100
                     self.progress_signal.emit(progress)
@@ -535,9 +683,11 @@ class PtdfTimeSeries(QThread):
             self.end_ = len(self.grid.time_profile)
         time_indices = np.arange(self.start_, self.end_)
 
-        self.results = self.run_nodal_mode(time_indices)
+        if self.use_jacobian_mode:
+            self.results = self.run_jacobian_mode(time_indices)
+        else:
+            self.results = self.run_nodal_mode(time_indices)
         # self.results = self.run_illinois_mode(time_indices)
-        # self.results = self.run_jacobian_mode(time_indices)
 
         self.elapsed = time.time() - a
 
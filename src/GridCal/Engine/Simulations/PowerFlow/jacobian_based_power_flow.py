@@ -23,11 +23,12 @@ import scipy.sparse as sp
 import numpy as np
 
 from GridCal.Engine.Sparse.csc import pack_4_by_4
-from GridCal.Engine.Simulations.sparse_solve import get_sparse_type, get_linear_solver
+from GridCal.Engine.Simulations.sparse_solve import get_sparse_type, get_linear_solver, get_factorization_cache
 from GridCal.Engine.Simulations.PowerFlow.numba_functions import calc_power_csr_numba, diag
 from GridCal.Engine.Simulations.PowerFlow.high_speed_jacobian import _create_J_with_numba, get_fastest_jacobian_function
 
 linear_solver = get_linear_solver()
+factorized_solver = get_factorization_cache()  # reuses the symbolic analysis of the repeated Jacobian patterns
 sparse = get_sparse_type()
 scipy.ALLOW_THREADS = True
 np.set_printoptions(precision=8, suppress=True, linewidth=320)
@@ -321,7 +322,7 @@ def NR_LS(Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15, acceleration_parameter=0
             # J = _create_J_with_numba(Ybus, V, pvpq, pq, pvpq_lookup, npv, npq)
 
             # compute update step
-            dx = linear_solver(J, f)
+            dx = factorized_solver.solve(J, f)
 
             # reassign the solution vector
             dVa[pvpq] = dx[j1:j2]
@@ -400,6 +401,248 @@ def NR_LS(Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15, acceleration_parameter=0
     return V, converged, norm_f, Scalc, iter_, elapsed
 
 
+def get_batch_jacobian_structure(Ybus, pvpq, pq):
+    """
+    Compute the (fixed) sparsity structure of the polar Jacobian for the given bus types.
+    The Jacobian entries are derived from the Ybus entries plus the diagonal, so the structure
+    only changes when the pv / pq sets change.
+    :param Ybus: Admittance matrix
+    :param pvpq: Array with the indices of the PV and PQ buses
+    :param pq: Array with the indices of the PQ buses
+    :return: dictionary with the structure information
+    """
+    n = Ybus.shape[0]
+    npvpq = len(pvpq)
+    npq = len(pq)
+    nj = npvpq + npq
+
+    Y = Ybus.tocoo()
+
+    # extended list of entries: the Ybus entries followed by the diagonal terms (dependent on the bus current)
+    rows = np.r_[Y.row, np.arange(n)]
+    cols = np.r_[Y.col, np.arange(n)]
+
+    pvpq_lookup = np.full(n, -1, dtype=int)
+    pvpq_lookup[pvpq] = np.arange(npvpq)
+    pq_lookup = np.full(n, -1, dtype=int)
+    pq_lookup[pq] = np.arange(npq)
+
+    r_pvpq = pvpq_lookup[rows] >= 0
+    c_pvpq = pvpq_lookup[cols] >= 0
+    r_pq = pq_lookup[rows] >= 0
+    c_pq = pq_lookup[cols] >= 0
+
+    # J11 = dS_dVa[pvpq, pvpq].real, J12 = dS_dVm[pvpq, pq].real
+    # J21 = dS_dVa[pq, pvpq].imag,   J22 = dS_dVm[pq, pq].imag
+    e11 = np.where(r_pvpq & c_pvpq)[0]
+    e12 = np.where(r_pvpq & c_pq)[0]
+    e21 = np.where(r_pq & c_pvpq)[0]
+    e22 = np.where(r_pq & c_pq)[0]
+
+    j_rows = np.r_[pvpq_lookup[rows[e11]],
+                   pvpq_lookup[rows[e12]],
+                   npvpq + pq_lookup[rows[e21]],
+                   npvpq + pq_lookup[rows[e22]]].astype(np.int64)
+
+    j_cols = np.r_[pvpq_lookup[cols[e11]],
+                   npvpq + pq_lookup[cols[e12]],
+                   pvpq_lookup[cols[e21]],
+                   npvpq + pq_lookup[cols[e22]]].astype(np.int64)
+
+    # the CSC order is the column-major order, hence sorting the linear keys gives the CSC slots
+    keys = j_cols * nj + j_rows
+    unique_keys, slot = np.unique(keys, return_inverse=True)
+    indices = unique_keys % nj
+    indptr = np.r_[0, np.cumsum(np.bincount(unique_keys // nj, minlength=nj))]
+
+    return {'n': n,
+            'nj': nj,
+            'rows': rows,
+            'cols': cols,
+            'n_y': Y.nnz,
+            'y_data': Y.data,
+            'e11': e11,
+            'e12': e12,
+            'e21': e21,
+            'e22': e22,
+            'slot': slot,
+            'n_slots': len(unique_keys),
+            'indices': indices,
+            'indptr': indptr}
+
+
+def batch_jacobian(structure, Ybus, V, Ibus):
+    """
+    Compute the block-diagonal Jacobian of a batch of power flow states that share the same
+    Ybus and the same bus types. Only the numerical values are computed here; the sparsity
+    structure is the one computed by get_batch_jacobian_structure.
+    :param structure: structure dictionary from get_batch_jacobian_structure
+    :param Ybus: Admittance matrix
+    :param V: Matrix of nodal voltages (n, nb)
+    :param Ibus: Matrix of nodal current injections (n, nb)
+    :return: block-diagonal Jacobian (nj * nb, nj * nb)
+    """
+    nb = V.shape[1]
+    nj = structure['nj']
+    n_y = structure['n_y']
+    n_slots = structure['n_slots']
+    rows = structure['rows'][:n_y]
+    cols = structure['cols'][:n_y]
+    y = structure['y_data'][:, np.newaxis]
+
+    I = Ybus * V - Ibus
+    Vnorm = V / np.abs(V)
+
+    # dS_dVa = 1j * diagV * conj(diagI - Ybus * diagV)
+    dVa_x = np.r_[-1.0j * V[rows, :] * np.conj(y * V[cols, :]),
+                  1.0j * V * np.conj(I)]
+
+    # dS_dVm = diagV * conj(Ybus * diagVnorm) + conj(diagI) * diagVnorm
+    dVm_x = np.r_[V[rows, :] * np.conj(y * Vnorm[cols, :]),
+                  np.conj(I) * Vnorm]
+
+    values = np.r_[dVa_x[structure['e11'], :].real,
+                   dVm_x[structure['e12'], :].real,
+                   dVa_x[structure['e21'], :].imag,
+                   dVm_x[structure['e22'], :].imag]
+
+    # accumulate the duplicated entries (i.e. the diagonal) in the CSC slots of every block
+    blocks = np.arange(nb)
+    slots = structure['slot'][:, np.newaxis] + n_slots * blocks[np.newaxis, :]
+    data = np.bincount(slots.ravel(order='F'), weights=values.ravel(order='F'), minlength=n_slots * nb)
+
+    indices = (structure['indices'][np.newaxis, :] + nj * blocks[:, np.newaxis]).ravel()
+    indptr = np.r_[(structure['indptr'][np.newaxis, :-1] + n_slots * blocks[:, np.newaxis]).ravel(), n_slots * nb]
+
+    J = sp.csc_matrix((data, indices, indptr), shape=(nj * nb, nj * nb))
+
+    return sparse(J)
+
+
+def NR_LS_batch(Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15, acceleration_parameter=0.05):
+    """
+    Solves many power flow states that share the same Ybus and bus types at once using
+    a full Newton's method with backtrack correction. Each column of the input matrices
+    is an independent state (i.e. a time step). The mismatches of all the states are
+    evaluated with one sparse product and the Jacobians are solved as a block-diagonal system.
+    The converged states are dropped from the iterations as they converge.
+    :param Ybus: Admittance matrix
+    :param Sbus: Matrix of nodal power injections (n, nt)
+    :param V0: Matrix of nodal voltages (initial solution) (n, nt)
+    :param Ibus: Matrix of nodal current injections (n, nt)
+    :param pv: Array with the indices of the PV buses
+    :param pq: Array with the indices of the PQ buses
+    :param tol: Tolerance
+    :param max_it: Maximum number of iterations
+    :param acceleration_parameter: parameter used to correct the "bad" iterations, should be be between 1e-3 ~ 0.5
+    :return: Voltage solution (n, nt), converged (nt), error (nt), calculated power injections (n, nt),
+             iterations (nt), elapsed
+    """
+    start = time.time()
+
+    n, nt = V0.shape
+    V = V0.copy()
+    Va = np.angle(V)
+    Vm = np.abs(V)
+
+    # set up indexing for updating V
+    pvpq = np.r_[pv, pq]
+    npvpq = len(pvpq)
+
+    iterations = np.zeros(nt, dtype=int)
+
+    # evaluate F(x0)
+    Scalc = V * np.conj(Ybus * V - Ibus)
+
+    if npvpq > 0:
+
+        dS = Scalc - Sbus  # compute the mismatch
+        f = np.r_[dS[pvpq, :].real, dS[pq, :].imag]
+        norm_f = 0.5 * (f * f).sum(axis=0)
+        converged = norm_f < tol
+
+        structure = get_batch_jacobian_structure(Ybus, pvpq, pq)
+        nj = structure['nj']
+
+        # indices of the states that are still being iterated
+        active = np.where(~converged)[0]
+        iter_ = 0
+
+        while len(active) > 0 and iter_ < max_it:
+            # update iteration counter
+            iter_ += 1
+            iterations[active] += 1
+            na = len(active)
+
+            Ia = Ibus[:, active]
+            Sa = Sbus[:, active]
+
+            # evaluate the block-diagonal Jacobian and solve all the steps at once
+            J = batch_jacobian(structure, Ybus, V[:, active], Ia)
+            dx = factorized_solver.solve(J, f[:, active].ravel(order='F')).reshape((nj, na), order='F')
+
+            # reassign the solution vector
+            dVa = np.zeros((n, na))
+            dVm = np.zeros((n, na))
+            dVa[pvpq, :] = dx[:npvpq, :]
+            dVm[pq, :] = dx[npvpq:, :]
+
+            # update voltage the Newton way (mu=1)
+            mu_ = np.ones(na)
+            Vm_new = Vm[:, active] - dVm
+            Va_new = Va[:, active] - dVa
+            Vnew = Vm_new * np.exp(1.0j * Va_new)
+
+            # compute the mismatch function f(x_new)
+            Snew = Vnew * np.conj(Ybus * Vnew - Ia)
+            dS = Snew - Sa
+            f_new = np.r_[dS[pvpq, :].real, dS[pq, :].imag]
+            norm_f_new = 0.5 * (f_new * f_new).sum(axis=0)
+
+            # back track the states that did not improve
+            worse = norm_f_new > norm_f[active]
+            l_iter = 0
+            while worse.any() and l_iter < 10:
+                b = np.where(worse & (mu_ > 0.01))[0]
+                if len(b) == 0:
+                    break
+
+                mu_[b] *= acceleration_parameter
+                Vm_new[:, b] = Vm[:, active[b]] - mu_[b] * dVm[:, b]
+                Va_new[:, b] = Va[:, active[b]] - mu_[b] * dVa[:, b]
+                Vnew[:, b] = Vm_new[:, b] * np.exp(1.0j * Va_new[:, b])
+
+                Snew[:, b] = Vnew[:, b] * np.conj(Ybus * Vnew[:, b] - Ia[:, b])
+                dS = Snew[:, b] - Sa[:, b]
+                f_new[:, b] = np.r_[dS[pvpq, :].real, dS[pq, :].imag]
+                norm_f_new[b] = 0.5 * (f_new[:, b] * f_new[:, b]).sum(axis=0)
+
+                worse[b] = norm_f_new[b] > norm_f[active[b]]
+                l_iter += 1
+
+            # update calculation variables
+            Vm[:, active] = Vm_new
+            Va[:, active] = Va_new
+            V[:, active] = Vnew
+            Scalc[:, active] = Snew
+            f[:, active] = f_new
+            norm_f[active] = norm_f_new
+
+            # check for convergence and drop the converged states
+            converged[active] = norm_f_new < tol
+            active = active[~converged[active]]
+
+    else:
+        norm_f = np.zeros(nt)
+        converged = np.ones(nt, dtype=bool)
+        Scalc = Sbus.copy()
+
+    end = time.time()
+    elapsed = end - start
+
+    return V, converged, norm_f, Scalc, iterations, elapsed
+
+
 def NRD_LS(Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15, acceleration_parameter=0.05, error_registry=None):
     """
     Solves the power flow using a full Newton's method with backtrack correction.
@@ -610,7 +853,7 @@ def IwamotoNR(Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15, robust=False):
 
             # compute update step
             try:
-                dx = linear_solver(J, f)
+                dx = factorized_solver.solve(J, f)
             except:
                 print(J)
                 converged = False
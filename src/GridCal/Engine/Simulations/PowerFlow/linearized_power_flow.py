@@ -55,10 +55,11 @@ def dcpf(Ybus, Bpqpv, Bref, Sbus, Ibus, V0, ref, pvpq, pq, pv):
 
         # compose the reduced power injections
         # Since we have removed the slack nodes, we must account their influence as injections Bref * Va_ref
-        Pinj = Sbus[pvpq].real + (- Bref * Va_ref + Ibus[pvpq].real) * Vm[pvpq]
+        # (Bpqpv and Bref are blocks of imag(Ybus), which is the negative of the DC susceptance matrix)
+        Pinj = Sbus[pvpq].real + (Bref * Va_ref + Ibus[pvpq].real) * Vm[pvpq]
 
         # update angles for non-reference buses
-        Va[pvpq] = linear_solver(Bpqpv, Pinj)
+        Va[pvpq] = linear_solver(-Bpqpv, Pinj)
         Va[ref] = Va_ref
 
         # re assemble the voltage
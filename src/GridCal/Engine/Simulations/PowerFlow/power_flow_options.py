@@ -70,6 +70,15 @@ class PowerFlowOptions:
 
         **correction_parameter** (float, 1e-4): parameter used to correct the "bad" iterations,
                                                 should be be between 1e-4 ~ 0.5
+
+        **batch_time_series** (bool, False): Solve the time series with the vectorized Newton-Raphson that
+                                             solves many time steps per iteration (only without outer loop controls)
+
+        **batch_size** (int, 256): Number of time steps solved together in the batch time series mode
+
+        **incremental_compilation** (bool, False): Update the previous compilation of the grid with the devices
+                                                   marked as modified (MultiCircuit.set_modified) instead of
+                                                   compiling the whole grid again
     """
 
     def __init__(self,
@@ -90,7 +99,10 @@ class PowerFlowOptions:
                  q_steepness_factor=30,
                  distributed_slack=False,
                  ignore_single_node_islands=False,
-                 correction_parameter=1e-4):
+                 correction_parameter=1e-4,
+                 batch_time_series=False,
+                 batch_size=256,
+                 incremental_compilation=False):
 
         self.solver_type = solver_type
 
@@ -128,5 +140,11 @@ class PowerFlowOptions:
 
         self.acceleration_parameter = correction_parameter
 
+        self.batch_time_series = batch_time_series
+
+        self.batch_size = batch_size
+
+        self.incremental_compilation = incremental_compilation
+
     def __str__(self):
         return "PowerFlowOptions"
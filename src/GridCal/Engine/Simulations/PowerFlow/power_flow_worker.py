@@ -28,7 +28,7 @@ from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOpt
 from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Core.common_functions import compile_types
-from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands, update_snapshot_circuit
 
 
 class ConvergenceReport:
@@ -116,7 +116,8 @@ def solve(options: PowerFlowOptions, report: ConvergenceReport, V0, Sbus, Ibus,
                        SolverType.IWAMOTO,
                        SolverType.LM,
                        SolverType.LACPF]
-        solver_list.remove(options.solver_type)
+        if options.solver_type in solver_list:
+            solver_list.remove(options.solver_type)
         solvers = [options.solver_type] + solver_list
     else:
         # No retry selected
@@ -797,6 +798,67 @@ def power_flow_post_process(calculation_inputs: SnapshotCircuit, Sbus, V, branch
     return Sbranch, Ibranch, Vbranch, loading, losses, flow_direction, Sbus
 
 
+def power_flow_post_process_batch(calculation_inputs: SnapshotCircuit, Sbus, V, branch_rates):
+    """
+    Compute the power flows trough the branches for many states at once
+    (vectorized version of power_flow_post_process).
+
+    Arguments:
+
+        **calculation_inputs**: instance of Circuit
+
+        **Sbus**: Power injections matrix (n, nt)
+
+        **V**: Voltage solution matrix for the circuit buses (n, nt)
+
+        **branch_rates**: Branch rates matrix (nt, m)
+
+    Returns:
+
+        Sbranch (MVA), Ibranch (p.u.), Vbranch (p.u.), loading (p.u.), losses (MVA), flow_direction, Sbus(MVA)
+        all of them with one column per state
+    """
+    # Compute the slack and pv buses power
+    vd = calculation_inputs.vd
+    pv = calculation_inputs.pv
+    Ybus = calculation_inputs.Ybus
+
+    # power at the slack nodes
+    Sbus[vd, :] = V[vd, :] * np.conj(Ybus[vd, :] * V)
+
+    # Reactive power at the pv nodes
+    P = Sbus[pv, :].real
+    Q = (V[pv, :] * np.conj(Ybus[pv, :] * V)).imag
+    Sbus[pv, :] = P + 1j * Q  # keep the original P injection and set the calculated reactive power
+
+    # Branches current, loading, etc
+    Vf = calculation_inputs.C_branch_bus_f * V
+    Vt = calculation_inputs.C_branch_bus_t * V
+    If = calculation_inputs.Yf * V
+    It = calculation_inputs.Yt * V
+    Sf = Vf * np.conj(If)
+    St = Vt * np.conj(It)
+
+    # Branch losses in MVA
+    losses = (Sf + St) * calculation_inputs.Sbase
+
+    flow_direction = Sf.real / np.abs(Sf + 1e-20)
+
+    # branch voltage increment
+    Vbranch = Vf - Vt
+
+    # Branch current in p.u.
+    Ibranch = If
+
+    # Branch power in MVA
+    Sbranch = Sf * calculation_inputs.Sbase
+
+    # Branch loading in p.u.
+    loading = Sbranch / (branch_rates.T + 1e-9)
+
+    return Sbranch, Ibranch, Vbranch, loading, losses, flow_direction, Sbus
+
+
 def control_q_direct(V, Vset, Q, Qmax, Qmin, types, original_types, verbose):
     """
     Change the buses type in order to control the generators reactive power.
@@ -1207,10 +1269,15 @@ def multi_island_pf(multi_circuit: MultiCircuit, options: PowerFlowOptions, opf_
     :return: PowerFlowResults instance
     """
 
-    numerical_circuit = compile_snapshot_circuit(circuit=multi_circuit,
-                                                 apply_temperature=options.apply_temperature_correction,
-                                                 branch_tolerance_mode=options.branch_impedance_tolerance_mode,
-                                                 opf_results=opf_results)
+    if options.incremental_compilation and opf_results is None:
+        numerical_circuit = update_snapshot_circuit(circuit=multi_circuit,
+                                                    apply_temperature=options.apply_temperature_correction,
+                                                    branch_tolerance_mode=options.branch_impedance_tolerance_mode)
+    else:
+        numerical_circuit = compile_snapshot_circuit(circuit=multi_circuit,
+                                                     apply_temperature=options.apply_temperature_correction,
+                                                     branch_tolerance_mode=options.branch_impedance_tolerance_mode,
+                                                     opf_results=opf_results)
 
     calculation_inputs = split_into_islands(numeric_circuit=numerical_circuit,
                                             ignore_single_node_islands=options.ignore_single_node_islands)
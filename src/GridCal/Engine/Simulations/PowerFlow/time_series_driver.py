@@ -17,25 +17,32 @@ import json
 import pandas as pd
 import numpy as np
 import time
+import shutil
+import tempfile
 import multiprocessing
 from sklearn.cluster import KMeans
 from PySide2.QtCore import QThread, QThreadPool, Signal
 
-from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.basic_structures import Logger, ReactivePowerControlMode, TapsControlMode, SolverType
 from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf, power_flow_worker_args
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf, power_flow_worker_args, \
+    power_flow_post_process_batch
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NR_LS_batch
+from GridCal.Engine.Simulations.PowerFlow.time_series_shared_data import SharedTimeIsland, \
+    time_series_shared_data_worker
 from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit, split_time_circuit_into_islands, BranchImpedanceMode
 from GridCal.Engine.Simulations.Stochastic.latin_hypercube_sampling import lhs
+from GridCal.Engine.IO.h5_interface import H5TimeSeriesStore
 from GridCal.Gui.GuiFunctions import ResultsModel
 
 
 class TimeSeriesResults(PowerFlowResults):
 
     def __init__(self, n, m, n_tr, n_hvdc, bus_names, branch_names, transformer_names, hvdc_names,
-                 time_array, bus_types):
+                 time_array, bus_types, file_name=None, chunk_steps=256):
         """
         TimeSeriesResults constructor
         :param n: number of buses
@@ -48,6 +55,8 @@ class TimeSeriesResults(PowerFlowResults):
         :param hvdc_names:
         :param time_array:
         :param bus_types:
+        :param file_name: HDF5 file where to stream the results (if None, the results are kept in memory)
+        :param chunk_steps: number of time steps of the HDF5 chunks
         """
         PowerFlowResults.__init__(self,
                                   n=n,
@@ -69,31 +78,64 @@ class TimeSeriesResults(PowerFlowResults):
 
         self.bus_types = np.zeros(n, dtype=int)
 
-        self.voltage = np.zeros((self.nt, n), dtype=complex)
+        self.file_name = file_name
+
+        self.chunk_steps = chunk_steps
+
+        if file_name is not None:
+            # the (time, element) results are written to disk by blocks and read lazily by slices
+            self.store = H5TimeSeriesStore.create(file_name=file_name,
+                                                  nt=self.nt,
+                                                  variables={'voltage': (n, complex, 0),
+                                                             'S': (n, complex, 0),
+                                                             'Sbranch': (m, complex, 0),
+                                                             'Ibranch': (m, complex, 0),
+                                                             'Vbranch': (m, complex, 0),
+                                                             'loading': (m, complex, 0),
+                                                             'losses': (m, complex, 0),
+                                                             'flow_direction': (m, float, 0),
+                                                             'error': (None, float, 0),
+                                                             'converged': (None, bool, True)},
+                                                  time_array=time_array,
+                                                  chunk_steps=chunk_steps)
+            self.voltage = self.store['voltage']
+            self.S = self.store['S']
+            self.Sbranch = self.store['Sbranch']
+            self.Ibranch = self.store['Ibranch']
+            self.Vbranch = self.store['Vbranch']
+            self.loading = self.store['loading']
+            self.losses = self.store['losses']
+            self.flow_direction = self.store['flow_direction']
+            self.error = self.store['error']
+            self.converged = self.store['converged']
+        else:
+            self.store = None
 
-        self.S = np.zeros((self.nt, n), dtype=complex)
+            self.voltage = np.zeros((self.nt, n), dtype=complex)
 
-        self.Sbranch = np.zeros((self.nt, m), dtype=complex)
+            self.S = np.zeros((self.nt, n), dtype=complex)
 
-        self.Ibranch = np.zeros((self.nt, m), dtype=complex)
+            self.Sbranch = np.zeros((self.nt, m), dtype=complex)
 
-        self.Vbranch = np.zeros((self.nt, m), dtype=complex)
+            self.Ibranch = np.zeros((self.nt, m), dtype=complex)
 
-        self.loading = np.zeros((self.nt, m), dtype=complex)
+            self.Vbranch = np.zeros((self.nt, m), dtype=complex)
 
-        self.losses = np.zeros((self.nt, m), dtype=complex)
+            self.loading = np.zeros((self.nt, m), dtype=complex)
 
-        self.hvdc_losses = np.zeros((self.nt, self.n_hvdc))
+            self.losses = np.zeros((self.nt, m), dtype=complex)
 
-        self.hvdc_sent_power = np.zeros((self.nt, self.n_hvdc))
+            self.flow_direction = np.zeros((self.nt, m), dtype=float)
 
-        self.hvdc_loading = np.zeros((self.nt, self.n_hvdc))
+            self.error = np.zeros(self.nt)
+
+            self.converged = np.ones(self.nt, dtype=bool)  # guilty assumption
 
-        self.flow_direction = np.zeros((self.nt, m), dtype=float)
+        self.hvdc_losses = np.zeros((self.nt, self.n_hvdc))
 
-        self.error = np.zeros(self.nt)
+        self.hvdc_sent_power = np.zeros((self.nt, self.n_hvdc))
 
-        self.converged = np.ones(self.nt, dtype=bool)  # guilty assumption
+        self.hvdc_loading = np.zeros((self.nt, self.n_hvdc))
 
         self.overloads = [None] * self.nt
 
@@ -184,6 +226,41 @@ class TimeSeriesResults(PowerFlowResults):
 
         return df
 
+    def set_chunk(self, t_idx, b_idx, br_idx, voltage, S, Sbranch, Ibranch, Vbranch, loading, losses,
+                  flow_direction, error, converged):
+        """
+        Set the results of a block of time steps of an island
+        :param t_idx: sorted positions of the time steps in these results
+        :param b_idx: bus original indices
+        :param br_idx: branch original indices
+        :param voltage: (time steps, island buses) array
+        :param S: (time steps, island buses) array
+        :param Sbranch: (time steps, island branches) array
+        :param Ibranch: (time steps, island branches) array
+        :param Vbranch: (time steps, island branches) array
+        :param loading: (time steps, island branches) array
+        :param losses: (time steps, island branches) array
+        :param flow_direction: (time steps, island branches) array
+        :param error: array of errors of the time steps
+        :param converged: array of convergence flags of the time steps
+        """
+        for arr, idx, values in [(self.voltage, b_idx, voltage),
+                                 (self.S, b_idx, S),
+                                 (self.Sbranch, br_idx, Sbranch),
+                                 (self.Ibranch, br_idx, Ibranch),
+                                 (self.Vbranch, br_idx, Vbranch),
+                                 (self.loading, br_idx, loading),
+                                 (self.losses, br_idx, losses),
+                                 (self.flow_direction, br_idx, flow_direction)]:
+            if self.store is not None:
+                arr.write_block(t_idx, idx, values)
+            else:
+                arr[np.ix_(t_idx, idx)] = values
+
+        # the error of a time step is the largest among its islands
+        self.error[t_idx] = np.maximum(self.error[t_idx], error)
+        self.converged[t_idx] = self.converged[t_idx] * converged
+
     def apply_from_island(self, results, b_idx, br_idx, t_index, grid_idx):
         """
         Apply results from another island circuit to the circuit results represented here
@@ -195,6 +272,20 @@ class TimeSeriesResults(PowerFlowResults):
         :return:
         """
 
+        if self.store is not None:
+            self.set_chunk(t_index, b_idx, br_idx,
+                           voltage=results.voltage,
+                           S=results.S,
+                           Sbranch=results.Sbranch,
+                           Ibranch=results.Ibranch,
+                           Vbranch=results.Vbranch,
+                           loading=results.loading,
+                           losses=results.losses,
+                           flow_direction=results.flow_direction,
+                           error=results.error,
+                           converged=results.converged)
+            return
+
         # bus results
         if self.voltage.shape == results.voltage.shape:
             self.voltage = results.voltage
@@ -240,21 +331,71 @@ class TimeSeriesResults(PowerFlowResults):
 
             self.converged[t_index] = self.converged[t_index] * results.converged
 
+    def finish(self):
+        """
+        Flush the HDF5 store of the results (if any) and keep it open read-only,
+        so that the file can be read (or overwritten by another simulation) meanwhile
+        """
+        if self.store is not None:
+            self.store.reopen(mode='r')
+
+    def close(self):
+        """
+        Close the HDF5 store of the results (if any)
+        """
+        if self.store is not None:
+            self.store.close()
+
+    def read(self, arr, fn=None, indices=None):
+        """
+        Read a (time, elements) results array applying a function to it.
+        The HDF5 results are read and transformed by blocks of time steps, so the complete array
+        is never loaded before being transformed
+        :param arr: results array (numpy array or H5LazyArray)
+        :param fn: function applied to the values (None to read them as they are)
+        :param indices: indices of the elements to read (all if None)
+        :return: 2D numpy array (time, elements)
+        """
+        if fn is None:
+            fn = np.asarray
+
+        if self.store is None:
+            return fn(arr if indices is None else arr[:, indices])
+
+        if indices is None:
+            cols = slice(None)
+            order = slice(None)
+        else:
+            # h5py reads the elements in increasing order only
+            cols, order = np.unique(indices, return_inverse=True)
+
+        data = None
+        for a in range(0, self.nt, self.chunk_steps):
+            b = min(a + self.chunk_steps, self.nt)
+            block = fn(arr[a:b, cols][:, order])
+            if data is None:
+                data = np.empty((self.nt, block.shape[1]), dtype=block.dtype)
+            data[a:b, :] = block
+
+        if data is None:
+            data = fn(arr[0:0, cols][:, order])  # no time steps
+        return data
+
     def get_results_dict(self):
         """
         Returns a dictionary with the results sorted in a dictionary
         :return: dictionary of 2D numpy arrays (probably of complex numbers)
         """
-        data = {'Vm': np.abs(self.voltage).tolist(),
-                'Va': np.angle(self.voltage).tolist(),
-                'P': self.S.real.tolist(),
-                'Q': self.S.imag.tolist(),
-                'Sbr_real': self.Sbranch.real.tolist(),
-                'Sbr_imag': self.Sbranch.imag.tolist(),
-                'Ibr_real': self.Ibranch.real.tolist(),
-                'Ibr_imag': self.Ibranch.imag.tolist(),
-                'loading': np.abs(self.loading).tolist(),
-                'losses': np.abs(self.losses).tolist()}
+        data = {'Vm': self.read(self.voltage, np.abs).tolist(),
+                'Va': self.read(self.voltage, np.angle).tolist(),
+                'P': self.read(self.S, np.real).tolist(),
+                'Q': self.read(self.S, np.imag).tolist(),
+                'Sbr_real': self.read(self.Sbranch, np.real).tolist(),
+                'Sbr_imag': self.read(self.Sbranch, np.imag).tolist(),
+                'Ibr_real': self.read(self.Ibranch, np.real).tolist(),
+                'Ibr_imag': self.read(self.Ibranch, np.imag).tolist(),
+                'loading': self.read(self.loading, np.abs).tolist(),
+                'losses': self.read(self.losses, np.abs).tolist()}
         return data
 
     def save(self, fname):
@@ -284,119 +425,119 @@ class TimeSeriesResults(PowerFlowResults):
         return branch_overload_frequency, bus_undervoltage_frequency, bus_overvoltage_frequency, \
                 buses_selected_for_storage_frequency
 
-    def mdl(self, result_type: ResultTypes) -> "ResultsModel":
+    def mdl(self, result_type: ResultTypes, indices=None, names=None) -> "ResultsModel":
         """
-
-        :param result_type:
-        :param indices:
-        :param names:
-        :return:
+        Get the results model (only the requested elements are read from the HDF5 store)
+        :param result_type: ResultTypes
+        :param indices: indices of the buses or branches to show (all if None)
+        :param names: not used, kept for compatibility
+        :return: ResultsModel
         """
 
         if result_type == ResultTypes.BusVoltageModule:
             labels = self.bus_names
-            data = np.abs(self.voltage)
+            data = self.read(self.voltage, np.abs, indices)
             y_label = '(p.u.)'
             title = 'Bus voltage '
 
         elif result_type == ResultTypes.BusVoltageAngle:
             labels = self.bus_names
-            data = np.angle(self.voltage, deg=True)
+            data = self.read(self.voltage, lambda x: np.angle(x, deg=True), indices)
             y_label = '(Deg)'
             title = 'Bus voltage '
 
         elif result_type == ResultTypes.BusActivePower:
             labels = self.bus_names
-            data = self.S.real
+            data = self.read(self.S, np.real, indices)
             y_label = '(MW)'
             title = 'Bus active power '
 
         elif result_type == ResultTypes.BusReactivePower:
             labels = self.bus_names
-            data = self.S.imag
+            data = self.read(self.S, np.imag, indices)
             y_label = '(MVAr)'
             title = 'Bus reactive power '
 
         elif result_type == ResultTypes.BranchPower:
             labels = self.branch_names
-            data = self.Sbranch
+            data = self.read(self.Sbranch, None, indices)
             y_label = '(MVA)'
             title = 'Branch power '
 
         elif result_type == ResultTypes.BranchActivePower:
             labels = self.branch_names
-            data = self.Sbranch.real
+            data = self.read(self.Sbranch, np.real, indices)
             y_label = '(MW)'
             title = 'Branch power '
 
         elif result_type == ResultTypes.BranchReactivePower:
             labels = self.branch_names
-            data = self.Sbranch.imag
+            data = self.read(self.Sbranch, np.imag, indices)
             y_label = '(MVAr)'
             title = 'Branch power '
 
         elif result_type == ResultTypes.BranchCurrent:
             labels = self.branch_names
-            data = self.Ibranch
+            data = self.read(self.Ibranch, None, indices)
             y_label = '(kA)'
             title = 'Branch current '
 
         elif result_type == ResultTypes.BranchActiveCurrent:
             labels = self.branch_names
-            data = self.Ibranch.real
+            data = self.read(self.Ibranch, np.real, indices)
             y_label = '(p.u.)'
             title = 'Branch current '
 
         elif result_type == ResultTypes.BranchReactiveCurrent:
             labels = self.branch_names
-            data = self.Ibranch.imag
+            data = self.read(self.Ibranch, np.imag, indices)
             y_label = '(p.u.)'
             title = 'Branch current '
 
         elif result_type == ResultTypes.BranchLoading:
             labels = self.branch_names
-            data = np.abs(self.loading) * 100
+            data = self.read(self.loading, np.abs, indices) * 100
             y_label = '(%)'
             title = 'Branch loading '
 
         elif result_type == ResultTypes.BranchLosses:
             labels = self.branch_names
-            data = self.losses
+            data = self.read(self.losses, None, indices)
             y_label = '(MVA)'
             title = 'Branch losses'
 
         elif result_type == ResultTypes.BranchActiveLosses:
             labels = self.branch_names
-            data = self.losses.real
+            data = self.read(self.losses, np.real, indices)
             y_label = '(MW)'
             title = 'Branch losses'
 
         elif result_type == ResultTypes.BranchReactiveLosses:
             labels = self.branch_names
-            data = self.losses.imag
+            data = self.read(self.losses, np.imag, indices)
             y_label = '(MVAr)'
             title = 'Branch losses'
 
         elif result_type == ResultTypes.BranchVoltage:
             labels = self.branch_names
-            data = np.abs(self.Vbranch)
+            data = self.read(self.Vbranch, np.abs, indices)
             y_label = '(p.u.)'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BranchAngles:
             labels = self.branch_names
-            data = np.angle(self.Vbranch, deg=True)
+            data = self.read(self.Vbranch, lambda x: np.angle(x, deg=True), indices)
             y_label = '(deg)'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BatteryPower:
             labels = self.branch_names
-            data = np.zeros_like(self.losses)
+            data = np.zeros((self.nt, self.m if indices is None else len(indices)))
             y_label = '$\Delta$ (MVA)'
             title = 'Battery power'
 
         elif result_type == ResultTypes.SimulationError:
-            data = self.error.reshape(-1, 1)
+            data = np.asarray(self.error).reshape(-1, 1)
             y_label = 'p.u.'
             labels = ['Error']
             title = 'Error'
@@ -404,6 +545,9 @@ class TimeSeriesResults(PowerFlowResults):
         else:
             raise Exception('Result type not understood:' + str(result_type))
 
+        if indices is not None and result_type != ResultTypes.SimulationError:
+            labels = np.array(labels)[indices]
+
         if self.time is not None:
             index = self.time
         else:
@@ -457,89 +601,6 @@ def kmeans_case_sampling(X, n_points=10):
     return closest_idx, closest_prob
 
 
-def time_series_worker(n, m, time_profile, namespace, options: PowerFlowOptions,
-                       time_indices, logger: Logger) -> (TimeSeriesResults, np.array):
-    """
-
-    :param n:
-    :param m:
-    :param time_profile:
-    :param buses:
-    :param numerical_circuit:
-    :param options:
-    :param time_indices:  array of time indices to consider
-    :param logger:
-    :return: TimeSeriesResults instance
-    """
-
-    # initialize the grid time series results we will append the island results with another function
-    time_series_results = TimeSeriesResults(n, m, time_array=time_profile[time_indices])
-
-    calc_inputs_dict = namespace.calc_inputs_dict
-    time_series_results.bus_types = namespace.bus_types
-
-    # for each partition of the profiles...
-    for t_key, calc_inputs in calc_inputs_dict.items():
-
-        # For every island, run the time series
-        for island_index, calculation_input in enumerate(calc_inputs):
-
-            # find the original indices
-            bus_original_idx = calculation_input.original_bus_idx
-            branch_original_idx = calculation_input.original_branch_idx
-
-            # if there are valid profiles...
-            if time_profile is not None:
-
-                # declare a results object for the partition
-                results = TimeSeriesResults(n=calculation_input.nbus,
-                                            m=calculation_input.nbr,
-                                            time_array=time_profile[time_indices])
-                last_voltage = calculation_input.Vbus
-
-                # default value in case of single-valued profile
-                dt = 1.0
-
-                # traverse the time profiles of the partition and simulate each time step
-                for it, t in enumerate(time_indices):
-
-                    # set the power values
-                    # if the storage dispatch option is active, the batteries power is not included
-                    # therefore, it shall be included after processing
-                    Ysh = calculation_input.Ysh_prof[:, it]
-                    I = calculation_input.Ibus_prof[:, it]
-                    S = calculation_input.Sbus_prof[:, it]
-                    branch_rates = calculation_input.branch_rates_prof[it, :]
-
-                    # add the controlled storage power if we are controlling the storage devices
-                    if options.dispatch_storage:
-
-                        if (it+1) < len(calculation_input.original_time_idx):
-                            # compute the time delta: the time values come in nanoseconds
-                            dt = (calculation_input.time_array[it + 1]
-                                  - calculation_input.time_array[it]).value * 1e-9 / 3600.0
-
-                    # run power flow at the circuit
-                    res = single_island_pf(circuit=calculation_input,
-                                           Vbus=last_voltage,
-                                           Sbus=S,
-                                           Ibus=I,
-                                           branch_rates=branch_rates,
-                                           options=options,
-                                           logger=logger)
-
-                    # store circuit results at the time index 'it'
-                    results.set_at(it, res)
-
-                # merge the circuit's results
-                time_series_results.apply_from_island(results,
-                                                      bus_original_idx,
-                                                      branch_original_idx,
-                                                      time_indices,
-                                                      'TS')
-    return time_series_results, time_indices
-
-
 class TimeSeries(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
@@ -547,11 +608,12 @@ class TimeSeries(QThread):
     name = 'Time Series'
 
     def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, opf_time_series_results=None,
-                 start_=0, end_=None, use_clustering=False, cluster_number=10):
+                 start_=0, end_=None, use_clustering=False, cluster_number=10, results_file_name=None):
         """
         TimeSeries constructor
         @param grid: MultiCircuit instance
         @param options: PowerFlowOptions instance
+        @param results_file_name: HDF5 file where to stream the results as they are computed (None to keep them in memory)
         """
         QThread.__init__(self)
 
@@ -572,6 +634,8 @@ class TimeSeries(QThread):
 
         self.cluster_number = cluster_number
 
+        self.results_file_name = results_file_name
+
         self.elapsed = 0
 
         self.logger = Logger()
@@ -618,13 +682,29 @@ class TimeSeries(QThread):
                                                 transformer_names=numerical_circuit.tr_names,
                                                 hvdc_names=numerical_circuit.hvdc_names,
                                                 bus_types=numerical_circuit.bus_types,
-                                                time_array=self.grid.time_profile[time_indices])
+                                                time_array=self.grid.time_profile[time_indices],
+                                                file_name=self.results_file_name)
 
         time_series_results.bus_types = numerical_circuit.bus_types
 
         # For every island, run the time series
         for island_index, calculation_input in enumerate(time_islands):
 
+            if self.batch_applicable(calculation_input):
+                self.progress_text.emit('Batch time series at circuit ' + str(island_index) + '...')
+
+                # the island results are written into the circuit's results as each batch is solved
+                self.run_batch_island(calculation_input, time_indices, time_series_results)
+
+                if self.__cancel__:
+                    return time_series_results
+                continue
+
+            elif self.options.batch_time_series:
+                self.logger.append('The batch time series is not applicable to the island ' + str(island_index) +
+                                   ' with the selected options (only Newton-Raphson without controls), '
+                                   'it is solved step by step')
+
             # Are we dispatching storage? if so, generate a dictionary of battery -> bus index
             # to be able to set the batteries values into the vector S
             batteries = list()
@@ -642,17 +722,9 @@ class TimeSeries(QThread):
             bus_original_idx = calculation_input.original_bus_idx
             branch_original_idx = calculation_input.original_branch_idx
 
-            # declare a results object for the partition
-            results = TimeSeriesResults(n=calculation_input.nbus,
-                                        m=calculation_input.nbr,
-                                        n_tr=calculation_input.ntr,
-                                        n_hvdc=calculation_input.nhvdc,
-                                        bus_names=calculation_input.bus_names,
-                                        branch_names=calculation_input.branch_names,
-                                        transformer_names=calculation_input.tr_names,
-                                        hvdc_names=calculation_input.hvdc_names,
-                                        bus_types=numerical_circuit.bus_types,
-                                        time_array=self.grid.time_profile[time_indices])
+            # when the results are streamed to disk, the island results are held for a block of steps only
+            nt = len(time_indices)
+            block_size = time_series_results.chunk_steps if time_series_results.store is not None else nt
 
             self.progress_signal.emit(0.0)
 
@@ -660,72 +732,182 @@ class TimeSeries(QThread):
             dt = 1.0
 
             # traverse the time profiles of the partition and simulate each time step
-            for it, t in enumerate(time_indices):
-
-                # set the power values
-                # if the storage dispatch option is active, the batteries power is not included
-                # therefore, it shall be included after processing
-                V = calculation_input.Vbus[it, :]
-                Ysh = calculation_input.Yshunt_from_devices[:, it]
-                I = calculation_input.Ibus[:, it]
-                S = calculation_input.Sbus[:, it]
-                branch_rates = calculation_input.branch_rates[it, :]
-
-                # add the controlled storage power if we are controlling the storage devices
-                if self.options.dispatch_storage:
+            for a in range(0, nt, block_size):
+                b = min(a + block_size, nt)
+
+                # declare a results object for the block of the partition
+                results = TimeSeriesResults(n=calculation_input.nbus,
+                                            m=calculation_input.nbr,
+                                            n_tr=calculation_input.ntr,
+                                            n_hvdc=calculation_input.nhvdc,
+                                            bus_names=calculation_input.bus_names,
+                                            branch_names=calculation_input.branch_names,
+                                            transformer_names=calculation_input.tr_names,
+                                            hvdc_names=calculation_input.hvdc_names,
+                                            bus_types=numerical_circuit.bus_types,
+                                            time_array=self.grid.time_profile[time_indices[a:b]])
+
+                for it in range(a, b):
+                    t = time_indices[it]
+
+                    # set the power values
+                    # if the storage dispatch option is active, the batteries power is not included
+                    # therefore, it shall be included after processing
+                    V = calculation_input.Vbus[it, :]
+                    Ysh = calculation_input.Yshunt_from_devices[:, it]
+                    I = calculation_input.Ibus[:, it]
+                    S = calculation_input.Sbus[:, it]
+                    branch_rates = calculation_input.branch_rates[it, :]
 
-                    if (it+1) < len(calculation_input.original_time_idx):
-                        # compute the time delta: the time values come in nanoseconds
-                        dt = (calculation_input.time_array[it + 1]
-                              - calculation_input.time_array[it]).value * 1e-9 / 3600.0
+                    # add the controlled storage power if we are controlling the storage devices
+                    if self.options.dispatch_storage:
 
-                    for k, battery in enumerate(batteries):
+                        if (it+1) < len(calculation_input.original_time_idx):
+                            # compute the time delta: the time values come in nanoseconds
+                            dt = (calculation_input.time_array[it + 1]
+                                  - calculation_input.time_array[it]).value * 1e-9 / 3600.0
 
-                        power = battery.get_processed_at(it, dt=dt, store_values=True)
+                        for k, battery in enumerate(batteries):
 
-                        bus_idx = batteries_bus_idx[k]
+                            power = battery.get_processed_at(it, dt=dt, store_values=True)
 
-                        S[bus_idx] += power / calculation_input.Sbase
+                            bus_idx = batteries_bus_idx[k]
 
-                # run power flow at the circuit
-                res = single_island_pf(circuit=calculation_input,
-                                       Vbus=V,
-                                       Sbus=S,
-                                       Ibus=I,
-                                       branch_rates=branch_rates,
-                                       options=self.options,
-                                       logger=self.logger)
+                            S[bus_idx] += power / calculation_input.Sbase
 
-                # Recycle voltage solution
-                # last_voltage = res.voltage
+                    # run power flow at the circuit
+                    res = single_island_pf(circuit=calculation_input,
+                                           Vbus=V,
+                                           Sbus=S,
+                                           Ibus=I,
+                                           branch_rates=branch_rates,
+                                           options=self.options,
+                                           logger=self.logger)
 
-                # store circuit results at the time index 'it'
-                results.set_at(it, res)
+                    # Recycle voltage solution
+                    # last_voltage = res.voltage
 
-                progress = ((t - self.start_ + 1) / (self.end_ - self.start_)) * 100
-                self.progress_signal.emit(progress)
-                self.progress_text.emit('Simulating island ' + str(island_index)
-                                        + ' at ' + str(self.grid.time_profile[t]))
+                    # store circuit results at the time index 'it' of the block
+                    results.set_at(it - a, res)
+
+                    progress = ((t - self.start_ + 1) / (self.end_ - self.start_)) * 100
+                    self.progress_signal.emit(progress)
+                    self.progress_text.emit('Simulating island ' + str(island_index)
+                                            + ' at ' + str(self.grid.time_profile[t]))
+
+                    if self.__cancel__:
+                        break
+
+                # merge the circuit's results
+                time_series_results.apply_from_island(results,
+                                                      bus_original_idx,
+                                                      branch_original_idx,
+                                                      np.arange(a, b),
+                                                      'TS')
 
                 if self.__cancel__:
-                    # merge the circuit's results
-                    time_series_results.apply_from_island(results,
-                                                          bus_original_idx,
-                                                          branch_original_idx,
-                                                          time_indices,
-                                                          'TS')
                     # abort by returning at this point
                     return time_series_results
 
-            # merge the circuit's results
-            time_series_results.apply_from_island(results,
-                                                  bus_original_idx,
-                                                  branch_original_idx,
-                                                  time_indices,
-                                                  'TS')
-
         return time_series_results
 
+    def batch_applicable(self, calculation_input) -> bool:
+        """
+        Is the batch (vectorized) Newton-Raphson applicable to this island?
+        The batch mode only implements the Newton-Raphson solver and it does not support the outer loop
+        controls nor the storage dispatch
+        :param calculation_input: TimeCircuit island
+        :return: True / False
+        """
+        return (self.options.batch_time_series
+                and self.options.solver_type == SolverType.NR
+                and not self.options.dispatch_storage
+                and not self.options.distributed_slack
+                and self.options.control_Q == ReactivePowerControlMode.NoControl
+                and self.options.control_taps == TapsControlMode.NoControl
+                and len(calculation_input.vd) > 0)
+
+    def run_batch_island(self, calculation_input, time_indices, time_series_results: TimeSeriesResults):
+        """
+        Run the time series of an island solving many time steps per Newton-Raphson iteration.
+        Each batch is written into the circuit's results as soon as it is solved.
+        :param calculation_input: TimeCircuit island
+        :param time_indices: array of time indices to consider
+        :param time_series_results: TimeSeriesResults of the circuit
+        """
+        # match the time steps of the island with the requested time indices
+        mask = np.isin(calculation_input.original_time_idx, time_indices)
+        local_t = np.where(mask)[0]
+        t_pos = np.searchsorted(time_indices, calculation_input.original_time_idx[mask])
+
+        self.progress_signal.emit(0.0)
+
+        nt = len(local_t)
+        batch_size = max(1, self.options.batch_size)
+        for a in range(0, nt, batch_size):
+            b = min(a + batch_size, nt)
+            t_idx = local_t[a:b]  # island columns
+
+            Sbus = calculation_input.Sbus[:, t_idx]
+            Ibus = calculation_input.Ibus[:, t_idx]
+            branch_rates = calculation_input.branch_rates[t_idx, :]
+
+            V, converged, norm_f, Scalc, it, el = NR_LS_batch(Ybus=calculation_input.Ybus,
+                                                              Sbus=Sbus,
+                                                              V0=calculation_input.Vbus[t_idx, :].T,
+                                                              Ibus=Ibus,
+                                                              pv=calculation_input.pv,
+                                                              pq=calculation_input.pq,
+                                                              tol=self.options.tolerance,
+                                                              max_it=self.options.max_iter,
+                                                              acceleration_parameter=self.options.acceleration_parameter)
+
+            Sbranch, Ibranch, Vbranch, loading, losses, \
+             flow_direction, Sbus_calc = power_flow_post_process_batch(calculation_inputs=calculation_input,
+                                                                       Sbus=Scalc,
+                                                                       V=V,
+                                                                       branch_rates=branch_rates)
+
+            # the steps that did not converge are solved one by one with the regular (retrying) solvers
+            for k in np.where(~converged)[0]:
+                t = t_idx[k]
+                res = single_island_pf(circuit=calculation_input,
+                                       Vbus=calculation_input.Vbus[t, :],
+                                       Sbus=calculation_input.Sbus[:, t],
+                                       Ibus=calculation_input.Ibus[:, t],
+                                       branch_rates=calculation_input.branch_rates[t, :],
+                                       options=self.options,
+                                       logger=self.logger)
+                V[:, k] = res.voltage
+                Sbus_calc[:, k] = res.Sbus
+                Sbranch[:, k] = res.Sbranch
+                Ibranch[:, k] = res.Ibranch
+                Vbranch[:, k] = res.Vbranch
+                loading[:, k] = res.loading
+                losses[:, k] = res.losses
+                flow_direction[:, k] = res.flow_direction
+                norm_f[k] = res.error()
+                converged[k] = res.converged()
+
+            time_series_results.set_chunk(t_pos[a:b],
+                                          calculation_input.original_bus_idx,
+                                          calculation_input.original_branch_idx,
+                                          voltage=V.T,
+                                          S=Sbus_calc.T,
+                                          Sbranch=Sbranch.T,
+                                          Ibranch=Ibranch.T,
+                                          Vbranch=Vbranch.T,
+                                          loading=loading.T,
+                                          losses=losses.T,
+                                          flow_direction=flow_direction.T,
+                                          error=norm_f,
+                                          converged=converged)
+
+            self.progress_signal.emit(b / nt * 100.0)
+
+            if self.__cancel__:
+                break
+
     def run_single_thread_clustering(self, time_indices) -> TimeSeriesResults:
         """
         Run single thread time series using the time series clustering
@@ -839,68 +1021,147 @@ class TimeSeries(QThread):
         return time_series_results
 
     def run_multi_thread(self, time_indices) -> TimeSeriesResults:
-
-        # initialize the grid time series results, we will append the island results with another function
-        n = len(self.grid.buses)
-        m = self.grid.get_branch_number()
-        nt = len(time_indices)
-        time_series_results = TimeSeriesResults(n, m, time_array=self.grid.time_profile[time_indices])
+        """
+        Run multi-process time series.
+        The island arrays are published once as read-only memory-mapped files that the worker
+        processes attach to; the workers write the voltages straight into a shared results matrix
+        and the branch magnitudes are computed afterwards in a vectorized way.
+        The outer loop controls are not implemented in this mode (see multi_thread_applicable).
+        :param time_indices: array of time indices to consider
+        :return: TimeSeriesResults instance
+        """
 
         # compile the multi-circuit
         self.progress_text.emit('Compiling time series...')
-        numerical_circuit = self.grid.compile_time_series(opf_time_series_results=self.opf_time_series_results)
+        numerical_circuit = compile_time_circuit(circuit=self.grid,
+                                                 apply_temperature=False,
+                                                 branch_tolerance_mode=BranchImpedanceMode.Specified,
+                                                 opf_results=self.opf_time_series_results)
+
+        # do the topological computation
+        time_islands = split_time_circuit_into_islands(numeric_circuit=numerical_circuit,
+                                                       ignore_single_node_islands=self.options.ignore_single_node_islands)
+
+        # initialize the grid time series results, we will append the island results with another function
+        time_series_results = TimeSeriesResults(n=numerical_circuit.nbus,
+                                                m=numerical_circuit.nbr,
+                                                n_tr=numerical_circuit.ntr,
+                                                n_hvdc=numerical_circuit.nhvdc,
+                                                bus_names=numerical_circuit.bus_names,
+                                                branch_names=numerical_circuit.branch_names,
+                                                transformer_names=numerical_circuit.tr_names,
+                                                hvdc_names=numerical_circuit.hvdc_names,
+                                                bus_types=numerical_circuit.bus_types,
+                                                time_array=self.grid.time_profile[time_indices],
+                                                file_name=self.results_file_name)
+
+        time_series_results.bus_types = numerical_circuit.bus_types
 
-        # compute the time indices per process
         n_cores = multiprocessing.cpu_count()
-        nchunk = int(nt / n_cores)
-        time_chunks = list()
-        k = 0
-        while k < (nt - nchunk * 2):
-            k2 = k+nchunk
-            if k2 > nt:
-                k2 = nt
-            time_chunk = time_indices[k:k2]
-            k += nchunk
-            time_chunks.append(time_chunk)
-        time_chunks.append(time_indices[k::])  # add the last chunk
-
-        # schedule jobs
-        self.progress_signal.emit(0.0)
-        self.progress_text.emit('Running in parallel...')
-        self.pool = multiprocessing.Pool()
-        manager = multiprocessing.Manager()
-        namespace = manager.Namespace()
+        folder = tempfile.mkdtemp(prefix='gridcal_ts_')
+
+        # the same pool serves all the islands
+        self.pool = multiprocessing.Pool(processes=n_cores)
+
+        try:
+            for island_index, calculation_input in enumerate(time_islands):
+
+                if len(calculation_input.vd) == 0:
+                    self.logger.append('There are no slack nodes in the island ' + str(island_index))
+                    continue
+
+                # match the time steps of the island with the requested time indices
+                mask = np.isin(calculation_input.original_time_idx, time_indices)
+                local_t = np.where(mask)[0]
+                t_pos = np.searchsorted(time_indices, calculation_input.original_time_idx[mask])
+                nt = len(local_t)
+
+                # publish the island arrays once
+                self.progress_text.emit('Publishing island ' + str(island_index) + '...')
+                shared = SharedTimeIsland(folder=folder, key='island_' + str(island_index))
+                shared.publish(calculation_input, local_t)
+                meta = shared.get_meta()
+
+                # schedule jobs: one block of time steps per core
+                self.progress_signal.emit(0.0)
+                self.progress_text.emit('Running island ' + str(island_index) + ' in parallel...')
+                chunks = [c for c in np.array_split(np.arange(nt), n_cores) if len(c) > 0]
+                self._mt_i = 0
+                self._mt_n = len(chunks)
+                jobs = [self.pool.apply_async(func=time_series_shared_data_worker,
+                                              args=(meta, self.options, chunk),
+                                              callback=lambda _: self.update_prog())
+                        for chunk in chunks]
+
+                # wait for all jobs to complete
+                for job in jobs:
+                    while not job.ready() and not self.__cancel__:
+                        job.wait(0.1)
 
-        stuff = list()
+                if self.__cancel__:
+                    return time_series_results
 
-        calc_inputs_dict = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
-                                                     ignore_single_node_islands=self.options.ignore_single_node_islands)
+                # the exceptions raised in the workers are re-raised by get()
+                for job in jobs:
+                    try:
+                        job.get()
+                    except Exception as e:
+                        self.logger.append('Island ' + str(island_index) + ': ' + str(e))
+
+                # collect the results by blocks of time steps, written as soon as they are post-processed
+                self.progress_text.emit('Collecting results...')
+                shared = SharedTimeIsland.attach(meta)
+                block_size = time_series_results.chunk_steps
+                for a in range(0, nt, block_size):
+                    b = min(a + block_size, nt)
+                    t_idx = local_t[a:b]  # island columns
+                    V = np.array(shared.voltage[a:b, :]).T
+
+                    Sbranch, Ibranch, Vbranch, loading, losses, \
+                     flow_direction, Sbus = power_flow_post_process_batch(calculation_inputs=calculation_input,
+                                                                          Sbus=calculation_input.Sbus[:, t_idx],
+                                                                          V=V,
+                                                                          branch_rates=calculation_input.branch_rates[t_idx, :])
+
+                    time_series_results.set_chunk(t_pos[a:b],
+                                                  calculation_input.original_bus_idx,
+                                                  calculation_input.original_branch_idx,
+                                                  voltage=V.T,
+                                                  S=Sbus.T,
+                                                  Sbranch=Sbranch.T,
+                                                  Ibranch=Ibranch.T,
+                                                  Vbranch=Vbranch.T,
+                                                  loading=loading.T,
+                                                  losses=losses.T,
+                                                  flow_direction=flow_direction.T,
+                                                  error=np.array(shared.error[a:b]),
+                                                  converged=np.array(shared.converged[a:b]))
+                shared.close()
+        finally:
+            if self.pool is not None:
+                if self.__cancel__:
+                    self.pool.terminate()
+                else:
+                    self.pool.close()
+                self.pool.join()
+                self.pool = None
+            shutil.rmtree(folder, ignore_errors=True)
 
-        namespace.calc_inputs_dict = calc_inputs_dict
-        namespace.bus_types = numerical_circuit.bus_types
-
-        for time_chunk in time_chunks:
-            # n, m, time_profile, buses, numerical_circuit, options, time_indices, logger
-            args = (n, m, self.grid.time_profile, namespace, self.options, time_chunk, self.logger)
-            p = self.pool.apply_async(func=time_series_worker, args=args, callback=self.collect_mt_result)
-            stuff.append(p)
-
-        # wait for all jobs to complete
-        self.pool.close()
-        self.pool.join()
-
-        # collect results
-        self.progress_text.emit('Collecting results...')
-        for result, time_chunk in self.returned_results:
-            # merge  the circuit's results
-            time_series_results.apply_from_island(result,
-                                                  np.arange(n),
-                                                  np.arange(m),
-                                                  time_chunk,
-                                                  'TS multi-thread')
         self.progress_signal.emit(100.0)
         return time_series_results
 
+    def multi_thread_applicable(self) -> bool:
+        """
+        Is the multi-core time series applicable with the current options?
+        The workers solve every time step independently, so the outer loop controls, the distributed slack
+        and the storage dispatch (which depends on the previous time steps) are not supported.
+        :return: True / False
+        """
+        return (not self.options.dispatch_storage
+                and not self.options.distributed_slack
+                and self.options.control_Q == ReactivePowerControlMode.NoControl
+                and self.options.control_taps == TapsControlMode.NoControl)
+
     def run(self):
         """
         Run the time series simulation
@@ -909,11 +1170,19 @@ class TimeSeries(QThread):
 
         a = time.time()
 
+        # release the HDF5 file of a previous run
+        if self.results is not None:
+            self.results.close()
+
         if self.end_ is None:
             self.end_ = len(self.grid.time_profile)
         time_indices = np.arange(self.start_, self.end_)
 
-        if self.options.multi_thread:
+        if self.options.multi_thread and not self.multi_thread_applicable():
+            self.logger.append('The multi-core time series does not support the outer loop controls, the distributed '
+                               'slack nor the storage dispatch: running single-core')
+
+        if self.options.multi_thread and self.multi_thread_applicable():
             self.results = self.run_multi_thread(time_indices)
         else:
             if self.use_clustering:
@@ -921,6 +1190,9 @@ class TimeSeries(QThread):
             else:
                 self.results = self.run_single_thread(time_indices)
 
+        # the HDF5 results are complete: keep them read-only
+        self.results.finish()
+
         self.elapsed = time.time() - a
 
         # send the finnish signal
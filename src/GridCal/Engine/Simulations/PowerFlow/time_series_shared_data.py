@@ -0,0 +1,251 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import numpy as np
+import scipy.sparse as sp
+
+from GridCal.Engine.basic_structures import Logger, SolverType
+from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import solve, ConvergenceReport
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NR_LS_batch
+
+
+class SharedTimeIsland:
+    """
+    Memory-mapped image of the arrays of a time series island (TimeCircuit) that are needed to run
+    its power flows, plus the memory-mapped results matrices.
+
+    The main process publishes the arrays once to disk; the worker processes attach to them
+    (read-only for the inputs, read-write for the results) without pickling the island. Only the
+    sparse matrices are copied into every process.
+    The profiles and the results are stored as (time, bus) so that every time step is contiguous.
+    """
+
+    # sparse matrices published as CSC arrays
+    sparse_structures = ['Ybus', 'Yseries', 'B1', 'B2', 'Bpqpv', 'Bref']
+
+    # results matrices: name -> dtype
+    results_structures = {'voltage': complex,
+                          'error': float,
+                          'converged': bool,
+                          'iterations': int}
+
+    def __init__(self, folder, key):
+        """
+        SharedTimeIsland constructor
+        :param folder: folder where the memory-mapped files are stored
+        :param key: unique name of the island (prefix of the files)
+        """
+        self.folder = folder
+
+        self.key = key
+
+        self.shapes = dict()
+
+        # input arrays
+        self.Sbus = None
+        self.Ibus = None
+        self.Vbus = None
+        self.Yshunt = None
+        self.pq = None
+        self.pv = None
+        self.vd = None
+        self.pqpv = None
+
+        # input matrices
+        self.Ybus = None
+        self.Yseries = None
+        self.B1 = None
+        self.B2 = None
+        self.Bpqpv = None
+        self.Bref = None
+
+        # results
+        self.voltage = None
+        self.error = None
+        self.converged = None
+        self.iterations = None
+
+    def path(self, name):
+        """
+        Path of the file that holds an array
+        :param name: name of the array
+        :return: file path
+        """
+        return os.path.join(self.folder, self.key + '_' + name + '.npy')
+
+    def save_array(self, name, arr):
+        """
+        Save an array in its memory-mappable file
+        :param name: name of the array
+        :param arr: numpy array
+        """
+        np.save(self.path(name), np.ascontiguousarray(arr))
+
+    def load_array(self, name, mode='r'):
+        """
+        Memory-map an array
+        :param name: name of the array
+        :param mode: memory map mode ('r' read-only, 'r+' read-write)
+        :return: numpy memmap
+        """
+        return np.load(self.path(name), mmap_mode=mode)
+
+    def publish(self, island, time_indices):
+        """
+        Write the island arrays and create the (empty) results files
+        :param island: TimeCircuit island
+        :param time_indices: time indices of the island to publish
+        """
+        for name in self.sparse_structures:
+            M = sp.csc_matrix(getattr(island, name))
+            M.sum_duplicates()  # canonical format: sorted indices without duplicates
+            self.save_array(name + '_data', M.data)
+            self.save_array(name + '_indices', M.indices)
+            self.save_array(name + '_indptr', M.indptr)
+            self.shapes[name] = M.shape
+
+        self.save_array('Sbus', island.Sbus[:, time_indices].T)
+        self.save_array('Ibus', island.Ibus[:, time_indices].T)
+        self.save_array('Vbus', island.Vbus[time_indices, :])
+        self.save_array('Yshunt', island.Yshunt)
+        self.save_array('pq', island.pq)
+        self.save_array('pv', island.pv)
+        self.save_array('vd', island.vd)
+        self.save_array('pqpv', island.pqpv)
+
+        nt = len(time_indices)
+        for name, dtype in self.results_structures.items():
+            shape = (nt, island.nbus) if name == 'voltage' else (nt, )
+            res = np.lib.format.open_memmap(self.path(name), mode='w+', dtype=dtype, shape=shape)
+            res.flush()
+            del res
+
+    def get_meta(self):
+        """
+        Information needed to attach to the published arrays from another process
+        :return: dictionary
+        """
+        return {'folder': self.folder, 'key': self.key, 'shapes': self.shapes}
+
+    @staticmethod
+    def attach(meta) -> "SharedTimeIsland":
+        """
+        Attach to the arrays published by another process
+        :param meta: dictionary from get_meta()
+        :return: SharedTimeIsland instance
+        """
+        island = SharedTimeIsland(folder=meta['folder'], key=meta['key'])
+        island.shapes = meta['shapes']
+
+        # the solvers may modify the sparse matrices in place (i.e. sort_indices), which fails on
+        # read-only memory maps, so every process gets its own copy of these (small) arrays
+        for name in island.sparse_structures:
+            M = sp.csc_matrix((np.array(island.load_array(name + '_data')),
+                               np.array(island.load_array(name + '_indices')),
+                               np.array(island.load_array(name + '_indptr'))),
+                              shape=island.shapes[name], copy=False)
+            M.has_canonical_format = True
+            setattr(island, name, M)
+
+        for name in ['Sbus', 'Ibus', 'Vbus', 'Yshunt', 'pq', 'pv', 'vd', 'pqpv']:
+            setattr(island, name, island.load_array(name))
+
+        for name in island.results_structures.keys():
+            setattr(island, name, island.load_array(name, mode='r+'))
+
+        return island
+
+    def flush(self):
+        """
+        Flush the results to disk
+        """
+        for name in self.results_structures.keys():
+            getattr(self, name).flush()
+
+    def close(self):
+        """
+        Release the memory maps
+        """
+        for name in self.sparse_structures + ['Sbus', 'Ibus', 'Vbus', 'Yshunt', 'pq', 'pv', 'vd', 'pqpv']:
+            setattr(self, name, None)
+
+        for name in self.results_structures.keys():
+            setattr(self, name, None)
+
+
+def time_series_shared_data_worker(meta, options: PowerFlowOptions, time_indices):
+    """
+    Process-pool worker that solves a block of time steps of a published island and writes
+    the voltage solutions straight into the shared results matrix.
+    The outer loop controls are not applied here (the driver runs single-core when they are set).
+    :param meta: SharedTimeIsland meta information (see SharedTimeIsland.get_meta)
+    :param options: PowerFlowOptions instance
+    :param time_indices: array of (local) time indices to solve
+    :return: number of solved time steps
+    """
+    island = SharedTimeIsland.attach(meta)
+
+    # the batch mode only implements the Newton-Raphson solver
+    if options.batch_time_series and options.solver_type == SolverType.NR:
+
+        V, converged, norm_f, Scalc, iterations, el = NR_LS_batch(Ybus=island.Ybus,
+                                                                  Sbus=island.Sbus[time_indices, :].T,
+                                                                  V0=island.Vbus[time_indices, :].T,
+                                                                  Ibus=island.Ibus[time_indices, :].T,
+                                                                  pv=island.pv,
+                                                                  pq=island.pq,
+                                                                  tol=options.tolerance,
+                                                                  max_it=options.max_iter,
+                                                                  acceleration_parameter=options.acceleration_parameter)
+        island.voltage[time_indices, :] = V.T
+        island.error[time_indices] = norm_f
+        island.converged[time_indices] = converged
+        island.iterations[time_indices] = iterations
+
+    else:
+        logger = Logger()
+        for t in time_indices:
+            report = ConvergenceReport()
+            V, converged, norm_f, Scalc, it, el = solve(options=options,
+                                                        report=report,
+                                                        V0=np.array(island.Vbus[t, :]),
+                                                        Sbus=np.array(island.Sbus[t, :]),
+                                                        Ibus=np.array(island.Ibus[t, :]),
+                                                        Ybus=island.Ybus,
+                                                        Yseries=island.Yseries,
+                                                        Ysh_helm=island.Yshunt,
+                                                        B1=island.B1,
+                                                        B2=island.B2,
+                                                        Bpqpv=island.Bpqpv,
+                                                        Bref=island.Bref,
+                                                        pq=island.pq,
+                                                        pv=island.pv,
+                                                        ref=island.vd,
+                                                        pqpv=island.pqpv,
+                                                        tolerance=options.tolerance,
+                                                        max_iter=options.max_iter,
+                                                        acceleration_parameter=options.acceleration_parameter,
+                                                        logger=logger)
+            island.voltage[t, :] = V
+            island.error[t] = norm_f
+            island.converged[t] = converged
+            island.iterations[t] = it
+
+    island.flush()
+    island.close()
+
+    return len(time_indices)
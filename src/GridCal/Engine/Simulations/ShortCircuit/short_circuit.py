@@ -1,4 +1,7 @@
+import numpy as np
 from numpy import zeros, diag
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
 
 
 def short_circuit_3p(bus_idx, Zbus, Vbus, Zf, baseMVA):
@@ -37,4 +40,104 @@ def short_circuit_3p(bus_idx, Zbus, Vbus, Zf, baseMVA):
     # SCC[bus_idx] = abs(Vbus[bus_idx]) * baseMVA / abs(Z[bus_idx])
     SCC = -I_k * Vbus * baseMVA
 
-    return V, SCC
\ No newline at end of file
+    return V, SCC
+
+
+def factorize_ybus(Ybus):
+    """
+    Factorize the admittance matrix once to get columns of Zbus on demand
+    Args:
+        Ybus: Admittance matrix (sparse)
+
+    Returns: SuperLU factorization of Ybus
+
+    """
+    return splu(sp.csc_matrix(Ybus, dtype=complex))
+
+
+def get_zbus_columns(lu, n, bus_idx):
+    """
+    Compute the columns of Zbus = inv(Ybus) of some buses with a single multi-RHS solve
+    Args:
+        lu: Factorization of Ybus (see factorize_ybus)
+        n: Number of buses
+        bus_idx: Indices of the columns to compute
+
+    Returns: Dense matrix (n, len(bus_idx)) with the Zbus columns
+
+    """
+    E = zeros((n, len(bus_idx)), dtype=complex)
+    E[bus_idx, np.arange(len(bus_idx))] = 1.0
+    return lu.solve(E)
+
+
+def short_circuit_3p_sparse(bus_idx, lu, Vbus, Zf, baseMVA, chunk_size=256):
+    """
+    Executes a 3-phase balanced short circuit study without forming Zbus.
+    Only the Zbus columns of the faulted buses are solved, in blocks of chunk_size right hand sides.
+    Gives the same results as short_circuit_3p.
+    Args:
+        bus_idx: Indices of the buses at which the short circuit is being studied
+        lu: Factorization of Ybus (see factorize_ybus)
+        Vbus: Voltages of the buses in the steady state
+        Zf: Fault impedance array
+        baseMVA: Base power
+        chunk_size: Number of Zbus columns solved at once
+
+    Returns: Voltages after the short circuit (p.u.), Short circuit power in MVA
+
+    """
+    n = len(Vbus)
+    bus_idx = np.array(bus_idx, dtype=int)
+    I_k = zeros(n, dtype=complex)
+    incV = zeros(n, dtype=complex)
+
+    for a in range(0, len(bus_idx), chunk_size):
+        idx = bus_idx[a:a + chunk_size]
+        Zcols = get_zbus_columns(lu, n, idx)
+
+        # Voltage Source Contribution
+        Z = Zcols[idx, np.arange(len(idx))]
+        I_k[idx] = -1 * Vbus[idx] / (Z + Zf[idx])
+
+        # voltage increment due to these currents
+        incV += Zcols.dot(I_k[idx])
+
+    V = Vbus + incV / len(bus_idx)
+
+    # Short circuit power in MVA
+    SCC = -I_k * Vbus * baseMVA
+
+    return V, SCC
+
+
+def short_circuit_levels(lu, Vbus, Zf, baseMVA, bus_idx=None, chunk_size=256):
+    """
+    Computes the 3-phase fault level of many buses, each fault being studied independently.
+    Only the diagonal of Zbus is needed, obtained in blocks of chunk_size right hand sides.
+    Args:
+        lu: Factorization of Ybus (see factorize_ybus)
+        Vbus: Voltages of the buses in the steady state
+        Zf: Fault impedance array
+        baseMVA: Base power
+        bus_idx: Indices of the buses to study (all if None)
+        chunk_size: Number of Zbus columns solved at once
+
+    Returns: Thevenin impedance (p.u.), Short circuit current (p.u.), Short circuit power in MVA of the studied buses
+
+    """
+    n = len(Vbus)
+    if bus_idx is None:
+        bus_idx = np.arange(n)
+    else:
+        bus_idx = np.array(bus_idx, dtype=int)
+
+    Zth = zeros(len(bus_idx), dtype=complex)
+    for a in range(0, len(bus_idx), chunk_size):
+        idx = bus_idx[a:a + chunk_size]
+        Zth[a:a + chunk_size] = get_zbus_columns(lu, n, idx)[idx, np.arange(len(idx))]
+
+    Isc = Vbus[bus_idx] / (Zth + Zf[bus_idx])
+    SCC = Isc * Vbus[bus_idx] * baseMVA
+
+    return Zth, Isc, SCC
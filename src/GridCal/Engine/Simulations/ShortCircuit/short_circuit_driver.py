@@ -14,18 +14,18 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
-from scipy.sparse.linalg import inv
 from PySide2.QtCore import QRunnable
 
 from GridCal.Engine.basic_structures import Logger
-from GridCal.Engine.Simulations.ShortCircuit.short_circuit import short_circuit_3p
+from GridCal.Engine.Simulations.ShortCircuit.short_circuit import factorize_ybus, short_circuit_3p_sparse, \
+    short_circuit_levels
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.basic_structures import BranchImpedanceMode
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults, PowerFlowOptions
 from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
 from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Devices import Branch, Bus
-from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands, update_snapshot_circuit
 from GridCal.Gui.GuiFunctions import ResultsModel
 
 ########################################################################################################################
@@ -37,7 +37,7 @@ class ShortCircuitOptions:
 
     def __init__(self, bus_index=[], branch_index=[], branch_fault_locations=[], branch_fault_impedance=[],
                  branch_impedance_tolerance_mode=BranchImpedanceMode.Specified,
-                 verbose=False):
+                 verbose=False, compute_fault_levels=False, chunk_size=256):
         """
 
         Args:
@@ -46,6 +46,8 @@ class ShortCircuitOptions:
             branch_fault_locations:
             branch_fault_impedance:
             verbose:
+            compute_fault_levels: compute the fault level of every bus (each fault studied independently)
+            chunk_size: number of Zbus columns solved at once
         """
 
         assert (len(branch_fault_locations) == len(branch_index))
@@ -63,6 +65,10 @@ class ShortCircuitOptions:
 
         self.verbose = verbose
 
+        self.compute_fault_levels = compute_fault_levels
+
+        self.chunk_size = chunk_size
+
 
 class ShortCircuitResults(PowerFlowResults):
 
@@ -92,7 +98,13 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.short_circuit_power = None
 
+        # fault level of every bus when faulted alone
+        self.fault_level = np.zeros(n, dtype=complex)
+
+        self.thevenin_impedance = np.zeros(n, dtype=complex)
+
         self.available_results = [ResultTypes.BusVoltageModule,
+                                  ResultTypes.BusShortCircuitPower,
                                   ResultTypes.BusVoltageAngle,
                                   ResultTypes.BranchActivePower,
                                   ResultTypes.BranchReactivePower,
@@ -109,6 +121,8 @@ class ShortCircuitResults(PowerFlowResults):
         """
         elm = super().copy()
         elm.short_circuit_power = self.short_circuit_power
+        elm.fault_level = self.fault_level
+        elm.thevenin_impedance = self.thevenin_impedance
         return elm
 
     def initialize(self, n, m):
@@ -124,6 +138,10 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.short_circuit_power = np.zeros(n, dtype=complex)
 
+        self.fault_level = np.zeros(n, dtype=complex)
+
+        self.thevenin_impedance = np.zeros(n, dtype=complex)
+
         self.overvoltage = np.zeros(n, dtype=complex)
 
         self.undervoltage = np.zeros(n, dtype=complex)
@@ -158,6 +176,10 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.short_circuit_power[b_idx] = results.short_circuit_power
 
+        self.fault_level[b_idx] = results.fault_level
+
+        self.thevenin_impedance[b_idx] = results.thevenin_impedance
+
         self.overvoltage[b_idx] = results.overvoltage
 
         self.undervoltage[b_idx] = results.undervoltage
@@ -175,6 +197,25 @@ class ShortCircuitResults(PowerFlowResults):
         if results.buses_useful_for_storage is not None:
             self.buses_useful_for_storage = b_idx[results.buses_useful_for_storage]
 
+    def mdl(self, result_type: ResultTypes) -> "ResultsModel":
+        """
+        Get ResultsModel instance
+        :param result_type: ResultTypes instance
+        :return: ResultsModel instance
+        """
+        if result_type == ResultTypes.BusShortCircuitPower:
+            if np.any(self.fault_level != 0):
+                y = np.abs(self.fault_level)
+                title = 'Bus fault level '
+            else:
+                y = np.abs(self.short_circuit_power)
+                title = 'Bus short circuit power '
+
+            return ResultsModel(data=y, index=self.bus_names, columns=[result_type.value[0]],
+                                title=title, ylabel='(MVA)', units='(MVA)')
+        else:
+            return super().mdl(result_type)
+
 
 class ShortCircuit(QRunnable):
     # progress_signal = pyqtSignal(float)
@@ -272,25 +313,33 @@ class ShortCircuit(QRunnable):
 
         return br1, br2, middle_bus
 
-    def single_short_circuit(self, calculation_inputs: SnapshotCircuit, Vpf, Zf):
+    def single_short_circuit(self, calculation_inputs: SnapshotCircuit, Vpf, Zf, bus_index=None):
         """
         Run a power flow simulation for a single circuit
         @param calculation_inputs:
         @param Vpf: Power flow voltage vector applicable to the island
         @param Zf: Short circuit impedance vector applicable to the island
+        @param bus_index: indices of the faulted buses in the island (if None, self.options.bus_index)
         @return: short circuit results
         """
-        # compute Zbus
-        # is dense, so no need to store it as sparse
+        if bus_index is None:
+            bus_index = self.options.bus_index
+
+        # Ybus is factorized once and only the needed columns of Zbus are computed
         if calculation_inputs.Ybus.shape[0] > 1:
-            Zbus = inv(calculation_inputs.Ybus).toarray()
+            lu = factorize_ybus(calculation_inputs.Ybus)
 
             # Compute the short circuit
-            V, SCpower = short_circuit_3p(bus_idx=self.options.bus_index,
-                                          Zbus=Zbus,
-                                          Vbus=Vpf,
-                                          Zf=Zf,
-                                          baseMVA=calculation_inputs.Sbase)
+            if len(bus_index) > 0:
+                V, SCpower = short_circuit_3p_sparse(bus_idx=bus_index,
+                                                     lu=lu,
+                                                     Vbus=Vpf,
+                                                     Zf=Zf,
+                                                     baseMVA=calculation_inputs.Sbase,
+                                                     chunk_size=self.options.chunk_size)
+            else:
+                V = Vpf.copy()
+                SCpower = np.zeros(calculation_inputs.nbus, dtype=complex)
 
             # Compute the branches power
             Sbranch, Ibranch, loading, losses = self.compute_branch_results(calculation_inputs=calculation_inputs, V=V)
@@ -310,7 +359,16 @@ class ShortCircuit(QRunnable):
             results.Ibranch = Ibranch
             results.losses = losses
             results.SCpower = SCpower
+            results.short_circuit_power = SCpower
 
+            if self.options.compute_fault_levels:
+                Zth, Isc, SCC = short_circuit_levels(lu=lu,
+                                                     Vbus=Vpf,
+                                                     Zf=Zf,
+                                                     baseMVA=calculation_inputs.Sbase,
+                                                     chunk_size=self.options.chunk_size)
+                results.thevenin_impedance = Zth
+                results.fault_level = SCC
 
         else:
             nbus = calculation_inputs.Ybus.shape[0]
@@ -331,6 +389,7 @@ class ShortCircuit(QRunnable):
             results.Ibranch = np.zeros(nbr, dtype=complex)
             results.losses = np.zeros(nbr, dtype=complex)
             results.SCpower = np.zeros(nbus, dtype=complex)
+            results.short_circuit_power = results.SCpower
 
         return results
 
@@ -383,11 +442,16 @@ class ShortCircuit(QRunnable):
         else:
             grid = self.grid
 
-        # Compile the grid
-        numerical_circuit = compile_snapshot_circuit(circuit=grid,
-                                                     apply_temperature=self.pf_options.apply_temperature_correction,
-                                                     branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode,
-                                                     opf_results=self.opf_results)
+        # Compile the grid (the grid with the fault branches is a new grid, that is always compiled)
+        if self.pf_options.incremental_compilation and self.opf_results is None and grid is self.grid:
+            numerical_circuit = update_snapshot_circuit(circuit=grid,
+                                                        apply_temperature=self.pf_options.apply_temperature_correction,
+                                                        branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
+        else:
+            numerical_circuit = compile_snapshot_circuit(circuit=grid,
+                                                         apply_temperature=self.pf_options.apply_temperature_correction,
+                                                         branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode,
+                                                         opf_results=self.opf_results)
 
         calculation_inputs = split_into_islands(numeric_circuit=numerical_circuit,
                                                 ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
@@ -410,9 +474,13 @@ class ShortCircuit(QRunnable):
                 bus_original_idx = calculation_input.original_bus_idx
                 branch_original_idx = calculation_input.original_branch_idx
 
+                # faulted buses of this island, in island indices
+                island_bus_index = np.where(np.isin(bus_original_idx, self.options.bus_index))[0]
+
                 res = self.single_short_circuit(calculation_inputs=calculation_input,
                                                 Vpf=self.pf_results.voltage[bus_original_idx],
-                                                Zf=Zf[bus_original_idx])
+                                                Zf=Zf[bus_original_idx],
+                                                bus_index=island_bus_index)
 
                 # merge results
                 results.apply_from_island(res, bus_original_idx, branch_original_idx)
@@ -21,7 +21,7 @@ from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOpt
 from GridCal.Gui.GuiFunctions import ResultsModel
 from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands, update_snapshot_circuit
 from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import helm_coefficients_josep, sigma_function
 
 
@@ -196,10 +196,15 @@ def multi_island_sigma(multi_circuit: MultiCircuit, options: PowerFlowOptions, l
     m = multi_circuit.get_branch_number()
     results = SigmaAnalysisResults(n)
 
-    numerical_circuit = compile_snapshot_circuit(circuit=multi_circuit,
-                                                 apply_temperature=options.apply_temperature_correction,
-                                                 branch_tolerance_mode=options.branch_impedance_tolerance_mode,
-                                                 opf_results=None)
+    if options.incremental_compilation:
+        numerical_circuit = update_snapshot_circuit(circuit=multi_circuit,
+                                                    apply_temperature=options.apply_temperature_correction,
+                                                    branch_tolerance_mode=options.branch_impedance_tolerance_mode)
+    else:
+        numerical_circuit = compile_snapshot_circuit(circuit=multi_circuit,
+                                                     apply_temperature=options.apply_temperature_correction,
+                                                     branch_tolerance_mode=options.branch_impedance_tolerance_mode,
+                                                     opf_results=None)
     results.bus_names = numerical_circuit.bus_names
 
     calculation_inputs = split_into_islands(numeric_circuit=numerical_circuit,
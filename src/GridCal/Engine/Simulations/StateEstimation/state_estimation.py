@@ -1,8 +1,11 @@
-from scipy.sparse import hstack as sphs, vstack as spvs, csc_matrix, csr_matrix
-from scipy.sparse.linalg import spsolve
+from scipy.sparse import hstack as sphs, vstack as spvs, csc_matrix, csr_matrix, diags, identity
+from scipy.sparse.linalg import splu
 import numpy as np
+import numba as nb
 from numpy import conj, arange
 
+from GridCal.Engine.Simulations.sparse_solve import get_factorization_cache
+
 
 def dSbus_dV(Ybus, V):
     """
@@ -256,8 +259,9 @@ def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
     H51 = np.abs(dIf_dVa[np.ix_(inputs.i_flow_idx, pvpq)])
     H52 = np.abs(dIf_dVm[inputs.i_flow_idx, :])
 
-    H61 = csc_matrix(np.zeros((len(inputs.vm_m_idx), len(pvpq))))
-    H62 = csc_matrix(np.diag(np.ones(n))[inputs.vm_m_idx, :])
+    nvm = len(inputs.vm_m_idx)
+    H61 = csc_matrix((nvm, len(pvpq)))
+    H62 = csc_matrix((np.ones(nvm), (arange(nvm), inputs.vm_m_idx)), shape=(nvm, n))
 
     # pack the Jacobian
     H = spvs([sphs([H11, H12]),
@@ -283,7 +287,289 @@ def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
     return H, h
 
 
-def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
+def gain_pattern(H):
+    """
+    Structural sparsity pattern of the gain matrix H^t·W·H + lambda·I
+    :param H: measurements Jacobian
+    :return: CSC matrix of ones with sorted indices
+    """
+    Hs = csc_matrix(H, copy=True)
+    Hs.data = np.ones(len(Hs.data))
+    P = csc_matrix(Hs.transpose().dot(Hs) + identity(H.shape[1], format='csc'))
+    P.sort_indices()
+    P.data = np.ones(len(P.data))
+    return P
+
+
+def set_on_pattern(A, P):
+    """
+    Copy the values of A into the sparsity pattern P, so that the gain matrix keeps the same structure
+    along the iterations (the sparse products drop the entries that cancel numerically)
+    :param A: sparse matrix
+    :param P: CSC pattern with sorted indices
+    :return: CSC matrix with the structure of P, or None if A has entries out of P
+    """
+    A = csc_matrix(A)
+    A.sort_indices()
+    n = P.shape[0]
+
+    p_keys = np.repeat(arange(P.shape[1], dtype=np.int64), np.diff(P.indptr)) * n + P.indices
+    a_keys = np.repeat(arange(A.shape[1], dtype=np.int64), np.diff(A.indptr)) * n + A.indices
+
+    pos = np.searchsorted(p_keys, a_keys)
+    if len(pos) and (pos[-1] >= len(p_keys) or (p_keys[np.minimum(pos, len(p_keys) - 1)] != a_keys).any()):
+        return None
+
+    data = np.zeros(P.nnz)
+    data[pos] = A.data
+    return csc_matrix((data, P.indices, P.indptr), shape=P.shape)
+
+
+@nb.njit(cache=True)
+def ldl_symbolic(n, Ap, Ai):
+    """
+    Symbolic LDL^t factorization (elimination tree and column counts)
+    :param n: dimension of the symmetric matrix
+    :param Ap: CSC column pointers of A
+    :param Ai: CSC row indices of A
+    :return: Lp (column pointers of L), Parent (elimination tree)
+    """
+    Lp = np.zeros(n + 1, dtype=np.int64)
+    Parent = np.empty(n, dtype=np.int64)
+    Lnz = np.zeros(n, dtype=np.int64)
+    Flag = np.empty(n, dtype=np.int64)
+
+    for k in range(n):
+        Parent[k] = -1
+        Flag[k] = k
+        for p in range(Ap[k], Ap[k + 1]):
+            i = Ai[p]
+            if i < k:
+                # follow the path from i to the root of the etree, stop at the flagged nodes
+                while Flag[i] != k:
+                    if Parent[i] == -1:
+                        Parent[i] = k
+                    Lnz[i] += 1
+                    Flag[i] = k
+                    i = Parent[i]
+
+    for k in range(n):
+        Lp[k + 1] = Lp[k] + Lnz[k]
+
+    return Lp, Parent
+
+
+@nb.njit(cache=True)
+def ldl_numeric(n, Ap, Ai, Ax, Lp, Parent):
+    """
+    Numeric LDL^t factorization (up-looking, the rows of each column of L come sorted)
+    :param n: dimension of the symmetric matrix
+    :param Ap: CSC column pointers of A
+    :param Ai: CSC row indices of A
+    :param Ax: CSC values of A
+    :param Lp: column pointers of L
+    :param Parent: elimination tree
+    :return: Li, Lx (strictly lower part of L), D, ok (False if a pivot is not positive)
+    """
+    Li = np.empty(Lp[n], dtype=np.int64)
+    Lx = np.empty(Lp[n])
+    D = np.zeros(n)
+    Y = np.zeros(n)
+    Pattern = np.empty(n, dtype=np.int64)
+    Flag = np.empty(n, dtype=np.int64)
+    Lnz = np.zeros(n, dtype=np.int64)
+
+    for k in range(n):
+        # nonzero pattern of the row k of L
+        top = n
+        Flag[k] = k
+        for p in range(Ap[k], Ap[k + 1]):
+            i = Ai[p]
+            if i <= k:
+                Y[i] += Ax[p]
+                length = 0
+                while Flag[i] != k:
+                    Pattern[length] = i
+                    length += 1
+                    Flag[i] = k
+                    i = Parent[i]
+                while length > 0:
+                    top -= 1
+                    length -= 1
+                    Pattern[top] = Pattern[length]
+
+        # sparse triangular solve
+        D[k] = Y[k]
+        Y[k] = 0.0
+        while top < n:
+            i = Pattern[top]
+            yi = Y[i]
+            Y[i] = 0.0
+            p2 = Lp[i] + Lnz[i]
+            for p in range(Lp[i], p2):
+                Y[Li[p]] -= Lx[p] * yi
+            l_ki = yi / D[i]
+            D[k] -= l_ki * yi
+            Li[p2] = k
+            Lx[p2] = l_ki
+            Lnz[i] += 1
+            top += 1
+
+        if D[k] <= 0.0:
+            return Li, Lx, D, False
+
+    return Li, Lx, D, True
+
+
+@nb.njit(cache=True)
+def find_in_column(Lp, Li, col, row):
+    """
+    Position of the entry (row, col) of L (binary search over the sorted rows of the column)
+    :return: position or -1 if it is not in the pattern
+    """
+    a = Lp[col]
+    b = Lp[col + 1] - 1
+    while a <= b:
+        mid = (a + b) // 2
+        if Li[mid] == row:
+            return mid
+        elif Li[mid] < row:
+            a = mid + 1
+        else:
+            b = mid - 1
+    return -1
+
+
+@nb.njit(cache=True)
+def takahashi_inverse(n, Lp, Li, Lx, D):
+    """
+    Entries of the inverse of A = L·D·L^t in the pattern of L (Takahashi equations):
+    Z_ij = delta_ij / d_j - sum_{k > j} L_kj·Z_ik for i >= j
+    The pattern of the symbolic factor is closed, so every Z_ik needed is in the pattern as well.
+    :param n: dimension
+    :param Lp: column pointers of L
+    :param Li: row indices of L (sorted per column)
+    :param Lx: values of the strictly lower part of L
+    :param D: diagonal of the factorization
+    :return: Zx (inverse entries in the pattern of L), Zd (diagonal of the inverse)
+    """
+    Zx = np.zeros(len(Lx))
+    Zd = np.zeros(n)
+
+    for j in range(n - 1, -1, -1):
+        a = Lp[j]
+        b = Lp[j + 1]
+
+        for p in range(a, b):
+            i = Li[p]
+            s = 0.0
+            for q in range(a, b):
+                k = Li[q]
+                if k == i:
+                    z = Zd[i]
+                elif k < i:
+                    z = Zx[find_in_column(Lp, Li, k, i)]
+                else:
+                    z = Zx[find_in_column(Lp, Li, i, k)]
+                s += Lx[q] * z
+            Zx[p] = -s
+
+        s = 0.0
+        for p in range(a, b):
+            s += Lx[p] * Zx[p]
+        Zd[j] = 1.0 / D[j] - s
+
+    return Zx, Zd
+
+
+@nb.njit(cache=True)
+def residual_covariance_diagonal(m, Hp, Hi, Hx, sigma2, iperm, Lp, Li, Zx, Zd):
+    """
+    Diagonal of the residual covariance matrix Omega = R - H·G^-1·H^t using the sparse inverse entries of G
+    :param m: number of measurements
+    :param Hp: CSR row pointers of H
+    :param Hi: CSR column indices of H
+    :param Hx: CSR values of H
+    :param sigma2: measurements variance (diagonal of R)
+    :param iperm: inverse of the fill-reducing permutation of G
+    :param Lp: column pointers of L
+    :param Li: row indices of L
+    :param Zx: inverse entries in the pattern of L
+    :param Zd: diagonal of the inverse
+    :return: diagonal of Omega
+    """
+    omega = np.empty(m)
+
+    for r in range(m):
+        s = 0.0
+        for p in range(Hp[r], Hp[r + 1]):
+            a = iperm[Hi[p]]
+            for q in range(Hp[r], Hp[r + 1]):
+                b = iperm[Hi[q]]
+                if a == b:
+                    z = Zd[a]
+                elif a < b:
+                    z = Zx[find_in_column(Lp, Li, a, b)]
+                else:
+                    z = Zx[find_in_column(Lp, Li, b, a)]
+                s += Hx[p] * Hx[q] * z
+        omega[r] = sigma2[r] - s
+
+    return omega
+
+
+def normalized_residuals(H, dz, sigma):
+    """
+    Compute the normalized residuals rN_i = |r_i| / sqrt(Omega_ii) of the measurements
+    :param H: measurements Jacobian at the solution
+    :param dz: measurements residual (z - h)
+    :param sigma: measurements standard deviation
+    :return: normalized residuals (zero for the critical measurements), success?
+    """
+    sigma2 = np.power(sigma, 2.0)
+    H = csr_matrix(H)
+    H.sort_indices()
+
+    # gain matrix, on its structural pattern so that every pair of states of a measurement is present
+    G = set_on_pattern(H.transpose().dot(diags(1.0 / sigma2)).dot(H), gain_pattern(H))
+    n = G.shape[0]
+
+    # symmetric fill-reducing ordering
+    try:
+        perm = splu(G, permc_spec='MMD_AT_PLUS_A').perm_c
+    except RuntimeError:
+        # singular gain matrix: the system is not observable
+        return np.zeros(len(dz)), False
+    iperm = np.empty(n, dtype=np.int64)
+    iperm[perm] = arange(n)
+    Gp = csc_matrix(G[perm, :][:, perm])
+    Gp.sort_indices()
+
+    # factorize and compute the inverse entries in the pattern of the factor
+    Ap = Gp.indptr.astype(np.int64)
+    Ai = Gp.indices.astype(np.int64)
+    Lp, Parent = ldl_symbolic(n, Ap, Ai)
+    Li, Lx, D, ok = ldl_numeric(n, Ap, Ai, Gp.data.astype(float), Lp, Parent)
+
+    if not ok:
+        # the gain matrix is not positive definite: the system is not observable
+        return np.zeros(len(dz)), False
+
+    Zx, Zd = takahashi_inverse(n, Lp, Li, Lx, D)
+
+    omega = residual_covariance_diagonal(H.shape[0], H.indptr.astype(np.int64), H.indices.astype(np.int64),
+                                         H.data.astype(float), sigma2, iperm, Lp, Li, Zx, Zd)
+
+    # the critical measurements have no redundancy (Omega_ii = 0): their errors cannot be detected
+    rN = np.zeros(len(dz))
+    valid = omega > 1e-10 * sigma2
+    rN[valid] = np.abs(dz[valid]) / np.sqrt(omega[valid])
+
+    return rN, True
+
+
+def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv, V0=None, active=None, tol=1e-9, max_iter=100,
+                linear_solver=None):
     """
     Solve the state estimation problem using the Levenberg-Marquadt method
     :param Ybus: 
@@ -295,27 +581,38 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
     :param ref: 
     :param pq: 
     :param pv: 
+    :param V0: initial voltage solution (flat start if None)
+    :param active: boolean array of the measurements to use (all if None)
+    :param tol: convergence tolerance
+    :param max_iter: maximum number of iterations
+    :param linear_solver: FactorizationCache instance that keeps the symbolic analysis of the gain matrix
+                          (a new one is created if None)
     :return: 
     """
 
     pvpq = np.r_[pv, pq]
     npvpq = len(pvpq)
-    npq = len(pq)
     nvd = len(ref)
     n = Ybus.shape[0]
-    V = np.ones(n, dtype=complex)
+    V = np.ones(n, dtype=complex) if V0 is None else V0.copy()
+
+    if linear_solver is None:
+        linear_solver = get_factorization_cache()
 
     # pick the measurements and uncertainties
     z, sigma = se_input.consolidate()
 
+    if active is None:
+        active = np.ones(len(z), dtype=bool)
+    z = z[active]
+    sigma = sigma[active]
+
     # compute the weights matrix
-    W = csc_matrix(np.diag(1.0 / np.power(sigma, 2.0)))
+    W = diags(1.0 / np.power(sigma, 2.0), format='csc')
 
     # Levenberg-Marquardt method
-    tol = 1e-9
-    max_iter = 100
     iter_ = 0
-    Idn = csc_matrix(np.identity(2 * n - nvd))  # identity matrix
+    Idn = identity(2 * n - nvd, format='csc')  # identity matrix
     # x = np.r_[np.angle(V)[pvpq], np.abs(V)]
     Va = np.angle(V)
     Vm = np.abs(V)
@@ -329,6 +626,11 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
 
     # first computation of the jacobian and free term
     H, h = Jacobian_SE(Ybus, Yf, Yt, V, f, t, se_input, pvpq)
+    H = csr_matrix(H)[active, :]
+    h = h[active]
+
+    # fixed structure of the gain matrix: its symbolic factorization is analyzed only once
+    P = gain_pattern(H)
 
     while not converged and iter_ < max_iter:
 
@@ -346,14 +648,19 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
             lbmda = 1e-3 * H2.diagonal().max()
 
         # compute system matrix
-        A = H2 + lbmda * Idn
+        A = set_on_pattern(H2 + lbmda * Idn, P)
+
+        if A is None:
+            # the Jacobian structure grew (i.e. entries that were numerically zero at the flat start)
+            P = gain_pattern(H)
+            A = set_on_pattern(H2 + lbmda * Idn, P)
 
         # right hand side
         # H^t·W·dz
         rhs = H1.dot(dz)
 
         # Solve the increment
-        dx = spsolve(A, rhs)
+        dx = linear_solver.solve(A, rhs)
 
         # objective function
         f_obj = 0.5 * dz.dot(W * dz)
@@ -368,13 +675,15 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
 
             # modify the solution
             dVa = dx[0:npvpq]
-            dVm = dx[npvpq:npvpq + npq + 1]
+            dVm = dx[npvpq:]
             Va[pvpq] += dVa
             Vm += dVm
             V = Vm * np.exp(1j * Va)
 
             # update Jacobian
             H, h = Jacobian_SE(Ybus, Yf, Yt, V, f, t, se_input, pvpq)
+            H = csr_matrix(H)[active, :]
+            h = h[active]
 
         else:
             lbmda = lbmda * nu
@@ -391,6 +700,70 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
     return V, err, converged
 
 
+def solve_se_lm_bad_data(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv, threshold=3.0, max_bad_data=None,
+                         tol=1e-9, max_iter=100, linear_solver=None):
+    """
+    Solve the state estimation with the largest normalized residual test: the measurement with the largest
+    normalized residual above the threshold is removed and the state is estimated again, until no
+    measurement exceeds the threshold.
+    :param Ybus:
+    :param Yf:
+    :param Yt:
+    :param f: array with the from bus indices of all the branches
+    :param t: array with the to bus indices of all the branches
+    :param se_input: state estimation input instance (contains the measurements)
+    :param ref:
+    :param pq:
+    :param pv:
+    :param threshold: normalized residual above which a measurement is considered bad data
+    :param max_bad_data: maximum number of measurements to remove (None: no limit)
+    :param tol: convergence tolerance
+    :param max_iter: maximum number of iterations
+    :param linear_solver: FactorizationCache instance shared by the successive estimations
+                          (a new one is created if None)
+    :return: V, err, converged, list of indices of the bad measurements (in the consolidated order),
+             normalized residuals of the measurements (nan for the removed ones)
+    """
+    pvpq = np.r_[pv, pq]
+    z, sigma = se_input.consolidate()
+    active = np.ones(len(z), dtype=bool)
+    bad_idx = list()
+    max_bad_data = len(z) if max_bad_data is None else max_bad_data
+    V = None
+
+    if linear_solver is None:
+        linear_solver = get_factorization_cache()
+
+    while True:
+        V, err, converged = solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv,
+                                        V0=V, active=active, tol=tol, max_iter=max_iter,
+                                        linear_solver=linear_solver)
+
+        rN = np.full(len(z), np.nan)
+
+        if not converged:
+            break
+
+        H, h = Jacobian_SE(Ybus, Yf, Yt, V, f, t, se_input, pvpq)
+        idx = np.where(active)[0]
+        rN_active, ok = normalized_residuals(csr_matrix(H)[active, :], z[active] - h[active], sigma[active])
+
+        if not ok:
+            break
+
+        rN[idx] = rN_active
+        k = rN_active.argmax() if len(rN_active) else 0
+
+        if len(rN_active) == 0 or rN_active[k] <= threshold or len(bad_idx) >= max_bad_data:
+            break
+
+        # remove the measurement with the largest normalized residual and estimate again
+        active[idx[k]] = False
+        bad_idx.append(idx[k])
+
+    return V, err, converged, bad_idx, rN
+
+
 if __name__ == '__main__':
 
     from GridCal.Engine import *
@@ -13,12 +13,17 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import numpy as np
 from PySide2.QtCore import QRunnable
 
-from GridCal.Engine.Simulations.StateEstimation.state_estimation import solve_se_lm
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowResults, power_flow_post_process
+from GridCal.Engine.basic_structures import SolverType
+from GridCal.Engine.Simulations.sparse_solve import get_factorization_cache
+from GridCal.Engine.Simulations.StateEstimation.state_estimation import solve_se_lm, solve_se_lm_bad_data
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowResults, power_flow_post_process, \
+    ConvergenceReport
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
 from GridCal.Engine.Devices.measurement import MeasurementType
 
 
@@ -83,20 +88,28 @@ class StateEstimationInput:
         self.i_flow_idx.clear()
         self.vm_m_idx.clear()
 
+    def get_measurements(self):
+        """
+        Get the measurements in the consolidated order (the order of the rows of the Jacobian)
+        :return: list of Measurement objects
+        """
+        return self.p_flow + self.p_inj + self.q_flow + self.q_inj + self.i_flow + self.vm_m
+
     def consolidate(self):
         """
         consolidate the measurements into "measurements" and "sigma"
         :return: measurements, sigma
         """
+        measurements = self.get_measurements()
 
-        nz = len(self.p_inj) + len(self.p_flow) + len(self.q_inj) + len(self.q_flow) + len(self.i_flow) + len(self.vm_m)
+        nz = len(measurements)
 
         magnitudes = np.zeros(nz)
         sigma = np.zeros(nz)
 
         # go through the measurements in order and form the vectors
         k = 0
-        for m in self.p_flow + self.p_inj + self.q_flow + self.q_inj + self.i_flow + self.vm_m:
+        for m in measurements:
             magnitudes[k] = m.val
             sigma[k] = m.sigma
             k += 1
@@ -104,6 +117,29 @@ class StateEstimationInput:
         return magnitudes, sigma
 
 
+class StateEstimationOptions:
+
+    def __init__(self, tolerance=1e-9, max_iter=100, detect_bad_data=False, bad_data_threshold=3.0,
+                 max_bad_data=None):
+        """
+        State estimation options
+        :param tolerance: convergence tolerance
+        :param max_iter: maximum number of iterations
+        :param detect_bad_data: remove the bad measurements with the largest normalized residual test
+        :param bad_data_threshold: normalized residual above which a measurement is considered bad data
+        :param max_bad_data: maximum number of measurements to remove per island (None: no limit)
+        """
+        self.tolerance = tolerance
+
+        self.max_iter = max_iter
+
+        self.detect_bad_data = detect_bad_data
+
+        self.bad_data_threshold = bad_data_threshold
+
+        self.max_bad_data = max_bad_data
+
+
 class StateEstimationResults(PowerFlowResults):
 
     def __init__(self, n, m, n_tr, bus_names, branch_names, transformer_names, bus_types):
@@ -129,44 +165,71 @@ class StateEstimationResults(PowerFlowResults):
                                   hvdc_names=(),
                                   bus_types=bus_types)
 
+        # measurements of all the islands in the consolidated order
+        self.measurements = list()
+
+        # normalized residual of each measurement (nan if it was not computed or the measurement was removed)
+        self.normalized_residuals = np.zeros(0)
+
+        # indices of the measurements detected as bad data
+        self.bad_data_idx = list()
+
+    def add_measurements(self, measurements, normalized_residuals, bad_data_idx):
+        """
+        Append the measurements of an island
+        :param measurements: list of Measurement objects of the island (consolidated order)
+        :param normalized_residuals: normalized residuals of the island measurements
+        :param bad_data_idx: indices of the bad measurements of the island
+        """
+        offset = len(self.measurements)
+        self.measurements += measurements
+        self.normalized_residuals = np.r_[self.normalized_residuals, normalized_residuals]
+        self.bad_data_idx += [offset + k for k in bad_data_idx]
+
 
 class StateEstimation(QRunnable):
 
-    def __init__(self, circuit: MultiCircuit):
+    def __init__(self, circuit: MultiCircuit, options: StateEstimationOptions = None):
         """
         Constructor
         :param circuit: circuit object
+        :param options: StateEstimationOptions instance (default options if None)
         """
 
         QRunnable.__init__(self)
 
         self.grid = circuit
 
+        self.options = StateEstimationOptions() if options is None else options
+
         self.se_results = None
 
     @staticmethod
     def collect_measurements(circuit: MultiCircuit, bus_idx, branch_idx):
         """
         Form the input from the circuit measurements
-        :return: nothing, the input object is stored in this class
+        :param circuit: MultiCircuit instance
+        :param bus_idx: indices of the buses of the island (the measurements refer to their position here)
+        :param branch_idx: indices of the branches of the island (the measurements refer to their position here)
+        :return: StateEstimationInput of the island
         """
         se_input = StateEstimationInput()
 
         # collect the bus measurements
-        for i in bus_idx:
+        for k, i in enumerate(bus_idx):
 
             for m in circuit.buses[i].measurements:
 
                 if m.measurement_type == MeasurementType.Pinj:
-                    se_input.p_inj_idx.append(i)
+                    se_input.p_inj_idx.append(k)
                     se_input.p_inj.append(m)
 
                 elif m.measurement_type == MeasurementType.Qinj:
-                    se_input.q_inj_idx.append(i)
+                    se_input.q_inj_idx.append(k)
                     se_input.q_inj.append(m)
 
                 elif m.measurement_type == MeasurementType.Vmag:
-                    se_input.vm_m_idx.append(i)
+                    se_input.vm_m_idx.append(k)
                     se_input.vm_m.append(m)
 
                 else:
@@ -174,23 +237,22 @@ class StateEstimation(QRunnable):
                                     + str(m.measurement_type))
 
         # collect the branch measurements
-        branches = circuit.get_branches()
-        for i in branch_idx:
-
-            # branch = circuit.branches[i]
+        # the branches in the order of the compiled circuit
+        branches = circuit.lines + circuit.transformers2w + circuit.vsc_converters + circuit.dc_lines
+        for k, i in enumerate(branch_idx):
 
             for m in branches[i].measurements:
 
                 if m.measurement_type == MeasurementType.Pflow:
-                    se_input.p_flow_idx.append(i)
+                    se_input.p_flow_idx.append(k)
                     se_input.p_flow.append(m)
 
                 elif m.measurement_type == MeasurementType.Qflow:
-                    se_input.q_flow_idx.append(i)
+                    se_input.q_flow_idx.append(k)
                     se_input.q_flow.append(m)
 
                 elif m.measurement_type == MeasurementType.Iflow:
-                    se_input.i_flow_idx.append(i)
+                    se_input.i_flow_idx.append(k)
                     se_input.i_flow.append(m)
 
                 else:
@@ -204,15 +266,16 @@ class StateEstimation(QRunnable):
         Run state estimation
         :return:
         """
-        n = len(self.grid.buses)
-        m = self.grid.get_branch_number()
-        self.se_results = StateEstimationResults()
-        self.se_results.initialize(n, m)
-
-        numerical_circuit = self.grid.compile_snapshot()
-        islands = numerical_circuit.compute()
+        numerical_circuit = compile_snapshot_circuit(self.grid)
+        islands = split_into_islands(numerical_circuit)
 
-        self.se_results.bus_types = numerical_circuit.bus_types
+        self.se_results = StateEstimationResults(n=numerical_circuit.nbus,
+                                                 m=numerical_circuit.nbr,
+                                                 n_tr=numerical_circuit.ntr,
+                                                 bus_names=numerical_circuit.bus_names,
+                                                 branch_names=numerical_circuit.branch_names,
+                                                 transformer_names=numerical_circuit.tr_names,
+                                                 bus_types=numerical_circuit.bus_types)
 
         for island in islands:
 
@@ -221,35 +284,82 @@ class StateEstimation(QRunnable):
                                                  bus_idx=island.original_bus_idx,
                                                  branch_idx=island.original_branch_idx)
 
+            # the symbolic analysis of the gain matrix is reused within the estimation of the island only
+            linear_solver = get_factorization_cache()
+
             # run solver
-            v_sol, err, converged = solve_se_lm(Ybus=island.Ybus,
-                                                Yf=island.Yf,
-                                                Yt=island.Yt,
-                                                f=island.F,
-                                                t=island.T,
-                                                se_input=se_input,
-                                                ref=island.ref,
-                                                pq=island.pq,
-                                                pv=island.pv)
-
-            # Compute the branches power and the slack buses power
-            Sbranch, Ibranch, Vbrnach, loading, \
-             losses, flow_direction, Sbus = power_flow_post_process(calculation_inputs=island, V=v_sol)
+            start = time.time()
+            if self.options.detect_bad_data:
+                v_sol, err, converged, bad_idx, rN = solve_se_lm_bad_data(Ybus=island.Ybus,
+                                                                          Yf=island.Yf,
+                                                                          Yt=island.Yt,
+                                                                          f=island.F,
+                                                                          t=island.T,
+                                                                          se_input=se_input,
+                                                                          ref=island.vd,
+                                                                          pq=island.pq,
+                                                                          pv=island.pv,
+                                                                          threshold=self.options.bad_data_threshold,
+                                                                          max_bad_data=self.options.max_bad_data,
+                                                                          tol=self.options.tolerance,
+                                                                          max_iter=self.options.max_iter,
+                                                                          linear_solver=linear_solver)
+            else:
+                v_sol, err, converged = solve_se_lm(Ybus=island.Ybus,
+                                                    Yf=island.Yf,
+                                                    Yt=island.Yt,
+                                                    f=island.F,
+                                                    t=island.T,
+                                                    se_input=se_input,
+                                                    ref=island.vd,
+                                                    pq=island.pq,
+                                                    pv=island.pv,
+                                                    tol=self.options.tolerance,
+                                                    max_iter=self.options.max_iter,
+                                                    linear_solver=linear_solver)
+                bad_idx = list()
+                rN = np.full(len(se_input.get_measurements()), np.nan)
+
+            report = ConvergenceReport()
+            report.add(method=SolverType.LM,
+                       converged=converged,
+                       error=err,
+                       elapsed=time.time() - start,
+                       iterations=None)
+
+            # Compute the branches power and the estimated injections
+            Scalc = v_sol * np.conj(island.Ybus * v_sol)
+            Sbranch, Ibranch, Vbranch, loading, \
+             losses, flow_direction, Sbus = power_flow_post_process(calculation_inputs=island,
+                                                                    Sbus=Scalc,
+                                                                    V=v_sol,
+                                                                    branch_rates=island.branch_rates)
 
             # pack results into a SE results object
-            results = StateEstimationResults(Sbus=Sbus,
-                                             voltage=v_sol,
-                                             Sbranch=Sbranch,
-                                             Ibranch=Ibranch,
-                                             loading=loading,
-                                             losses=losses,
-                                             error=[err],
-                                             converged=[converged],
-                                             Qpv=None)
+            results = StateEstimationResults(n=island.nbus,
+                                             m=island.nbr,
+                                             n_tr=island.ntr,
+                                             bus_names=island.bus_names,
+                                             branch_names=island.branch_names,
+                                             transformer_names=island.tr_names,
+                                             bus_types=island.bus_types)
+            results.Sbus = Sbus
+            results.voltage = v_sol
+            results.Sbranch = Sbranch
+            results.Ibranch = Ibranch
+            results.Vbranch = Vbranch
+            results.loading = loading
+            results.losses = losses
+            results.flow_direction = flow_direction
+            results.tap_module = island.tr_tap_mod
+            results.convergence_reports.append(report)
 
             self.se_results.apply_from_island(results,
                                               island.original_bus_idx,
-                                              island.original_branch_idx)
+                                              island.original_branch_idx,
+                                              island.original_tr_idx)
+
+            self.se_results.add_measurements(se_input.get_measurements(), rN, bad_idx)
 
 
 if __name__ == '__main__':
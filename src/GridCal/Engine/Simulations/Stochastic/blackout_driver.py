@@ -14,23 +14,224 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 from enum import Enum
+import multiprocessing
 import pandas as pd
 import numpy as np
 from PySide2.QtCore import QThread, Signal
 
-
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
-from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, single_island_pf
+from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import MonteCarloResults
-from GridCal.Engine.Simulations.Stochastic.lhs_driver import LatinHypercubeSampling
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_input import MonteCarloSampling
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_driver import make_monte_carlo_input
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
+from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit, compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit
+from GridCal.Engine.Core.topology import ConnectivityStructure
 
 
 class CascadeType(Enum):
     PowerFlow = 0,
     LatinHypercube = 1
 
+########################################################################################################################
+# Cascading functions (they work on a compiled circuit)
+########################################################################################################################
+
+
+def cascade_power_flow(nc: SnapshotCircuit, V0, S, I, options: PowerFlowOptions, logger: Logger):
+    """
+    Power flow of a compiled circuit in its current topology.
+    The admittance matrices of the circuit must be up to date (see SnapshotCircuit.update_admittance_matrices)
+    :param nc: SnapshotCircuit instance
+    :param V0: initial voltage (the buses at zero start from the circuit voltage)
+    :param S: power injections (p.u.)
+    :param I: current injections (p.u.)
+    :param options: PowerFlowOptions instance
+    :param logger: Logger instance
+    :return: voltage (n), branch power (m, MVA), branch loading (m), energized buses (n)
+    """
+    V = np.zeros(nc.nbus, dtype=complex)
+    Sbranch = np.zeros(nc.nbr, dtype=complex)
+    loading = np.zeros(nc.nbr, dtype=complex)
+    energized = np.zeros(nc.nbus, dtype=bool)
+
+    # warm start
+    V0 = np.where(np.abs(V0) > 0, V0, nc.Vbus)
+
+    islands = split_into_islands(numeric_circuit=nc, ignore_single_node_islands=options.ignore_single_node_islands)
+
+    for island in islands:
+
+        if island is nc:
+            b_idx = np.arange(nc.nbus)
+            br_idx = np.arange(nc.nbr)
+        else:
+            b_idx = island.original_bus_idx
+            br_idx = island.original_branch_idx
+
+        if len(island.vd) > 0:
+            res = single_island_pf(circuit=island,
+                                   Vbus=V0[b_idx],
+                                   Sbus=S[b_idx],
+                                   Ibus=I[b_idx],
+                                   branch_rates=island.branch_rates,
+                                   options=options,
+                                   logger=logger)
+            V[b_idx] = res.voltage
+            Sbranch[br_idx] = res.Sbranch
+            loading[br_idx] = res.loading
+            energized[b_idx] = True
+
+    return V, Sbranch, loading, energized
+
+
+def get_overloaded_branches(loading, branch_active, max_loading=1.0, force=False):
+    """
+    Select the branches that fail because of their loading
+    :param loading: branch loading
+    :param branch_active: branch states
+    :param max_loading: loading above which a branch fails
+    :param force: if there are no overloads, fail the most loaded branch
+    :return: indices of the failed branches, criteria
+    """
+    load = np.abs(loading) * (branch_active != 0)
+    idx = np.where(load > max_loading)[0]
+
+    if len(idx) > 0:
+        return idx, 'Overload'
+
+    if force and load.max() > 0:
+        return np.where(load >= load.max())[0], 'Loading'
+
+    return idx, 'None'
+
+
+def set_branches_state(nc: SnapshotCircuit, connectivity: ConnectivityStructure, idx, active):
+    """
+    Switch branches of a compiled circuit, updating its admittance matrices with a low rank correction
+    :param nc: SnapshotCircuit instance
+    :param connectivity: ConnectivityStructure of the circuit (updated as well)
+    :param idx: branch indices
+    :param active: new state (a single value or one value per branch)
+    """
+    if len(idx) == 0:
+        return
+
+    active = np.broadcast_to(active, (len(idx),))
+    nc.branch_active[idx] = active
+    nc.update_admittance_matrices(idx)
+    for k, a in zip(idx, active):
+        connectivity.set_branch_state(k, a)
+
+
+def run_cascade(nc: SnapshotCircuit, options: PowerFlowOptions, triggering_idx, S=None, I=None,
+                max_loading=1.0, max_additional_islands=1, max_steps=100, connectivity: ConnectivityStructure = None,
+                logger=Logger()):
+    """
+    Simulate a cascade of overloads on a compiled circuit.
+    The branches are switched in place and the circuit is restored at the end.
+    :param nc: SnapshotCircuit instance
+    :param options: PowerFlowOptions instance
+    :param triggering_idx: indices of the branches that fail first
+    :param S: power injections (p.u.), the circuit ones if None
+    :param I: current injections (p.u.), the circuit ones if None
+    :param max_loading: loading above which a branch fails
+    :param max_additional_islands: number of islands that shall be formed to consider a blackout
+    :param max_steps: maximum number of cascade steps
+    :param connectivity: ConnectivityStructure of the circuit (computed if None)
+    :param logger: Logger instance
+    :return: list of arrays of failed branches (one per step), voltage, loading, energized buses
+    """
+    S = nc.Sbus if S is None else S
+    I = nc.Ibus if I is None else I
+
+    if connectivity is None:
+        connectivity = ConnectivityStructure.from_circuit(nc)
+
+    max_islands = connectivity.island_number + max_additional_islands
+    initial_state = nc.branch_active.copy()
+
+    steps = list()
+    failed = np.zeros(0, dtype=int)
+    idx = np.array(triggering_idx, dtype=int)
+    V = nc.Vbus.copy()
+    loading = np.zeros(nc.nbr, dtype=complex)
+    energized = np.ones(nc.nbus, dtype=bool)
+
+    while len(idx) > 0 and len(steps) < max_steps:
+
+        set_branches_state(nc, connectivity, idx, 0)
+        failed = np.r_[failed, idx]
+        steps.append(idx)
+
+        if connectivity.island_number > max_islands:
+            break
+
+        V, Sbranch, loading, energized = cascade_power_flow(nc, V, S, I, options, logger)
+
+        idx, criteria = get_overloaded_branches(loading, nc.branch_active, max_loading=max_loading)
+
+    # restore the circuit
+    set_branches_state(nc, connectivity, failed, initial_state[failed])
+
+    return steps, V, loading, energized
+
+
+def get_cascade_circuit(circuit: MultiCircuit, options: PowerFlowOptions) -> SnapshotCircuit:
+    """
+    Compile a circuit for the cascading simulations
+    :param circuit: MultiCircuit instance
+    :param options: PowerFlowOptions instance
+    :return: SnapshotCircuit with all the admittance matrices computed
+    """
+    nc = compile_snapshot_circuit(circuit=circuit,
+                                  apply_temperature=options.apply_temperature_correction,
+                                  branch_tolerance_mode=options.branch_impedance_tolerance_mode)
+    nc.consolidate()
+    return nc
+
+
+# compiled circuit and options of the cascade worker processes (set once per process by the pool initializer)
+_cascade_worker_circuit = None
+_cascade_worker_connectivity = None
+_cascade_worker_options = None
+
+
+def cascade_worker_init(nc: SnapshotCircuit, options: PowerFlowOptions):
+    """
+    Process pool initializer: keep the compiled circuit and the power flow options in the worker process
+    :param nc: SnapshotCircuit instance
+    :param options: PowerFlowOptions instance
+    """
+    global _cascade_worker_circuit, _cascade_worker_connectivity, _cascade_worker_options
+    _cascade_worker_circuit = nc
+    _cascade_worker_connectivity = ConnectivityStructure.from_circuit(nc)
+    _cascade_worker_options = options
+
+
+def cascade_worker(scenario_idx, triggering_idx, S, max_loading, max_additional_islands, max_steps):
+    """
+    Process pool worker that simulates one cascade scenario
+    :param scenario_idx: index of the scenario
+    :param triggering_idx: indices of the branches that fail first
+    :param S: power injections of the scenario (p.u.), the circuit ones if None
+    :param max_loading: loading above which a branch fails
+    :param max_additional_islands: number of islands that shall be formed to consider a blackout
+    :param max_steps: maximum number of cascade steps
+    :return: scenario_idx, list of arrays of failed branches, energized buses
+    """
+    steps, V, loading, energized = run_cascade(nc=_cascade_worker_circuit,
+                                               options=_cascade_worker_options,
+                                               triggering_idx=triggering_idx,
+                                               S=S,
+                                               max_loading=max_loading,
+                                               max_additional_islands=max_additional_islands,
+                                               max_steps=max_steps,
+                                               connectivity=_cascade_worker_connectivity)
+    return scenario_idx, steps, energized
+
 ########################################################################################################################
 # Cascading classes
 ########################################################################################################################
@@ -67,12 +268,9 @@ class CascadingResults:
         Returns:
             array of all failed branches
         """
-        res = None
-        for i in range(len(self.events)):
-            if i == 0:
-                res = self.events[i][0]
-            else:
-                res = np.r_[res, self.events[i][0]]
+        res = np.zeros(0, dtype=int)
+        for event in self.events:
+            res = np.r_[res, event.removed_idx]
 
         return res
 
@@ -93,6 +291,75 @@ class CascadingResults:
         pass
 
 
+class CascadingEnsembleResults:
+
+    def __init__(self, n_scenarios, bus_names, branch_names):
+        """
+        Results of an ensemble of cascade scenarios
+        :param n_scenarios: number of scenarios
+        :param bus_names: array of bus names
+        :param branch_names: array of branch names
+        """
+        self.bus_names = bus_names
+
+        self.branch_names = branch_names
+
+        self.n_scenarios = n_scenarios
+
+        # failed branches of every scenario (list of arrays per step)
+        self.steps = [list() for _ in range(n_scenarios)]
+
+        # number of cascade steps of every scenario
+        self.steps_number = np.zeros(n_scenarios, dtype=int)
+
+        # number of failed branches of every scenario
+        self.failed_number = np.zeros(n_scenarios, dtype=int)
+
+        # load not supplied at the end of every scenario (MW)
+        self.load_shed = np.zeros(n_scenarios)
+
+        # number of scenarios where each branch fails
+        self.branch_failure_count = np.zeros(len(branch_names), dtype=int)
+
+    def set_scenario(self, i, steps, load_shed):
+        """
+        Store the outcome of a scenario
+        :param i: scenario index
+        :param steps: list of arrays of failed branches
+        :param load_shed: load not supplied (MW)
+        """
+        self.steps[i] = steps
+        self.steps_number[i] = len(steps)
+        failed = np.unique(np.concatenate(steps)) if len(steps) > 0 else np.zeros(0, dtype=int)
+        self.failed_number[i] = len(failed)
+        self.branch_failure_count[failed] += 1
+        self.load_shed[i] = load_shed
+
+    def get_branch_failure_probability(self):
+        """
+        Frequency with which every branch fails in the ensemble
+        :return: array (m)
+        """
+        return self.branch_failure_count / max(self.n_scenarios, 1)
+
+    def get_load_shed_exceedance(self, values):
+        """
+        Probability of shedding more load than the given values
+        :param values: array of load values (MW)
+        :return: array of probabilities
+        """
+        values = np.atleast_1d(values)
+        return (self.load_shed[:, np.newaxis] > values[np.newaxis, :]).mean(axis=0)
+
+    def get_table(self):
+        """
+        Get DataFrame of the scenarios
+        :return: DataFrame
+        """
+        return pd.DataFrame(data=np.c_[self.steps_number, self.failed_number, self.load_shed],
+                            columns=['Cascade steps', 'Elements failed', 'Load shed (MW)'])
+
+
 class Cascading(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
@@ -131,27 +398,109 @@ class Cascading(QThread):
 
         self.results = CascadingResults(self.cascade_type)
 
-    @staticmethod
-    def remove_elements(circuit: MultiCircuit, loading_vector, idx=None):
+        self.logger = Logger()
+
+        # compiled circuit, its connectivity and the voltage of the last step (warm start)
+        self.numerical_circuit = None
+        self.connectivity = None
+        self.V = None
+
+        # injection samples of the latin hypercube cascade (samples, n)
+        self.S_samples = None
+        self.I_samples = None
+
+    def compile(self):
+        """
+        Compile the grid (only once, the cascade switches the branches of the compiled circuit)
+        """
+        self.numerical_circuit = get_cascade_circuit(self.grid, self.options)
+        self.connectivity = ConnectivityStructure.from_circuit(self.numerical_circuit)
+        self.V = self.numerical_circuit.Vbus.copy()
+        self.current_step = 0
+        self.results = CascadingResults(self.cascade_type)
+
+        if self.cascade_type is CascadeType.LatinHypercube:
+            self.sample_injections()
+
+    def sample_injections(self):
+        """
+        Latin hypercube samples of the injections, from the profiles if there are any
+        """
+        nc = self.numerical_circuit
+
+        if self.grid.time_profile is not None:
+            time_circuit = compile_time_circuit(circuit=self.grid,
+                                                apply_temperature=self.options.apply_temperature_correction,
+                                                branch_tolerance_mode=self.options.branch_impedance_tolerance_mode)
+            mc_input = make_monte_carlo_input(time_circuit)
+            samples = mc_input(self.n_lhs_samples, sampling=MonteCarloSampling.LatinHypercube)
+            self.S_samples = samples.S
+            self.I_samples = samples.I
+        else:
+            self.S_samples = nc.Sbus[np.newaxis, :]
+            self.I_samples = nc.Ibus[np.newaxis, :]
+
+    def power_flow_step(self):
+        """
+        Run the power flow of the current topology
+        :return: PowerFlowResults instance
+        """
+        nc = self.numerical_circuit
+        V, Sbranch, loading, energized = cascade_power_flow(nc, self.V, nc.Sbus, nc.Ibus,
+                                                            self.options, self.logger)
+        self.V = V
+
+        results = PowerFlowResults(n=nc.nbus, m=nc.nbr, n_tr=nc.ntr, n_hvdc=nc.nhvdc,
+                                   bus_names=nc.bus_names, branch_names=nc.branch_names,
+                                   transformer_names=nc.tr_names, hvdc_names=nc.hvdc_names,
+                                   bus_types=nc.bus_types)
+        results.voltage = V
+        results.Sbranch = Sbranch
+        results.loading = loading
+        results.Sbus = nc.Sbus * energized * nc.Sbase
+        results.sbranch = Sbranch.real
+
+        return results
+
+    def latin_hypercube_step(self):
+        """
+        Run the power flows of all the injection samples with the current topology
+        :return: MonteCarloResults instance
+        """
+        nc = self.numerical_circuit
+        p = self.S_samples.shape[0]
+        results = MonteCarloResults(nc.nbus, nc.nbr, p, bus_names=nc.bus_names, branch_names=nc.branch_names,
+                                    bus_types=nc.bus_types, name='Latin Hypercube')
+        V = self.V
+        for t in range(p):
+            V, Sbranch, loading, energized = cascade_power_flow(nc, V, self.S_samples[t, :], self.I_samples[t, :],
+                                                                self.options, self.logger)
+            results.S_points[t, :] = self.S_samples[t, :] * energized * nc.Sbase
+            results.V_points[t, :] = V
+            results.Sbr_points[t, :] = Sbranch
+            results.loading_points[t, :] = loading
+
+            if self.__cancel__:
+                break
+
+        self.V = V
+        results.compile()
+
+        return results
+
+    def remove_elements(self, loading_vector, idx=None):
         """
         Remove branches based on loading
-        Returns:
-            Nothing
+        :param loading_vector: branch loading
+        :param idx: branches to remove (if None, they are chosen by their loading)
+        :return: removed indices, criteria
         """
         criteria = 'None'
         if idx is None:
-            load = abs(loading_vector)
-            idx = np.where(load > 1.0)[0]
-
-            if len(idx) == 0:
-                criteria = 'Loading'
-                idx = np.where(load >= load.max())[0]
+            idx, criteria = get_overloaded_branches(loading_vector, self.numerical_circuit.branch_active, force=True)
 
-        # disable the selected branches
-        # print('Removing:', idx, load[idx])
-        branches = circuit.get_branches()
-        for i in idx:
-            branches[i].active = False
+        idx = np.array(idx, dtype=int)
+        set_branches_state(self.numerical_circuit, self.connectivity, idx, 0)
 
         return idx, criteria
 
@@ -205,38 +554,39 @@ class Cascading(QThread):
         Returns:
             Nothing
         """
+        if self.numerical_circuit is None:
+            self.compile()
 
-        # initialize the simulator
-        if self.cascade_type is CascadeType.PowerFlow:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
-
-        elif self.cascade_type is CascadeType.LatinHypercube:
-            model_simulator = LatinHypercubeSampling(self.grid, self.options, sampling_points=self.n_lhs_samples)
+        if self.cascade_type is CascadeType.LatinHypercube:
+            results = self.latin_hypercube_step()
 
+            if self.current_step == 0 and self.triggering_idx is not None:
+                idx, criteria = self.remove_elements(results.loading, idx=self.triggering_idx)
+            else:
+                idx, criteria = self.remove_probability_based(self.numerical_circuit, results,
+                                                              max_val=1.0, min_prob=0.1)
+                idx = np.array(idx, dtype=int)
+                # the branch states are already set: update the matrices and the connectivity
+                self.numerical_circuit.update_admittance_matrices(idx)
+                for k in idx:
+                    self.connectivity.set_branch_state(k, False)
         else:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
+            results = self.power_flow_step()
 
-        # For every circuit, run a power flow
-        # for c in self.grid.circuits:
-        model_simulator.run()
-
-        if self.current_step == 0:
-            # the first iteration try to trigger the selected indices, if any
-            idx, criteria = self.remove_elements(self.grid, idx=self.triggering_idx,
-                                                 loading_vector=model_simulator.results.loading)
-        else:
-            # cascade normally
-            idx, criteria = self.remove_elements(self.grid, loading_vector=model_simulator.results.loading)
+            if self.current_step == 0:
+                # the first iteration try to trigger the selected indices, if any
+                idx, criteria = self.remove_elements(results.loading, idx=self.triggering_idx)
+            else:
+                # cascade normally
+                idx, criteria = self.remove_elements(results.loading)
 
         # store the removed indices and the results
-        entry = CascadingReportElement(idx, model_simulator.results, criteria)
+        entry = CascadingReportElement(idx, results, criteria)
         self.results.events.append(entry)
 
         # increase the step number
         self.current_step += 1
 
-        # print(model_simulator.results.get_convergence_report())
-
         # send the finnish signal
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Done!')
@@ -244,66 +594,50 @@ class Cascading(QThread):
 
     def run(self):
         """
-        Run the monte carlo simulation
+        Run the cascading simulation
         @return:
         """
 
         self.__cancel__ = False
 
-        # compile
-        # print('Compiling...', end='')
-        numerical_circuit = self.grid.compile_time_series()
-        calculation_inputs = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode)
-
-        self.results = CascadingResults(self.cascade_type)
-
-        # initialize the simulator
-        if self.cascade_type is CascadeType.PowerFlow:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
-
-        elif self.cascade_type is CascadeType.LatinHypercube:
-            model_simulator = LatinHypercubeSampling(self.grid, self.options, sampling_points=self.n_lhs_samples)
-
-        else:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
-
         self.progress_signal.emit(0.0)
-        self.progress_text.emit('Running cascading failure...')
+        self.progress_text.emit('Compiling...')
+        self.compile()
 
-        n_grids = len(calculation_inputs) + self.max_additional_islands
-        if n_grids > len(self.grid.buses):  # safety check
-            n_grids = len(self.grid.buses) - 1
+        self.progress_text.emit('Running cascading failure...')
 
-        # print('n grids: ', n_grids)
+        n_grids = self.connectivity.island_number + self.max_additional_islands
+        if n_grids > self.numerical_circuit.nbus:  # safety check
+            n_grids = self.numerical_circuit.nbus - 1
 
         it = 0
-        while len(calculation_inputs) <= n_grids and it <= n_grids:
-
-            # For every circuit, run a power flow
-            # for c in self.grid.circuits:
-            model_simulator.run()
-            # print(model_simulator.results.get_convergence_report())
-
-            # remove grid elements (branches)
-            idx, criteria = self.remove_probability_based(numerical_circuit, model_simulator.results, max_val=1.0, min_prob=0.1)
+        while self.connectivity.island_number <= n_grids and it <= n_grids:
+
+            if self.cascade_type is CascadeType.LatinHypercube:
+                results = self.latin_hypercube_step()
+                idx, criteria = self.remove_probability_based(self.numerical_circuit, results,
+                                                              max_val=1.0, min_prob=0.1)
+                idx = np.array(idx, dtype=int)
+                self.numerical_circuit.update_admittance_matrices(idx)
+                for k in idx:
+                    self.connectivity.set_branch_state(k, False)
+            else:
+                results = self.power_flow_step()
+                idx, criteria = self.remove_elements(results.loading)
 
             # store the removed indices and the results
-            entry = CascadingReportElement(idx, model_simulator.results, criteria)
+            entry = CascadingReportElement(idx, results, criteria)
             self.results.events.append(entry)
 
-            # recompile grid
-            calculation_inputs = numerical_circuit.compute()
-
             it += 1
+            self.current_step += 1
 
-            prog = max(len(calculation_inputs) / (n_grids+1), it/(n_grids+1))
+            prog = max(self.connectivity.island_number / (n_grids + 1), it / (n_grids + 1))
             self.progress_signal.emit(prog * 100.0)
 
-            if self.__cancel__:
+            if self.__cancel__ or len(idx) == 0:
                 break
 
-        print('Grid split into ', len(calculation_inputs), ' islands after', it, ' steps')
-
         # send the finnish signal
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Done!')
@@ -333,3 +667,130 @@ class Cascading(QThread):
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Cancelled')
         self.done_signal.emit()
+
+
+class CascadingEnsemble(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+    name = 'Cascading ensemble'
+
+    def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, triggering_idx_list,
+                 injection_samples=None, max_loading=1.0, max_additional_islands=1, max_steps=100,
+                 use_multi_process=True):
+        """
+        Simulate many independent cascade scenarios on the same compiled circuit
+        :param grid: MultiCircuit instance
+        :param options: PowerFlowOptions instance
+        :param triggering_idx_list: list of arrays of the branches that trigger every scenario
+        :param injection_samples: power injections of every scenario (scenarios, n) in MW, the snapshot if None
+        :param max_loading: loading above which a branch fails
+        :param max_additional_islands: number of islands that shall be formed to consider a blackout
+        :param max_steps: maximum number of cascade steps per scenario
+        :param use_multi_process: distribute the scenarios among processes?
+        """
+        QThread.__init__(self)
+
+        self.grid = grid
+
+        self.options = options
+
+        self.triggering_idx_list = triggering_idx_list
+
+        self.injection_samples = injection_samples
+
+        self.max_loading = max_loading
+
+        self.max_additional_islands = max_additional_islands
+
+        self.max_steps = max_steps
+
+        self.use_multi_process = use_multi_process
+
+        self.results = None
+
+        self.logger = Logger()
+
+        self.pool = None
+
+        self.__cancel__ = False
+
+    def get_scenario_injections(self, i, nc: SnapshotCircuit):
+        """
+        Get the injections of a scenario in p.u.
+        :param i: scenario index
+        :param nc: SnapshotCircuit instance
+        :return: array (n) or None
+        """
+        if self.injection_samples is None:
+            return None
+        return self.injection_samples[i, :] / nc.Sbase
+
+    def run(self):
+        """
+        Run the ensemble
+        """
+        self.__cancel__ = False
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Compiling...')
+
+        nc = get_cascade_circuit(self.grid, self.options)
+        n_scenarios = len(self.triggering_idx_list)
+        self.results = CascadingEnsembleResults(n_scenarios, nc.bus_names, nc.branch_names)
+
+        # load of every bus (MW)
+        bus_load = np.maximum(-nc.Sbus.real, 0.0) * nc.Sbase
+
+        def store(res):
+            i, steps, energized = res
+            self.results.set_scenario(i, steps, bus_load[~energized].sum())
+
+        self.progress_text.emit('Running cascades...')
+
+        if self.use_multi_process:
+            self.pool = multiprocessing.Pool(initializer=cascade_worker_init, initargs=(nc, self.options))
+            try:
+                jobs = [self.pool.apply_async(cascade_worker, (i, idx, self.get_scenario_injections(i, nc),
+                                                               self.max_loading, self.max_additional_islands,
+                                                               self.max_steps))
+                        for i, idx in enumerate(self.triggering_idx_list)]
+
+                for k, job in enumerate(jobs):
+                    if self.__cancel__:
+                        break
+                    store(job.get())
+                    self.progress_signal.emit((k + 1) / n_scenarios * 100.0)
+            finally:
+                self.pool.terminate()
+                self.pool = None
+        else:
+            connectivity = ConnectivityStructure.from_circuit(nc)
+            for i, idx in enumerate(self.triggering_idx_list):
+                if self.__cancel__:
+                    break
+                steps, V, loading, energized = run_cascade(nc=nc,
+                                                           options=self.options,
+                                                           triggering_idx=idx,
+                                                           S=self.get_scenario_injections(i, nc),
+                                                           max_loading=self.max_loading,
+                                                           max_additional_islands=self.max_additional_islands,
+                                                           max_steps=self.max_steps,
+                                                           connectivity=connectivity,
+                                                           logger=self.logger)
+                store((i, steps, energized))
+                self.progress_signal.emit((i + 1) / n_scenarios * 100.0)
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        if self.pool is not None:
+            self.pool.terminate()
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled')
+        self.done_signal.emit()
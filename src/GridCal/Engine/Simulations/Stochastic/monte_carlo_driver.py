@@ -12,7 +12,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
-from numpy import complex, zeros, power
+import numpy as np
 
 import multiprocessing
 from PySide2.QtCore import QThread, Signal
@@ -20,12 +20,12 @@ from PySide2.QtCore import QThread, Signal
 from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import MonteCarloResults
-from GridCal.Engine.Simulations.Stochastic.monte_carlo_input import MonteCarloInput
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_input import MonteCarloInput, StackedCDF, \
+    MonteCarloSampling
 from GridCal.Engine.Core.time_series_pf_data import TimeCircuit
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.basic_structures import CDF
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, single_island_pf, \
-                                                                    power_flow_worker_args, power_flow_post_process
+                                                                    power_flow_post_process
 
 from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit, split_time_circuit_into_islands, BranchImpedanceMode
 
@@ -41,18 +41,67 @@ def make_monte_carlo_input(numerical_input_island: TimeCircuit):
     :return:
     """
     n = numerical_input_island.nbus
-    Scdf = [None] * n
-    Icdf = [None] * n
-    Ycdf = [None] * n
-
-    for i in range(n):
-        Scdf[i] = CDF(numerical_input_island.Sbus[i, :])
-        Icdf[i] = CDF(numerical_input_island.Ibus[i, :])
-        Ycdf[i] = CDF(numerical_input_island.Yshunt_from_devices[i, :])
+    Scdf = StackedCDF(numerical_input_island.Sbus)
+    Icdf = StackedCDF(numerical_input_island.Ibus)
+    Ycdf = StackedCDF(numerical_input_island.Yshunt_from_devices)
 
     return MonteCarloInput(n, Scdf, Icdf, Ycdf)
 
 
+# islands and options of the Monte Carlo worker processes (set once per process by the pool initializer)
+_mc_worker_islands = None
+_mc_worker_options = None
+
+
+def monte_carlo_worker_init(islands, options: PowerFlowOptions):
+    """
+    Process pool initializer: keep the islands and the power flow options in the worker process
+    :param islands: list of TimeCircuit islands
+    :param options: PowerFlowOptions instance
+    """
+    global _mc_worker_islands, _mc_worker_options
+    _mc_worker_islands = islands
+    _mc_worker_options = options
+
+
+def monte_carlo_worker(island_index, block_start, S, I):
+    """
+    Process pool worker that runs the power flows of a block of Monte Carlo samples of one island
+    :param island_index: index of the island in the list given to the initializer
+    :param block_start: index of the first sample of the block within the batch
+    :param S: sampled power injections of the block (block size, island buses)
+    :param I: sampled current injections of the block (block size, island buses)
+    :return: island_index, block_start, Sbus, voltage, Sbranch, loading, losses (one row per sample)
+    """
+    island = _mc_worker_islands[island_index]
+    logger = Logger()
+    nb = S.shape[0]
+    Vbus = island.Vbus[0, :]
+    branch_rates = island.branch_rates[0, :]
+
+    Sbus = np.zeros((nb, island.nbus), dtype=complex)
+    V = np.zeros((nb, island.nbus), dtype=complex)
+    Sbranch = np.zeros((nb, island.nbr), dtype=complex)
+    loading = np.zeros((nb, island.nbr), dtype=complex)
+    losses = np.zeros((nb, island.nbr), dtype=complex)
+
+    for t in range(nb):
+        res = single_island_pf(circuit=island,
+                               Vbus=Vbus,
+                               Sbus=S[t, :],
+                               Ibus=I[t, :],
+                               branch_rates=branch_rates,
+                               options=_mc_worker_options,
+                               logger=logger)
+        Sbus[t, :] = res.Sbus
+        V[t, :] = res.voltage
+        Sbranch[t, :] = res.Sbranch
+        loading[t, :] = res.loading
+        losses[t, :] = res.losses
+
+    return island_index, block_start, Sbus, V, Sbranch, loading, losses
+
+
 class MonteCarlo(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
@@ -60,7 +109,7 @@ class MonteCarlo(QThread):
     name = 'Monte Carlo'
 
     def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, mc_tol=1e-3, batch_size=100, max_mc_iter=10000,
-                 opf_time_series_results=None):
+                 opf_time_series_results=None, streaming_results=False, reservoir_size=1000):
         """
         Monte Carlo simulation constructor
         :param grid: MultiGrid instance
@@ -68,6 +117,8 @@ class MonteCarlo(QThread):
         :param mc_tol: monte carlo std.dev tolerance
         :param batch_size: size of the batch
         :param max_mc_iter: maximum monte carlo iterations in case of not reach the precission
+        :param streaming_results: reduce the batches to streaming statistics instead of storing every sample
+        :param reservoir_size: number of raw samples kept when streaming_results is True
         """
         QThread.__init__(self)
 
@@ -82,14 +133,16 @@ class MonteCarlo(QThread):
         self.batch_size = batch_size
         self.max_mc_iter = max_mc_iter
 
+        self.streaming_results = streaming_results
+
+        self.reservoir_size = reservoir_size
+
         self.results = None
 
         self.logger = Logger()
 
         self.pool = None
 
-        self.returned_results = list()
-
         self.__cancel__ = False
 
     def get_steps(self):
@@ -99,140 +152,138 @@ class MonteCarlo(QThread):
         p = self.results.points_number
         return ['point:' + str(l) for l in range(p)]
 
-    def update_progress_mt(self, res):
+    def update_error(self, mc_results_master: MonteCarloResults, it):
         """
+        Convergence criterion shared by the single and the multi core runs: the standard error of the
+        mean voltage module of the worst bus. It replaces the former single core criterion (the running
+        sum of the minimum voltage variance divided by the iterations), which was computed over the
+        zero-filled rows of the pre-allocated points and cannot be evaluated without storing every sample.
+        :param mc_results_master: MonteCarloResults with the batches appended so far
+        :param it: number of samples run so far
+        :return: error, progress in % of the tolerance
         """
-        t, _ = res
-        progress = (t + 1) / self.max_mc_iter * 100
-        self.progress_signal.emit(progress)
-        self.returned_results.append(res)
+        err = mc_results_master.get_voltage_standard_error()
+        if err == 0:
+            err = 1e-200  # to avoid division by zeros
+        mc_results_master.error_series.append(err)
+
+        # emmit the progress signal
+        std_dev_progress = 100 * self.mc_tol / err
+        if std_dev_progress > 100:
+            std_dev_progress = 100
+        self.progress_signal.emit(max((std_dev_progress, it / self.max_mc_iter * 100)))
+
+        return err, std_dev_progress
 
     def run_multi_thread(self):
         """
-        Run the monte carlo simulation
+        Run the monte carlo simulation using a process pool.
+        The pool is created once with the islands pre-loaded; every batch is sampled here and split
+        into blocks of samples that are solved by the workers. Convergence is checked between batches.
         @return: MonteCarloResults instance
         """
 
         self.__cancel__ = False
 
-        # initialize the grid time series results
-        # we will append the island results with another function
-        # self.circuit.time_series_results = TimeSeriesResults(0, 0, [])
-        self.pool = multiprocessing.Pool()
-        it = 0
-        variance_sum = 0.0
-        std_dev_progress = 0
-        v_variance = 0
+        # compile the multi-circuit
+        numerical_circuit = compile_time_circuit(circuit=self.circuit,
+                                                 apply_temperature=False,
+                                                 branch_tolerance_mode=BranchImpedanceMode.Specified,
+                                                 opf_results=self.opf_time_series_results)
 
-        n = len(self.circuit.buses)
-        m = self.circuit.get_branch_number()
+        # do the topological computation
+        calculation_inputs = split_time_circuit_into_islands(numeric_circuit=numerical_circuit,
+                                                             ignore_single_node_islands=self.options.ignore_single_node_islands)
 
-        mc_results = MonteCarloResults(n, m, name='Monte Carlo')
-        avg_res = PowerFlowResults()
-        avg_res.initialize(n, m)
+        n = numerical_circuit.nbus
+        m = numerical_circuit.nbr
 
-        # compile circuits
-        numerical_circuit = self.circuit.compile_time_series()
+        mc_results_master = MonteCarloResults(n=n,
+                                              m=m,
+                                              p=0,
+                                              bus_names=numerical_circuit.bus_names,
+                                              branch_names=numerical_circuit.branch_names,
+                                              bus_types=numerical_circuit.bus_types,
+                                              name='Monte Carlo',
+                                              streaming=self.streaming_results,
+                                              reservoir_size=self.reservoir_size)
 
-        # perform the topological computation
-        calc_inputs_dict = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
-                                                     ignore_single_node_islands=self.options.ignore_single_node_islands)
+        # the input samplers are built once per island
+        mc_inputs = [make_monte_carlo_input(numerical_island) for numerical_island in calculation_inputs]
 
-        mc_results.bus_types = numerical_circuit.bus_types
+        # split every batch in blocks, one (or more) per worker
+        n_workers = multiprocessing.cpu_count()
+        block_size = int(np.ceil(self.batch_size / n_workers))
 
-        v_sum = zeros(n, dtype=complex)
+        it = 0
+        std_dev_progress = 0
+        err = 0
 
         self.progress_signal.emit(0.0)
 
-        while (std_dev_progress < 100.0) and (it < self.max_mc_iter) and not self.__cancel__:
-
-            self.progress_text.emit('Running Monte Carlo: Variance: ' + str(v_variance))
-
-            mc_results = MonteCarloResults(n, m, self.batch_size, name='Monte Carlo')
-
-            # for each partition of the profiles...
-            for t_key, calc_inputs in calc_inputs_dict.items():
-
-                # For every island, run the time series
-                for island_index, numerical_island in enumerate(calc_inputs):
-
-                    # set the time series as sampled
-                    monte_carlo_input = make_monte_carlo_input(numerical_island)
-                    mc_time_series = monte_carlo_input(self.batch_size, use_latin_hypercube=False)
-                    Vbus = numerical_island.Vbus
-                    branch_rates = numerical_island.branch_rates
-
-                    # short cut the indices
-                    b_idx = numerical_island.original_bus_idx
-                    br_idx = numerical_island.original_branch_idx
-
-                    self.returned_results = list()
-
-                    t = 0
-                    while t < self.batch_size and not self.__cancel__:
-
-                        Ysh, Ibus, Sbus = mc_time_series.get_at(t)
-
-                        args = (t, self.options, numerical_island, Vbus, Sbus, Ibus, branch_rates)
-
-                        self.pool.apply_async(power_flow_worker_args, (args,), callback=self.update_progress_mt)
-
-                    # wait for all jobs to complete
-                    self.pool.close()
-                    self.pool.join()
-
-                    # collect results
-                    self.progress_text.emit('Collecting batch results...')
-                    for t, res in self.returned_results:
-                        # store circuit results at the time index 't'
-                        mc_results.S_points[t, numerical_island.original_bus_idx] = res.Sbus
-                        mc_results.V_points[t, numerical_island.original_bus_idx] = res.voltage
-                        mc_results.Sbr_points[t, numerical_island.original_branch_idx] = res.Sbranch
-                        mc_results.loading_points[t, numerical_island.original_branch_idx] = res.loading
-                        mc_results.losses_points[t, numerical_island.original_branch_idx] = res.losses
+        self.pool = multiprocessing.Pool(processes=n_workers,
+                                         initializer=monte_carlo_worker_init,
+                                         initargs=(calculation_inputs, self.options))
+        try:
+            while (std_dev_progress < 100.0) and (it < self.max_mc_iter) and not self.__cancel__:
+
+                self.progress_text.emit('Running Monte Carlo: Error: ' + str(err))
+
+                batch_results = MonteCarloResults(n=n,
+                                                  m=m,
+                                                  p=self.batch_size,
+                                                  bus_names=numerical_circuit.bus_names,
+                                                  branch_names=numerical_circuit.branch_names,
+                                                  bus_types=numerical_circuit.bus_types,
+                                                  name='Monte Carlo')
+
+                # sample every island and send the blocks to the workers
+                jobs = list()
+                for island_index, mc_input in enumerate(mc_inputs):
+                    mc_time_series = mc_input(self.batch_size, sampling=MonteCarloSampling.Random)
+
+                    for block_start in range(0, self.batch_size, block_size):
+                        block_end = min(block_start + block_size, self.batch_size)
+                        args = (island_index,
+                                block_start,
+                                mc_time_series.S[block_start:block_end, :],
+                                mc_time_series.I[block_start:block_end, :])
+                        jobs.append(self.pool.apply_async(monte_carlo_worker, args))
+
+                # collect the blocks
+                for job in jobs:
+                    if self.__cancel__:
+                        break
+
+                    island_index, block_start, Sbus, V, Sbranch, loading, losses = job.get()
+                    bus_idx = calculation_inputs[island_index].original_bus_idx
+                    br_idx = calculation_inputs[island_index].original_branch_idx
+                    rows = np.arange(block_start, block_start + Sbus.shape[0])
+
+                    batch_results.S_points[np.ix_(rows, bus_idx)] = Sbus
+                    batch_results.V_points[np.ix_(rows, bus_idx)] = V
+                    batch_results.Sbr_points[np.ix_(rows, br_idx)] = Sbranch
+                    batch_results.loading_points[np.ix_(rows, br_idx)] = loading
+                    batch_results.losses_points[np.ix_(rows, br_idx)] = losses
+
+                if self.__cancel__:
+                    break
+
+                # Compute the Monte Carlo values
+                it += self.batch_size
+                mc_results_master.append_batch(batch_results)
+                err, std_dev_progress = self.update_error(mc_results_master, it)
+        finally:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
 
-                    # compile MC results
-                    self.progress_text.emit('Compiling results...')
-                    mc_results.compile()
-
-                    # compute the island branch results
-                    island_avg_res = numerical_island.compute_branch_results(mc_results.voltage[b_idx])
-
-                    # apply the island averaged results
-                    avg_res.apply_from_island(island_avg_res, b_idx=b_idx, br_idx=br_idx)
-
-            # Compute the Monte Carlo values
-            it += self.batch_size
-            mc_results.append_batch(mc_results)
-            v_sum += mc_results.get_voltage_sum()
-            v_avg = v_sum / it
-            v_variance = abs((power(mc_results.V_points - v_avg, 2.0) / (it - 1)).min())
-
-            # progress
-            variance_sum += v_variance
-            err = variance_sum / it
-            if err == 0:
-                err = 1e-200  # to avoid division by zeros
-            mc_results.error_series.append(err)
-
-            # emmit the progress signal
-            std_dev_progress = 100 * self.mc_tol / err
-            if std_dev_progress > 100:
-                std_dev_progress = 100
-            self.progress_signal.emit(max((std_dev_progress, it / self.max_mc_iter * 100)))
-
-        # compute the averaged branch magnitudes
-        mc_results.sbranch = avg_res.Sbranch
-        mc_results.losses = avg_res.losses
-
-        # print('V mc: ', mc_results.voltage)
-
-        # send the finnish signal
-        self.progress_signal.emit(0.0)
-        self.progress_text.emit('Done!')
-        self.done_signal.emit()
+        # compile results
+        self.progress_text.emit('Compiling results...')
+        mc_results_master.compile()
+        mc_results_master.bus_types = numerical_circuit.bus_types
 
-        return mc_results
+        return mc_results_master
 
     def run_single_thread(self):
         """
@@ -248,9 +299,8 @@ class MonteCarlo(QThread):
         # Sbase = self.circuit.Sbase
 
         it = 0
-        variance_sum = 0.0
         std_dev_progress = 0
-        v_variance = 0
+        err = 0
 
         # n = len(self.circuit.buses)
         # m = self.circuit.get_branch_number()
@@ -278,11 +328,13 @@ class MonteCarlo(QThread):
 
         mc_results_master = MonteCarloResults(n=numerical_circuit.nbus,
                                               m=numerical_circuit.nbr,
-                                              p=self.max_mc_iter,
+                                              p=0,
                                               bus_names=numerical_circuit.bus_names,
                                               branch_names=numerical_circuit.branch_names,
                                               bus_types=numerical_circuit.bus_types,
-                                              name='Monte Carlo')
+                                              name='Monte Carlo',
+                                              streaming=self.streaming_results,
+                                              reservoir_size=self.reservoir_size)
 
         avg_res = PowerFlowResults(n=numerical_circuit.nbus,
                                    m=numerical_circuit.nbr,
@@ -294,19 +346,15 @@ class MonteCarlo(QThread):
                                    hvdc_names=numerical_circuit.hvdc_names,
                                    bus_types=numerical_circuit.bus_types)
 
-        n = numerical_circuit.nbus
-        m = numerical_circuit.nbr
-        v_sum = zeros(n, dtype=complex)
-
         self.progress_signal.emit(0.0)
 
         while (std_dev_progress < 100.0) and (it < self.max_mc_iter) and not self.__cancel__:
 
-            self.progress_text.emit('Running Monte Carlo: Variance: ' + str(v_variance))
+            self.progress_text.emit('Running Monte Carlo: Error: ' + str(err))
 
             batch_results = MonteCarloResults(n=numerical_circuit.nbus,
                                               m=numerical_circuit.nbr,
-                                              p=self.max_mc_iter,
+                                              p=self.batch_size,
                                               bus_names=numerical_circuit.bus_names,
                                               branch_names=numerical_circuit.branch_names,
                                               bus_types=numerical_circuit.bus_types,
@@ -366,24 +414,11 @@ class MonteCarlo(QThread):
             # Compute the Monte Carlo values
             it += self.batch_size
             mc_results_master.append_batch(batch_results)
-            v_sum += mc_results_master.get_voltage_sum()
-            v_avg = v_sum / it
-            v_variance = abs((power(mc_results_master.V_points - v_avg, 2.0) / (it - 1)).min())
-
-            # progress
-            variance_sum += v_variance
-            err = variance_sum / it
-            if err == 0:
-                err = 1e-200  # to avoid division by zeros
-            mc_results_master.error_series.append(err)
-
-            # emmit the progress signal
-            std_dev_progress = 100 * self.mc_tol / err
-            if std_dev_progress > 100:
-                std_dev_progress = 100
-            self.progress_signal.emit(max((std_dev_progress, it / self.max_mc_iter * 100)))
+            err, std_dev_progress = self.update_error(mc_results_master, it)
 
         # compile results
+        self.progress_text.emit('Compiling results...')
+        mc_results_master.compile()
         mc_results_master.bus_types = numerical_circuit.bus_types
 
         # send the finnish signal
@@ -417,6 +452,8 @@ class MonteCarlo(QThread):
         :return:
         """
         self.__cancel__ = True
+        if self.pool is not None:
+            self.pool.terminate()
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Cancelled')
         self.done_signal.emit()
@@ -14,9 +14,124 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
+from enum import Enum
+from warnings import warn
+from numba import jit
 from GridCal.Engine.Simulations.Stochastic.latin_hypercube_sampling import lhs
 from GridCal.Engine.Simulations.PowerFlow.time_Series_input import TimeSeriesInput
 
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+
+class MonteCarloSampling(Enum):
+    Random = 'Random'
+    LatinHypercube = 'Latin hypercube'
+    Sobol = 'Sobol'
+
+
+@jit(nopython=True, cache=False)
+def interpolate_quantiles(Qr, Qi, P, out):  # pragma: no cover
+    """
+    Inverse CDF interpolation of all the buses at once
+    :param Qr: real part of the sorted values (n, k), sampled at the probabilities arange(k) / (k - 1)
+    :param Qi: imaginary part of the sorted values (n, k)
+    :param P: points in [0, 1] (samples, n)
+    :param out: complex output matrix (samples, n)
+    """
+    ns, n = P.shape
+    k = Qr.shape[1]
+
+    for i in range(n):
+        if k == 1:
+            for s in range(ns):
+                out[s, i] = Qr[i, 0] + 1j * Qi[i, 0]
+        elif k > 1:
+            for s in range(ns):
+                pos = P[s, i] * (k - 1)
+                if pos <= 0.0:
+                    j = 0
+                    w = 0.0
+                elif pos >= k - 1:
+                    j = k - 2
+                    w = 1.0
+                else:
+                    j = int(pos)
+                    w = pos - j
+                re = Qr[i, j] * (1.0 - w) + Qr[i, j + 1] * w
+                im = Qi[i, j] * (1.0 - w) + Qi[i, j + 1] * w
+                out[s, i] = re + 1j * im
+
+
+class StackedCDF:
+    """
+    Inverse cumulative density functions of many variables (i.e. the buses) stored as one matrix of sorted values.
+    Equivalent to a list of CDF objects, but all the variables are sampled at once.
+    """
+
+    def __init__(self, data):
+        """
+        Constructor
+        :param data: matrix of observations (n variables, k observations)
+        """
+        data = np.atleast_2d(data)
+        arr = np.sort(data, axis=1)
+
+        self.n = arr.shape[0]
+        self.k = arr.shape[1]
+        self.Qr = np.ascontiguousarray(arr.real, dtype=float)
+        self.Qi = np.ascontiguousarray(arr.imag, dtype=float) if np.iscomplexobj(arr) else np.zeros_like(self.Qr)
+
+    @staticmethod
+    def from_cdf_list(cdf_list, n):
+        """
+        Build a stacked CDF from a list of CDF objects (None entries are zero)
+        :param cdf_list: list of CDF objects or None
+        :param n: number of variables
+        :return: StackedCDF instance
+        """
+        k = max([len(cdf.arr) for cdf in cdf_list if cdf is not None] + [1])
+        data = np.zeros((n, k), dtype=complex)
+        for i, cdf in enumerate(cdf_list):
+            if cdf is not None:
+                # resample every CDF to a common number of quantiles
+                data[i, :] = cdf.get_at(np.linspace(0, 1, k))
+        return StackedCDF(data)
+
+    def get_at(self, P):
+        """
+        Get the values of all the variables at the probabilities P
+        :param P: points in [0, 1] (samples, n)
+        :return: complex matrix (samples, n)
+        """
+        P = np.ascontiguousarray(np.atleast_2d(P), dtype=float)
+        out = np.zeros(P.shape, dtype=complex)
+        interpolate_quantiles(self.Qr, self.Qi, P, out)
+        return out
+
+
+def get_sampling_points(samples, n, sampling: MonteCarloSampling = MonteCarloSampling.Random):
+    """
+    Get the points in [0, 1] to sample the CDF
+    :param samples: number of samples
+    :param n: number of dimensions (variables)
+    :param sampling: MonteCarloSampling method
+    :return: matrix (samples, n)
+    """
+    if sampling == MonteCarloSampling.LatinHypercube:
+        return lhs(n, samples=samples, criterion='center')
+
+    elif sampling == MonteCarloSampling.Sobol:
+        if qmc is None:
+            warn('Sobol sampling needs scipy >= 1.7, using latin hypercube instead')
+            return lhs(n, samples=samples, criterion='center')
+        return qmc.Sobol(d=n, scramble=True).random(samples)
+
+    else:
+        return np.random.uniform(0, 1, (samples, n))
+
 
 class MonteCarloInput:
 
@@ -24,63 +139,40 @@ class MonteCarloInput:
         """
         Monte carlo input constructor
         @param n: number of nodes
-        @param Scdf: Power cumulative density function
-        @param Icdf: Current cumulative density function
-        @param Ycdf: Admittances cumulative density function
+        @param Scdf: Power cumulative density function (StackedCDF or list of CDF)
+        @param Icdf: Current cumulative density function (StackedCDF or list of CDF)
+        @param Ycdf: Admittances cumulative density function (StackedCDF or list of CDF)
         """
 
         # number of nodes
         self.n = n
 
-        self.Scdf = Scdf
+        self.Scdf = Scdf if isinstance(Scdf, StackedCDF) else StackedCDF.from_cdf_list(Scdf, n)
 
-        self.Icdf = Icdf
+        self.Icdf = Icdf if isinstance(Icdf, StackedCDF) else StackedCDF.from_cdf_list(Icdf, n)
 
-        self.Ycdf = Ycdf
+        self.Ycdf = Ycdf if isinstance(Ycdf, StackedCDF) else StackedCDF.from_cdf_list(Ycdf, n)
 
-    def __call__(self, samples=0, use_latin_hypercube=False):
+    def __call__(self, samples=0, use_latin_hypercube=False, sampling: MonteCarloSampling = None):
         """
         Call this object
         :param samples: number of samples
         :param use_latin_hypercube: use Latin Hypercube to sample
+        :param sampling: MonteCarloSampling method (overrides use_latin_hypercube)
         :return: Time series object
         """
-        if use_latin_hypercube:
-
-            lhs_points = lhs(self.n, samples=samples, criterion='center')
+        if sampling is None:
+            sampling = MonteCarloSampling.LatinHypercube if use_latin_hypercube else MonteCarloSampling.Random
 
-            if samples > 0:
-                S = np.zeros((samples, self.n), dtype=complex)
-                I = np.zeros((samples, self.n), dtype=complex)
-                Y = np.zeros((samples, self.n), dtype=complex)
+        points = get_sampling_points(max(samples, 1), self.n, sampling)
 
-                for i in range(self.n):
-                    if self.Scdf[i] is not None:
-                        S[:, i] = self.Scdf[i].get_at(lhs_points[:, i])
+        time_series_input = self.get_at(points)
 
-        else:
-            if samples > 0:
-                S = np.zeros((samples, self.n), dtype=complex)
-                I = np.zeros((samples, self.n), dtype=complex)
-                Y = np.zeros((samples, self.n), dtype=complex)
-
-                for i in range(self.n):
-                    if self.Scdf[i] is not None:
-                        S[:, i] = self.Scdf[i].get_sample(samples)
-            else:
-                S = np.zeros(self.n, dtype=complex)
-                I = np.zeros(self.n, dtype=complex)
-                Y = np.zeros(self.n, dtype=complex)
-
-                for i in range(self.n):
-                    if self.Scdf[i] is not None:
-                        S[i] = complex(self.Scdf[i].get_sample()[0])
-
-        time_series_input = TimeSeriesInput()
-        time_series_input.S = S
-        time_series_input.I = I
-        time_series_input.Y = Y
-        time_series_input.valid = True
+        if samples == 0:
+            # single sample as vectors
+            time_series_input.S = time_series_input.S[0, :]
+            time_series_input.I = time_series_input.I[0, :]
+            time_series_input.Y = time_series_input.Y[0, :]
 
         return time_series_input
 
@@ -88,23 +180,14 @@ class MonteCarloInput:
         """
         Get samples at x
         Args:
-            x: values in [0, 1] to sample the CDF
+            x: values in [0, 1] to sample the CDF, vector (n) or matrix (samples, n)
 
         Returns: Time series object
         """
-        S = np.zeros((1, self.n), dtype=complex)
-        I = np.zeros((1, self.n), dtype=complex)
-        Y = np.zeros((1, self.n), dtype=complex)
-
-        for i in range(self.n):
-            if self.Scdf[i] is not None:
-                S[:, i] = self.Scdf[i].get_at(x[i])
-
         time_series_input = TimeSeriesInput()
-        time_series_input.S = S
-        time_series_input.I = I
-        time_series_input.Y = Y
+        time_series_input.S = self.Scdf.get_at(x)
+        time_series_input.I = self.Icdf.get_at(x)
+        time_series_input.Y = self.Ycdf.get_at(x)
         time_series_input.valid = True
 
         return time_series_input
-
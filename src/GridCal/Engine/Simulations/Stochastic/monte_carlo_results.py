@@ -23,18 +23,226 @@ from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Gui.GuiFunctions import ResultsModel
 
 
+class StreamingStatistics:
+    """
+    Statistics of many variables (columns) updated batch by batch without storing the samples:
+    count, mean and variance (Welford / Chan merge), min, max, exceedance counts and a
+    histogram per column (widened when the samples drift out of its range) used to estimate the quantiles.
+    """
+
+    def __init__(self, n, bins=100, thresholds=()):
+        """
+        Constructor
+        :param n: number of variables
+        :param bins: number of histogram bins per variable
+        :param thresholds: values whose exceedance (x > threshold) is counted exactly
+        """
+        self.n = n
+        self.bins = bins
+        self.thresholds = np.array(thresholds, dtype=float)
+
+        self.count = 0
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.exceedance = np.zeros((len(self.thresholds), n), dtype=int)
+
+        # the histogram range is set with the first batch and doubled when later values fall outside
+        self.lower = None
+        self.upper = None
+        self.histogram = np.zeros((n, bins), dtype=int)
+
+    def update(self, X):
+        """
+        Add a batch of samples
+        :param X: matrix of real values (samples, n)
+        """
+        X = np.atleast_2d(X)
+        nb = X.shape[0]
+        if nb == 0:
+            return
+
+        # merge the batch mean and variance with the accumulated ones
+        b_mean = X.mean(axis=0)
+        b_m2 = ((X - b_mean) ** 2).sum(axis=0)
+        total = self.count + nb
+        delta = b_mean - self.mean
+        self.mean += delta * nb / total
+        self.m2 += b_m2 + delta * delta * self.count * nb / total
+        self.count = total
+
+        self.min = np.minimum(self.min, X.min(axis=0))
+        self.max = np.maximum(self.max, X.max(axis=0))
+
+        for k, thr in enumerate(self.thresholds):
+            self.exceedance[k, :] += (X > thr).sum(axis=0)
+
+        if self.lower is None:
+            span = self.max - self.min
+            pad = np.where(span > 0, 0.25 * span, np.maximum(0.1 * np.abs(self.max), 1e-3))
+            self.lower = self.min - pad
+            self.upper = self.max + pad
+        else:
+            self.widen(X.min(axis=0), X.max(axis=0))
+
+        # bin the batch
+        width = (self.upper - self.lower) / self.bins
+        b = np.floor((X - self.lower) / width).astype(int)
+        np.clip(b, 0, self.bins - 1, out=b)
+        flat = (b + np.arange(self.n) * self.bins).ravel()
+        self.histogram += np.bincount(flat, minlength=self.n * self.bins).reshape(self.n, self.bins)
+
+    def widen(self, lo, hi):
+        """
+        Double the histogram range of the variables until it covers [lo, hi], merging the old bins
+        into the new ones (pairs of bins are merged exactly when the number of bins is even)
+        :param lo: lowest value of every variable in the new batch
+        :param hi: highest value of every variable in the new batch
+        """
+        lower = self.lower.copy()
+        upper = self.upper.copy()
+        out = (lo < lower) | (hi > upper)
+        if not out.any():
+            return
+
+        while out.any():
+            span = upper - lower
+            down = out & (lo < lower)
+            up = out & ~down
+            lower[down] -= span[down]
+            upper[up] += span[up]
+            out = (lo < lower) | (hi > upper)
+
+        # move the counts of the old bins (by their centre) to the new bins
+        old_width = (self.upper - self.lower) / self.bins
+        new_width = (upper - lower) / self.bins
+        centres = self.lower.reshape(-1, 1) + (np.arange(self.bins) + 0.5) * old_width.reshape(-1, 1)
+        b = np.floor((centres - lower.reshape(-1, 1)) / new_width.reshape(-1, 1)).astype(int)
+        np.clip(b, 0, self.bins - 1, out=b)
+        flat = (b + np.arange(self.n).reshape(-1, 1) * self.bins).ravel()
+        self.histogram = np.bincount(flat, weights=self.histogram.ravel(),
+                                     minlength=self.n * self.bins).astype(int).reshape(self.n, self.bins)
+        self.lower = lower
+        self.upper = upper
+
+    @property
+    def variance(self):
+        """
+        Sample variance of every variable
+        """
+        if self.count < 2:
+            return np.zeros(self.n)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        """
+        Sample standard deviation of every variable
+        """
+        return np.sqrt(self.variance)
+
+    def get_quantiles(self, prob):
+        """
+        Estimate the quantiles from the histogram
+        :param prob: array of probabilities in [0, 1]
+        :return: matrix (len(prob), n)
+        """
+        prob = np.atleast_1d(prob)
+        Q = np.zeros((len(prob), self.n))
+        for i, pr in enumerate(prob):
+            Q[i, :] = self.get_quantile(pr)
+        return Q
+
+    def get_quantile(self, prob):
+        """
+        Estimate one quantile of every variable from the histogram
+        :param prob: probability in [0, 1], scalar or one per variable (n)
+        :return: array (n)
+        """
+        if self.count == 0:
+            return np.zeros(self.n)
+
+        width = (self.upper - self.lower) / self.bins
+        cum = np.cumsum(self.histogram, axis=1)
+        rows = np.arange(self.n)
+
+        target = prob * self.count
+        b = np.minimum((cum < np.reshape(target, (-1, 1))).sum(axis=1), self.bins - 1)
+        inside = self.histogram[rows, b]
+        prev = cum[rows, b] - inside
+        frac = np.where(inside > 0, (target - prev) / np.maximum(inside, 1), 0.0)
+        q = self.lower + (b + frac) * width
+
+        return np.clip(q, self.min, self.max)
+
+    def get_exceedance_probability(self, threshold):
+        """
+        Probability of every variable being greater than a threshold
+        (exact if the threshold was given to the constructor, estimated from the histogram otherwise)
+        :param threshold: value
+        :return: array of probabilities (n)
+        """
+        if self.count == 0:
+            return np.zeros(self.n)
+
+        exact = np.where(self.thresholds == threshold)[0]
+        if len(exact):
+            return self.exceedance[exact[0], :] / self.count
+
+        width = (self.upper - self.lower) / self.bins
+        pos = np.clip((threshold - self.lower) / width, 0, self.bins)
+        b = np.minimum(np.floor(pos).astype(int), self.bins - 1)
+        rows = np.arange(self.n)
+        cum = np.cumsum(self.histogram, axis=1)
+        above = self.count - cum[rows, b] + self.histogram[rows, b] * (1.0 - (pos - b))
+        above[threshold >= self.max] = 0
+        return above / self.count
+
+
 class MonteCarloResults:
 
-    def __init__(self, n, m, p, bus_names, branch_names, bus_types, name='Monte Carlo'):
+    def __init__(self, n, m, p, bus_names, branch_names, bus_types, name='Monte Carlo',
+                 streaming=False, reservoir_size=1000, bins=100, loading_thresholds=(1.0,)):
         """
         Constructor
         @param n: number of nodes
         @param m: number of branches
         @param p: number of points (rows)
+        @param streaming: if true, the batches are reduced to streaming statistics and only a reservoir of
+                          samples is kept in the *_points arrays
+        @param reservoir_size: maximum number of raw samples kept in streaming mode
+        @param bins: number of histogram bins of the streaming statistics
+        @param loading_thresholds: loading values whose exceedance is counted exactly in streaming mode
         """
 
         self.name = name
 
+        self.streaming = streaming
+
+        self.reservoir_size = reservoir_size
+
+        # number of samples seen in streaming mode
+        self.samples_number = 0
+
+        if streaming:
+            p = 0
+            self.v_stats = StreamingStatistics(n, bins)
+            self.s_stats = StreamingStatistics(n, bins)
+            self.sbr_stats = StreamingStatistics(m, bins)
+            self.loading_stats = StreamingStatistics(m, bins, thresholds=loading_thresholds)
+            self.losses_stats = StreamingStatistics(m, bins)
+
+            # per batch snapshots of the averages and standard deviations
+            self.conv_snapshots = list()
+        else:
+            self.v_stats = None
+            self.s_stats = None
+            self.sbr_stats = None
+            self.loading_stats = None
+            self.losses_stats = None
+            self.conv_snapshots = None
+
         self.n = n
 
         self.m = m
@@ -98,11 +306,54 @@ class MonteCarloResults:
         @param mcres: MonteCarloResults object
         @return:
         """
+        if self.streaming:
+            self.update_statistics(mcres)
+            return
+
         self.S_points = np.vstack((self.S_points, mcres.S_points))
         self.V_points = np.vstack((self.V_points, mcres.V_points))
         self.Sbr_points = np.vstack((self.Sbr_points, mcres.Sbr_points))
         self.loading_points = np.vstack((self.loading_points, mcres.loading_points))
-        self.losses_points = np.vstack((self.losses_points, mcres.loading_points))
+        self.losses_points = np.vstack((self.losses_points, mcres.losses_points))
+        self.points_number = self.V_points.shape[0]
+
+    def update_statistics(self, mcres):
+        """
+        Reduce a batch into the streaming statistics and the samples reservoir
+        @param mcres: MonteCarloResults object (not streaming) with the batch points
+        """
+        self.v_stats.update(np.abs(mcres.V_points))
+        self.s_stats.update(mcres.S_points.real)
+        self.sbr_stats.update(mcres.Sbr_points.real)
+        self.loading_stats.update(np.abs(mcres.loading_points.real))
+        self.losses_stats.update(np.abs(mcres.losses_points))
+
+        self.conv_snapshots.append((self.v_stats.mean.copy(), self.v_stats.std,
+                                    self.sbr_stats.mean.copy(), self.sbr_stats.std,
+                                    self.loading_stats.mean.copy(), self.loading_stats.std,
+                                    self.losses_stats.mean.copy(), self.losses_stats.std))
+
+        # reservoir sampling (algorithm R) of the raw points
+        nb = mcres.V_points.shape[0]
+        free = max(min(self.reservoir_size - self.V_points.shape[0], nb), 0)
+        if free > 0:
+            self.S_points = np.vstack((self.S_points, mcres.S_points[:free, :]))
+            self.V_points = np.vstack((self.V_points, mcres.V_points[:free, :]))
+            self.Sbr_points = np.vstack((self.Sbr_points, mcres.Sbr_points[:free, :]))
+            self.loading_points = np.vstack((self.loading_points, mcres.loading_points[:free, :]))
+            self.losses_points = np.vstack((self.losses_points, mcres.losses_points[:free, :]))
+
+        for k in range(free, nb):
+            j = np.random.randint(0, self.samples_number + k + 1)
+            if j < self.reservoir_size:
+                self.S_points[j, :] = mcres.S_points[k, :]
+                self.V_points[j, :] = mcres.V_points[k, :]
+                self.Sbr_points[j, :] = mcres.Sbr_points[k, :]
+                self.loading_points[j, :] = mcres.loading_points[k, :]
+                self.losses_points[j, :] = mcres.losses_points[k, :]
+
+        self.samples_number += nb
+        self.points_number = self.V_points.shape[0]
 
     def get_voltage_sum(self):
         """
@@ -111,11 +362,31 @@ class MonteCarloResults:
         """
         return self.V_points.sum(axis=0)
 
+    def get_voltage_standard_error(self):
+        """
+        Standard error of the averaged voltage module (worst bus)
+        @return: float
+        """
+        if self.streaming:
+            count = self.v_stats.count
+            variance = self.v_stats.variance
+        else:
+            count = self.V_points.shape[0]
+            variance = np.abs(self.V_points).var(axis=0, ddof=1) if count > 1 else np.zeros(self.n)
+
+        if count == 0:
+            return 0.0
+        return np.sqrt(variance.max() / count)
+
     def compile(self):
         """
         Compiles the final Monte Carlo values by running an online mean and
         @return:
         """
+        if self.streaming:
+            self.compile_statistics()
+            return
+
         p, n = self.V_points.shape
         ni, m = self.Sbr_points.shape
         step = 1
@@ -174,6 +445,31 @@ class MonteCarloResults:
         self.loading = self.l_avg_conv[-2]
         self.losses = self.loss_avg_conv[-2]
 
+    def compile_statistics(self):
+        """
+        Compiles the final Monte Carlo values from the streaming statistics
+        (the convergence arrays have one row per batch)
+        """
+        zn = np.zeros((1, self.n))
+        zm = np.zeros((1, self.m))
+
+        def stack(k, z):
+            return np.vstack([z] + [snapshot[k] for snapshot in self.conv_snapshots] + [z])
+
+        self.v_avg_conv = stack(0, zn)
+        self.v_std_conv = stack(1, zn)
+        self.s_avg_conv = stack(2, zm)
+        self.s_std_conv = stack(3, zm)
+        self.l_avg_conv = stack(4, zm)
+        self.l_std_conv = stack(5, zm)
+        self.loss_avg_conv = stack(6, zm)
+        self.loss_std_conv = stack(7, zm)
+
+        self.voltage = self.v_stats.mean.copy()
+        self.sbranch = self.sbr_stats.mean.copy()
+        self.loading = self.loading_stats.mean.copy()
+        self.losses = self.losses_stats.mean.copy()
+
     def get_results_dict(self):
         """
         Returns a dictionary with the results sorted in a dictionary
@@ -221,6 +517,7 @@ class MonteCarloResults:
     def query_voltage(self, power_array):
         """
         Fantastic function that allows to query the voltage from the sampled points without having to run power flows
+        (in streaming mode the reservoir of samples is used)
         Args:
             power_array: power injections vector
 
@@ -265,6 +562,12 @@ class MonteCarloResults:
         :return: indices, associated probability
         """
 
+        if self.streaming:
+            prob = self.loading_stats.get_exceedance_probability(max_val)
+            idx = np.where(self.loading_stats.max > max_val)[0]
+            val = self.loading_stats.get_quantile(1.0 - prob)
+            return list(idx), list(val[idx]), list(prob[idx]), self.loading_stats.max.copy()
+
         # turn the loading real values into CDF
         cdf = CDF(np.abs(self.loading_points.real[:, :]))
 
@@ -284,6 +587,18 @@ class MonteCarloResults:
 
         return idx, val, prob, cdf.arr[-1, :]
 
+    def get_cdf(self, points, stats: StreamingStatistics):
+        """
+        Get the CDF of a magnitude, from the points or from the streaming statistics
+        :param points: matrix of samples (used if not streaming)
+        :param stats: StreamingStatistics of the magnitude (used if streaming)
+        :return: CDF instance
+        """
+        if self.streaming:
+            return CDF(stats.get_quantiles(np.linspace(0, 1, stats.bins + 1)))
+        else:
+            return CDF(points)
+
     def mdl(self, result_type: ResultTypes) -> "ResultsModel":
         """
         Plot the results
@@ -357,35 +672,35 @@ class MonteCarloResults:
 
         elif result_type == ResultTypes.BusVoltageCDF:
             labels = self.bus_names
-            cdf = CDF(np.abs(self.V_points))
+            cdf = self.get_cdf(np.abs(self.V_points), self.v_stats)
             y_label = '(p.u.)'
             x_label = 'Probability $P(X \leq x)$'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BranchLoadingCDF:
             labels = self.branch_names
-            cdf = CDF(np.abs(self.loading_points.real))
+            cdf = self.get_cdf(np.abs(self.loading_points.real), self.loading_stats)
             y_label = '(p.u.)'
             x_label = 'Probability $P(X \leq x)$'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BranchLossesCDF:
             labels = self.branch_names
-            cdf = CDF(np.abs(self.losses_points))
+            cdf = self.get_cdf(np.abs(self.losses_points), self.losses_stats)
             y_label = '(MVA)'
             x_label = 'Probability $P(X \leq x)$'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BranchPowerCDF:
             labels = self.branch_names
-            cdf = CDF(self.Sbr_points.real)
+            cdf = self.get_cdf(self.Sbr_points.real, self.sbr_stats)
             y_label = '(MW)'
             x_label = 'Probability $P(X \leq x)$'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BusPowerCDF:
             labels = self.bus_names
-            cdf = CDF(self.S_points.real)
+            cdf = self.get_cdf(self.S_points.real, self.s_stats)
             y_label = '(p.u.)'
             x_label = 'Probability $P(X \leq x)$'
             title = result_type.value[0]
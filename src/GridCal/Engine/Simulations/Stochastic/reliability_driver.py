@@ -13,189 +13,587 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+from enum import Enum
 import numpy as np
+from numba import jit
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.stats import norm
 
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Core.snapshot_pf_data import SnapshotData
-from GridCal.Engine.Core.time_series_pf_data import SeriesData
-from GridCal.Engine.Devices import DeviceType
+from GridCal.Engine.Core.common_functions import get_devices_per_bus
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit
+from GridCal.ThirdParty.pulp.pulp_extra import LpSparseProblem
 
+# hours in a year
+YEAR_HOURS = 8760.0
 
-def get_failure_time(mttf):
+
+class AdequacyModel(Enum):
+    CopperPlate = 'Copper plate (per island)'
+    Transport = 'Transport'
+    DC = 'DC'
+
+
+def get_failure_time(mttf, size=None):
     """
     Get an array of possible failure times
-    :param mttf: mean time to failure
+    :param mttf: mean time to failure (array)
+    :param size: shape of the samples (by default the shape of mttf)
     """
-    n_samples = len(mttf)
-    return -1.0 * mttf * np.log(np.random.rand(n_samples))
+    if size is None:
+        size = np.shape(mttf)
+    return -1.0 * mttf * np.log(1.0 - np.random.rand(*size))
 
 
-def get_repair_time(mttr):
+def get_repair_time(mttr, size=None):
     """
     Get an array of possible repair times
-    :param mttr: mean time to recovery
+    :param mttr: mean time to recovery (array)
+    :param size: shape of the samples (by default the shape of mttr)
     """
-    n_samples = len(mttr)
-    return -1.0 * mttr * np.log(np.random.rand(n_samples))
+    if size is None:
+        size = np.shape(mttr)
+    return -1.0 * mttr * np.log(1.0 - np.random.rand(*size))
 
 
-def get_reliability_events(horizon, mttf, mttr, tpe: DeviceType):
+def get_reliability_events(horizon, mttf, mttr, cycles=8):
     """
-    Get random fail-repair events until a given time horizon in hours
+    Get random fail-repair events of all the elements until a given time horizon in hours.
+    All the elements start available; the failure and repair times are sampled for all of them
+    at once, several cycles at a time, until every element goes beyond the horizon.
     :param horizon: maximum horizon in hours
-    :return: list of events,
-    Each event tuple has: (time in hours, element index, activation state (True/False))
+    :param mttf: array of mean times to failure (elements with mttf <= 0 never fail)
+    :param mttr: array of mean times to recovery
+    :param cycles: number of fail-repair cycles sampled per element and iteration
+    :return: time of the events, element index of the events, state after the events (True: available),
+             sorted by time
     """
-    n_samples = len(mttf)
-    t = np.zeros(n_samples)
-    done = np.zeros(n_samples, dtype=bool)
-    events = list()
+    idx = np.where((mttf > 0) & (mttr > 0))[0]
+    t = np.zeros(len(idx))
+    pending = np.arange(len(idx))
 
-    if mttf.all() == 0.0:
-        return events
+    times = list()
+    elements = list()
+    states = list()
 
-    not_done = np.where(done == False)[0]
-    not_done_s = set(not_done)
-    while len(not_done) > 0:  # if all event get to the horizon, finnish the sampling
+    while len(pending) > 0:
+        k = len(pending)
+        el = idx[pending]
 
-        # simulate failure
-        t[not_done] += get_failure_time(mttf[not_done])
-        idx = np.where(t >= horizon)[0]
-        done[idx] = True
+        # alternate up (failure) and down (repair) durations
+        steps = np.empty((k, 2 * cycles))
+        steps[:, 0::2] = get_failure_time(mttf[el][:, np.newaxis], (k, cycles))
+        steps[:, 1::2] = get_repair_time(mttr[el][:, np.newaxis], (k, cycles))
+        tt = t[pending][:, np.newaxis] + np.cumsum(steps, axis=1)
 
-        # store failure events
-        events += [(t[i], tpe, i, False) for i in (not_done_s - set(idx))]
+        r, c = np.nonzero(tt < horizon)
+        times.append(tt[r, c])
+        elements.append(el[r])
+        states.append(c % 2 == 1)  # even columns are failures, odd columns are repairs
 
-        # simulate repair
-        t[not_done] += get_repair_time(mttr[not_done])
-        idx = np.where(t >= horizon)[0]
-        done[idx] = True
+        t[pending] = tt[:, -1]
+        pending = pending[tt[:, -1] < horizon]
 
-        # store recovery events
-        events += [(t[i], tpe, i, True) for i in (not_done_s - set(idx))]
+    if len(times):
+        times = np.concatenate(times)
+        elements = np.concatenate(elements)
+        states = np.concatenate(states)
+    else:
+        times = np.zeros(0)
+        elements = np.zeros(0, dtype=int)
+        states = np.zeros(0, dtype=bool)
 
-        # update not done
-        not_done = np.where(done == False)[0]
-        not_done_s = set(not_done)
+    order = np.argsort(times, kind='mergesort')
 
-    # sort in place
-    # events.sort(key=lambda tup: tup[0])
-    return events
+    return times[order], elements[order], states[order]
 
 
-def get_reliability_scenario(nc: SnapshotData, horizon=10000):
+@jit(nopython=True, cache=False)
+def get_failed_elements_at(elements, n_elements, positions):  # pragma: no cover
+    """
+    Replay the events and get the failed elements after a number of events
+    :param elements: element index of every event (each event toggles the element state)
+    :param n_elements: number of elements
+    :param positions: sorted number of events applied of each requested state (0: initial state)
+    :return: CSR-like structure (indptr, indices) with the failed elements of each requested state
     """
-    Get reliability events
-    Args:
-        nc: numerical circuit instance
-        horizon: time horizon in hours
+    failed = np.zeros(n_elements, dtype=np.bool_)
+    n = len(positions)
+
+    # first pass: count the failed elements of every state
+    counts = np.zeros(n, dtype=np.int64)
+    n_failed = 0
+    ev = 0
+    for k in range(n):
+        while ev < positions[k]:
+            e = elements[ev]
+            failed[e] = not failed[e]
+            if failed[e]:
+                n_failed += 1
+            else:
+                n_failed -= 1
+            ev += 1
+        counts[k] = n_failed
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    for k in range(n):
+        indptr[k + 1] = indptr[k] + counts[k]
+    indices = np.zeros(indptr[n], dtype=np.int64)
+
+    # second pass: store them
+    failed[:] = False
+    ev = 0
+    for k in range(n):
+        while ev < positions[k]:
+            e = elements[ev]
+            failed[e] = not failed[e]
+            ev += 1
+        p = indptr[k]
+        for i in range(n_elements):
+            if failed[i]:
+                indices[p] = i
+                p += 1
+
+    return indptr, indices
+
+
+def accumulate_by_year(start, end, value, n_years, year_hours=YEAR_HOURS):
+    """
+    Accumulate the duration and the energy of intervals per year
+    :param start: start time of the intervals (h)
+    :param end: end time of the intervals (h)
+    :param value: power of each interval (MW)
+    :param n_years: number of years
+    :param year_hours: hours per year
+    :return: hours per year, energy per year (MWh)
+    """
+    hours = np.zeros(n_years)
+    energy = np.zeros(n_years)
+
+    y0 = np.floor(start / year_hours).astype(int)
+    y1 = np.minimum(np.ceil(end / year_hours).astype(int) - 1, n_years - 1)
+
+    same = y0 >= y1
+    d = end[same] - start[same]
+    np.add.at(hours, y0[same], d)
+    np.add.at(energy, y0[same], d * value[same])
 
-    Returns: dictionary of events
-    Each event tuple has: (time in hours, element index, activation state (True/False))
+    # intervals spanning several years
+    for i in np.where(~same)[0]:
+        for y in range(y0[i], y1[i] + 1):
+            d = min(end[i], (y + 1) * year_hours) - max(start[i], y * year_hours)
+            hours[y] += d
+            energy[y] += d * value[i]
+
+    return hours, energy
+
+
+class AdequacyEvaluator:
+    """
+    Computes the load curtailment of outage states with a copper plate (per island), transport or DC model.
+    The islands of every branch outage state and the curtailment of every outage state are cached.
     """
-    all_events = list()
 
-    # branches
-    all_events += get_reliability_events(horizon, nc.branch_mttf, nc.branch_mttr, DeviceType.BranchDevice)
+    def __init__(self, nbus, F, T, rates, reactances, bus_load, unit_bus, unit_capacity, Sbase=100.0,
+                 model: AdequacyModel = AdequacyModel.Transport):
+        """
+        Constructor
+        :param nbus: number of buses
+        :param F: from bus index of the branches
+        :param T: to bus index of the branches
+        :param rates: branch rates in MW (<= 0 means unlimited)
+        :param reactances: branch reactances in p.u. (0 means that the branch is not included in the DC law)
+        :param bus_load: load of the buses in MW
+        :param unit_bus: bus index of the generation units
+        :param unit_capacity: capacity of the generation units in MW
+        :param Sbase: base power in MVA
+        :param model: AdequacyModel
+        """
+        self.nbus = nbus
+        self.nbr = len(F)
+        self.F = F
+        self.T = T
+        self.rates = np.where(rates > 0, rates, np.inf)
+        self.reactances = reactances
+        self.bus_load = bus_load
+        self.unit_bus = unit_bus
+        self.unit_capacity = unit_capacity
+        self.Sbase = Sbase
+        self.model = model
+
+        # caches
+        self.island_cache = dict()
+        self.shed_cache = dict()
+        self.n_evaluations = 0
+
+    def get_islands(self, branch_active, key):
+        """
+        Get the island label of every bus
+        :param branch_active: array of branch states
+        :param key: hash of the branch outage state
+        :return: number of islands, island labels
+        """
+        res = self.island_cache.get(key, None)
+        if res is None:
+            idx = np.where(branch_active)[0]
+            adj = coo_matrix((np.ones(len(idx)), (self.F[idx], self.T[idx])), shape=(self.nbus, self.nbus))
+            res = connected_components(adj, directed=False)
+            self.island_cache[key] = res
+        return res
+
+    def copper_plate(self, n_islands, labels, capacity):
+        """
+        Curtailment balancing every island with the available capacity
+        :param n_islands: number of islands
+        :param labels: island label of every bus
+        :param capacity: available capacity of the generation units
+        :return: load curtailment (MW)
+        """
+        load = np.bincount(labels, weights=self.bus_load, minlength=n_islands)
+        gen = np.bincount(labels[self.unit_bus], weights=capacity, minlength=n_islands)
+        return np.maximum(load - gen, 0.0).sum()
 
-    all_events += get_reliability_events(horizon, nc.generator_mttf, nc.generator_mttr, DeviceType.GeneratorDevice)
+    def network_flow(self, branch_active, capacity):
+        """
+        Minimum curtailment with a transport or DC model
+        :param branch_active: array of branch states
+        :param capacity: available capacity of the generation units
+        :return: load curtailment (MW)
+        """
+        br = np.where(branch_active)[0]
+        nb = len(br)
+        ng = len(capacity)
+        n = self.nbus
+
+        problem = LpSparseProblem('Adequacy')
+        g = problem.add_variables(ng, 0.0, capacity)
+        s = problem.add_variables(n, 0.0, self.bus_load)
+        f = problem.add_variables(nb, -self.rates[br], self.rates[br])
+        problem.add_cost(s, np.ones(n))
+
+        # nodal balance: generation + curtailment + flows in - flows out = load
+        rows = np.r_[self.unit_bus, np.arange(n), self.T[br], self.F[br]]
+        cols = np.r_[g, s, f, f]
+        vals = np.r_[np.ones(ng), np.ones(n), np.ones(nb), -np.ones(nb)]
+        problem.add_restrictions(rows, cols, vals, self.bus_load, '=')
+
+        if self.model == AdequacyModel.DC:
+            # DC law for the branches with reactance: f = Sbase / x * (theta_f - theta_t)
+            theta = problem.add_variables(n)
+            k = br[self.reactances[br] > 0]
+            b = self.Sbase / self.reactances[k]
+            fk = f[np.isin(br, k)]
+            m = len(k)
+            rows = np.r_[np.arange(m), np.arange(m), np.arange(m)]
+            cols = np.r_[fk, theta[self.F[k]], theta[self.T[k]]]
+            vals = np.r_[np.ones(m), -b, b]
+            problem.add_restrictions(rows, cols, vals, np.zeros(m), '=')
+
+        problem.solve_linprog()
+
+        return problem.objective if problem.objective is not None else self.bus_load.sum()
+
+    def get_curtailment(self, key, branch_key, failed_branches, failed_units):
+        """
+        Get the load curtailment of an outage state
+        :param key: hash of the outage state
+        :param branch_key: hash of the branch outage state
+        :param failed_branches: indices of the failed branches
+        :param failed_units: indices of the failed generation units
+        :return: load curtailment (MW)
+        """
+        shed = self.shed_cache.get(key, None)
+        if shed is not None:
+            return shed
 
-    all_events += get_reliability_events(horizon, nc.battery_mttf, nc.battery_mttr, DeviceType.BatteryDevice)
+        branch_active = np.ones(self.nbr, dtype=bool)
+        branch_active[failed_branches] = False
+        capacity = self.unit_capacity.copy()
+        capacity[failed_units] = 0.0
 
-    all_events += get_reliability_events(horizon, nc.static_gen_mttf, nc.static_gen_mttr, DeviceType.StaticGeneratorDevice)
+        n_islands, labels = self.get_islands(branch_active, branch_key)
 
-    all_events += get_reliability_events(horizon, nc.load_mttf, nc.load_mttr, DeviceType.LoadDevice)
+        # the copper plate curtailment is a lower bound of the network curtailment
+        shed = self.copper_plate(n_islands, labels, capacity)
 
-    all_events += get_reliability_events(horizon, nc.shunt_mttf, nc.shunt_mttr, DeviceType.ShuntDevice)
+        if self.model != AdequacyModel.CopperPlate:
+            shed = max(shed, self.network_flow(branch_active, capacity))
 
-    # sort all
-    all_events.sort(key=lambda tup: tup[0])
+        self.n_evaluations += 1
+        self.shed_cache[key] = shed
+        return shed
 
-    return all_events
 
+class ReliabilityResults:
 
-def run_events(nc: SnapshotData, events_list: list):
+    def __init__(self, n_years, confidence=0.95):
+        """
+        Constructor
+        :param n_years: number of simulated years
+        :param confidence: confidence level of the intervals
+        """
+        self.name = 'Reliability'
+        self.n_years = n_years
+        self.confidence = confidence
 
-    for t, tpe, i, state in events_list:
+        # loss of load hours, energy not supplied and loss of load events of every simulated year
+        self.lol_hours = np.zeros(n_years)
+        self.ens = np.zeros(n_years)
+        self.lol_events = np.zeros(n_years)
 
-        # Set the state of the event
-        if tpe == DeviceType.BusDevice:
-            pass
+        self.n_events = 0
+        self.n_states = 0
+        self.n_evaluations = 0
 
-        elif tpe == DeviceType.BranchDevice:
-            nc.branch_active[i] = state
+    def get_interval(self, x):
+        """
+        Mean of a yearly magnitude and half width of its confidence interval
+        :param x: array of yearly values
+        :return: mean, half width
+        """
+        z = norm.ppf(0.5 + self.confidence / 2.0)
+        if len(x) < 2:
+            return x.mean(), np.inf
+        return x.mean(), z * x.std(ddof=1) / np.sqrt(len(x))
 
-        elif tpe == DeviceType.GeneratorDevice:
-            nc.generator_active[i] = state
+    @property
+    def lole(self):
+        """
+        Loss of load expectation (h/year)
+        """
+        return self.get_interval(self.lol_hours)[0]
 
-        elif tpe == DeviceType.StaticGeneratorDevice:
-            nc.static_gen_active[i] = state
+    @property
+    def lole_ci(self):
+        """
+        Half width of the LOLE confidence interval (h/year)
+        """
+        return self.get_interval(self.lol_hours)[1]
 
-        elif tpe == DeviceType.BatteryDevice:
-            nc.battery_active[i] = state
+    @property
+    def eens(self):
+        """
+        Expected energy not supplied (MWh/year)
+        """
+        return self.get_interval(self.ens)[0]
 
-        elif tpe == DeviceType.ShuntDevice:
-            nc.shunt_active[i] = state
+    @property
+    def eens_ci(self):
+        """
+        Half width of the EENS confidence interval (MWh/year)
+        """
+        return self.get_interval(self.ens)[1]
 
-        elif tpe == DeviceType.LoadDevice:
-            nc.load_active[i] = state
+    @property
+    def lolp(self):
+        """
+        Loss of load probability
+        """
+        return self.lole / YEAR_HOURS
 
-        else:
-            pass
+    @property
+    def lolf(self):
+        """
+        Loss of load frequency (events/year)
+        """
+        return self.lol_events.mean()
 
-        # compile the grid information
-        calculation_islands = nc.compute()
+    def get_report(self):
+        """
+        Get a dictionary with the reliability indices
+        """
+        return {'LOLE (h/year)': self.lole,
+                'LOLE CI (h/year)': self.lole_ci,
+                'EENS (MWh/year)': self.eens,
+                'EENS CI (MWh/year)': self.eens_ci,
+                'LOLP': self.lolp,
+                'LOLF (1/year)': self.lolf,
+                'Years': self.n_years,
+                'Events': self.n_events,
+                'Outage states': self.n_states,
+                'Adequacy evaluations': self.n_evaluations}
 
 
 class ReliabilityStudy(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
     done_signal = Signal()
+    name = 'Reliability'
 
-    def __init__(self, circuit: MultiCircuit, pf_options: PowerFlowOptions):
+    def __init__(self, circuit: MultiCircuit, pf_options: PowerFlowOptions, n_years=1000,
+                 model: AdequacyModel = AdequacyModel.Transport, years_per_chunk=100, confidence=0.95):
         """
-        VoltageCollapse constructor
-        @param circuit: NumericalCircuit instance
+        Sequential Monte Carlo reliability study constructor
+        @param circuit: MultiCircuit instance
         @param pf_options: power flow options instance
+        @param n_years: number of years to simulate
+        @param model: AdequacyModel used to compute the load curtailment
+        @param years_per_chunk: number of years whose events are sampled at once
+        @param confidence: confidence level of the reported intervals
         """
         QThread.__init__(self)
 
         # MultiCircuit instance
         self.circuit = circuit
 
-        # voltage stability options
+        # power flow options
         self.pf_options = pf_options
 
-        self.results = list()
+        self.n_years = n_years
+
+        self.model = model
+
+        self.years_per_chunk = years_per_chunk
+
+        self.confidence = confidence
+
+        self.results = None
 
         self.__cancel__ = False
 
-    def progress_callback(self, l):
+    def get_elements(self):
+        """
+        Gather the reliability data of the elements that may fail (branches and generation units)
+        :return: AdequacyEvaluator, mttf, mttr, number of branches
         """
-        Send progress report
-        :param l: lambda value
-        :return: None
+        nc = compile_snapshot_circuit(self.circuit)
+        buses = self.circuit.buses
+
+        branches = self.circuit.lines + self.circuit.transformers2w + self.circuit.vsc_converters + \
+                   self.circuit.dc_lines
+        loads, load_bus = get_devices_per_bus(buses, 'loads')
+        generators, gen_bus = get_devices_per_bus(buses, 'controlled_generators')
+        batteries, batt_bus = get_devices_per_bus(buses, 'batteries')
+        stagens, stagen_bus = get_devices_per_bus(buses, 'static_generators')
+        units = generators + batteries + stagens
+
+        # the inactive branches and units are permanently out
+        br_idx = np.where(nc.branch_active)[0]
+        unit_active = np.array([elm.active for elm in units], dtype=bool)
+        unit_idx = np.where(unit_active)[0]
+
+        reactances = np.r_[nc.line_X, nc.tr_X, nc.vsc_X1, np.zeros(nc.ndcline)]
+        capacity = np.r_[[elm.Pmax for elm in generators],
+                         [elm.Pmax for elm in batteries],
+                         [max(elm.P, 0.0) for elm in stagens]]
+        unit_bus = np.r_[gen_bus, batt_bus, stagen_bus].astype(int)
+
+        load_p = np.array([elm.P if elm.active else 0.0 for elm in loads])
+        bus_load = np.bincount(load_bus, weights=load_p, minlength=nc.nbus) if len(loads) else np.zeros(nc.nbus)
+
+        evaluator = AdequacyEvaluator(nbus=nc.nbus,
+                                      F=nc.F[br_idx],
+                                      T=nc.T[br_idx],
+                                      rates=nc.branch_rates[br_idx],
+                                      reactances=reactances[br_idx],
+                                      bus_load=bus_load,
+                                      unit_bus=unit_bus[unit_idx],
+                                      unit_capacity=capacity[unit_idx],
+                                      Sbase=nc.Sbase,
+                                      model=self.model)
+
+        mttf = np.r_[[branches[i].mttf for i in br_idx], [units[i].mttf for i in unit_idx]].astype(float)
+        mttr = np.r_[[branches[i].mttr for i in br_idx], [units[i].mttr for i in unit_idx]].astype(float)
+
+        return evaluator, mttf, mttr, len(br_idx)
+
+    def simulate(self, evaluator: AdequacyEvaluator, mttf, mttr, n_br, n_years, keys):
         """
-        self.progress_text.emit('Running voltage collapse lambda:' + "{0:.2f}".format(l) + '...')
+        Simulate a number of consecutive years
+        :param evaluator: AdequacyEvaluator instance
+        :param mttf: mean time to failure of the elements (branches first)
+        :param mttr: mean time to recovery of the elements
+        :param n_br: number of branches
+        :param n_years: number of years
+        :param keys: random 64 bit key of every element, used to hash the outage states
+        :return: loss of load hours, energy not supplied and loss of load events per year, number of events,
+                 number of unique outage states
+        """
+        horizon = n_years * YEAR_HOURS
+        n_elm = len(mttf)
+
+        # merged timeline of the fail-repair events of all the elements
+        times, elements, states = get_reliability_events(horizon, mttf, mttr)
+
+        # hash of the outage state after every event (each event toggles its element)
+        h = np.r_[0, np.bitwise_xor.accumulate(keys[elements])] if len(elements) else np.zeros(1, dtype=np.int64)
+        br_keys = np.where(np.arange(n_elm) < n_br, keys, 0)
+        hb = np.r_[0, np.bitwise_xor.accumulate(br_keys[elements])] if len(elements) else np.zeros(1, dtype=np.int64)
+
+        # unique outage states
+        unique_h, first, inverse = np.unique(h, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        indptr, indices = get_failed_elements_at(elements, n_elm, first[order])
+
+        shed = np.zeros(len(unique_h))
+        for k, u in enumerate(order):
+            failed = indices[indptr[k]:indptr[k + 1]]
+            shed[u] = evaluator.get_curtailment(key=unique_h[u],
+                                                branch_key=hb[first[u]],
+                                                failed_branches=failed[failed < n_br],
+                                                failed_units=failed[failed >= n_br] - n_br)
+
+        # intervals between events
+        start = np.r_[0.0, times]
+        end = np.r_[times, horizon]
+        interval_shed = shed[inverse]
+        lol = (interval_shed > 1e-6) & (end > start)
+
+        hours, energy = accumulate_by_year(start[lol], end[lol], interval_shed[lol], n_years)
+
+        # loss of load events: intervals with curtailment that follow one without it
+        begins = lol & ~np.r_[False, lol[:-1]]
+        events = np.bincount(np.minimum((start[begins] / YEAR_HOURS).astype(int), n_years - 1),
+                             minlength=n_years)
+
+        return hours, energy, events, len(times), len(unique_h)
 
     def run(self):
         """
-        run the voltage collapse simulation
+        run the sequential Monte Carlo reliability simulation
         @return:
         """
-        print('Running voltage collapse...')
+        self.__cancel__ = False
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Compiling...')
 
-        # compile the numerical circuit
-        numerical_circuit = self.circuit.compile_snapshot()
+        evaluator, mttf, mttr, n_br = self.get_elements()
 
-        evt = get_reliability_scenario(numerical_circuit)
+        # random keys to hash the outage states (Zobrist hashing)
+        keys = np.random.randint(1, np.iinfo(np.int64).max, size=len(mttf), dtype=np.int64)
 
-        run_events(nc=numerical_circuit, events_list=evt)
+        self.results = ReliabilityResults(n_years=self.n_years, confidence=self.confidence)
 
-        print('done!')
+        y = 0
+        while y < self.n_years and not self.__cancel__:
+            ny = min(self.years_per_chunk, self.n_years - y)
+
+            self.progress_text.emit('Simulating years ' + str(y) + ' to ' + str(y + ny) + '...')
+
+            hours, energy, events, n_events, n_states = self.simulate(evaluator, mttf, mttr, n_br, ny, keys)
+
+            self.results.lol_hours[y:y + ny] = hours
+            self.results.ens[y:y + ny] = energy
+            self.results.lol_events[y:y + ny] = events
+            self.results.n_events += n_events
+            self.results.n_states = len(evaluator.shed_cache)
+            self.results.n_evaluations = evaluator.n_evaluations
+
+            y += ny
+            self.progress_signal.emit(y / self.n_years * 100.0)
+
+        if self.__cancel__:
+            # keep only the simulated years
+            self.results.n_years = y
+            self.results.lol_hours = self.results.lol_hours[:y]
+            self.results.ens = self.results.ens[:y]
+            self.results.lol_events = self.results.lol_events[:y]
+
+        self.progress_signal.emit(0.0)
         self.progress_text.emit('Done!')
         self.done_signal.emit()
 
@@ -211,6 +609,8 @@ if __name__ == '__main__':
     circuit_ = MultiCircuit()
     circuit_.load_file(fname)
 
-    study = ReliabilityStudy(circuit=circuit_, pf_options=PowerFlowOptions())
+    study = ReliabilityStudy(circuit=circuit_, pf_options=PowerFlowOptions(), n_years=1000)
+
+    study.run()
 
-    study.run()
\ No newline at end of file
+    print(study.results.get_report())
@@ -80,6 +80,11 @@ class ResultTypes(Enum):
 
     OTDFSimulationError = 'Error', DeviceType.BranchDevice
 
+    # contingency analysis
+    ContingencyMaxLoading = 'Contingency max loading', DeviceType.BranchDevice
+    ContingencyWorstCases = 'Worst contingencies', DeviceType.BranchDevice
+    ContingencyViolations = 'Contingency violations', DeviceType.BranchDevice
+
     # sigma
     SigmaReal = 'Sigma real', DeviceType.BusDevice
     SigmaImag = 'Sigma imaginary', DeviceType.BusDevice
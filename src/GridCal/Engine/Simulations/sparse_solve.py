@@ -13,8 +13,10 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import threading
 import numpy as np
 from enum import Enum
+from collections import OrderedDict
 from scipy.sparse import csr_matrix, csc_matrix
 
 
@@ -48,6 +50,7 @@ except ImportError:
 
 try:
     from scipy.sparse.linalg import spsolve as scipy_spsolve, splu, spilu, gmres
+    from scipy.sparse.linalg import splu as scipy_splu
     available_sparse_solvers.append(SparseSolver.BLAS_LAPACK)
     available_sparse_solvers.append(SparseSolver.ILU)
     available_sparse_solvers.append(SparseSolver.SuperLU)
@@ -67,6 +70,7 @@ except ImportError:
 
 try:
     from scikits.umfpack import spsolve, splu
+    import scikits.umfpack as umfpack
 
     available_sparse_solvers.append(SparseSolver.UMFPACK)
 except ImportError:
@@ -184,6 +188,225 @@ def get_linear_solver(solver_type: SparseSolver = preferred_type):
             return umfpack_linsolve
 
 
+class FactorizationCache:
+    """
+    Sparse linear solver that reuses the analysis of the systems that share a sparsity pattern.
+    The pattern changes only when the structure of the problem changes (i.e. the pv / pq sets of
+    a Jacobian or the topology of the grid), so it is analyzed once along the Newton iterations,
+    the time steps and the contingencies of a study.
+
+    What is reused depends on the solver:
+        - UMFPACK and KLU: the symbolic factorization object, only the numeric factorization is repeated.
+        - SuperLU: only the fill-reducing column ordering (COLAMD). scipy does not expose the symbolic
+          factorization of SuperLU, so every system is still factorized completely with that ordering.
+    For any other solver the systems are simply solved with get_linear_solver.
+
+    A singular system gives a solution of nan values (like spsolve), so the iterative methods that use
+    this end as not converged instead of raising.
+    """
+
+    def __init__(self, solver_type: SparseSolver = preferred_type, max_size=32):
+        """
+        FactorizationCache constructor
+        :param solver_type: SparseSolver option
+        :param max_size: maximum number of symbolic analyses to keep (least recently used are dropped)
+        """
+        if solver_type == SparseSolver.BLAS_LAPACK and SparseSolver.SuperLU in available_sparse_solvers:
+            # scipy's spsolve factorizes with SuperLU, so use SuperLU directly to be able to keep the ordering
+            solver_type = SparseSolver.SuperLU
+
+        self.solver_type = solver_type
+
+        self.max_size = max_size
+
+        self.symbolic = OrderedDict()
+
+        self.lock = threading.Lock()
+
+        self.fallback = get_linear_solver(solver_type)
+
+        # UMFPACK context -> (context, owner of its current numeric factorization)
+        self.umfpack_numeric = dict()
+
+        # is the symbolic analysis reusable with the selected solver?
+        if solver_type == SparseSolver.KLU:
+            self.reuse = hasattr(klu, 'symbolic') and hasattr(klu, 'numeric')
+        else:
+            self.reuse = solver_type in [SparseSolver.SuperLU, SparseSolver.UMFPACK]
+
+        self.hits = 0
+
+        self.misses = 0
+
+    @staticmethod
+    def get_key(A, key=None):
+        """
+        Get the cache key of a matrix (the hash may collide, the pattern is compared on every hit)
+        :param A: sparse matrix (CSC)
+        :param key: hashable structural key provided by the caller (i.e. the pv / pq arrays bytes), optional
+        :return: hashable key
+        """
+        return hash((A.shape, A.indptr.tobytes(), A.indices.tobytes(), key))
+
+    def clear(self):
+        """
+        Drop all the symbolic analyses
+        """
+        with self.lock:
+            self.symbolic.clear()
+
+    def get_symbolic(self, A, key):
+        """
+        Get the symbolic analysis of the matrix pattern, computing it if needed
+        :param A: sparse matrix (CSC with sorted indices)
+        :param key: cache key
+        :return: symbolic analysis object, factorization of A if it had to be computed (or None)
+        """
+        with self.lock:
+            entry = self.symbolic.get(key, None)
+
+            if entry is not None:
+                shape, indptr, indices, sym = entry
+
+                # the key is a hash, so check that the pattern is really the same
+                if shape == A.shape and np.array_equal(indptr, A.indptr) and np.array_equal(indices, A.indices):
+                    self.symbolic.move_to_end(key)
+                    self.hits += 1
+                    return sym, None
+
+            self.misses += 1
+            lu = None
+
+            if self.solver_type == SparseSolver.SuperLU:
+                # keep the column permutation computed by COLAMD
+                lu = scipy_splu(A)
+                sym = lu.perm_c.copy()
+
+            elif self.solver_type == SparseSolver.UMFPACK:
+                sym = umfpack.UmfpackContext('dl' if A.indices.dtype == np.int64 else 'di')
+                sym.symbolic(A)
+
+            elif self.solver_type == SparseSolver.KLU:
+                sym = klu.symbolic(to_cvxopt(A))
+
+            self.symbolic[key] = (A.shape, A.indptr.copy(), A.indices.copy(), sym)
+            if len(self.symbolic) > self.max_size:
+                self.symbolic.popitem(last=False)
+
+            return sym, lu
+
+    def solve(self, A, b, key=None):
+        """
+        Solve A x = b reusing the symbolic analysis of the pattern of A
+        :param A: System matrix
+        :param b: right hand side (vector or matrix)
+        :param key: structural key provided by the caller, optional
+        :return: solution
+        """
+        if not self.reuse:
+            return self.fallback(A, b)
+
+        A = csc_matrix(A)
+        A.sort_indices()
+
+        try:
+            return self.solve_with_cache(A, b, key)
+
+        except (RuntimeError, ArithmeticError):
+            # singular matrix
+            return np.full(b.shape, np.nan)
+
+    def solve_with_cache(self, A, b, key=None):
+        """
+        Solve A x = b reusing the symbolic analysis of the pattern of A
+        :param A: System matrix (CSC with sorted indices)
+        :param b: right hand side (vector or matrix)
+        :param key: structural key provided by the caller, optional
+        :return: solution
+        """
+        return self.factorize(A, key)(b)
+
+    def factorize(self, A, key=None):
+        """
+        Factorize A reusing the symbolic analysis of its pattern, to solve several right hand sides with it
+        (a singular matrix raises RuntimeError, like splu)
+        :param A: System matrix (CSC with sorted indices)
+        :param key: structural key provided by the caller, optional
+        :return: function x = f(b) that solves A x = b
+        """
+        if not self.reuse:
+            return lambda b: self.fallback(A, b)
+
+        sym, lu = self.get_symbolic(A, self.get_key(A, key))
+
+        if self.solver_type == SparseSolver.SuperLU:
+            if lu is not None:
+                # the pattern was just analyzed and factorized
+                return lu.solve
+
+            # numeric factorization of the column-permuted matrix with the cached ordering
+            lu = scipy_splu(A[:, sym], permc_spec='NATURAL')
+
+            def solve(b):
+                y = lu.solve(b)
+                x = np.empty_like(y)
+                x[sym] = y
+                return x
+
+            return solve
+
+        elif self.solver_type == SparseSolver.UMFPACK:
+            # the numeric factorization lives in the shared context: it is repeated if another matrix replaced it
+            A = A.copy()
+            token = object()
+
+            def solve(b):
+                with self.lock:
+                    if self.umfpack_numeric.get(id(sym), (None, None))[1] is not token:
+                        sym.numeric(A)
+                        self.umfpack_numeric[id(sym)] = (sym, token)
+                    if b.ndim == 1:
+                        return sym.solve(umfpack.UMFPACK_A, A, b, autoTranspose=True)
+                    else:
+                        return np.array([sym.solve(umfpack.UMFPACK_A, A, b[:, j], autoTranspose=True)
+                                         for j in range(b.shape[1])]).T
+
+            solve(np.zeros(A.shape[0]))  # factorize now
+
+            return solve
+
+        elif self.solver_type == SparseSolver.KLU:
+            A_cvxopt = to_cvxopt(A)
+            num = klu.numeric(A_cvxopt, sym)
+
+            def solve(b):
+                x = cvxopt.matrix(b)
+                klu.solve(A_cvxopt, num, x)
+                return np.array(x)[:, 0] if b.ndim == 1 else np.array(x)
+
+            return solve
+
+
+def to_cvxopt(A):
+    """
+    Convert a scipy sparse matrix to a cvxopt sparse matrix
+    :param A: scipy sparse matrix
+    :return: cvxopt.spmatrix
+    """
+    A2 = A.tocoo()
+    return cvxopt.spmatrix(A2.data, A2.row, A2.col, A2.shape, 'd')
+
+
+def get_factorization_cache(solver_type: SparseSolver = preferred_type, max_size=32):
+    """
+    Provide a linear solver function f(A, b) that reuses the symbolic analysis of the repeated sparsity patterns
+    :param solver_type: SparseSolver option
+    :param max_size: maximum number of symbolic analyses to keep
+    :return: FactorizationCache instance (callable through its solve method)
+    """
+    return FactorizationCache(solver_type=solver_type, max_size=max_size)
+
+
 if __name__ == '__main__':
 
     import time
@@ -43,6 +43,7 @@ from GridCal.Engine.Visualization.visualization import *
 from GridCal.Engine.basic_structures import Logger, SyncIssueType
 
 from GridCal.Engine.Simulations.Stochastic.blackout_driver import *
+from GridCal.Engine.Simulations.Stochastic.lhs_driver import LatinHypercubeSampling
 from GridCal.Engine.Simulations.OPF.opf_driver import *
 from GridCal.Engine.Simulations.PTDF.ptdf_driver import *
 from GridCal.Engine.Simulations.PTDF.ptdf_ts_driver import PtdfTimeSeries
@@ -51,7 +52,7 @@ from GridCal.Engine.Simulations.OPF.opf_ts_driver import *
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import *
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import *
 from GridCal.Engine.Simulations.ShortCircuit.short_circuit_driver import *
-from GridCal.Engine.IO.export_results_driver import ExportAllThread
+from GridCal.Engine.IO.export_results_driver import ExportAllThread, ExportFormat, available_export_formats
 from GridCal.Engine.IO.file_handler import *
 from GridCal.Engine.IO.synchronization_driver import FileSyncThread
 from GridCal.Engine.Simulations.result_types import SimulationTypes
@@ -642,7 +643,7 @@ class MainGUI(QMainWindow):
                 file_name = events[0].toLocalFile()
                 name, file_extension = os.path.splitext(file_name)
                 accepted = ['.gridcal', '.xlsx', '.xls', '.sqlite',
-                            '.dgs', '.m', '.raw', '.RAW', '.json', '.xml', '.dpx']
+                            '.dgs', '.m', '.raw', '.RAW', '.json', '.xml', '.zip', '.dpx']
                 if file_extension.lower() in accepted:
 
                     if len(self.circuit.buses) > 0:
@@ -1028,7 +1029,7 @@ class MainGUI(QMainWindow):
         Open file from a Qt thread to remain responsive
         """
 
-        files_types = "Formats (*.gridcal *.xlsx *.xls *.sqlite *.dgs *.m *.raw *.RAW *.json *.xml *.dpx)"
+        files_types = "Formats (*.gridcal *.xlsx *.xls *.sqlite *.dgs *.m *.raw *.RAW *.json *.xml *.zip *.dpx)"
         # files_types = ''
         # call dialog to select the file
 
@@ -1379,7 +1380,12 @@ class MainGUI(QMainWindow):
 
         if len(available_results) > 0:
 
-            files_types = "Zip file (*.zip)"
+            # only the formats whose dependencies are installed are offered
+            formats = dict()
+            for export_format in available_export_formats:
+                extension = '.h5' if export_format == ExportFormat.HDF5 else '.zip'
+                formats[export_format.value + ' (*' + extension + ')'] = (export_format, extension)
+            files_types = ';;'.join(formats.keys())
             fname = os.path.join(self.project_directory, 'Results of ' + self.grid_editor.name_label.text())
             options = QFileDialog.Options()
             if self.use_native_dialogues:
@@ -1389,12 +1395,18 @@ class MainGUI(QMainWindow):
                                                                   options=options)
 
             if filename != "":
+                export_format, extension = formats.get(type_selected, (ExportFormat.CSV, '.zip'))
+
+                if not filename.endswith(extension):
+                    filename += extension
+
                 self.LOCK()
 
                 self.stuff_running_now.append('export_all')
                 self.export_all_thread_object = ExportAllThread(circuit=self.circuit,
                                                                 simulations_list=available_results,
-                                                                file_name=filename)
+                                                                file_name=filename,
+                                                                export_format=export_format)
 
                 self.export_all_thread_object.progress_signal.connect(self.ui.progressBar.setValue)
                 self.export_all_thread_object.progress_text.connect(self.ui.progress_label.setText)
@@ -2343,9 +2355,16 @@ class MainGUI(QMainWindow):
 
                     group_mode = self.ptdf_group_modes[self.ui.ptdf_grouping_comboBox.currentText()]
 
+                    # the DC power flow gives the DC PTDF, any other solver the AC linearized PTDF
+                    if pf_options.solver_type == SolverType.DC:
+                        method = PtdfMethod.Linear
+                    else:
+                        method = PtdfMethod.LinearAC
+
                     options = PTDFOptions(group_mode=group_mode,
                                           use_multi_threading=self.ui.use_multiprocessing_checkBox.isChecked(),
-                                          power_increment=self.ui.ptdf_power_delta_doubleSpinBox.value())
+                                          power_increment=self.ui.ptdf_power_delta_doubleSpinBox.value(),
+                                          method=method)
 
                     self.ptdf_analysis = PTDF(grid=self.circuit, options=options, pf_options=pf_options)
 
@@ -3716,9 +3735,9 @@ class MainGUI(QMainWindow):
 
             elif current_study == PTDF.name:
 
-                voltage = self.ptdf_analysis.results.pf_results[current_step].voltage
+                voltage = self.ptdf_analysis.results.get_voltage_at(current_step)
                 loading = self.ptdf_analysis.results.flows_sensitivity_matrix[current_step, :]
-                Sbranch = self.ptdf_analysis.results.pf_results[current_step].Sbranch
+                Sbranch = self.ptdf_analysis.results.get_branch_flows_at(current_step)
 
                 plot_function(circuit=self.circuit,
                               s_bus=None,
@@ -17,10 +17,15 @@
 This file includes extensions to the PuLP library
 """
 
+import os
+import subprocess
+from uuid import uuid4
 import numpy as np
-from .pulp import LpProblem, LpVariable
+from .pulp import LpProblem, LpVariable, PULP_CBC_CMD, PulpSolverError
+from .constants import LpStatusNotSolved, LpStatusOptimal, LpStatusInfeasible, LpStatusUnbounded, \
+    LpStatusUndefined
 from itertools import product
-from scipy.sparse import csc_matrix
+from scipy.sparse import csc_matrix, coo_matrix, diags as sp_diags
 
 
 def lpDot(mat, arr):
@@ -256,3 +261,345 @@ def lpGet2D(arr, make_abs=False):
         val = np.abs(val)
 
     return val
+
+
+def lpBroadcast(value, shape, default):
+    """
+    Expand a bound or cost specification to the shape of a block of variables
+    :param value: None, scalar, 1D array (one value per row of the block) or array of the block shape
+    :param shape: shape of the block
+    :param default: value to use if value is None
+    :return: float array of the given shape
+    """
+    if value is None:
+        return np.full(shape, default, dtype=float)
+
+    value = np.array(value, dtype=float)
+
+    if value.ndim == 1 and len(shape) == 2 and value.shape[0] == shape[0] and value.shape != shape:
+        value = value[:, np.newaxis]
+
+    return np.broadcast_to(value, shape).astype(float)
+
+
+def join_columns(*columns):
+    """
+    Concatenate element-wise arrays (or scalars) of strings
+    :param columns: arrays of strings of the same length or strings
+    :return: array of strings
+    """
+    result = columns[0]
+    for col in columns[1:]:
+        result = np.char.add(result, col)
+    return np.atleast_1d(result)
+
+
+def write_lines(f, lines):
+    """
+    Write an array of strings to a file, one per line
+    :param f: file object
+    :param lines: array of strings
+    """
+    if len(lines) > 0:
+        f.write('\n'.join(lines.tolist()))
+        f.write('\n')
+
+
+class LpSparseProblem:
+    """
+    Linear problem stored directly as sparse matrices:
+
+        min c·x   s.t.   A x (=, <=, >=) b,   lb <= x <= ub
+
+    The variables are created by blocks that are addressed with integer index arrays and the
+    restrictions are added as sparse blocks (COO triplets), so no Python object is created per
+    variable or per restriction. The problem is written to a MPS file column by column and solved
+    with CBC, or solved in-process with the scipy (HiGHS) linear programming interface.
+    """
+
+    def __init__(self, name='NoName'):
+        """
+        LpSparseProblem constructor
+        :param name: name of the problem
+        """
+        self.name = name
+
+        self.n_vars = 0
+        self.n_cons = 0
+
+        # variables data (by blocks)
+        self.lower = list()
+        self.upper = list()
+        self.cost_idx = list()
+        self.cost_vals = list()
+
+        # restrictions data (by blocks)
+        self.rows = list()
+        self.cols = list()
+        self.vals = list()
+        self.sense = list()
+        self.rhs = list()
+
+        # solution
+        self.status = LpStatusNotSolved
+        self.x = None
+        self.duals = None
+        self.objective = None
+
+    def add_variables(self, shape, lower=None, upper=None):
+        """
+        Declare a block of variables
+        :param shape: int or tuple with the shape of the block
+        :param lower: lower bound (None means -inf), scalar, per row or of the block shape
+        :param upper: upper bound (None means +inf), scalar, per row or of the block shape
+        :return: array of variable indices with the block shape
+        """
+        if type(shape) == int:
+            shape = (shape, )
+
+        k = int(np.prod(shape))
+        idx = np.arange(self.n_vars, self.n_vars + k).reshape(shape)
+        self.n_vars += k
+
+        self.lower.append(lpBroadcast(lower, shape, -np.inf).ravel())
+        self.upper.append(lpBroadcast(upper, shape, np.inf).ravel())
+
+        return idx
+
+    def fix_variables(self, idx, value):
+        """
+        Fix variables to a value through their bounds
+        :param idx: array of variable indices
+        :param value: values (same shape as idx)
+        """
+        lower = np.concatenate(self.lower)
+        upper = np.concatenate(self.upper)
+        lower[idx.ravel()] = np.array(value, dtype=float).ravel()
+        upper[idx.ravel()] = lower[idx.ravel()]
+        self.lower = [lower]
+        self.upper = [upper]
+
+    def add_cost(self, idx, cost):
+        """
+        Add linear cost coefficients to the objective function
+        :param idx: array of variable indices
+        :param cost: costs (same shape as idx)
+        """
+        idx = np.array(idx, dtype=int).ravel()
+        self.cost_idx.append(idx)
+        self.cost_vals.append(np.broadcast_to(np.array(cost, dtype=float).ravel(), idx.shape))
+
+    def add_restrictions(self, rows, cols, vals, rhs, op='='):
+        """
+        Add a block of restrictions given as COO triplets
+        :param rows: local row indices of the block (0..k-1)
+        :param cols: variable indices
+        :param vals: coefficients
+        :param rhs: right hand side of the block restrictions (k)
+        :param op: type of restriction (=, <=, >=)
+        :return: array of the restriction indices (k)
+        """
+        rhs = np.array(rhs, dtype=float).ravel()
+        k = len(rhs)
+        idx = np.arange(self.n_cons, self.n_cons + k)
+
+        self.rows.append(np.array(rows, dtype=int).ravel() + self.n_cons)
+        self.cols.append(np.array(cols, dtype=int).ravel())
+        self.vals.append(np.array(vals, dtype=float).ravel())
+        self.rhs.append(rhs)
+        self.sense.append(np.full(k, {'=': 'E', '<=': 'L', '>=': 'G'}[op]))
+
+        self.n_cons += k
+
+        return idx
+
+    def get_matrices(self):
+        """
+        Assemble the problem matrices
+        :return: c, A (CSC), sense, b, lb, ub
+        """
+        if len(self.cost_idx) > 0:
+            c = np.bincount(np.concatenate(self.cost_idx), weights=np.concatenate(self.cost_vals),
+                            minlength=self.n_vars)
+        else:
+            c = np.zeros(self.n_vars)
+
+        if self.n_cons > 0:
+            A = coo_matrix((np.concatenate(self.vals), (np.concatenate(self.rows), np.concatenate(self.cols))),
+                           shape=(self.n_cons, self.n_vars)).tocsc()
+            A.sum_duplicates()
+            A.eliminate_zeros()
+            sense = np.concatenate(self.sense)
+            b = np.concatenate(self.rhs)
+        else:
+            A = csc_matrix((0, self.n_vars))
+            sense = np.zeros(0, dtype=str)
+            b = np.zeros(0)
+
+        return c, A, sense, b, np.concatenate(self.lower), np.concatenate(self.upper)
+
+    def write_mps(self, file_name):
+        """
+        Write the problem in (free) MPS format, the lines of every section are composed with array operations
+        :param file_name: name of the file
+        """
+        c, A, sense, b, lb, ub = self.get_matrices()
+
+        col_names = np.char.add('C', np.arange(self.n_vars).astype(str))
+
+        # COLUMNS: the objective entry (or a zero entry for the empty columns) followed by the matrix entries
+        counts = np.diff(A.indptr)
+        obj = np.where((c != 0) | (counts == 0))[0]
+        cols = np.r_[obj, np.repeat(np.arange(self.n_vars), counts)]
+        rows = np.r_[np.full(len(obj), 'OBJ'), np.char.add('R', A.indices.astype(str))]
+        vals = np.r_[c[obj], A.data]
+        order = np.argsort(cols, kind='stable')
+        columns = join_columns(' ', col_names[cols[order]], ' ', rows[order], ' ', vals[order].astype(str))
+
+        # RHS
+        nz = np.where(b != 0)[0]
+        rhs = join_columns(' RHS R', nz.astype(str), ' ', b[nz].astype(str))
+
+        # BOUNDS
+        fixed = lb == ub
+        free = ~fixed & np.isinf(lb) & np.isinf(ub)
+        minus = ~fixed & ~free & np.isinf(lb)
+        lower = ~fixed & ~free & ~np.isinf(lb) & (lb != 0)
+        upper = ~fixed & ~free & ~np.isinf(ub)
+        bounds = [(fixed, ' FX', lb), (free, ' FR', None), (minus, ' MI', None), (lower, ' LO', lb), (upper, ' UP', ub)]
+        bnd_cols = np.concatenate([np.where(mask)[0] for mask, _, _ in bounds])
+        bnd_lines = np.concatenate([join_columns(tpe, ' BND ', col_names[mask]) if val is None else
+                                    join_columns(tpe, ' BND ', col_names[mask], ' ', val[mask].astype(str))
+                                    for mask, tpe, val in bounds])
+        bnd_lines = bnd_lines[np.argsort(bnd_cols, kind='stable')]
+
+        with open(file_name, 'w') as f:
+            f.write('NAME ' + self.name.replace(' ', '_') + '\n')
+            f.write('ROWS\n N OBJ\n')
+            write_lines(f, join_columns(' ', sense.astype(str), ' R', np.arange(len(sense)).astype(str)))
+            f.write('COLUMNS\n')
+            write_lines(f, columns)
+            f.write('RHS\n')
+            write_lines(f, rhs)
+            f.write('BOUNDS\n')
+            write_lines(f, bnd_lines)
+            f.write('ENDATA\n')
+
+    def solve_cbc(self, msg=False, fracGap=None, threads=None, keep_files=False):
+        """
+        Solve the problem with the CBC executable shipped with PuLP
+        :param msg: show the solver output
+        :param fracGap: relative gap
+        :param threads: number of threads (None: solver default)
+        :param keep_files: keep the MPS and solution files
+        :return: status (see LpStatus)
+        """
+        solver = PULP_CBC_CMD(msg=msg, fracGap=fracGap)
+
+        if not solver.executable(solver.path):
+            raise PulpSolverError("Pulp: cannot execute %s cwd: %s" % (solver.path, os.getcwd()))
+
+        uuid = uuid4().hex
+        tmp_mps = os.path.join(solver.tmpDir, "%s-sparse.mps" % uuid)
+        tmp_sol = os.path.join(solver.tmpDir, "%s-sparse.sol" % uuid)
+
+        self.write_mps(tmp_mps)
+
+        args = [solver.path, tmp_mps]
+        if threads:
+            args += ['threads', str(threads)]
+        if fracGap is not None:
+            args += ['ratio', str(fracGap)]
+        args += ['initialSolve', 'printingOptions', 'all', 'solution', tmp_sol]
+
+        pipe = None if msg else open(os.devnull, 'w')
+        cbc = subprocess.Popen(args, stdout=pipe, stderr=pipe)
+        if cbc.wait() != 0:
+            raise PulpSolverError("Pulp: Error while trying to execute " + solver.path)
+        if pipe:
+            pipe.close()
+        if not os.path.exists(tmp_sol):
+            raise PulpSolverError("Pulp: Error while executing " + solver.path)
+
+        self.read_cbc_solution(tmp_sol)
+
+        if not keep_files:
+            for fname in [tmp_mps, tmp_sol]:
+                try:
+                    os.remove(fname)
+                except OSError:
+                    pass
+
+        return self.status
+
+    def read_cbc_solution(self, file_name):
+        """
+        Read a CBC solution file of a problem written with write_mps
+        :param file_name: name of the solution file
+        """
+        cbc_status = {'Optimal': LpStatusOptimal,
+                      'Infeasible': LpStatusInfeasible,
+                      'Integer': LpStatusInfeasible,
+                      'Unbounded': LpStatusUnbounded,
+                      'Stopped': LpStatusNotSolved}
+
+        self.x = np.zeros(self.n_vars)
+        self.duals = np.zeros(self.n_cons)
+
+        with open(file_name) as f:
+            first = f.readline().split()
+            self.status = cbc_status.get(first[0], LpStatusUndefined)
+            if 'objective' in first:
+                self.objective = float(first[-1])
+
+            for line in f:
+                if len(line) <= 2:
+                    break
+                data = line.split()
+                # in case the solution is infeasible
+                if data[0] == '**':
+                    data = data[1:]
+                name = data[1]
+                if name[0] == 'C':
+                    self.x[int(name[1:])] = float(data[2])
+                elif name[0] == 'R':
+                    self.duals[int(name[1:])] = float(data[3])
+
+    def solve_linprog(self):
+        """
+        Solve the problem in-process with scipy's linear programming interface (HiGHS)
+        :return: status (see LpStatus)
+        """
+        from scipy.optimize import linprog
+
+        c, A, sense, b, lb, ub = self.get_matrices()
+        A = A.tocsr()
+
+        eq = np.where(sense == 'E')[0]
+        le = np.where(sense == 'L')[0]
+        ge = np.where(sense == 'G')[0]
+        ineq = np.r_[le, ge]
+        sign = np.r_[np.ones(len(le)), -np.ones(len(ge))]
+
+        A_ub = sp_diags(sign) * A[ineq, :] if len(ineq) else None
+        b_ub = sign * b[ineq] if len(ineq) else None
+        A_eq = A[eq, :] if len(eq) else None
+        b_eq = b[eq] if len(eq) else None
+        bounds = [(None if np.isinf(l) else l, None if np.isinf(u) else u) for l, u in zip(lb, ub)]
+
+        res = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs')
+
+        self.status = {0: LpStatusOptimal, 2: LpStatusInfeasible, 3: LpStatusUnbounded}.get(res.status,
+                                                                                          LpStatusNotSolved)
+        self.x = res.x if res.x is not None else np.zeros(self.n_vars)
+        self.objective = res.fun
+
+        # the marginals are only given when the problem was solved to optimality
+        self.duals = np.zeros(self.n_cons)
+        if res.status == 0:
+            if len(eq) and getattr(res, 'eqlin', None) is not None and res.eqlin.marginals is not None:
+                self.duals[eq] = res.eqlin.marginals
+            if len(ineq) and getattr(res, 'ineqlin', None) is not None and res.ineqlin.marginals is not None:
+                self.duals[ineq] = sign * res.ineqlin.marginals
+
+        return self.status
@@ -0,0 +1,44 @@
+"""
+Benchmark of the PSS/e RAW parser over the bundled RAW cases
+"""
+import os
+import time
+from pathlib import Path
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.IO.psse_parser import PSSeParser, read_raw_sections
+
+
+def benchmark(fname, repetitions=5):
+    """
+    Time the tokenization and the full parse of a RAW file
+    :param fname: RAW file name
+    :param repetitions: number of runs (the best one is reported)
+    :return: tokenization time (s), full parse time (s), number of buses
+    """
+    t_read = list()
+    t_parse = list()
+    n = 0
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        read_raw_sections(fname, Logger())
+        t1 = time.perf_counter()
+        parser = PSSeParser(fname)
+        t2 = time.perf_counter()
+        t_read.append(t1 - t0)
+        t_parse.append(t2 - t1)
+        n = len(parser.circuit.buses)
+
+    return min(t_read), min(t_parse), n
+
+
+if __name__ == '__main__':
+
+    root = Path(__file__).parent.parent.parent
+    files = sorted(list((root / 'src' / 'tests' / 'data').glob('*.raw')) +
+                   list((root / 'Grids_and_profiles' / 'grids').glob('*.raw')))
+
+    print('{:<40} {:>8} {:>12} {:>12}'.format('File', 'Buses', 'Read (ms)', 'Parse (ms)'))
+    for f in files:
+        tr, tp, nb = benchmark(str(f))
+        print('{:<40} {:>8} {:>12.2f} {:>12.2f}'.format(os.path.basename(str(f)), nb, tr * 1e3, tp * 1e3))
@@ -0,0 +1,100 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from GridCal.Engine.IO.file_handler import FileOpen, FileSave
+from GridCal.Engine.IO.zip_interface import save_data_frames_to_binary_zip, open_data_frames_from_zip, \
+    to_typed_column, is_memory_mapped_from
+
+
+def test_typed_columns():
+    """
+    Checks the type inference of the text columns
+    """
+    assert to_typed_column(np.array(['1', '2'])).dtype == np.int64
+    assert to_typed_column(np.array(['1.5', ''])).dtype == float
+    assert to_typed_column(np.array(['True', 'False'])).dtype == bool
+    assert to_typed_column(np.array(['a', '1'])).dtype.kind == 'U'
+
+
+def test_profiles_are_memory_mapped(tmp_path):
+    """
+    The profiles come back as memory mapped views with the same values
+    """
+    T = pd.date_range('2020-01-01', periods=24, freq='H')
+    prof = pd.DataFrame(data=np.random.rand(24, 3), columns=['a', 'b', 'c'], index=T)
+    table = pd.DataFrame(data=np.array([['a', '1.0', 'True'], ['b', '2.5', 'False']]), columns=['name', 'P', 'active'])
+    fname = str(tmp_path / 'test.gridcal')
+
+    save_data_frames_to_binary_zip({'load': table, 'load_P_prof': prof}, fname)
+    data = open_data_frames_from_zip(fname)
+
+    assert isinstance(data['load_P_prof'].base, np.memmap)
+    assert np.allclose(data['load_P_prof'], prof.values)
+    assert list(data['load']['P'].values) == [1.0, 2.5]
+    assert list(data['load']['active'].values) == [True, False]
+
+
+def test_binary_round_trip(tmp_path):
+    """
+    Saves a grid in the binary format and opens it again
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    circuit = FileOpen(fname).open()
+
+    fname2 = str(tmp_path / 'IEEE 30 Bus.gridcal')
+    FileSave(circuit, fname2).save()
+    circuit2 = FileOpen(fname2).open()
+
+    assert len(circuit2.buses) == len(circuit.buses)
+    assert len(circuit2.get_branches()) == len(circuit.get_branches())
+    for a, b in zip(circuit.get_loads(), circuit2.get_loads()):
+        assert a.name == b.name
+        assert np.isclose(a.P, b.P)
+        if a.P_prof is not None:
+            assert np.allclose(a.P_prof, b.P_prof)
+
+
+def test_save_over_mapped_file(tmp_path):
+    """
+    Saves a grid over the binary file its profiles are memory mapped from
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    circuit = FileOpen(fname).open()
+
+    fname2 = str(tmp_path / 'IEEE 30 Bus with storage.gridcal')
+    FileSave(circuit, fname2).save()
+    circuit2 = FileOpen(fname2).open()
+
+    loads = [elm for elm in circuit2.get_loads() if elm.P_prof is not None]
+    assert len(loads) > 0
+    assert is_memory_mapped_from(loads[0].P_prof, fname2)
+
+    loads[0].P_prof = loads[0].P_prof * 2.0
+    expected = [elm.P_prof.copy() for elm in loads]
+
+    FileSave(circuit2, fname2).save()
+
+    # the mapped profiles are now in memory
+    for elm in circuit2.get_loads():
+        assert not is_memory_mapped_from(elm.P_prof, fname2)
+
+    circuit3 = FileOpen(fname2).open()
+    loads3 = [elm for elm in circuit3.get_loads() if elm.P_prof is not None]
+    for a, b in zip(expected, loads3):
+        assert np.allclose(a, b.P_prof)
@@ -0,0 +1,61 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
+from GridCal.Engine.Simulations.Stochastic.blackout_driver import get_cascade_circuit, run_cascade, \
+    CascadingEnsemble
+
+
+def test_cascade_restores_the_circuit():
+    """
+    A cascade switches the branches of the compiled circuit in place and restores them at the end
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    main_circuit = FileOpen(fname).open()
+    options = PowerFlowOptions()
+    nc = get_cascade_circuit(main_circuit, options)
+
+    active = nc.branch_active.copy()
+    Ybus = nc.Ybus.copy()
+
+    steps, V, loading, energized = run_cascade(nc, options, triggering_idx=[0], max_loading=0.5)
+
+    assert len(steps) > 0
+    assert np.array_equal(steps[0], [0])
+    assert np.array_equal(nc.branch_active, active)
+    assert np.allclose((nc.Ybus - Ybus).toarray(), 0)
+
+
+def test_cascading_ensemble():
+    """
+    Runs a small ensemble in a single process
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    main_circuit = FileOpen(fname).open()
+    options = PowerFlowOptions()
+
+    triggers = [[i] for i in range(5)]
+    driver = CascadingEnsemble(main_circuit, options, triggers, max_loading=0.8, use_multi_process=False)
+    driver.run()
+
+    res = driver.results
+    assert np.all(res.steps_number >= 1)
+    assert np.all(res.failed_number >= 1)
+    assert np.all(res.branch_failure_count[:5] >= 1)
+    assert np.all(res.load_shed >= 0)
@@ -0,0 +1,85 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import zipfile
+
+from GridCal.Engine.IO.cim_parser import CIMCircuit
+
+EQ = """<?xml version="1.0" encoding="utf-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:cim="http://iec.ch/TC57/2009/CIM-schema-cim14#">
+  <!-- a comment with a <cim:ACLineSegment rdf:ID="_fake"> inside -->
+  <cim:BaseVoltage rdf:ID="_bv">
+    <cim:BaseVoltage.nominalVoltage>110</cim:BaseVoltage.nominalVoltage>
+  </cim:BaseVoltage>
+  <cim:ACLineSegment rdf:ID="_line">
+    <cim:IdentifiedObject.name>Line 1</cim:IdentifiedObject.name>
+    <cim:ACLineSegment.r>0.5</cim:ACLineSegment.r>
+    <cim:ConductingEquipment.BaseVoltage rdf:resource="#_bv"/>
+  </cim:ACLineSegment>
+  <cim:Terminal rdf:ID="_t1">
+    <cim:Terminal.ConductingEquipment rdf:resource="#_line"/>
+  </cim:Terminal>
+  <cim:Terminal rdf:ID="_t2">
+    <cim:Terminal.ConductingEquipment rdf:resource="#_line"/>
+  </cim:Terminal>
+</rdf:RDF>
+"""
+
+TP = """<?xml version="1.0" encoding="utf-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:cim="http://iec.ch/TC57/2009/CIM-schema-cim14#">
+  <cim:Terminal rdf:about="#_t1">
+    <cim:Terminal.connected>true</cim:Terminal.connected>
+  </cim:Terminal>
+</rdf:RDF>
+"""
+
+
+def check_circuit(cim: CIMCircuit):
+    cim.find_references(recognised=set())
+
+    assert len(cim.elements_by_type['ACLineSegment']) == 1
+    assert len(cim.elements_by_type['Terminal']) == 2  # the TP terminal is merged, not duplicated
+
+    line = cim.elements_by_type['ACLineSegment'][0]
+    assert line.properties['name'] == 'Line 1'
+    assert line.properties['r'] == '0.5'
+    assert line.base_voltage[0].properties['nominalVoltage'] == '110'
+    assert [t.id for t in line.terminals] == ['_t1', '_t2']
+
+    assert cim.elm_dict['_t1'].properties['connected'] == 'true'
+
+
+def test_parse_xml_files(tmp_path):
+    eq_file = tmp_path / 'grid_EQ.xml'
+    tp_file = tmp_path / 'grid_TP.xml'
+    eq_file.write_text(EQ)
+    tp_file.write_text(TP)
+
+    cim = CIMCircuit()
+    cim.parse_file(str(eq_file))
+    cim.parse_file(str(tp_file))
+
+    check_circuit(cim)
+
+
+def test_parse_zip_file(tmp_path):
+    zip_file = tmp_path / 'grid.zip'
+    with zipfile.ZipFile(str(zip_file), 'w') as f:
+        f.writestr('grid_EQ.xml', EQ)
+        f.writestr('grid_TP.xml', TP)
+
+    cim = CIMCircuit()
+    cim.parse_file(str(zip_file))
+
+    check_circuit(cim)
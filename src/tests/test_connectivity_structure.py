@@ -0,0 +1,69 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.Core.topology import ConnectivityStructure
+
+
+def get_structure():
+    """
+    Triangle 0-1-2, bridges 2-3 and 3-4 and two parallel branches 4-5
+    """
+    F = np.array([0, 1, 2, 2, 3, 4, 4])
+    T = np.array([1, 2, 0, 3, 4, 5, 5])
+    return ConnectivityStructure(6, F, T, np.ones(7, dtype=bool))
+
+
+def test_bridges():
+    """
+    Only the branches 3 and 4 split the grid (the parallel branches do not)
+    """
+    cs = get_structure()
+    assert cs.island_number == 1
+    assert [cs.splits_island(k) for k in range(7)] == [False, False, False, True, True, False, False]
+
+
+def test_split():
+    """
+    Checks the bus sets produced by disconnecting a bridge
+    """
+    cs = get_structure()
+    lbl, remaining, separated = cs.get_split(4)
+    sets = sorted([list(remaining), list(separated)])
+    assert sets == [[0, 1, 2, 3], [4, 5]]
+    assert cs.get_split(0) is None
+
+
+def test_switching():
+    """
+    Switching branches updates the islands and the bridges
+    """
+    cs = get_structure()
+
+    # the remaining parallel branch becomes a bridge
+    cs.set_branch_state(5, False)
+    assert cs.splits_island(6)
+
+    # opening a bridge splits the island
+    cs.set_branch_state(3, False)
+    assert cs.island_number == 2
+    islands = cs.get_islands()
+    assert [list(i) for i in islands] == [[0, 1, 2], [3, 4, 5]]
+
+    # closing it again joins them
+    cs.set_branch_state(3, True)
+    assert cs.island_number == 1
+    assert cs.splits_island(3)
+    assert not cs.splits_island(0)
@@ -0,0 +1,119 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import zipfile
+from io import BytesIO
+
+import h5py
+import numpy as np
+import pandas as pd
+
+import GridCal.Engine.IO.export_results_driver as export_results_driver
+from GridCal.Engine.IO.export_results_driver import ExportFormat, ExportAllThread, result_to_bytes, \
+    write_result_to_h5
+from GridCal.Engine.Simulations.result_types import ResultTypes
+
+
+def get_data():
+    index = pd.date_range('2020-01-01', periods=48, freq='H')
+    columns = ['Branch 1', 'Branch 2', 'Branch 3']
+    data = np.random.rand(48, 3) + 1j * np.random.rand(48, 3)
+    return index, columns, data
+
+
+class DummyModel:
+
+    def __init__(self, index, columns, data):
+        self.index = index
+        self.columns = columns
+        self.data = data
+
+    def get_data(self):
+        return self.index, self.columns, self.data
+
+
+class DummyResults:
+
+    def __init__(self):
+        self.name = 'Dummy'
+        self.available_results = [ResultTypes.BranchActivePower, ResultTypes.BranchLoading]
+        self.index, self.columns, self.data = get_data()
+
+    def mdl(self, result_type):
+        return DummyModel(self.index, self.columns, self.data)
+
+
+class DummyDriver:
+
+    def __init__(self):
+        self.results = DummyResults()
+
+
+def test_export_npz():
+    index, columns, data = get_data()
+
+    ext, raw = result_to_bytes(ExportFormat.Numpy, index, columns, data)
+    assert ext == '.npz'
+
+    npz = np.load(BytesIO(raw))
+    assert np.allclose(npz['data'], data)
+    assert list(npz['columns']) == columns
+    assert (pd.to_datetime(npz['index']) == index).all()
+
+
+def test_export_h5(tmp_path):
+    index, columns, data = get_data()
+    file_name = str(tmp_path / 'results.h5')
+
+    with h5py.File(file_name, 'w') as f:
+        write_result_to_h5(f, 'Time series Branch power', index, columns, data)
+
+    with h5py.File(file_name, 'r') as f:
+        grp = f['Time series Branch power']
+        assert grp['data'].chunks is not None
+        assert grp['data'].compression == 'gzip'
+        assert np.allclose(grp['data'][()], data)
+        assert [c.decode('utf-8') for c in grp['columns'][()]] == columns
+        assert grp.attrs['index_type'] == 'datetime64[ns]'
+        assert (pd.to_datetime(grp['index'][()]) == index).all()
+
+
+def test_export_all_zip(tmp_path):
+    file_name = str(tmp_path / 'results.zip')
+
+    thread = ExportAllThread(circuit=None, simulations_list=[DummyDriver()], file_name=file_name,
+                             export_format=ExportFormat.Numpy, max_workers=2)
+    thread.run()
+
+    assert thread.valid
+    with zipfile.ZipFile(file_name) as f:
+        assert len(f.namelist()) == 2
+
+
+def test_export_all_failure_removes_file(tmp_path, monkeypatch):
+    file_name = str(tmp_path / 'results.zip')
+
+    def fail(*args):
+        raise ValueError('serialization failed')
+
+    monkeypatch.setattr(export_results_driver, 'result_to_bytes', fail)
+
+    thread = ExportAllThread(circuit=None, simulations_list=[DummyDriver()], file_name=file_name,
+                             export_format=ExportFormat.CSV)
+    thread.run()
+
+    assert not thread.valid
+    assert len(thread.logger) > 0
+    assert not os.path.exists(file_name)
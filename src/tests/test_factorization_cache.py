@@ -0,0 +1,93 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import spsolve
+
+from GridCal.Engine.Simulations.sparse_solve import FactorizationCache, SparseSolver
+
+
+def test_factorization_cache():
+    """
+    Solve several systems with the same sparsity pattern and different values
+    and check that the pattern analysis is reused and the solutions are right
+    """
+    np.random.seed(0)
+    n = 200
+    A0 = sp.rand(n, n, 0.02, format='csc') + sp.eye(n, format='csc') * 10.0
+    A0.sort_indices()
+
+    cache = FactorizationCache(solver_type=SparseSolver.SuperLU)
+
+    for i in range(5):
+        A = A0.copy()
+        A.data = A0.data * np.random.rand(len(A0.data)) + 1e-3
+        b = np.random.rand(n)
+
+        x = cache.solve(A, b)
+
+        assert np.allclose(x, spsolve(A, b))
+
+    assert cache.misses == 1
+    assert cache.hits == 4
+
+
+def test_factorization_cache_singular():
+    """
+    A singular system gives nan values instead of raising, like spsolve
+    """
+    A = sp.csc_matrix(np.array([[1.0, 2.0], [2.0, 4.0]]))
+    b = np.ones(2)
+
+    cache = FactorizationCache(solver_type=SparseSolver.SuperLU)
+
+    assert np.isnan(cache.solve(A, b)).all()
+
+
+def test_factorization_cache_collision():
+    """
+    An entry whose key collides with a different pattern must not be reused
+    """
+    A1 = sp.csc_matrix(np.array([[4.0, 1.0, 0.0], [1.0, 4.0, 0.0], [0.0, 0.0, 4.0]]))
+    A2 = sp.csc_matrix(np.array([[4.0, 0.0, 1.0], [0.0, 4.0, 0.0], [1.0, 0.0, 4.0]]))
+    b = np.array([1.0, 2.0, 3.0])
+
+    cache = FactorizationCache(solver_type=SparseSolver.SuperLU)
+    cache.get_key = lambda A, key=None: 0  # force the same key for both patterns
+
+    assert np.allclose(cache.solve(A1, b), spsolve(A1, b))
+    assert np.allclose(cache.solve(A2, b), spsolve(A2, b))
+    assert cache.misses == 2
+
+
+def test_factorization_cache_factorize():
+    """
+    Checks that the factorizations returned by the cache solve several right hand sides
+    and that the second factorization of a pattern reuses its analysis
+    """
+    np.random.seed(2)
+    A = sp.random(40, 40, density=0.1, format='csc') + sp.identity(40, format='csc') * 4.0
+    A.sort_indices()
+
+    cache = FactorizationCache(solver_type=SparseSolver.SuperLU)
+    for i in range(2):
+        A.data *= 1.1
+        solve = cache.factorize(A)
+        for j in range(3):
+            b = np.random.rand(40)
+            assert np.allclose(A.dot(solve(b)), b)
+
+    assert cache.misses == 1
+    assert cache.hits == 1
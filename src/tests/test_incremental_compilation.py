@@ -0,0 +1,85 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, update_snapshot_circuit
+
+
+def test_incremental_compilation():
+    """
+    Checks that patching a compilation after some modifications gives the same circuit as compiling again
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'Illinois 200 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+
+    # the imported grids (i.e. PSS/e) may have idtags that are not hexadecimal
+    main_circuit.buses[0].idtag = '212_ 1'
+    main_circuit.lines[3].idtag = 'line 3'
+
+    nc0 = update_snapshot_circuit(main_circuit)
+
+    # modify some devices
+    main_circuit.lines[3].active = False
+    main_circuit.lines[7].X *= 1.5
+    main_circuit.transformers2w[0].tap_module = 0.98
+    load = main_circuit.get_loads()[2]
+    load.P *= 2.0
+
+    main_circuit.set_modified([main_circuit.lines[3], main_circuit.lines[7], main_circuit.transformers2w[0], load])
+
+    nc1 = update_snapshot_circuit(main_circuit)
+    nc2 = compile_snapshot_circuit(main_circuit)
+
+    assert nc1 is nc0  # the compilation was patched
+    assert len(main_circuit.get_modified()) == 0
+    assert np.allclose(nc1.Sbus, nc2.Sbus)
+    assert np.allclose(nc1.Ybus.toarray(), nc2.Ybus.toarray())
+    assert np.allclose(nc1.Yf.toarray(), nc2.Yf.toarray())
+    assert np.allclose(nc1.Yt.toarray(), nc2.Yt.toarray())
+    assert np.allclose(nc1.Yseries.toarray(), nc2.Yseries.toarray())
+    assert np.allclose(nc1.Yshunt, nc2.Yshunt)
+    assert np.allclose(nc1.B1.toarray(), nc2.B1.toarray())
+    assert np.allclose(nc1.B2.toarray(), nc2.B2.toarray())
+
+
+def test_incremental_compilation_moved_device():
+    """
+    Checks that moving an injection device to another bus triggers a full compilation
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    nc0 = update_snapshot_circuit(main_circuit)
+
+    # move a load to another bus
+    bus1 = [bus for bus in main_circuit.buses if len(bus.loads) > 0][0]
+    bus2 = [bus for bus in main_circuit.buses if bus is not bus1][0]
+    load = bus1.loads.pop(0)
+    load.bus = bus2
+    bus2.loads.append(load)
+
+    main_circuit.set_modified(load)
+
+    nc1 = update_snapshot_circuit(main_circuit)
+    nc2 = compile_snapshot_circuit(main_circuit)
+
+    assert nc1 is not nc0  # the compilation was done again
+    assert np.allclose(nc1.Sbus, nc2.Sbus)
+    assert np.allclose((nc1.C_bus_load - nc2.C_bus_load).toarray(), 0)
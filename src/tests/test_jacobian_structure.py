@@ -0,0 +1,55 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
+from GridCal.Engine.Simulations.PTDF.ptdf_ts_driver import JacobianStructure
+
+
+def test_jacobian_structure():
+    """
+    Checks that the Jacobian updated in place matches the Jacobian built from scratch at several
+    operating points and that the factorization is only repeated out of the tolerance band
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(main_circuit)
+
+    structure = JacobianStructure(Ybus=nc.Ybus, Yf=nc.Yf, Yt=nc.Yt,
+                                  Cf=nc.C_branch_bus_f, Ct=nc.C_branch_bus_t,
+                                  pq=nc.pq, pv=nc.pv)
+
+    np.random.seed(0)
+    pvpq = np.r_[nc.pv, nc.pq]
+    for i in range(3):
+        V = (1.0 + 0.05 * np.random.rand(nc.nbus)) * np.exp(0.1j * np.random.rand(nc.nbus))
+        J1 = structure.update_jacobian(V, nc.Ibus).toarray()
+        J2 = Jacobian(nc.Ybus, V, nc.Ibus, nc.pq, pvpq).toarray()
+        assert np.allclose(J1, J2)
+
+        # the solution with the reused ordering solves the system
+        structure.factorize(V, nc.Ibus)
+        f = np.random.rand(J2.shape[0])
+        assert np.allclose(J2.dot(structure.solve(f)), f)
+
+    # within the tolerance band the factorization is kept
+    n = structure.n_factorizations
+    assert not structure.factorize(structure.V_fact + 1e-6, nc.Ibus, tolerance=1e-3)
+    assert structure.n_factorizations == n
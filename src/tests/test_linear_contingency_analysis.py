@@ -0,0 +1,230 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.topology import ConnectivityStructure
+from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions, SolverType
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver
+from GridCal.Engine.Simulations.NK.n_minus_k_driver import NMinusK, NMinusKOptions
+from GridCal.Engine.Simulations.PTDF.linear_factors import make_dc_matrices, factorize_dc_matrix, make_lodf, \
+    make_lodf_columns, make_transfer_sensitivities, get_n1_flows, get_multiple_outage_flows
+
+
+def dc_flows(island):
+    """
+    Solve the DC power flow of an island
+    :param island: SnapshotCircuit
+    :return: branch flows (p.u.)
+    """
+    Bbus, Bf, A = make_dc_matrices(island)
+    lu = factorize_dc_matrix(Bbus, island.pqpv)
+    theta = np.zeros(island.nbus)
+    theta[island.pqpv] = lu.solve(island.Sbus.real[island.pqpv])
+    return Bf * theta
+
+
+def test_lodf():
+    """
+    Checks that the LODF post-contingency flows match the DC power flow without the outaged branches
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    island = split_into_islands(compile_snapshot_circuit(main_circuit))[0]
+
+    Bbus, Bf, A = make_dc_matrices(island)
+    lu = factorize_dc_matrix(Bbus, island.pqpv)
+    flows = dc_flows(island)
+
+    br_idx = np.arange(island.nbr)
+    LODF, islanding = make_lodf_columns(Bf, A, lu, island.pqpv, br_idx)
+    post = get_n1_flows(flows, LODF, br_idx)
+
+    for c in np.where(~islanding)[0][:10]:
+        island.branch_active[c] = 0
+        assert np.allclose(post[:, c], dc_flows(island), atol=1e-8)
+        island.branch_active[c] = 1
+
+    # double outage
+    pair = np.where(~islanding)[0][[0, 10]]
+    M = make_transfer_sensitivities(Bf, A, lu, island.pqpv, pair)
+    post2 = get_multiple_outage_flows(flows, M, pair)
+    island.branch_active[pair] = 0
+    assert np.allclose(post2, dc_flows(island), atol=1e-8)
+
+
+def test_streaming_n_minus_k():
+    """
+    Checks that the streamed N-2 screening evaluates every contingency and that the results do not depend
+    on the size of the chunks
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    pf_options = PowerFlowOptions(SolverType.NR)
+
+    results = list()
+    for chunk_size in [7, 1000]:
+        options = NMinusKOptions(use_multi_threading=False, linear_screening=True, k=2,
+                                 chunk_size=chunk_size, ac_verification=False)
+        simulation = NMinusK(grid=main_circuit, options=options, pf_options=pf_options)
+        simulation.run()
+        results.append(simulation.results)
+
+    m = sum(branch.active for branch in main_circuit.get_branches_wo_hvdc())
+    assert results[0].n_contingencies == m + m * (m - 1) // 2
+    assert np.allclose(results[0].top_loading, results[1].top_loading)
+    assert len(results[0].violations) == len(results[1].violations)
+
+
+def test_n_minus_k_otdf():
+    """
+    Checks that the OTDF of the linear N-1 screening is the transposed LODF matrix
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    pf_options = PowerFlowOptions(SolverType.NR)
+
+    options = NMinusKOptions(use_multi_threading=False, linear_screening=True, k=1, ac_verification=False)
+    simulation = NMinusK(grid=main_circuit, options=options, pf_options=pf_options)
+    simulation.run()
+    results = simulation.results
+
+    island = split_into_islands(compile_snapshot_circuit(main_circuit))[0]
+    Bbus, Bf, A = make_dc_matrices(island)
+    LODF, islanding = make_lodf(Bbus, Bf, A, island.pqpv)
+
+    rows = np.where(np.abs(results.base_flow) >= 1e-2)[0]
+    assert len(rows) > 0
+    assert np.allclose(results.otdf[rows, :], LODF.T[rows, :])
+    assert np.allclose(results.otdf[np.abs(results.base_flow) < 1e-2, :], 0.0)
+
+
+def test_n_minus_k_multi_process():
+    """
+    Checks that the AC contingency analysis gives the same results in parallel processes
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    pf_options = PowerFlowOptions(SolverType.NR)
+
+    results = list()
+    for use_multi_threading in [False, True]:
+        options = NMinusKOptions(use_multi_threading=use_multi_threading, linear_screening=False, k=1)
+        simulation = NMinusK(grid=main_circuit, options=options, pf_options=pf_options)
+        simulation.run()
+        results.append(simulation.results)
+
+    assert results[0].n_contingencies == results[1].n_contingencies
+    assert np.allclose(results[0].top_loading, results[1].top_loading)
+    assert np.allclose(results[0].otdf, results[1].otdf)
+    assert len(results[0].violations) == len(results[1].violations)
+
+
+def test_ac_verification():
+    """
+    Checks that the AC verified post-contingency flows match a full power flow of the grid without the branch
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    pf_options = PowerFlowOptions(SolverType.NR, tolerance=1e-8, retry_with_other_methods=False)
+
+    # with a zero threshold every contingency is flagged and verified
+    options = NMinusKOptions(use_multi_threading=False, linear_screening=True, k=1,
+                             screening_threshold=0.0, ac_verification=True)
+    simulation = NMinusK(grid=main_circuit, options=options, pf_options=pf_options)
+    simulation.run()
+    results = simulation.results
+
+    ac_flows = dict()
+    for c, i, f, l, method in results.violations:
+        if method == 'AC':
+            ac_flows[(c[0], i)] = f
+
+    verified = [c[0] for c, l, i, isl, method in results.summary if method == 'AC' and not isl]
+    assert len(verified) > 0
+
+    branches = main_circuit.get_branches_wo_hvdc()
+    for c in verified[:5]:
+        branches[c].active = False
+        power_flow = PowerFlowDriver(main_circuit, pf_options)
+        power_flow.run()
+        branches[c].active = True
+
+        expected = power_flow.results.Sbranch.real
+        compared = [(i, f) for (c2, i), f in ac_flows.items() if c2 == c]
+        assert len(compared) > 0
+        for i, f in compared:
+            assert np.isclose(f, expected[i], atol=1e-3)
+
+
+def test_n_minus_k_two_islands():
+    """
+    Checks the contingency analysis of a grid with two islands: the islands are given their own bus
+    indices, so the bridges are found in every island and the AC verified flows match a full power flow
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'grid_2_islands.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+    pf_options = PowerFlowOptions(SolverType.NR, tolerance=1e-8, retry_with_other_methods=False)
+
+    islands = split_into_islands(compile_snapshot_circuit(main_circuit))
+    assert len(islands) == 2
+    for island in islands:
+        assert island.F.max() < island.nbus
+        assert island.T.max() < island.nbus
+        structure = ConnectivityStructure.from_circuit(island)
+        assert structure.island_number == 1
+        if island.nbr == island.nbus - 1:
+            # radial island: every branch is a bridge
+            assert all(structure.splits_island(k) for k in range(island.nbr))
+
+    options = NMinusKOptions(use_multi_threading=False, linear_screening=False, k=1)
+    simulation = NMinusK(grid=main_circuit, options=options, pf_options=pf_options)
+    simulation.run()
+    assert simulation.results.n_contingencies == len(main_circuit.get_branches_wo_hvdc())
+
+    options = NMinusKOptions(use_multi_threading=False, linear_screening=True, k=1,
+                             screening_threshold=0.0, ac_verification=True)
+    simulation = NMinusK(grid=main_circuit, options=options, pf_options=pf_options)
+    simulation.run()
+    results = simulation.results
+
+    ac_flows = dict()
+    for c, i, f, l, method in results.violations:
+        if method == 'AC':
+            ac_flows[(c[0], i)] = f
+
+    verified = [c[0] for c, l, i, isl, method in results.summary if method == 'AC' and not isl]
+    assert len(verified) > 0
+
+    branches = main_circuit.get_branches_wo_hvdc()
+    for c in verified[:5]:
+        branches[c].active = False
+        power_flow = PowerFlowDriver(main_circuit, pf_options)
+        power_flow.run()
+        branches[c].active = True
+
+        expected = power_flow.results.Sbranch.real
+        for (c2, i), f in ac_flows.items():
+            if c2 == c:
+                assert np.isclose(f, expected[i], atol=1e-3)
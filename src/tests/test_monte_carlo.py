@@ -0,0 +1,62 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+from pathlib import Path
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import SolverType
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_driver import MonteCarlo
+
+
+def run_monte_carlo(grid, multi_core, seed=0):
+    """
+    Run a short Monte Carlo simulation with a fixed seed
+    :param grid: MultiCircuit instance
+    :param multi_core: use the process pool
+    :param seed: random seed
+    :return: MonteCarloResults
+    """
+    options = PowerFlowOptions(SolverType.NR, verbose=False, multi_core=multi_core)
+    np.random.seed(seed)
+    mc = MonteCarlo(grid, options, mc_tol=1e-9, batch_size=10, max_mc_iter=30)
+    mc.run()
+    return mc.results
+
+
+def test_monte_carlo_multi_core():
+    """
+    The process pool must sample and solve the same points as the single core run
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    grid = FileOpen(fname).open()
+
+    # random load profiles to sample from
+    rng = np.random.RandomState(1)
+    grid.create_profiles(24, 1, 'h')
+    for load in grid.get_loads():
+        load.P_prof = load.P * (0.5 + rng.rand(24))
+        load.Q_prof = load.Q * (0.5 + rng.rand(24))
+
+    single = run_monte_carlo(grid, multi_core=False)
+    multi = run_monte_carlo(grid, multi_core=True)
+
+    assert single.V_points.shape == (30, grid.get_bus_number())
+    assert np.abs(single.V_points).std(axis=0).max() > 1e-4  # the samples do differ
+    assert multi.V_points.shape == single.V_points.shape
+    assert np.allclose(multi.V_points, single.V_points, atol=1e-8)
+    assert np.allclose(multi.Sbr_points, single.Sbr_points, atol=1e-6)
+    assert np.allclose(multi.voltage, single.voltage, atol=1e-8)
+    assert np.allclose(multi.error_series, single.error_series)
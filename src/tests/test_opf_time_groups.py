@@ -0,0 +1,116 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.basic_structures import TimeGrouping
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
+from GridCal.Engine.Simulations.OPF.opf_driver import OptimalPowerFlowOptions
+from GridCal.Engine.Simulations.OPF.opf_ts_driver import OptimalPowerFlowTimeSeries
+
+
+def get_grid():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    grid = FileOpen(fname).open()
+
+    # the generators of this grid are not dispatchable and their fixed power exceeds the load
+    for i, gen in enumerate(grid.get_generators()):
+        gen.enabled_dispatch = True
+        gen.Cost_prof[:] = 1.0 + i
+
+    for load in grid.get_loads():
+        load.Cost_prof[:] = 1000.0
+
+    return grid
+
+
+def run_opf_by_groups(grid, parallel_groups, overlap_steps=0):
+    options = OptimalPowerFlowOptions(power_flow_options=PowerFlowOptions(),
+                                      grouping=TimeGrouping.Hourly,
+                                      sparse_formulation=True,
+                                      in_process_solver=True,
+                                      parallel_groups=parallel_groups,
+                                      overlap_steps=overlap_steps)
+    driver = OptimalPowerFlowTimeSeries(grid=grid, options=options)
+    driver.run()
+    return driver
+
+
+def test_opf_parallel_groups():
+    """
+    Checks that the time groups solved in parallel give the same dispatch as the groups solved one after the other
+    """
+    grid = get_grid()
+    for bus in grid.buses:
+        bus.batteries = list()
+
+    sequential = run_opf_by_groups(grid, parallel_groups=False)
+    parallel = run_opf_by_groups(grid, parallel_groups=True)
+
+    assert sequential.results.converged.all()
+    assert parallel.results.converged.all()
+    assert np.allclose(sequential.results.generator_power, parallel.results.generator_power, atol=1e-4)
+    assert np.allclose(sequential.results.Sbranch, parallel.results.Sbranch, atol=1e-4)
+    assert np.allclose(sequential.results.load_shedding, parallel.results.load_shedding, atol=1e-4)
+
+
+def test_opf_groups_battery_continuity():
+    """
+    Checks that the state of charge of the batteries is continuous across the time group boundaries
+    """
+    grid = get_grid()
+
+    sequential = run_opf_by_groups(grid, parallel_groups=False)
+    parallel = run_opf_by_groups(grid, parallel_groups=True)
+
+    assert sequential.results.converged.all()
+    assert np.allclose(sequential.results.battery_energy, parallel.results.battery_energy, atol=1e-4)
+
+    # E(t) = E(t-1) - dt * Pb(t) / eff for every time step, including the first step of every group
+    nc = sequential.numerical_circuit
+    eff = (nc.battery_discharge_efficiency + nc.battery_charge_efficiency) / 2.0
+    t = pd.to_datetime(grid.time_profile)
+    dt = np.floor((t[1:] - t[:-1]).total_seconds().values) / 3600.0  # whole seconds, like the formulation
+    E = sequential.results.battery_energy
+    Pb = sequential.results.battery_power
+    assert np.allclose(E[1:, :] - E[:-1, :], -dt[:, np.newaxis] * Pb[1:, :] / eff[np.newaxis, :], atol=1e-4)
+
+
+def test_opf_groups_overlap():
+    """
+    Checks the parallel time groups with batteries solved with an overlapping horizon
+    """
+    grid = get_grid()
+
+    overlap = run_opf_by_groups(grid, parallel_groups=True, overlap_steps=2)
+    nc = overlap.numerical_circuit
+    E = overlap.results.battery_energy
+
+    assert overlap.results.converged.all()
+    assert len(overlap.logger) == 0  # the groups were not run sequentially
+    assert np.all(E >= nc.battery_min_soc * nc.battery_enom - 1e-6)
+    assert np.all(E <= nc.battery_max_soc * nc.battery_enom + 1e-6)
+
+    # within every group the energy follows the battery power
+    eff = (nc.battery_discharge_efficiency + nc.battery_charge_efficiency) / 2.0
+    t = pd.to_datetime(grid.time_profile)
+    dt = np.floor((t[1:] - t[:-1]).total_seconds().values) / 3600.0
+    for start_, end_ in overlap.get_group_intervals():
+        dE = E[start_ + 1:end_, :] - E[start_:end_ - 1, :]
+        dE_pb = -dt[start_:end_ - 1, np.newaxis] * overlap.results.battery_power[start_ + 1:end_, :] / eff
+        assert np.allclose(dE, dE_pb, atol=1e-4)
@@ -0,0 +1,42 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+from GridCal.Engine.IO.psse_parser import PSSeParser, split_raw_record, is_raw_section_end
+
+
+def test_split_raw_record():
+    """
+    Checks the splitting of records with quoted strings and comments
+    """
+    assert split_raw_record("  1,'BUS 1  ', 138.0,3 / comment\n") == [1, "'BUS 1  '", 138.0, 3]
+    assert split_raw_record("  1,'A/B, C',2.5\n") == [1, "'A/B, C'", 2.5]
+    assert is_raw_section_end("0 / END OF BUS DATA, BEGIN LOAD DATA\n")
+    assert is_raw_section_end("Q\n")
+    assert not is_raw_section_end("0, 0.0\n")
+
+
+def test_parse_ieee14():
+    """
+    Parses the IEEE 14 bus RAW file
+    """
+    fname = Path(__file__).parent / 'data' / 'IEEE 14 bus.raw'
+    circuit = PSSeParser(str(fname)).circuit
+
+    assert len(circuit.buses) == 14
+    assert len(circuit.lines) == 17
+    assert len(circuit.transformers2w) == 3
+    assert len(circuit.get_loads()) == 11
+    assert circuit.buses[0].name == 'BUS 1'
@@ -0,0 +1,82 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions, SolverType
+from GridCal.Engine.Simulations.PTDF.ptdf_driver import PTDF, PTDFOptions, PtdfGroupMode, PtdfMethod
+from GridCal.Engine.Simulations.PTDF.linear_factors import make_dc_matrices, make_lodf
+
+
+def test_analytical_ptdf():
+    """
+    Checks that the thresholded (sparse) PTDF gives the same sensitivities as the dense one
+    and that the LODF derived from the PTDF matches the LODF computed from the DC matrices
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    pf_options = PowerFlowOptions(SolverType.DC, retry_with_other_methods=False)
+
+    results = list()
+    for threshold in [0.0, 1e-12]:
+        options = PTDFOptions(group_mode=PtdfGroupMode.ByNode, power_increment=10,
+                              method=PtdfMethod.Linear, threshold=threshold, chunk_size=7)
+        driver = PTDF(grid=main_circuit, options=options, pf_options=pf_options)
+        driver.run()
+        results.append(driver.results)
+
+    assert np.allclose(results[0].flows_sensitivity_matrix, results[1].flows_sensitivity_matrix)
+
+    island = split_into_islands(compile_snapshot_circuit(main_circuit))[0]
+    Bbus, Bf, A = make_dc_matrices(island)
+    LODF, islanding = make_lodf(Bbus, Bf, A, island.pqpv)
+
+    assert np.allclose(results[0].get_lodf(), LODF)
+    assert np.allclose(results[1].get_lodf(), LODF)
+
+
+def test_linear_ptdf_vs_perturbation():
+    """
+    Checks that the DC linear PTDF has the same sign convention as the one obtained by perturbing
+    DC power flows, both for the sensitivities and for the flows of every variation
+    (they are not identical because the DC power flow includes the resistances, taps and shunts)
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    pf_options = PowerFlowOptions(SolverType.DC, retry_with_other_methods=False)
+
+    results = dict()
+    for method in [PtdfMethod.Linear, PtdfMethod.Perturbation]:
+        options = PTDFOptions(group_mode=PtdfGroupMode.ByNode, power_increment=10, method=method)
+        driver = PTDF(grid=main_circuit, options=options, pf_options=pf_options)
+        driver.run()
+        driver.results.consolidate()
+        results[method] = driver.results
+
+    linear = results[PtdfMethod.Linear]
+    perturbation = results[PtdfMethod.Perturbation]
+
+    # an opposite sign convention would give differences close to 2
+    assert np.abs(linear.flows_sensitivity_matrix - perturbation.flows_sensitivity_matrix).max() < 0.2
+
+    for i in range(linear.n_variations):
+        Sf_linear = linear.get_branch_flows_at(i).real
+        Sf_perturbation = perturbation.get_branch_flows_at(i).real
+        assert np.abs(Sf_linear - Sf_perturbation).max() < 0.2 * 10
@@ -0,0 +1,125 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
+from GridCal.Engine.Simulations.Stochastic.reliability_driver import get_reliability_events, accumulate_by_year, \
+    get_failed_elements_at, AdequacyEvaluator, AdequacyModel, ReliabilityStudy
+
+
+def test_reliability_events_unavailability():
+    """
+    Checks that the sampled timeline reproduces the expected unavailability mttr / (mttf + mttr)
+    """
+    np.random.seed(0)
+    mttf = np.array([1000.0, 500.0, 0.0])
+    mttr = np.array([100.0, 20.0, 10.0])
+    horizon = 1e7
+
+    times, elements, states = get_reliability_events(horizon, mttf, mttr)
+
+    assert (np.diff(times) >= 0).all()
+    assert not (elements == 2).any()  # mttf = 0 never fails
+
+    for i in range(2):
+        t = times[elements == i]
+        s = states[elements == i]
+        assert not s[0]  # the first event is a failure
+        assert (s[1:] != s[:-1]).all()  # failures and repairs alternate
+        end = np.r_[t[1:], horizon]
+        down = ((end - t) * ~s).sum() / horizon
+        assert abs(down - mttr[i] / (mttf[i] + mttr[i])) < 0.01
+
+
+def test_failed_elements_replay():
+    """
+    Checks the replay of the toggling events
+    """
+    elements = np.array([0, 2, 0, 1, 2], dtype=np.int64)
+    positions = np.array([0, 2, 3, 5], dtype=np.int64)
+    indptr, indices = get_failed_elements_at(elements, 3, positions)
+    states = [list(indices[indptr[k]:indptr[k + 1]]) for k in range(len(positions))]
+    assert states == [[], [0, 2], [2], [1]]
+
+
+def test_accumulate_by_year():
+    """
+    Checks the split of the intervals among years
+    """
+    start = np.array([10.0, 8000.0])
+    end = np.array([20.0, 9000.0])
+    value = np.array([5.0, 1.0])
+    hours, energy = accumulate_by_year(start, end, value, n_years=2, year_hours=8760.0)
+    assert np.allclose(hours, [10.0 + 760.0, 240.0])
+    assert np.allclose(energy, [50.0 + 760.0, 240.0])
+
+
+def test_adequacy_models():
+    """
+    Two buses joined by a 50 MW line: 80 MW of generation at bus 0 and 70 MW of load at bus 1
+    """
+    F = np.array([0])
+    T = np.array([1])
+    for model, expected in [(AdequacyModel.CopperPlate, 0.0),
+                            (AdequacyModel.Transport, 20.0),
+                            (AdequacyModel.DC, 20.0)]:
+        ev = AdequacyEvaluator(nbus=2, F=F, T=T, rates=np.array([50.0]), reactances=np.array([0.1]),
+                               bus_load=np.array([0.0, 70.0]), unit_bus=np.array([0]),
+                               unit_capacity=np.array([80.0]), model=model)
+        assert np.isclose(ev.get_curtailment(1, 0, np.zeros(0, dtype=int), np.zeros(0, dtype=int)), expected)
+
+        # the line is out: bus 1 is islanded without generation
+        assert np.isclose(ev.get_curtailment(2, 2, np.array([0]), np.zeros(0, dtype=int)), 70.0)
+
+
+def test_reliability_study():
+    """
+    Runs the sequential Monte Carlo study with every adequacy model over the same sampled timeline:
+    the network constraints can only increase the load curtailment
+    """
+    fname = Path(__file__).parent.parent.parent / \
+            'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    results = dict()
+    for model in [AdequacyModel.CopperPlate, AdequacyModel.Transport, AdequacyModel.DC]:
+        np.random.seed(0)
+        study = ReliabilityStudy(circuit=main_circuit, pf_options=PowerFlowOptions(), n_years=50,
+                                 model=model, years_per_chunk=10)
+        study.run()
+        results[model] = study.results
+
+        assert study.results.n_years == 50
+        assert study.results.n_events > 0
+        assert np.isfinite(study.results.lole)
+        assert np.isfinite(study.results.eens)
+        assert (study.results.lol_hours >= 0).all()
+        assert (study.results.lol_hours <= 8760.0).all()
+
+    cp = results[AdequacyModel.CopperPlate]
+    tr = results[AdequacyModel.Transport]
+    dc = results[AdequacyModel.DC]
+
+    # same events for every model
+    assert cp.n_events == tr.n_events == dc.n_events
+
+    assert cp.lole <= tr.lole + 1e-9
+    assert tr.lole <= dc.lole + 1e-9
+    assert cp.eens <= tr.eens + 1e-6
+    assert tr.eens <= dc.eens + 1e-6
@@ -0,0 +1,52 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse.linalg import inv
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit
+from GridCal.Engine.Simulations.ShortCircuit.short_circuit import short_circuit_3p, factorize_ybus, \
+    short_circuit_3p_sparse, short_circuit_levels
+
+
+def test_sparse_short_circuit():
+    """
+    Checks that the short circuit computed with the Zbus columns matches the one computed with the dense Zbus
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+
+    main_circuit = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(main_circuit)
+
+    Zbus = inv(nc.Ybus.tocsc()).toarray()
+    lu = factorize_ybus(nc.Ybus)
+    Vbus = np.ones(nc.nbus, dtype=complex)
+    Zf = np.full(nc.nbus, 1e-3 + 1e-2j)
+
+    bus_idx = [3, 7, 16, 21, 28]
+    V1, SCC1 = short_circuit_3p(bus_idx=bus_idx, Zbus=Zbus, Vbus=Vbus, Zf=Zf, baseMVA=nc.Sbase)
+    V2, SCC2 = short_circuit_3p_sparse(bus_idx=bus_idx, lu=lu, Vbus=Vbus, Zf=Zf, baseMVA=nc.Sbase, chunk_size=2)
+
+    assert np.allclose(V1, V2)
+    assert np.allclose(SCC1, SCC2)
+
+    # independent faults at every bus
+    Zth, Isc, SCC = short_circuit_levels(lu=lu, Vbus=Vbus, Zf=Zf, baseMVA=nc.Sbase, chunk_size=7)
+    assert np.allclose(Zth, np.diag(Zbus))
+    for k in bus_idx:
+        V, SCC_k = short_circuit_3p(bus_idx=[k], Zbus=Zbus, Vbus=Vbus, Zf=Zf, baseMVA=nc.Sbase)
+        assert np.isclose(SCC[k], SCC_k[k])
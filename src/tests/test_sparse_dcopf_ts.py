@@ -0,0 +1,111 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.load import Load
+from GridCal.Engine.Devices.generator import Generator
+from GridCal.Engine.Devices.line import Line
+from GridCal.Engine.Core.time_series_opf_data import compile_opf_time_circuit
+from GridCal.Engine.Simulations.OPF.dc_opf_ts import OpfDcTimeSeriesSparse
+from GridCal.ThirdParty.pulp import LpSparseProblem, LpStatusInfeasible, LpStatusOptimal
+
+
+def test_sparse_dcopf_ts():
+    """
+    Checks the dispatch of the DC OPF time series assembled as sparse matrices in a grid with a known optimum:
+    the cheap generator supplies the load up to the rate of the line and the expensive one supplies the rest
+    """
+    grid = MultiCircuit()
+    bus1 = Bus('Bus1', is_slack=True)
+    bus2 = Bus('Bus2')
+    grid.add_bus(bus1)
+    grid.add_bus(bus2)
+
+    load = Load('Load', P=30, Q=0)
+    load.Cost = 1000.0  # load shedding cost
+    grid.add_load(bus2, load)
+
+    grid.add_generator(bus1, Generator('cheap', active_power=0, op_cost=1.0, p_max=100, Snom=100))
+    grid.add_generator(bus2, Generator('expensive', active_power=0, op_cost=10.0, p_max=100, Snom=100))
+
+    line = Line(bus1, bus2, 'line', r=0.001, x=0.05, rate=50)
+    line.Cost = 10000.0  # overload cost
+    grid.add_branch(line)
+
+    grid.create_profiles(3, 1, 'h')
+    load.P_prof = np.array([30.0, 60.0, 90.0])
+
+    nc = compile_opf_time_circuit(grid)
+    problem = OpfDcTimeSeriesSparse(numerical_circuit=nc, start_idx=0, end_idx=3, in_process=True)
+    status = problem.solve()
+
+    assert status == 'Optimal'
+    assert np.allclose(problem.get_generator_power(), [[30, 0], [50, 10], [50, 40]], atol=1e-6)
+    assert np.allclose(problem.get_branch_power(), [[30], [50], [50]], atol=1e-6)
+    assert np.allclose(problem.get_load_shedding(), 0, atol=1e-6)
+
+
+def test_sparse_problem():
+    """
+    Checks the solution of a small sparse problem with a known optimum and its MPS file
+    """
+    # min -x - 2y  s.t.  x + y <= 4,  x - y >= -2,  0 <= x <= 3,  y >= 0  ->  x = 1, y = 3
+    problem = LpSparseProblem('small problem')
+    x = problem.add_variables(2, lower=0, upper=[3, np.inf])
+    problem.add_cost(x[:1], [-1])
+    problem.add_cost(x[1:], [-2])
+    problem.add_restrictions(rows=[0, 0], cols=x, vals=[1, 1], rhs=[4], op='<=')
+    problem.add_restrictions(rows=[0, 0], cols=x, vals=[1, -1], rhs=[-2], op='>=')
+
+    status = problem.solve_linprog()
+
+    assert status == LpStatusOptimal
+    assert np.allclose(problem.x, [1, 3])
+    assert np.isclose(problem.objective, -7)
+
+    fname = Path(tempfile.gettempdir()) / 'test_sparse_problem.mps'
+    problem.write_mps(str(fname))
+    with open(fname) as f:
+        lines = f.read().splitlines()
+    os.remove(fname)
+
+    assert lines == ['NAME small_problem',
+                     'ROWS', ' N OBJ', ' L R0', ' G R1',
+                     'COLUMNS', ' C0 OBJ -1.0', ' C0 R0 1.0', ' C0 R1 1.0',
+                     ' C1 OBJ -2.0', ' C1 R0 1.0', ' C1 R1 -1.0',
+                     'RHS', ' RHS R0 4.0', ' RHS R1 -2.0',
+                     'BOUNDS', ' UP BND C0 3.0',
+                     'ENDATA']
+
+
+def test_sparse_problem_infeasible():
+    """
+    Checks that an infeasible sparse problem reports its status without duals
+    """
+    problem = LpSparseProblem('infeasible')
+    x = problem.add_variables(2, lower=0, upper=1)
+    problem.add_cost(x, [1, 1])
+    problem.add_restrictions(rows=[0, 0], cols=x, vals=[1, 1], rhs=[3], op='>=')
+
+    status = problem.solve_linprog()
+
+    assert status == LpStatusInfeasible
+    assert np.allclose(problem.duals, 0)
@@ -0,0 +1,56 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.basic_structures import CDF
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_input import StackedCDF, MonteCarloInput, MonteCarloSampling
+
+
+def test_stacked_cdf():
+    """
+    Checks that the stacked CDF matches the per-bus CDF objects
+    """
+    np.random.seed(0)
+    n, nt, ns = 5, 20, 100
+    data = np.random.rand(n, nt) + 1j * np.random.rand(n, nt)
+    P = np.random.rand(ns, n)
+
+    stacked = StackedCDF(data)
+    values = stacked.get_at(P)
+
+    for i in range(n):
+        expected = CDF(data[i, :]).get_at(P[:, i])
+        assert np.allclose(values[:, i], expected)
+
+
+def test_monte_carlo_input_sampling():
+    """
+    Checks the shapes produced by every sampling method
+    """
+    np.random.seed(0)
+    n, nt, ns = 4, 10, 16
+    S = np.random.rand(n, nt) + 1j * np.random.rand(n, nt)
+    I = np.zeros((n, nt), dtype=complex)
+    Y = np.zeros((n, nt), dtype=complex)
+    mc_input = MonteCarloInput(n, StackedCDF(S), StackedCDF(I), StackedCDF(Y))
+
+    for sampling in MonteCarloSampling:
+        ts = mc_input(ns, sampling=sampling)
+        assert ts.S.shape == (ns, n)
+        assert (ts.S.real >= S.real.min(axis=1)).all()
+        assert (ts.S.real <= S.real.max(axis=1)).all()
+
+    assert mc_input(0).S.shape == (n,)
+    assert mc_input.get_at(np.full(n, 0.5)).S.shape == (1, n)
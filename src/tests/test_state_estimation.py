@@ -0,0 +1,149 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Devices.measurement import Measurement, MeasurementType
+from GridCal.Engine.Simulations.StateEstimation.state_estimation import solve_se_lm, solve_se_lm_bad_data
+from GridCal.Engine.Simulations.StateEstimation.state_stimation_driver import StateEstimationInput, \
+    StateEstimationOptions, StateEstimation
+
+
+def get_measurements(nc, V):
+    """
+    Measure the injections, the flows and the voltage modules of the state V
+    """
+    S = V * np.conj(nc.Ybus * V)
+    Sf = V[nc.F] * np.conj(nc.Yf * V)
+
+    se_input = StateEstimationInput()
+
+    for i in range(nc.nbus):
+        se_input.p_inj_idx.append(i)
+        se_input.p_inj.append(Measurement(S[i].real, 0.01, MeasurementType.Pinj))
+        se_input.q_inj_idx.append(i)
+        se_input.q_inj.append(Measurement(S[i].imag, 0.01, MeasurementType.Qinj))
+        se_input.vm_m_idx.append(i)
+        se_input.vm_m.append(Measurement(np.abs(V[i]), 0.004, MeasurementType.Vmag))
+
+    for k in range(nc.nbr):
+        se_input.p_flow_idx.append(k)
+        se_input.p_flow.append(Measurement(Sf[k].real, 0.008, MeasurementType.Pflow))
+        se_input.q_flow_idx.append(k)
+        se_input.q_flow.append(Measurement(Sf[k].imag, 0.008, MeasurementType.Qflow))
+
+    return se_input
+
+
+def get_state(nc):
+    np.random.seed(0)
+    V = (1.0 + 0.05 * np.random.rand(nc.nbus)) * np.exp(-0.1j * np.random.rand(nc.nbus))
+    V[nc.vd] = np.abs(V[nc.vd])  # the slack angle is the reference
+    return V
+
+
+def test_state_estimation_lm():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    nc = compile_snapshot_circuit(FileOpen(fname).open())
+
+    V_true = get_state(nc)
+    se_input = get_measurements(nc, V_true)
+
+    V, err, converged = solve_se_lm(nc.Ybus, nc.Yf, nc.Yt, nc.F, nc.T, se_input, nc.vd, nc.pq, nc.pv)
+
+    assert converged
+    assert np.allclose(V, V_true, atol=1e-6)
+
+
+def test_state_estimation_bad_data():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    nc = compile_snapshot_circuit(FileOpen(fname).open())
+
+    V_true = get_state(nc)
+    se_input = get_measurements(nc, V_true)
+
+    # gross error in the active power flow measurement of the branch 3 (the flows come first)
+    se_input.p_flow[3].val += 0.5
+
+    V, err, converged, bad_idx, rN = solve_se_lm_bad_data(nc.Ybus, nc.Yf, nc.Yt, nc.F, nc.T, se_input,
+                                                          nc.vd, nc.pq, nc.pv, threshold=3.0)
+
+    assert converged
+    assert bad_idx == [3]
+    assert np.isnan(rN[3])
+    assert np.nanmax(rN) < 3.0
+    assert np.allclose(V, V_true, atol=1e-6)
+
+
+def test_state_estimation_driver_bad_data():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    grid = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(grid)
+
+    V_true = get_state(nc)
+    se_input = get_measurements(nc, V_true)
+
+    # place the measurements in the circuit devices (the branches in the compiled order)
+    branches = grid.lines + grid.transformers2w + grid.vsc_converters + grid.dc_lines
+    for i, m in zip(se_input.p_inj_idx + se_input.q_inj_idx + se_input.vm_m_idx,
+                    se_input.p_inj + se_input.q_inj + se_input.vm_m):
+        grid.buses[i].measurements.append(m)
+    for k, m in zip(se_input.p_flow_idx + se_input.q_flow_idx, se_input.p_flow + se_input.q_flow):
+        branches[k].measurements.append(m)
+
+    # gross error in the active power flow measurement of the branch 3
+    bad_measurement = se_input.p_flow[3]
+    bad_measurement.val += 0.5
+
+    options = StateEstimationOptions(detect_bad_data=True, bad_data_threshold=3.0)
+    se = StateEstimation(circuit=grid, options=options)
+    se.run()
+
+    assert se.se_results.converged()
+    assert len(se.se_results.bad_data_idx) == 1
+    assert se.se_results.measurements[se.se_results.bad_data_idx[0]] is bad_measurement
+    assert np.nanmax(se.se_results.normalized_residuals) < 3.0
+    assert np.allclose(se.se_results.voltage, V_true, atol=1e-6)
+
+
+def test_state_estimation_driver_two_islands():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'grid_2_islands.xlsx'
+    grid = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(grid)
+    islands = split_into_islands(nc)
+    assert len(islands) == 2
+
+    V_true = get_state(nc)
+    for island in islands:
+        slack = np.array(island.original_bus_idx)[island.vd]
+        V_true[slack] = np.abs(V_true[slack])  # the slack angle of every island is the reference
+    se_input = get_measurements(nc, V_true)
+
+    # place the measurements in the circuit devices (the branches in the compiled order)
+    branches = grid.lines + grid.transformers2w + grid.vsc_converters + grid.dc_lines
+    for i, m in zip(se_input.p_inj_idx + se_input.q_inj_idx + se_input.vm_m_idx,
+                    se_input.p_inj + se_input.q_inj + se_input.vm_m):
+        grid.buses[i].measurements.append(m)
+    for k, m in zip(se_input.p_flow_idx + se_input.q_flow_idx, se_input.p_flow + se_input.q_flow):
+        branches[k].measurements.append(m)
+
+    se = StateEstimation(circuit=grid)
+    se.run()
+
+    assert se.se_results.converged()
+    assert np.allclose(se.se_results.voltage, V_true, atol=1e-6)
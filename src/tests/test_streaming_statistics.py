@@ -0,0 +1,90 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import StreamingStatistics, MonteCarloResults
+
+
+def test_streaming_statistics():
+    """
+    Checks the batch by batch statistics against the statistics of all the samples
+    """
+    np.random.seed(1)
+    n = 6
+    X = np.random.normal(1.0, 0.2, (5000, n))
+
+    stats = StreamingStatistics(n, bins=200, thresholds=(1.2,))
+    for batch in np.array_split(X, 13):
+        stats.update(batch)
+
+    assert stats.count == X.shape[0]
+    assert np.allclose(stats.mean, X.mean(axis=0))
+    assert np.allclose(stats.variance, X.var(axis=0, ddof=1))
+    assert np.allclose(stats.min, X.min(axis=0))
+    assert np.allclose(stats.max, X.max(axis=0))
+    assert np.allclose(stats.get_exceedance_probability(1.2), (X > 1.2).mean(axis=0))
+    assert np.allclose(stats.get_exceedance_probability(1.1), (X > 1.1).mean(axis=0), atol=0.02)
+    assert np.allclose(stats.get_quantiles([0.5])[0, :], np.median(X, axis=0), atol=0.02)
+
+
+def test_streaming_statistics_drift():
+    """
+    Checks that the later batches drifting outside the range of the first one are not clipped
+    into the end bins of the histogram
+    """
+    np.random.seed(3)
+    n = 4
+    X = np.vstack([np.random.normal(1.0 + 0.5 * k, 0.05, (400, n)) for k in range(5)])
+
+    stats = StreamingStatistics(n, bins=100, thresholds=(2.5,))
+    for batch in np.array_split(X, 5):
+        stats.update(batch)
+
+    assert stats.histogram.sum() == X.size
+    assert np.all(stats.lower <= X.min(axis=0))
+    assert np.all(stats.upper >= X.max(axis=0))
+    assert np.allclose(stats.min, X.min(axis=0))
+    assert np.allclose(stats.max, X.max(axis=0))
+    for prob in (0.1, 0.5, 0.9):
+        assert np.allclose(stats.get_quantiles([prob])[0, :], np.quantile(X, prob, axis=0), atol=0.1)
+    assert np.allclose(stats.get_exceedance_probability(2.5), (X > 2.5).mean(axis=0))
+    assert np.allclose(stats.get_exceedance_probability(2.0), (X > 2.0).mean(axis=0), atol=0.05)
+
+
+def test_streaming_results_reservoir():
+    """
+    Checks that the streaming results keep a bounded reservoir and the loading exceedance
+    """
+    np.random.seed(2)
+    n, m, nb = 3, 4, 50
+    names_n = ['bus' + str(i) for i in range(n)]
+    names_m = ['branch' + str(i) for i in range(m)]
+    master = MonteCarloResults(n, m, 0, names_n, names_m, np.zeros(n), streaming=True, reservoir_size=80)
+
+    for k in range(4):
+        batch = MonteCarloResults(n, m, nb, names_n, names_m, np.zeros(n))
+        batch.V_points = np.random.normal(1.0, 0.05, (nb, n)) + 0j
+        batch.loading_points = np.random.uniform(0.5, 1.5, (nb, m)) + 0j
+        master.append_batch(batch)
+
+    master.compile()
+
+    assert master.V_points.shape == (80, n)
+    assert master.v_stats.count == 4 * nb
+    assert master.v_avg_conv.shape == (4 + 2, n)
+
+    idx, val, prob, max_loading = master.get_index_loading_cdf(max_val=1.0)
+    assert len(idx) == m
+    assert all(0.0 < p < 1.0 for p in prob)
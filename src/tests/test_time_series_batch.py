@@ -0,0 +1,139 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import \
+    PowerFlowOptions, ReactivePowerControlMode, SolverType
+from GridCal.Engine.Simulations.PowerFlow.time_series_driver import TimeSeries
+
+
+def test_batch_time_series():
+    """
+    Checks that the batch (vectorized) Newton-Raphson time series matches the step by step time series
+    """
+    fname = Path(__file__).parent.parent.parent / \
+            'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    options = PowerFlowOptions(SolverType.NR, verbose=False,
+                               initialize_with_existing_solution=False,
+                               multi_core=False, dispatch_storage=False,
+                               control_q=ReactivePowerControlMode.NoControl,
+                               tolerance=1e-8,
+                               retry_with_other_methods=False)
+
+    ts = TimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    ts.run()
+
+    options.batch_time_series = True
+    options.batch_size = 10
+    ts_batch = TimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    ts_batch.run()
+
+    assert ts_batch.results.converged.all()
+    assert np.allclose(ts.results.voltage, ts_batch.results.voltage, atol=1e-6)
+    assert np.allclose(ts.results.Sbranch, ts_batch.results.Sbranch, atol=1e-3)
+
+
+def test_multi_core_time_series():
+    """
+    Checks that the multi-core time series (step by step solver in the workers) matches the
+    single-core time series
+    """
+    fname = Path(__file__).parent.parent.parent / \
+            'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    options = PowerFlowOptions(SolverType.NR, verbose=False,
+                               initialize_with_existing_solution=False,
+                               multi_core=False, dispatch_storage=False,
+                               control_q=ReactivePowerControlMode.NoControl,
+                               tolerance=1e-8,
+                               retry_with_other_methods=False)
+
+    ts = TimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    ts.run()
+
+    options.multi_thread = True
+    options.batch_time_series = False
+    ts_mc = TimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    ts_mc.run()
+
+    assert len(ts_mc.logger) == 0
+    assert ts_mc.results.converged.all()
+    assert np.allclose(ts.results.voltage, ts_mc.results.voltage, atol=1e-6)
+    assert np.allclose(ts.results.Sbranch, ts_mc.results.Sbranch, atol=1e-3)
+
+
+def test_batch_time_series_other_solver():
+    """
+    Checks that the batch mode is not used for the solvers that it does not implement
+    """
+    fname = Path(__file__).parent.parent.parent / \
+            'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    options = PowerFlowOptions(SolverType.DC, verbose=False,
+                               initialize_with_existing_solution=False,
+                               multi_core=False, dispatch_storage=False,
+                               control_q=ReactivePowerControlMode.NoControl,
+                               retry_with_other_methods=False)
+
+    ts = TimeSeries(grid=main_circuit, options=options, start_=0, end_=24)
+    ts.run()
+
+    options.batch_time_series = True
+    ts_batch = TimeSeries(grid=main_circuit, options=options, start_=0, end_=24)
+    ts_batch.run()
+
+    assert len(ts_batch.logger) > 0
+    assert np.allclose(ts.results.voltage, ts_batch.results.voltage)
+    assert np.allclose(ts.results.Sbranch, ts_batch.results.Sbranch)
+
+
+def test_multi_core_time_series_unsupported_options():
+    """
+    Checks that the multi-core time series falls back to single-core with the options that it does not
+    support (here the distributed slack), so that both give the same results
+    """
+    fname = Path(__file__).parent.parent.parent / \
+            'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    options = PowerFlowOptions(SolverType.NR, verbose=False,
+                               initialize_with_existing_solution=False,
+                               multi_core=False, dispatch_storage=False,
+                               control_q=ReactivePowerControlMode.NoControl,
+                               distributed_slack=True,
+                               tolerance=1e-8,
+                               retry_with_other_methods=False)
+
+    ts = TimeSeries(grid=main_circuit, options=options, start_=0, end_=24)
+    ts.run()
+
+    options.multi_thread = True
+    ts_mc = TimeSeries(grid=main_circuit, options=options, start_=0, end_=24)
+    ts_mc.run()
+
+    assert len(ts_mc.logger) > 0
+    assert np.allclose(ts.results.voltage, ts_mc.results.voltage)
+    assert np.allclose(ts.results.Sbranch, ts_mc.results.Sbranch)
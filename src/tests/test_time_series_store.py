@@ -0,0 +1,130 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.IO.h5_interface import H5TimeSeriesStore
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import \
+    PowerFlowOptions, ReactivePowerControlMode, SolverType
+from GridCal.Engine.Simulations.PowerFlow.time_series_driver import TimeSeries
+from GridCal.Engine.Simulations.result_types import ResultTypes
+
+
+def test_store_blocks(tmp_path):
+    """
+    Checks the block writes and the sliced reads of the HDF5 store
+    """
+    nt, n = 100, 7
+    time_array = pd.date_range('2020-01-01', periods=nt, freq='H')
+    store = H5TimeSeriesStore.create(str(tmp_path / 'store.h5'), nt=nt,
+                                     variables={'voltage': (n, complex, 0),
+                                                'converged': (None, bool, True)},
+                                     time_array=time_array, chunk_steps=16)
+
+    expected = np.zeros((nt, n), dtype=complex)
+    cols = np.array([1, 4, 5])
+    for a in range(0, nt, 30):
+        rows = np.arange(a, min(a + 30, nt))
+        values = np.random.rand(len(rows), len(cols)) + 1j
+        store['voltage'].write_block(rows, cols, values)
+        expected[np.ix_(rows, cols)] = values
+
+    assert np.allclose(store['voltage'][10:20, 4], expected[10:20, 4])
+    assert np.allclose(np.abs(store['voltage']), np.abs(expected))
+    assert store['converged'][:].all()
+    assert (store.get_time() == time_array).all()
+    store.close()
+
+
+def test_streamed_time_series(tmp_path):
+    """
+    Checks that the time series streamed to HDF5 matches the time series in memory
+    """
+    fname = Path(__file__).parent.parent.parent / \
+            'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    options = PowerFlowOptions(SolverType.NR, verbose=False,
+                               initialize_with_existing_solution=False,
+                               multi_core=False, dispatch_storage=False,
+                               control_q=ReactivePowerControlMode.NoControl,
+                               tolerance=1e-8,
+                               retry_with_other_methods=False)
+
+    ts = TimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    ts.run()
+
+    for batch in [False, True]:
+        options.batch_time_series = batch
+        options.batch_size = 10
+        file_name = str(tmp_path / ('results_' + str(batch) + '.h5'))
+        ts_h5 = TimeSeries(grid=main_circuit, options=options, start_=0, end_=48, results_file_name=file_name)
+        ts_h5.run()
+
+        assert np.asarray(ts_h5.results.converged).all()
+        assert np.allclose(ts.results.voltage, ts_h5.results.voltage, atol=1e-6)
+        assert np.allclose(ts.results.Sbranch[:, 3], ts_h5.results.Sbranch[:, 3], atol=1e-3)
+        ts_h5.results.close()
+
+
+def test_streamed_time_series_rerun(tmp_path):
+    """
+    Checks that the time series can be run again on the same HDF5 file, in a single and in multiple processes,
+    and that the results models read only the requested elements
+    """
+    fname = Path(__file__).parent.parent.parent / \
+            'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+
+    main_circuit = FileOpen(fname).open()
+
+    options = PowerFlowOptions(SolverType.NR, verbose=False,
+                               initialize_with_existing_solution=False,
+                               multi_core=False, dispatch_storage=False,
+                               control_q=ReactivePowerControlMode.NoControl,
+                               tolerance=1e-8,
+                               retry_with_other_methods=False)
+
+    ts = TimeSeries(grid=main_circuit, options=options, start_=0, end_=24)
+    ts.run()
+
+    file_name = str(tmp_path / 'results.h5')
+    ts_h5 = TimeSeries(grid=main_circuit, options=options, start_=0, end_=24, results_file_name=file_name)
+    ts_h5.run()
+    ts_h5.run()  # the file of the previous run is released
+
+    # another simulation overwrites the same file
+    options.multi_core = True
+    ts_mt = TimeSeries(grid=main_circuit, options=options, start_=0, end_=24, results_file_name=file_name)
+    ts_mt.run()
+
+    assert np.asarray(ts_mt.results.converged).all()
+    assert np.allclose(ts.results.voltage, ts_mt.results.voltage, atol=1e-6)
+    assert np.allclose(ts.results.Sbranch, ts_mt.results.Sbranch, atol=1e-3)
+
+    indices = np.array([5, 2, 11])
+    mdl = ts_mt.results.mdl(ResultTypes.BusVoltageModule, indices=indices)
+    assert np.allclose(mdl.data_c, np.abs(ts.results.voltage[:, indices]), atol=1e-6)
+    assert list(mdl.cols_c) == list(ts.results.bus_names[indices])
+
+    mdl = ts_mt.results.mdl(ResultTypes.BranchLoading)
+    assert np.allclose(mdl.data_c, np.abs(ts.results.loading) * 100, atol=1e-3)
+
+    data = ts_mt.results.get_results_dict()
+    assert np.allclose(data['Vm'], np.abs(ts.results.voltage), atol=1e-6)
+    ts_mt.results.close()
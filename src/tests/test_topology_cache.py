@@ -0,0 +1,72 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.topology import TopologyCache, get_topology_key
+
+
+def test_topology_cache_lru():
+    """
+    Checks the least recently used eviction
+    """
+    cache = TopologyCache(max_size=2)
+    k1 = get_topology_key(np.array([1, 0, 1]), np.ones(2))
+    k2 = get_topology_key(np.array([1, 1, 1]), np.ones(2))
+    k3 = get_topology_key(np.array([0, 1, 1]), np.ones(2))
+
+    cache.set(k1, 'a')
+    cache.set(k2, 'b')
+    assert cache.get(k1) == 'a'  # k2 is now the least recently used
+    cache.set(k3, 'c')
+
+    assert len(cache) == 2
+    assert cache.get(k2) is None
+    assert cache.get(k1) == 'a'
+    assert cache.get(k3) == 'c'
+
+
+def test_split_into_islands_cached():
+    """
+    Checks that a repeated topology reuses the cached island partition
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    main_circuit = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(main_circuit)
+
+    assert len(split_into_islands(nc)) == 1
+
+    # isolate the first bus
+    br_idx = np.where((nc.F == 0) | (nc.T == 0))[0]
+    nc.branch_active[br_idx] = 0
+
+    islands1 = split_into_islands(nc)
+    misses = nc.topology_cache.misses
+    islands2 = split_into_islands(nc)
+
+    assert len(islands1) == 2
+    assert nc.topology_cache.misses == misses
+    assert nc.topology_cache.hits >= 1
+    for a, b in zip(islands1, islands2):
+        assert np.array_equal(a.original_bus_idx, b.original_bus_idx)
+        assert np.array_equal(a.original_branch_idx, b.original_branch_idx)
+
+    # back to the original topology
+    nc.branch_active[br_idx] = 1
+    assert len(split_into_islands(nc)) == 1
+    assert nc.topology_cache.misses == misses